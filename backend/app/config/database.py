@@ -1,4 +1,9 @@
 import os
+import asyncio
+import logging
+import time
+from typing import Optional
+import httpx
 from dotenv import load_dotenv
 from supabase import create_client, Client
 from supabase._async.client import create_client as create_async_client, AsyncClient
@@ -8,17 +13,30 @@ from supabase.client import ClientOptions
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 
-# MEMORY OPTIMIZATION: Add connection pooling configuration
+# Connection pool configuration for the per-worker async client.
+# Every web/scheduler worker keeps ONE AsyncClient whose PostgREST session
+# holds keep-alive HTTP/2 connections bounded by these limits.
 SUPABASE_POOL_CONFIG = {
-    "max_connections": 10,  # Limit concurrent connections
-    "min_connections": 2,   # Keep minimum connections alive
-    "connection_timeout": 30,  # Timeout after 30 seconds
-    "pool_recycle": 3600,   # Recycle connections after 1 hour
+    "max_connections": int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "20")),  # Hard cap on open connections
+    "max_keepalive_connections": int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "10")),  # Idle connections kept warm
+    "keepalive_expiry": float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "30")),  # Drop idle connections after 30s
+    "connection_timeout": float(os.getenv("SUPABASE_POOL_CONNECT_TIMEOUT", "10")),  # TCP/TLS connect timeout
+    "request_timeout": float(os.getenv("SUPABASE_POOL_REQUEST_TIMEOUT", "30")),  # Read/write timeout per request
+    "http2": os.getenv("SUPABASE_POOL_HTTP2", "true").lower() == "true",  # Multiplex requests over one connection
+    "health_check_interval": float(os.getenv("SUPABASE_POOL_HEALTH_INTERVAL", "60")),  # Seconds between health probes
 }
 
+def _require_supabase_config() -> None:
+    if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+        raise ValueError(
+            "Supabase configuration not found. Please set SUPABASE_URL and SUPABASE_SERVICE_KEY environment variables."
+        )
+
 def get_supabase_client() -> Client:
     """
     Initialize and return a Supabase client instance using the service key for admin operations.
@@ -29,29 +47,170 @@ def get_supabase_client() -> Client:
     Raises:
         ValueError: If required environment variables are not set
     """
-    if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-        raise ValueError(
-            "Supabase configuration not found. Please set SUPABASE_URL and SUPABASE_SERVICE_KEY environment variables."
-        )
+    _require_supabase_config()
     
     return create_client(
         supabase_url=SUPABASE_URL,
         supabase_key=SUPABASE_SERVICE_KEY
     )
 
-# Use connection pooling for async operations
-async def get_async_supabase_client():
-    """Get async Supabase client with connection pooling"""
-    if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-        raise ValueError(
-            "Supabase configuration not found. Please set SUPABASE_URL and SUPABASE_SERVICE_KEY environment variables."
+class AsyncSupabasePool:
+    """
+    Lifecycle-managed async Supabase client shared by everything in one worker process.
+    
+    The client (and its pooled httpx session) is bound to the event loop it was
+    created on; a different loop (e.g. a fresh asyncio.run in a script) gets its
+    own client so connections are never shared across loops.
+    """
+    
+    def __init__(self, config: dict):
+        self.config = config
+        self._client: Optional[AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._last_health_check = 0.0
+        self._healthy = False
+    
+    def _build_session(self, client: AsyncClient) -> httpx.AsyncClient:
+        """Build the pooled PostgREST session that replaces the per-client default"""
+        current = client.postgrest.session
+        return httpx.AsyncClient(
+            base_url=current.base_url,
+            headers=current.headers,
+            timeout=httpx.Timeout(
+                self.config["request_timeout"],
+                connect=self.config["connection_timeout"]
+            ),
+            limits=httpx.Limits(
+                max_connections=self.config["max_connections"],
+                max_keepalive_connections=self.config["max_keepalive_connections"],
+                keepalive_expiry=self.config["keepalive_expiry"]
+            ),
+            http2=self.config["http2"],
+            follow_redirects=True
         )
     
-    client = await create_async_client(
-        supabase_url=SUPABASE_URL, 
-        supabase_key=SUPABASE_SERVICE_KEY
-    )
-    return client
+    async def _create_client(self) -> AsyncClient:
+        _require_supabase_config()
+        
+        client = await create_async_client(
+            supabase_url=SUPABASE_URL,
+            supabase_key=SUPABASE_SERVICE_KEY
+        )
+        default_session = client.postgrest.session
+        client.postgrest.session = self._build_session(client)
+        await default_session.aclose()
+        
+        logger.info(
+            f"Created pooled async Supabase client (max_connections={self.config['max_connections']}, "
+            f"keepalive={self.config['max_keepalive_connections']}, http2={self.config['http2']})"
+        )
+        return client
+    
+    async def get_client(self) -> AsyncClient:
+        """Return the worker's shared client, creating it on first use"""
+        loop = asyncio.get_running_loop()
+        
+        if self._client is not None and self._loop is loop:
+            return self._client
+        
+        if self._lock is None or self._loop is not loop:
+            # First use on this loop - locks cannot be shared across loops
+            self._lock = asyncio.Lock()
+            self._loop = loop
+            self._client = None
+        
+        async with self._lock:
+            if self._client is None:
+                self._client = await self._create_client()
+                self._healthy = True
+                self._last_health_check = time.monotonic()
+        
+        return self._client
+    
+    async def health_check(self, force: bool = False) -> bool:
+        """
+        Probe the database through the pooled client.
+        
+        A failed probe drops the client so the next caller rebuilds the pool
+        with fresh connections.
+        
+        Args:
+            force: Probe even if the last check is within health_check_interval
+            
+        Returns:
+            bool: True if the pooled client can reach Supabase
+        """
+        now = time.monotonic()
+        if not force and self._client is not None and now - self._last_health_check < self.config["health_check_interval"]:
+            return self._healthy
+        
+        try:
+            client = await self.get_client()
+            await client.table("users").select("id").limit(1).execute()
+            self._healthy = True
+        except Exception as e:
+            logger.warning(f"Async Supabase pool health check failed, recycling client: {e}")
+            self._healthy = False
+            await self.close()
+        finally:
+            self._last_health_check = now
+        
+        return self._healthy
+    
+    async def close(self) -> None:
+        """Close pooled connections; the next get_client() starts a new pool"""
+        client, self._client = self._client, None
+        if client is None:
+            return
+        
+        try:
+            await client.postgrest.aclose()
+            storage_session = getattr(client._storage, "session", None)
+            if storage_session is not None:
+                await storage_session.aclose()
+            logger.info("Closed pooled async Supabase client")
+        except Exception as e:
+            logger.warning(f"Error closing pooled async Supabase client: {e}")
+    
+    def get_status(self) -> dict:
+        """Get pool status for diagnostics"""
+        return {
+            "active": self._client is not None,
+            "healthy": self._healthy,
+            "config": dict(self.config)
+        }
+
+# Global per-worker pool instance
+_async_pool = AsyncSupabasePool(SUPABASE_POOL_CONFIG)
+
+async def get_async_supabase_client() -> AsyncClient:
+    """
+    Get the worker's pooled async Supabase client.
+    
+    Safe to use as a FastAPI dependency: every request shares the same client and
+    its keep-alive connections instead of paying for a new pool and TLS handshake.
+    
+    Raises:
+        ValueError: If required environment variables are not set
+    """
+    return await _async_pool.get_client()
+
+async def init_async_supabase_pool() -> bool:
+    """Warm the pool at startup so the first request doesn't pay connection setup"""
+    return await _async_pool.health_check(force=True)
+
+async def check_async_supabase_health(force: bool = False) -> bool:
+    """Health check for the pooled async client (rebuilds the pool on failure)"""
+    return await _async_pool.health_check(force=force)
+
+async def close_async_supabase_pool() -> None:
+    """Gracefully close the pooled async client on shutdown"""
+    await _async_pool.close()
+
+def get_async_supabase_pool_status() -> dict:
+    """Get status of the pooled async client"""
+    return _async_pool.get_status()
 
 # Create a singleton instance for backward compatibility
-supabase = get_supabase_client() 
\ No newline at end of file
+supabase = get_supabase_client() 
@@ -12,6 +12,19 @@ from routers.habit_verification import router as habit_verification_router
 from routers.habits import router as habits_router
 from fastapi.staticfiles import StaticFiles
 from tasks.scheduler import setup_scheduler, check_and_charge_penalties
+from utils.conditional_requests import ConditionalRequestMiddleware, CONDITIONAL_ROUTES
+from utils.memory_optimization import configure_gc
+from utils.ttl_cache import get_cache_stats
+from utils.aws_client_manager import get_async_rekognition
+from utils.stripe_gateway import stripe_gateway
+from utils.http_clients import integration_http, close_http_clients
+from services.notification_service import notification_service
+from services.push_outbox import push_outbox, PushOutboxConsumer, PUSH_OUTBOX
+from config.database import (
+    init_async_supabase_pool, close_async_supabase_pool,
+    check_async_supabase_health, get_async_supabase_pool_status
+)
+import asyncio
 import os
 from pathlib import Path
 import logging
@@ -31,6 +44,10 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Conditional GET (strong ETag + If-None-Match) for selected routes. Added before
+# GZip so it wraps the uncompressed, deterministic body.
+app.add_middleware(ConditionalRequestMiddleware, routes=CONDITIONAL_ROUTES)
+
 # MEMORY OPTIMIZATION: Add compression middleware to reduce response sizes
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 
@@ -48,29 +65,10 @@ app.add_middleware(
 async def add_cache_control_headers(request, call_next):
     response = await call_next(request)
     
-    # Add cache headers for static-like endpoints
-    if request.url.path in ["/api/sync/delta"]:
-        response.headers["Cache-Control"] = "private, max-age=60"  # Cache for 1 minute
-    elif "image" in request.url.path or "static" in request.url.path:
+    # Add cache headers for static-like endpoints (conditional routes set their own)
+    if "image" in request.url.path or "static" in request.url.path:
         response.headers["Cache-Control"] = "public, max-age=3600"  # Cache images for 1 hour
     
-    # Add ETag for better caching
-    if hasattr(response, 'body') and response.status_code == 200:
-        import hashlib
-        etag = hashlib.md5(str(response.body)[:100].encode()).hexdigest()
-        response.headers["ETag"] = f'"{etag}"'
-    
-    return response
-
-# Memory optimization middleware - Skip for high-performance endpoints
-@app.middleware("http")
-async def memory_cleanup_middleware(request: Request, call_next):
-    response = await call_next(request)
-    
-    # Skip cleanup for high-performance endpoints to reduce latency
-    if request.url.path in ["/api/sync/delta"]:
-        return response
-    
     return response
 
 # Mount static files directory for icons
@@ -114,6 +112,15 @@ async def startup_event():
     except Exception as e:
         logger.warning(f"Memory monitoring setup failed: {e}")
     
+    # Warm the per-worker Supabase connection pool before taking traffic
+    try:
+        if await init_async_supabase_pool():
+            logger.info("Async Supabase connection pool ready")
+        else:
+            logger.warning("Async Supabase connection pool failed its startup health check")
+    except Exception as e:
+        logger.warning(f"Async Supabase connection pool warmup failed: {e}")
+    
     # Only start scheduler if we're NOT running as a web dyno
     # The worker dyno will handle all scheduled tasks
     dyno_type = os.getenv("DYNO", "").startswith("web")
@@ -128,11 +135,45 @@ async def startup_event():
         # Running as Heroku web dyno - scheduler runs in worker dyno
         logger.info("Web dyno started - scheduler runs in worker dyno")
         logger.info("This dyno focuses on API requests only")
+    
+    # Queued pushes are delivered by the worker dyno; an in-memory outbox can only be
+    # drained by the process that filled it
+    if push_outbox is not None and (not is_web_dyno or PUSH_OUTBOX == "memory"):
+        app.state.push_consumer = asyncio.create_task(PushOutboxConsumer(push_outbox).run())
+        logger.info("Push outbox consumer started")
+    
+    # Startup objects are long-lived: freeze them out of future collections and raise thresholds
+    configure_gc()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    push_consumer = getattr(app.state, "push_consumer", None)
+    if push_consumer is not None:
+        push_consumer.cancel()
+    # Drain keep-alive connections so the dyno exits cleanly
+    await close_async_supabase_pool()
+    await close_http_clients()
+    get_async_rekognition().shutdown()
+    stripe_gateway.shutdown()
 
 @app.get("/")
 async def root():
     return {"message": "Joy Thief API is running"}
 
+@app.get("/health")
+async def health():
+    """Health check including the pooled database client"""
+    database_healthy = await check_async_supabase_health()
+    return {
+        "status": "ok" if database_healthy else "degraded",
+        "database": get_async_supabase_pool_status(),
+        "caches": get_cache_stats(),
+        "rekognition": get_async_rekognition().get_metrics(),
+        "stripe": stripe_gateway.get_metrics(),
+        "apns": notification_service.get_metrics(),
+        "integrations": integration_http.get_status()
+    }
+
 # Add endpoints to handle WebView automatic requests for icons
 @app.get("/favicon.ico")
 async def favicon():
@@ -15,7 +15,6 @@ from PIL import Image, ImageOps
 import io
 from botocore.exceptions import ClientError, NoCredentialsError
 from config.settings import get_settings
-from config.aws import get_rekognition_client
 from config.twilio import get_twilio_client
 import logging
 from typing import Any
@@ -29,13 +28,23 @@ except Exception:  # pragma: no cover - Twilio may not be installed in some envi
 
 settings = get_settings()
 from utils.memory_optimization import disable_print
+from utils.auth_cache import (
+    hash_token,
+    is_token_blacklisted,
+    get_cached_principal,
+    set_cached_principal,
+    revoke_token,
+    invalidate_user_principal
+)
 from utils import (
     generate_profile_photo_url,
     generate_identity_snapshot_url,
     upload_to_supabase_storage_with_retry,
     validate_face_in_image,
     detect_moderation_labels,
-    is_content_appropriate_for_profile
+    is_content_appropriate_for_profile,
+    get_async_rekognition,
+    RekognitionTimeoutError
 )
 
 load_dotenv()
@@ -204,6 +213,7 @@ async def login_for_access_token(
         await supabase.table("users").update({
             "last_active": datetime.utcnow().isoformat()
         }).eq("id", user_data["id"]).execute()
+        invalidate_user_principal(user_data["id"])
         
         # Return both token and user data with profile photo URL
         return {
@@ -354,9 +364,18 @@ async def signup(
             raise HTTPException(status_code=400, detail="Invalid verification photo.")
 
         # Face detection on verification photo (must have one face)
-        rekognition_client = get_rekognition_client()
-        if rekognition_client:
-            face_validation = validate_face_in_image(verification_processed_bytes, rekognition_client)
+        rekognition = get_async_rekognition()
+        if rekognition.is_available():
+            try:
+                face_validation = await rekognition.run(
+                    lambda client: validate_face_in_image(verification_processed_bytes, client),
+                    "detect_faces"
+                )
+            except RekognitionTimeoutError:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Image verification temporarily unavailable"
+                )
             logger.debug(f"Signup face validation result: {face_validation}")
             if not face_validation["valid"]:
                 logger.warning(f"Signup 400: face validation failed: {face_validation['message']}")
@@ -408,6 +427,7 @@ async def signup(
             "identity_snapshot_filename": identity_snapshot_filename,
             "updated_at": datetime.utcnow().isoformat()
         }).eq("id", user_id).execute()
+        invalidate_user_principal(user_id)
         logger.info("Signup: user updated with identity snapshot filename")
 
         # Generate signed URL for identity snapshot
@@ -528,6 +548,9 @@ async def logout(
         else:
             logger.info(f"Token already blacklisted for user {user_id}")
         
+        # Reject the token on this worker immediately and drop its cached principal
+        revoke_token(token)
+        
         # Clear device tokens for this user to stop push notifications
         # and make tokens available for reuse
         device_token_result = await supabase.table("device_tokens").update({
@@ -566,9 +589,9 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        # Check if token is blacklisted
-        blacklisted = await supabase.table("blacklisted_tokens").select("*").eq("token", token).execute()
-        if blacklisted.data:
+        # Check if token is blacklisted (in-process filter, DB only on a filter hit)
+        token_hash = hash_token(token)
+        if await is_token_blacklisted(supabase, token, token_hash):
             raise credentials_exception
             
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -576,12 +599,15 @@ async def get_current_user(
         if user_id is None:
             raise credentials_exception
             
-        # Get user from Supabase using the ID from the token
-        result = await supabase.table("users").select("*").eq("id", user_id).execute()
-        if not result.data:
-            raise credentials_exception
-            
-        user_data = result.data[0]
+        # Get user from the principal cache, falling back to Supabase
+        user_data = get_cached_principal(token_hash)
+        if user_data is None:
+            result = await supabase.table("users").select("*").eq("id", user_id).execute()
+            if not result.data:
+                raise credentials_exception
+                
+            user_data = result.data[0]
+            set_cached_principal(token_hash, str(user_id), user_data)
         
         # Generate profile photo URL from filename if it exists
         profile_photo_url = await generate_profile_photo_url(supabase, user_data.get("profile_photo_filename"))
@@ -628,9 +654,9 @@ async def get_current_user_lightweight(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        # Check if token is blacklisted
-        blacklisted = await supabase.table("blacklisted_tokens").select("*").eq("token", token).execute()
-        if blacklisted.data:
+        # Check if token is blacklisted (in-process filter, DB only on a filter hit)
+        token_hash = hash_token(token)
+        if await is_token_blacklisted(supabase, token, token_hash):
             raise credentials_exception
             
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -638,12 +664,15 @@ async def get_current_user_lightweight(
         if user_id is None:
             raise credentials_exception
             
-        # Get user from Supabase using the ID from the token
-        result = await supabase.table("users").select("*").eq("id", user_id).execute()
-        if not result.data:
-            raise credentials_exception
-            
-        user_data = result.data[0]
+        # Get user from the principal cache, falling back to Supabase
+        user_data = get_cached_principal(token_hash)
+        if user_data is None:
+            result = await supabase.table("users").select("*").eq("id", user_id).execute()
+            if not result.data:
+                raise credentials_exception
+                
+            user_data = result.data[0]
+            set_cached_principal(token_hash, str(user_id), user_data)
         
         # Return a User object without generating profile photo URL
         return User(
@@ -5,8 +5,9 @@ from supabase._async.client import AsyncClient
 from models.schemas import FeedPost, Comment, User
 from utils.activity_tracking import track_user_activity
 from utils.memory_optimization import cleanup_memory, disable_print
+from utils.async_coordination import coalesced_execute
 from ..utils.comment_utils import organize_comments_flattened
-from ..utils.image_utils import generate_post_image_urls
+from ..utils.image_utils import generate_post_image_urls_batch
 from utils.memory_cleanup import _cleanup_memory
 import json
 
@@ -33,11 +34,11 @@ async def get_user_feed(
         await track_user_activity(supabase, str(current_user.id))
         user_id = str(current_user.id)
         
-        # Call shared RPC to get feed for this user
-        result = await supabase.rpc(
+        # Call shared RPC to get feed for this user (coalesced with a concurrent delta sync)
+        result = await coalesced_execute(supabase.rpc(
             "get_user_feed",
             {"user_id_param": user_id}
-        ).execute()
+        ))
         
         if not result.data:
             return []
@@ -55,14 +56,14 @@ async def get_user_feed(
         
         # Clear result early to free memory
         result = None
-        cleanup_memory(raw_posts)
         
-        # Process posts in memory-efficient chunks
-        for post in _process_posts_generator(raw_posts, since_dt):
+        posts = list(_process_posts_generator(raw_posts, since_dt))
+        
+        # Sign every image on the page in one bulk request per bucket
+        page_image_urls = await generate_post_image_urls_batch(supabase, posts)
+        
+        for post, image_urls in zip(posts, page_image_urls):
             try:
-                # Generate signed URLs for post images
-                image_urls = await generate_post_image_urls(supabase, post, post['is_private'])
-                
                 # Create FeedPost object
                 feed_post = FeedPost(
                     post_id=str(post['post_id']),
@@ -96,7 +97,7 @@ async def get_user_feed(
                 continue
         
         # Final cleanup
-        cleanup_memory(raw_posts)
+        cleanup_memory(raw_posts, posts)
         
         return feed_posts
         
@@ -234,10 +235,12 @@ async def get_posts_for_user(
         
         # Clear result early to free memory
         result = None
-        cleanup_memory(raw_posts)
+        
+        # Sign every image in one bulk request per bucket
+        post_image_urls = await generate_post_image_urls_batch(supabase, raw_posts)
         
         # Process posts with memory efficiency
-        for post in raw_posts:
+        for post, image_urls in zip(raw_posts, post_image_urls):
             try:
                 # Parse comments efficiently
                 processed_comments = []
@@ -270,9 +273,6 @@ async def get_posts_for_user(
                         print(f"❌ [FeedAPI] Error parsing comments for post {post.get('post_id')}: {e}")
                         processed_comments = []
                 
-                # Generate signed URLs for post images
-                image_urls = await generate_post_image_urls(supabase, post, post['is_private'])
-                
                 # Create FeedPost
                 feed_post = FeedPost(
                     post_id=str(post['post_id']),
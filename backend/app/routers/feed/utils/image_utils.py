@@ -2,7 +2,8 @@ from typing import Optional, Dict
 from supabase._async.client import AsyncClient
 from utils import (
     generate_post_image_url,
-    generate_post_image_urls
+    generate_post_image_urls,
+    generate_post_image_urls_batch
 )
 
 # These functions are now imported from the centralized utils package
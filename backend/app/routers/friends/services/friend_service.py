@@ -7,6 +7,7 @@ from pydantic import BaseModel
 from typing import Optional
 import asyncio
 from utils.memory_optimization import memory_optimized
+from utils.async_coordination import coalesced_execute
 from utils.memory_monitoring import memory_profile
 from ..utils.cache_utils import get_user_relationship_data
 import re
@@ -267,9 +268,9 @@ async def get_friends_service(
         current_user_id = str(current_user.id)
         
         # Use the simplified database function (1 call with optimized join)
-        result = await supabase.rpc("get_user_friends", {
+        result = await coalesced_execute(supabase.rpc("get_user_friends", {
             "user_id": current_user_id
-        }).execute()
+        }))
         
         if not result.data:
             return []
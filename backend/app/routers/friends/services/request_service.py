@@ -9,6 +9,7 @@ from supabase._async.client import AsyncClient
 from uuid import UUID
 from utils.activity_tracking import track_user_activity
 from utils.memory_optimization import memory_optimized
+from utils.async_coordination import coalesced_execute
 from utils.memory_monitoring import memory_profile
 from ..utils.cache_utils import invalidate_relationship_cache
 
@@ -87,9 +88,9 @@ async def get_received_requests_service(
         user_id = str(current_user.id)
         
         # Use the new database function with avatar data (1 call with optimized join)
-        result = await supabase.rpc("get_received_friend_requests_with_avatars", {
+        result = await coalesced_execute(supabase.rpc("get_received_friend_requests_with_avatars", {
             "user_id": user_id
-        }).execute()
+        }))
         
         if not result.data:
             return []
@@ -170,9 +171,9 @@ async def get_sent_requests_service(
         user_id = str(current_user.id)
         
         # Use the new database function with avatar data (1 call with optimized join)
-        result = await supabase.rpc("get_sent_friend_requests_with_avatars", {
+        result = await coalesced_execute(supabase.rpc("get_sent_friend_requests_with_avatars", {
             "user_id": user_id
-        }).execute()
+        }))
         
         if not result.data:
             return []
@@ -4,12 +4,15 @@ from config.database import get_async_supabase_client
 from supabase._async.client import AsyncClient
 from routers.auth import get_current_user_lightweight
 from utils.timezone_utils import get_user_timezone
+from utils.http_clients import get_http_client
 import os, httpx, logging
 from typing import Optional
 import datetime
 import pytz
 from datetime import time, timedelta
-from utils.github_commits import get_commit_count, get_current_week_github_commits
+from utils.github_commits import (
+    get_commit_count, get_commit_count_with_error_handling, get_current_week_github_commits, get_user_commit_calendar
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -27,43 +30,43 @@ if not GITHUB_CLIENT_ID or not GITHUB_CLIENT_SECRET:
 async def exchange_code_for_token(code: str) -> dict:
     """Exchange the one-time GitHub `code` for an access token and refresh token."""
     token_url = "https://github.com/login/oauth/access_token"
-    async with httpx.AsyncClient() as client:
-        headers = {"Accept": "application/json"}
-        data = {
-            "client_id": GITHUB_CLIENT_ID,
-            "client_secret": GITHUB_CLIENT_SECRET,
-            "code": code,
-        }
-        resp = await client.post(token_url, headers=headers, data=data, timeout=15)
-        if resp.status_code != 200:
-            raise HTTPException(status_code=500, detail="Failed to exchange GitHub code")
-        return resp.json()
+    client = get_http_client(token_url)
+    headers = {"Accept": "application/json"}
+    data = {
+        "client_id": GITHUB_CLIENT_ID,
+        "client_secret": GITHUB_CLIENT_SECRET,
+        "code": code,
+    }
+    resp = await client.post(token_url, headers=headers, data=data, timeout=15)
+    if resp.status_code != 200:
+        raise HTTPException(status_code=500, detail="Failed to exchange GitHub code")
+    return resp.json()
 
 async def refresh_github_token(refresh_token: str) -> dict:
     """Refresh an expired GitHub access token using the refresh token."""
     token_url = "https://github.com/login/oauth/access_token"
-    async with httpx.AsyncClient() as client:
-        headers = {"Accept": "application/json"}
-        data = {
-            "client_id": GITHUB_CLIENT_ID,
-            "client_secret": GITHUB_CLIENT_SECRET,
-            "grant_type": "refresh_token",
-            "refresh_token": refresh_token,
-        }
-        resp = await client.post(token_url, headers=headers, data=data, timeout=15)
-        if resp.status_code != 200:
-            logger.error(f"Failed to refresh GitHub token: {resp.status_code} {resp.text}")
-            raise HTTPException(status_code=500, detail="Failed to refresh GitHub token")
-        return resp.json()
+    client = get_http_client(token_url)
+    headers = {"Accept": "application/json"}
+    data = {
+        "client_id": GITHUB_CLIENT_ID,
+        "client_secret": GITHUB_CLIENT_SECRET,
+        "grant_type": "refresh_token",
+        "refresh_token": refresh_token,
+    }
+    resp = await client.post(token_url, headers=headers, data=data, timeout=15)
+    if resp.status_code != 200:
+        logger.error(f"Failed to refresh GitHub token: {resp.status_code} {resp.text}")
+        raise HTTPException(status_code=500, detail="Failed to refresh GitHub token")
+    return resp.json()
 
 async def fetch_github_user(access_token: str) -> dict:
     """Fetch the authenticated GitHub user profile."""
-    async with httpx.AsyncClient() as client:
-        headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
-        resp = await client.get("https://api.github.com/user", headers=headers, timeout=15)
-        if resp.status_code != 200:
-            raise HTTPException(status_code=500, detail="Failed to fetch GitHub user profile")
-        return resp.json()
+    client = get_http_client("https://api.github.com")
+    headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
+    resp = await client.get("https://api.github.com/user", headers=headers, timeout=15)
+    if resp.status_code != 200:
+        raise HTTPException(status_code=500, detail="Failed to fetch GitHub user profile")
+    return resp.json()
 
 # ---------------------------------------------------------------------------
 # 1) Step 1 – return an authorization URL the mobile app can open
@@ -222,17 +225,21 @@ async def github_today_commit_count(current_user=Depends(get_current_user_lightw
         start_local = user_tz.localize(datetime.datetime.combine(today_date, time.min))
         end_local = user_tz.localize(datetime.datetime.combine(today_date, time.max))
         
-        # Convert to UTC for GitHub API (GitHub expects UTC timestamps)
-        start_utc = start_local.astimezone(pytz.UTC).replace(tzinfo=None)
-        end_utc = end_local.astimezone(pytz.UTC).replace(tzinfo=None)
-        
         logger.debug(f"Fetching commits for user {user_id} for date {today_date} in timezone {user_timezone}")
-        logger.debug(f"Local range: {start_local} to {end_local}")
-        logger.debug(f"UTC range: {start_utc} to {end_utc}")
         
-        # Use the new error handling function
-        from utils.github_commits import get_commit_count_with_error_handling
-        count = await get_commit_count_with_error_handling(supabase, user_id, start_utc, end_utc)
+        calendar = None
+        if start_local.utcoffset() == end_local.utcoffset() == timedelta(0):
+            # The local day is a UTC day: read it from the cached commit calendar if its days are UTC days
+            calendar = await get_user_commit_calendar(supabase, user_id, today_date, today_date)
+        
+        if calendar is not None and calendar.utc_aligned:
+            count = calendar.count(today_date)
+        else:
+            # Convert to UTC for GitHub API (GitHub expects UTC timestamps)
+            start_utc = start_local.astimezone(pytz.UTC).replace(tzinfo=None)
+            end_utc = end_local.astimezone(pytz.UTC).replace(tzinfo=None)
+            logger.debug(f"UTC range: {start_utc} to {end_utc}")
+            count = await get_commit_count_with_error_handling(supabase, user_id, start_utc, end_utc)
         
         if count is None:
             # Check if there's a token error in the database
@@ -279,21 +286,19 @@ async def github_yesterday_commit_count(current_user=Depends(get_current_user_li
         utc_now = datetime.datetime.now(utc_tz)
         yesterday_date_utc = utc_now.date() - timedelta(days=1)
         
-        # Create timezone-aware datetime objects for start and end of yesterday in UTC
-        start_local = utc_tz.localize(datetime.datetime.combine(yesterday_date_utc, time.min))
-        end_local = utc_tz.localize(datetime.datetime.combine(yesterday_date_utc, time.max))
-        
-        # Convert to UTC for GitHub API (GitHub expects UTC timestamps)
-        start_utc = start_local.astimezone(pytz.UTC).replace(tzinfo=None)
-        end_utc = end_local.astimezone(pytz.UTC).replace(tzinfo=None)
-        
         logger.debug(f"Using EXACT test_github_commits.py logic (UTC timezone)")
         logger.debug(f"UTC yesterday: {yesterday_date_utc}")
-        logger.debug(f"UTC range: {start_utc} to {end_utc}")
         
-        # Use the new error handling function
-        from utils.github_commits import get_commit_count_with_error_handling
-        count = await get_commit_count_with_error_handling(supabase, user_id, start_utc, end_utc)
+        # Read yesterday's day from the user's cached commit calendar (shared with the other counts)
+        calendar = await get_user_commit_calendar(supabase, user_id, yesterday_date_utc, yesterday_date_utc)
+        
+        if calendar is not None and calendar.utc_aligned:
+            count = calendar.count(yesterday_date_utc)
+        else:
+            # GitHub's days aren't UTC days: count the UTC day exactly, as the penalty check does
+            start_utc = datetime.datetime.combine(yesterday_date_utc, time.min)
+            end_utc = datetime.datetime.combine(yesterday_date_utc, time.max)
+            count = await get_commit_count_with_error_handling(supabase, user_id, start_utc, end_utc)
         
         if count is None:
             # Check if there's a token error in the database
@@ -107,14 +107,9 @@ async def reschedule_habit_notifications(
         if str(current_user.id) != habit_data['user_id']:
             raise HTTPException(status_code=403, detail="Can only reschedule notifications for your own habits")
         
-        # Delete existing unsent notifications for this habit
-        await supabase.table('scheduled_notifications').delete().eq(
-            'habit_id', habit_id
-        ).eq('sent', False).execute()
-        
-        # Schedule new notifications
+        # Replace the habit's unsent notifications, touching only rows that changed
         await habit_notification_scheduler.schedule_notifications_for_habit(
-            habit_data, supabase
+            habit_data, supabase, replace=True
         )
         
         return {
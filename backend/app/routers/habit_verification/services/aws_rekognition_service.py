@@ -1,5 +1,5 @@
 from typing import Tuple, Dict, Any, Optional
-from utils.aws_client_manager import get_aws_rekognition_client, AWSResponseCleaner
+from utils.aws_client_manager import get_aws_rekognition_client, get_async_rekognition, AWSResponseCleaner
 from utils.memory_optimization import cleanup_memory, memory_optimized
 from utils.memory_monitoring import MemoryMonitor
 from utils.moderation import is_content_appropriate
@@ -29,8 +29,8 @@ async def perform_face_verification(
         # Use AWS response cleaner for automatic cleanup
         with AWSResponseCleaner() as aws_cleaner:
             try:
-                # Perform face comparison using singleton client
-                response = rekognition_client.compare_faces(
+                # Perform face comparison on the Rekognition thread pool
+                response = await get_async_rekognition().compare_faces(
                     SourceImage={'Bytes': identity_bytes},
                     TargetImage={'Bytes': selfie_bytes},
                     SimilarityThreshold=80
@@ -144,8 +144,11 @@ async def perform_content_moderation(content_bytes: bytes) -> Tuple[bool, str]:
         # Use AWS response cleaner for automatic cleanup
         with AWSResponseCleaner() as aws_cleaner:
             try:
-                # Content moderation only
-                moderation_response = detect_moderation_labels_optimized(content_bytes, rekognition_client)
+                # Content moderation only, on the Rekognition thread pool
+                moderation_response = await get_async_rekognition().run(
+                    lambda client: detect_moderation_labels_optimized(content_bytes, client),
+                    "detect_moderation_labels"
+                )
                 aws_cleaner.register(moderation_response)
                 monitor.checkpoint("moderation_checked")
                 
@@ -3,6 +3,7 @@ from datetime import datetime
 from supabase._async.client import AsyncClient
 from utils.memory_optimization import cleanup_memory, disable_print, memory_optimized
 from utils.memory_monitoring import memory_profile
+from utils.ttl_cache import TTLCache
 from utils.timezone_utils import get_user_timezone
 # OPTIMIZATION: Use optimized habit queries
 from utils.habit_queries import get_habit_by_id
@@ -105,39 +106,31 @@ async def reset_habit_streak(habit_id: str, supabase: AsyncClient) -> int:
         print(f"❌ [Streak] Failed to reset streak for habit {habit_id}: {e}")
         return 0
 
-# OPTIMIZATION: Add caching for custom habit types (frequently accessed)
-_custom_habit_type_cache = {}
+# OPTIMIZATION: Add caching for custom habit types (frequently accessed).
+# TTL bounds how long an edited type's keywords can be stale on this worker.
+_custom_habit_type_cache = TTLCache("custom_habit_types", max_entries=500, ttl=600)
 
 @memory_optimized(cleanup_args=False)
 @memory_profile("get_custom_habit_type_cached")
 async def get_custom_habit_type_cached(supabase: AsyncClient, custom_habit_type_id: str) -> Optional[Dict[str, Any]]:
     """Get custom habit type with caching for performance"""
     try:
-        # Check cache first
-        if custom_habit_type_id in _custom_habit_type_cache:
-            return _custom_habit_type_cache[custom_habit_type_id]
-        
-        # OPTIMIZATION: Use selective columns instead of SELECT *
-        custom_type = await supabase.table("custom_habit_types").select(
-            "id, type_identifier, keywords, description"
-        ).eq("id", custom_habit_type_id).execute()
-        
-        if custom_type.data:
-            custom_type_data = custom_type.data[0]
-            
-            # Cache for future use (limit cache size)
-            if len(_custom_habit_type_cache) < 100:  # Limit cache size
-                _custom_habit_type_cache[custom_habit_type_id] = custom_type_data
-            
-            cleanup_memory(custom_type)
-            return custom_type_data
-        
-        return None
-        
+        return await _custom_habit_type_cache.get_or_load(
+            custom_habit_type_id,
+            lambda: _fetch_custom_habit_type(supabase, custom_habit_type_id)
+        )
     except Exception as e:
         print(f"Error fetching custom habit type {custom_habit_type_id}: {e}")
         return None
 
+async def _fetch_custom_habit_type(supabase: AsyncClient, custom_habit_type_id: str) -> Optional[Dict[str, Any]]:
+    # OPTIMIZATION: Use selective columns instead of SELECT *
+    custom_type = await supabase.table("custom_habit_types").select(
+        "id, type_identifier, keywords, description"
+    ).eq("id", custom_habit_type_id).execute()
+    
+    return custom_type.data[0] if custom_type.data else None
+
 @memory_optimized(cleanup_args=False)
 @memory_profile("batch_update_streaks")
 async def batch_update_streaks(supabase: AsyncClient, streak_updates: Dict[str, int]) -> Dict[str, int]:
@@ -169,5 +162,4 @@ async def batch_update_streaks(supabase: AsyncClient, streak_updates: Dict[str,
 
 def clear_custom_habit_type_cache():
     """Clear the custom habit type cache (useful for testing or when types are updated)"""
-    global _custom_habit_type_cache
     _custom_habit_type_cache.clear() 
\ No newline at end of file
@@ -14,8 +14,10 @@ from utils.storage import async_upload_to_supabase_storage_with_retry
 from utils.recipient_analytics import update_analytics_on_habit_verified
 from utils.health_processing import is_health_habit_type
 from utils.weekly_habits import update_weekly_progress
+from utils.identity_snapshot_cache import get_identity_snapshot
 from .aws_rekognition_service import perform_face_verification, perform_content_moderation
 from .habit_verification_service import check_existing_verification, increment_habit_streak
+from .verification_pipeline import VerificationPipeline
 # OPTIMIZATION: Use optimized habit queries
 from utils.habit_queries import get_habit_by_id, HABIT_VERIFICATION_COLUMNS
 from services.openai_vision_service import openai_vision_service
@@ -26,6 +28,45 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+async def _verify_identity(supabase: AsyncClient, user_id: str, selfie_contents: bytes):
+    """Pipeline stage: load the user's identity snapshot and compare it with the selfie"""
+    # OPTIMIZATION: Get only needed user fields; updated_at versions the cached snapshot
+    identity_result = await supabase.table("users").select("identity_snapshot_filename, updated_at").eq("id", user_id).execute()
+    if not identity_result.data or not identity_result.data[0].get("identity_snapshot_filename"):
+        raise HTTPException(status_code=400, detail="Identity snapshot not found. Please update your profile photo.")
+    
+    identity_filename = identity_result.data[0]["identity_snapshot_filename"]
+    
+    # Cached, pre-resized identity snapshot (storage is only hit on a miss)
+    try:
+        identity_snapshot = await get_identity_snapshot(
+            supabase, identity_filename, identity_result.data[0].get("updated_at")
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail="Failed to load identity snapshot for verification")
+    
+    return await perform_face_verification(identity_snapshot.rekognition_bytes, selfie_contents)
+
+async def _verify_with_openai(supabase: AsyncClient, habit_data: dict, habit_type: str, content_contents: bytes):
+    """Pipeline stage: OpenAI Vision check of the content image. Returns (metadata, custom_type_data)"""
+    custom_description = None
+    custom_type_data = None
+    
+    # Get custom habit description if needed
+    if habit_type.startswith("custom_") and habit_data.get("custom_habit_type_id"):
+        custom_type_data = await get_custom_habit_type_cached(
+            supabase, habit_data.get("custom_habit_type_id")
+        )
+        custom_description = custom_type_data.get("description") if custom_type_data else None
+    
+    openai_metadata = await openai_vision_service.verify_habit(
+        content_contents,
+        habit_type,
+        habit_data.get("name"),
+        custom_description
+    )
+    return openai_metadata, custom_type_data
+
 # Disable verbose printing
 @memory_optimized(cleanup_args=True)
 async def process_image_verification(
@@ -104,78 +145,48 @@ async def process_image_verification(
             
             monitor.checkpoint("aws_client_loaded")
             
-            # OPTIMIZATION: Get only needed user field for identity snapshot
-            identity_result = await supabase.table("users").select("identity_snapshot_filename").eq("id", user_id).execute()
-            if not identity_result.data or not identity_result.data[0].get("identity_snapshot_filename"):
-                raise HTTPException(status_code=400, detail="Identity snapshot not found. Please update your profile photo.")
-            
-            identity_filename = identity_result.data[0]["identity_snapshot_filename"]
-            
-            # Get identity snapshot from storage
-            try:
-                identity_response = await supabase.storage.from_("identity-snapshots").download(identity_filename)
-                identity_snapshot_bytes = identity_response
-            except Exception as e:
-                raise HTTPException(status_code=400, detail="Failed to load identity snapshot for verification")
-            
-            monitor.checkpoint("identity_snapshot_loaded")
-            log_memory_usage("identity_loaded")
-            
-            # Perform face verification
-            face_success, face_message, similarity = await perform_face_verification(
-                identity_snapshot_bytes, selfie_contents
-            )
-            
-            monitor.checkpoint("face_verification_complete")
-            log_memory_usage("face_verified")
-            
-            if not face_success:
-                raise HTTPException(status_code=400, detail=face_message)
-            
-            # Perform NSFW content moderation
-            is_appropriate, moderation_reason = await perform_content_moderation(content_contents)
-            
-            monitor.checkpoint("content_moderation_complete")
-            log_memory_usage("content_moderated")
-            
-            if not is_appropriate:
-                raise HTTPException(status_code=400, detail=moderation_reason)
-            
             # Check if this is a health habit type using the centralized utility function
             is_health_habit = is_health_habit_type(habit_type)
             
             # Initialize variables
             openai_metadata = {"valid": True, "is_screen": False}
-            custom_description = None
             custom_type_data = None
             verification_failed = False
             error_message = None
             is_screen_detected = False
             
-            # Skip OpenAI verification for health habits (they're already verified via HealthKit)
-            if not is_health_habit:
-                # Get custom habit description if needed
-                if habit_type.startswith("custom_"):
-                    if habit_data.get("custom_habit_type_id"):
-                        custom_type_data = await get_custom_habit_type_cached(
-                            supabase, habit_data.get("custom_habit_type_id")
-                        )
-                        custom_description = custom_type_data.get("description") if custom_type_data else None
+            # Face match, NSFW moderation and OpenAI vision only depend on the image bytes, so
+            # they run concurrently. Results are checked in the original order; raising on a
+            # failed check cancels the stages still running (e.g. OpenAI after a face mismatch).
+            async with VerificationPipeline("image_verification") as pipeline:
+                pipeline.start("face", _verify_identity(supabase, user_id, selfie_contents))
+                pipeline.start("moderation", perform_content_moderation(content_contents))
+                # Skip OpenAI verification for health habits (they're already verified via HealthKit)
+                if not is_health_habit:
+                    pipeline.start("openai", _verify_with_openai(supabase, habit_data, habit_type, content_contents))
                 
-                # Verify with OpenAI Vision
-                openai_metadata = await openai_vision_service.verify_habit(
-                    content_contents,
-                    habit_type,
-                    habit_data.get("name"),
-                    custom_description
-                )
+                face_success, face_message, similarity = await pipeline.result("face")
+                monitor.checkpoint("face_verification_complete")
                 
+                if not face_success:
+                    raise HTTPException(status_code=400, detail=face_message)
+                
+                is_appropriate, moderation_reason = await pipeline.result("moderation")
+                monitor.checkpoint("content_moderation_complete")
+                
+                if not is_appropriate:
+                    raise HTTPException(status_code=400, detail=moderation_reason)
+                
+                if not is_health_habit:
+                    openai_metadata, custom_type_data = await pipeline.result("openai")
+                    monitor.checkpoint("openai_verification_complete")
+            
+            log_memory_usage("verification_stages_complete")
+            
+            if not is_health_habit:
                 # Debug logging
                 logger.info(f"OpenAI verification result: {json.dumps(openai_metadata)}")
                 
-                monitor.checkpoint("openai_verification_complete")
-                log_memory_usage("openai_verified")
-                
                 # Store screen detection flag for later
                 is_screen_detected = openai_metadata.get("is_screen", False)
                 
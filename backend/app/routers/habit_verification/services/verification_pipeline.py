@@ -0,0 +1,76 @@
+import asyncio
+import time
+import logging
+from typing import Any, Coroutine, Dict
+
+logger = logging.getLogger(__name__)
+
+class VerificationPipeline:
+    """
+    Run independent verification stages concurrently, consuming their results in a
+    fixed order.
+
+    Stages start as soon as they are added. Awaiting result() gates on one stage, so
+    a failure can be reported with the same precedence as a sequential pipeline.
+    Leaving the block, normally or by exception (e.g. the face match failed), cancels
+    every stage still running, so no OpenAI/Rekognition call outlives the request.
+
+    Example:
+        async with VerificationPipeline("image_verification") as pipeline:
+            pipeline.start("face", perform_face_verification(identity, selfie))
+            pipeline.start("openai", openai_vision_service.verify_habit(...))
+
+            face_success, face_message, _ = await pipeline.result("face")
+            if not face_success:
+                raise HTTPException(status_code=400, detail=face_message)  # cancels "openai"
+            openai_metadata = await pipeline.result("openai")
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.timings: Dict[str, float] = {}  # stage -> seconds (completed or cancelled)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._started = 0.0
+
+    async def __aenter__(self) -> "VerificationPipeline":
+        self._started = time.perf_counter()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.cancel_pending()
+        self.timings["total"] = time.perf_counter() - self._started
+        logger.info(
+            f"{self.name} stage timings: "
+            + ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in self.timings.items())
+        )
+
+    async def _timed(self, stage: str, coro: Coroutine[Any, Any, Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self.timings[stage] = time.perf_counter() - started
+
+    def start(self, stage: str, coro: Coroutine[Any, Any, Any]) -> None:
+        """Schedule a stage to run concurrently with the others"""
+        self._tasks[stage] = asyncio.create_task(self._timed(stage, coro), name=f"{self.name}:{stage}")
+
+    def has(self, stage: str) -> bool:
+        return stage in self._tasks
+
+    async def result(self, stage: str) -> Any:
+        """Wait for one stage; its exception (if any) propagates to the caller"""
+        return await self._tasks[stage]
+
+    async def cancel_pending(self) -> None:
+        """Cancel unfinished stages and wait for them to unwind"""
+        pending = [task for task in self._tasks.values() if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        # Retrieve exceptions of stages nobody awaited so they aren't logged as unhandled
+        for task in self._tasks.values():
+            if task.done() and not task.cancelled():
+                task.exception()
@@ -1,70 +1,21 @@
-import time
 from typing import Optional, Dict
 from supabase._async.client import AsyncClient
 from utils.memory_optimization import cleanup_memory, disable_print, memory_optimized
+from utils.ttl_cache import TTLCache
 
 # Disable verbose printing for performance
 print = disable_print()
 
-# MEMORY OPTIMIZATION: Reduce cache size and implement LRU eviction
-_url_cache = {}
-_cache_access_order = []  # LRU tracking
-_cache_size_limit = 100  # Reduced from 1000 to prevent memory growth
-
-def _cleanup_cache():
-    """Aggressive cache cleanup with LRU eviction"""
-    current_time = time.time()
-    
-    # Remove expired entries
-    expired_keys = []
-    for key in list(_url_cache.keys()):
-        if key not in _cache_access_order:
-            expired_keys.append(key)
-        elif current_time >= _url_cache.get(key, {}).get('expires_at', 0):
-            expired_keys.append(key)
-    
-    for key in expired_keys:
-        _url_cache.pop(key, None)
-        if key in _cache_access_order:
-            _cache_access_order.remove(key)
-    
-    # LRU eviction if cache is too large
-    while len(_url_cache) > _cache_size_limit:
-        oldest_key = _cache_access_order.pop(0)
-        _url_cache.pop(oldest_key, None)
-    
-    if expired_keys:
-        print(f"🧹 URL cache cleanup: removed {len(expired_keys)} entries, {len(_url_cache)} remaining")
+# MEMORY OPTIMIZATION: Small LRU cache; signed URLs are valid for an hour, served for 30 minutes
+_url_cache = TTLCache("verification_image_urls", max_entries=100, ttl=1800)
 
 def _get_cached_url(cache_key: str) -> Optional[str]:
-    """Get cached URL if not expired with LRU tracking"""
-    if cache_key in _url_cache:
-        cache_entry = _url_cache[cache_key]
-        if time.time() < cache_entry.get('expires_at', 0):
-            # Update LRU order
-            if cache_key in _cache_access_order:
-                _cache_access_order.remove(cache_key)
-            _cache_access_order.append(cache_key)
-            return cache_entry.get('url')
-        else:
-            # Expired - remove immediately
-            _url_cache.pop(cache_key, None)
-            if cache_key in _cache_access_order:
-                _cache_access_order.remove(cache_key)
-    return None
+    """Get cached URL if not expired"""
+    return _url_cache.get(cache_key)
 
 def _set_cached_url(cache_key: str, url: str) -> None:
-    """Cache URL with aggressive size management"""
-    # Cleanup before adding
-    _cleanup_cache()
-    
-    _url_cache[cache_key] = {
-        'url': url,
-        'expires_at': time.time() + 1800  # 30 minutes
-    }
-    if cache_key in _cache_access_order:
-        _cache_access_order.remove(cache_key)
-    _cache_access_order.append(cache_key)
+    """Cache a signed URL"""
+    _url_cache.set(cache_key, url)
 
 @memory_optimized(cleanup_args=False)
 async def generate_verification_image_url(supabase, image_filename: Optional[str], is_private: bool) -> Optional[str]:
@@ -683,14 +683,9 @@ async def update_habit_service(
         # If changes affect notifications, reschedule them
         if should_reschedule_notifications:
             try:
-                # Delete existing unsent notifications for this habit
-                await supabase.table('scheduled_notifications').delete().eq(
-                    'habit_id', habit_id
-                ).eq('sent', False).execute()
-                
-                # Schedule new notifications with updated habit data
+                # Replace unsent notifications with the updated habit's, touching only rows that changed
                 await habit_notification_scheduler.schedule_notifications_for_habit(
-                    new_habit_data, supabase
+                    new_habit_data, supabase, replace=True
                 )
                 
                 logger.info(f"Rescheduled notifications for updated habit {habit_id}")
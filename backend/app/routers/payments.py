@@ -11,6 +11,8 @@ from pydantic import BaseModel
 from models.schemas import User
 from datetime import datetime
 from utils.memory_optimization import disable_print
+from utils.stripe_gateway import stripe_gateway, idempotency_key
+from utils.auth_cache import invalidate_user_principal
 
 print = disable_print()
 
@@ -50,7 +52,8 @@ async def create_payment_intent_endpoint(
             raise HTTPException(status_code=404, detail="Penalty not found")
 
         # Create payment intent
-        payment_intent = create_payment_intent(
+        payment_intent = await stripe_gateway.call(
+            create_payment_intent,
             amount=payment_data.amount,
             currency=payment_data.currency,
             metadata={
@@ -89,7 +92,8 @@ async def create_habit_payment_intent(
         total_amount = sum(habit["penalty_amount"] for habit in habits.data)
         
         # Create a payment intent
-        intent = stripe.PaymentIntent.create(
+        intent = await stripe_gateway.call(
+            stripe.PaymentIntent.create,
             amount=int(total_amount * 100),  # Convert to cents
             currency="usd",
             automatic_payment_methods={"enabled": True},
@@ -118,7 +122,7 @@ async def create_habit_payment_intent(
 @router.post("/create-customer")
 async def create_customer_endpoint(email: str, name: Optional[str] = None):
     try:
-        customer = create_customer(email=email, name=name)
+        customer = await stripe_gateway.call(create_customer, email=email, name=name)
         return {"customer_id": customer.id}
     except Exception as e:
         logger.error(f"Error creating customer: {str(e)}")
@@ -127,7 +131,8 @@ async def create_customer_endpoint(email: str, name: Optional[str] = None):
 @router.post("/attach-payment-method")
 async def attach_payment_method_endpoint(payment_data: PaymentMethodAttach):
     try:
-        payment_method = attach_payment_method(
+        payment_method = await stripe_gateway.call(
+            attach_payment_method,
             customer_id=payment_data.customer_id,
             payment_method_id=payment_data.payment_method_id
         )
@@ -158,7 +163,8 @@ async def create_connect_account(
         logger.info(f"🔗 Creating new Stripe Connect account for user: {user['name']}")
         
         # Create a new Stripe Connect account (user will enter payout/bank info during onboarding)
-        account = stripe.Account.create(
+        account = await stripe_gateway.call(
+            stripe.Account.create,
             type="express",
             business_profile={"name": user["name"]},
             business_type="individual",
@@ -167,7 +173,9 @@ async def create_connect_account(
                 "card_payments": {"requested": True},
                 "transfers": {"requested": True},
             },
-            metadata={"user_id": str(current_user.id)}
+            metadata={"user_id": str(current_user.id)},
+            # A double-tapped "connect" button must not create two Express accounts
+            idempotency_key=idempotency_key("connect_account", current_user.id)
         )
         account_id = account.id
         logger.info(f"✅ Stripe Connect account created: {account_id}")
@@ -176,6 +184,7 @@ async def create_connect_account(
             "stripe_connect_account_id": account_id,
             "stripe_connect_status": True  # Set to True when account is created
         }).eq("id", current_user.id).execute()
+        invalidate_user_principal(current_user.id)
         
         logger.info(f"✅ Database updated with account_id: {account_id}")
 
@@ -196,14 +205,15 @@ async def create_connect_account_link(
         
         # First, verify the account exists in Stripe
         try:
-            account = stripe.Account.retrieve(link_data.account_id)
+            account = await stripe_gateway.call(stripe.Account.retrieve, link_data.account_id)
             logger.info(f"🔗 Account found in Stripe: {account.id}, status: {account.status}")
         except stripe.error.InvalidRequestError as e:
             logger.error(f"❌ Account {link_data.account_id} not found in Stripe: {str(e)}")
             raise HTTPException(status_code=400, detail=f"Account {link_data.account_id} not found in Stripe")
         
         # Create an account link for onboarding
-        account_link = stripe.AccountLink.create(
+        account_link = await stripe_gateway.call(
+            stripe.AccountLink.create,
             account=link_data.account_id,
             refresh_url=link_data.refresh_url,
             return_url=link_data.return_url,
@@ -229,7 +239,7 @@ async def get_connect_account_status(
             return {"status": "not_connected"}
         
         # Get the account status from Stripe
-        account = stripe.Account.retrieve(user.data["stripe_connect_account_id"])
+        account = await stripe_gateway.call(stripe.Account.retrieve, user.data["stripe_connect_account_id"])
         
         # Determine actual status based on account state
         if account.details_submitted and account.charges_enabled and account.payouts_enabled:
@@ -309,11 +319,14 @@ async def stripe_webhook(request: Request, supabase: AsyncClient = Depends(get_a
                     recipient = await supabase.table("users").select("*").eq("id", recipient_id).single().execute()
                     account_id = recipient.data.get("stripe_connect_account_id")
                     if account_id:
-                        transfer = stripe.Transfer.create(
+                        # Stripe redelivers webhooks, so the transfer is keyed by the payment intent
+                        transfer = await stripe_gateway.call(
+                            stripe.Transfer.create,
                             amount=int(total_amount * 100),
                             currency="usd",
                             destination=account_id,
-                            transfer_group=f"habit_{habit_id}_week"
+                            transfer_group=f"habit_{habit_id}_week",
+                            idempotency_key=idempotency_key("webhook_transfer", payment_intent_id)
                         )
                         await supabase.table("penalties") \
                             .update({"is_paid": True, "transfer_id": transfer.id, "payment_status": "completed"}) \
@@ -390,14 +403,15 @@ async def stripe_webhook(request: Request, supabase: AsyncClient = Depends(get_a
         if customer_id and payment_method_id:
             # 1️⃣ Make sure the payment-method is attached to the customer (no-op if already attached)
             try:
-                stripe.PaymentMethod.attach(payment_method_id, customer=customer_id)
+                await stripe_gateway.call(stripe.PaymentMethod.attach, payment_method_id, customer=customer_id)
             except stripe.error.InvalidRequestError as e:
                 # If already attached, Stripe throws an error – ignore in that case
                 if "already" not in str(e).lower():
                     logger.error(f"❌ Error attaching payment method: {e}")
                     raise
             # 2️⃣ Set it as dashboard-default so it shows in Stripe UI
-            stripe.Customer.modify(
+            await stripe_gateway.call(
+                stripe.Customer.modify,
                 customer_id,
                 invoice_settings={"default_payment_method": payment_method_id}
             )
@@ -411,6 +425,7 @@ async def stripe_webhook(request: Request, supabase: AsyncClient = Depends(get_a
                     "default_payment_method_id": payment_method_id,
                     "updated_at": datetime.utcnow().isoformat()
                 }).eq("id", user_id).execute()
+                invalidate_user_principal(user_id)
                 logger.debug(f"✅ Stored default_payment_method_id in DB for user {user_id}")
             else:
                 logger.warning(f"⚠️ No user found for Stripe customer: {customer_id}")
@@ -429,6 +444,8 @@ async def stripe_webhook(request: Request, supabase: AsyncClient = Depends(get_a
             "stripe_connect_status": is_fully_enabled,
             "updated_at": datetime.utcnow().isoformat()  # Update timestamp to trigger sync
         }).eq("stripe_connect_account_id", account.id).execute()
+        for row in user_result.data or []:
+            invalidate_user_principal(row["id"])
         
         logger.debug(f"✅ Updated account status for {account.id}: {is_fully_enabled}")
         
@@ -465,16 +482,20 @@ async def create_setup_intent(
         stripe_customer_id = user_row.data["stripe_customer_id"]
 
         if not stripe_customer_id:
-            customer = stripe.Customer.create(
+            customer = await stripe_gateway.call(
+                stripe.Customer.create,
                 phone=current_user.phone_number,
-                name=current_user.name
+                name=current_user.name,
+                idempotency_key=idempotency_key("customer", user_id)
             )
             stripe_customer_id = customer.id
             await supabase.table("users").update(
                 {"stripe_customer_id": stripe_customer_id}
             ).eq("id", user_id).execute()
+            invalidate_user_principal(user_id)
 
-        setup_intent = stripe.SetupIntent.create(
+        setup_intent = await stripe_gateway.call(
+            stripe.SetupIntent.create,
             customer=stripe_customer_id,
             payment_method_types=["card"],
             usage="off_session",
@@ -483,7 +504,8 @@ async def create_setup_intent(
             }
         )
 
-        ephemeral_key = stripe.EphemeralKey.create(
+        ephemeral_key = await stripe_gateway.call(
+            stripe.EphemeralKey.create,
             customer=stripe_customer_id,
             stripe_version="2024-04-10"
         )
@@ -522,7 +544,7 @@ async def get_user_payment_method(
                 "message": "No payment method set up yet"
             }
 
-        payment_method = stripe.Customer.list_payment_methods(stripe_customer_id)
+        payment_method = await stripe_gateway.call(stripe.Customer.list_payment_methods, stripe_customer_id)
         if not payment_method.data:
             # No payment method found for customer
             return {
@@ -552,7 +574,8 @@ async def get_connect_balance(
             return {"balance": 0, "currency": "usd"}
         
         # Get the balance from Stripe
-        balance = stripe.Balance.retrieve(
+        balance = await stripe_gateway.call(
+            stripe.Balance.retrieve,
             stripe_account=user.data["stripe_connect_account_id"]
         )
         
@@ -583,7 +606,8 @@ async def create_withdrawal(
             raise HTTPException(status_code=400, detail="No Stripe Connect account found")
         
         # Get current balance
-        balance = stripe.Balance.retrieve(
+        balance = await stripe_gateway.call(
+            stripe.Balance.retrieve,
             stripe_account=user.data["stripe_connect_account_id"]
         )
         
@@ -602,7 +626,8 @@ async def create_withdrawal(
             )
         
         # Create a payout
-        payout = stripe.Payout.create(
+        payout = await stripe_gateway.call(
+            stripe.Payout.create,
             amount=available_balance,
             currency="usd",
             stripe_account=user.data["stripe_connect_account_id"]
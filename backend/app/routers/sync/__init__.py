@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response
 from typing import Optional
 from models.schemas import User
 from config.database import get_async_supabase_client
 from supabase._async.client import AsyncClient
 from routers.auth import get_current_user_lightweight
 from utils.memory_optimization import cleanup_memory, disable_print
+from utils.conditional_requests import check_not_modified
 # TODO: Replace preloader dependency with optimized habit services
 # from routers.preloader import get_app_preload_data, PreloadedData
 
@@ -18,17 +19,29 @@ router = APIRouter()
 
 @router.get("/delta", response_model=DeltaChanges)
 async def get_delta_changes(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user_lightweight),
     supabase: AsyncClient = Depends(get_async_supabase_client),
     if_modified_since: Optional[str] = Header(None, alias="If-Modified-Since")
 ):
     """
-    Get ALL app data in delta format. This now serves as the complete preloader endpoint.
-    Returns 304 Not Modified if no changes since last sync, 200 with ALL data otherwise.
+    Get app data in delta format. This now serves as the complete preloader endpoint.
+    Without If-Modified-Since returns ALL data; with it, returns only the sections that
+    changed since the cursor, or 304 Not Modified if none did.
+    If-None-Match is checked against a content hash of the payload before serialization.
     Memory optimized endpoint using optimized habit services.
     """
     try:
-        return await get_delta_changes_service(current_user, supabase, if_modified_since)
+        delta_response = await get_delta_changes_service(current_user, supabase, if_modified_since)
+        if delta_response is None:
+            return Response(status_code=304)
+        
+        etag, not_modified = check_not_modified(request, delta_response)
+        if not_modified is not None:
+            return not_modified
+        response.headers["ETag"] = etag
+        return delta_response
     except Exception as e:
         print(f"Delta sync error: {e}")
         raise HTTPException(status_code=500, detail="Failed to get delta changes")
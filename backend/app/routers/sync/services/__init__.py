@@ -9,6 +9,7 @@ from .progress_verification_service import (
     fetch_staged_deletions, fetch_friend_recommendations
 )
 from .payment_stats_service import get_payment_stats_service
+from .sync_cursor_service import parse_sync_cursor, fetch_section_watermarks, get_changed_sections
 
 __all__ = [
     "get_delta_changes_service",
@@ -27,5 +28,8 @@ __all__ = [
     "fetch_friend_requests",
     "fetch_staged_deletions",
     "fetch_friend_recommendations",
-    "get_payment_stats_service"
+    "get_payment_stats_service",
+    "parse_sync_cursor",
+    "fetch_section_watermarks",
+    "get_changed_sections"
 ] 
\ No newline at end of file
@@ -7,13 +7,15 @@ from utils import (
     disable_print,
     memory_optimized,
     DataFetcher,
+    coalesced_execute,
     generate_verification_image_urls,
     generate_profile_photo_url,
-    generate_post_image_urls
+    generate_post_image_urls_batch
 )
 import json
 import stripe
 import uuid
+from utils.stripe_gateway import stripe_gateway
 
 # Disable verbose printing for performance
 print = disable_print()
@@ -73,7 +75,8 @@ async def fetch_friends(supabase: AsyncClient, user_id: str) -> List[Dict[str, A
     """Fetch user's friends with memory optimization"""
     try:
         # MEMORY OPTIMIZATION: Use optimized RPC and limit results
-        result = await supabase.rpc("get_user_friends", {"user_id": user_id}).execute()
+        # Shared with fetch_friends_with_stripe and /api/friends when they run concurrently
+        result = await coalesced_execute(supabase.rpc("get_user_friends", {"user_id": user_id}))
         
         if not result.data:
             return []
@@ -99,9 +102,9 @@ async def fetch_friends_with_stripe(supabase: AsyncClient, user_id: str) -> List
     """Fetch ALL friends including their Stripe Connect status"""
     try:
         # Get ALL user's friends (not just those with Stripe)
-        result = await supabase.rpc("get_user_friends", {
+        result = await coalesced_execute(supabase.rpc("get_user_friends", {
             "user_id": user_id
-        }).execute()
+        }))
         
         all_friends = []
         if result.data:
@@ -137,78 +140,69 @@ async def fetch_friends_with_stripe(supabase: AsyncClient, user_id: str) -> List
 
 @memory_optimized(cleanup_args=False)
 async def fetch_feed(supabase: AsyncClient, user_id: str) -> List[Dict[str, Any]]:
-    """Fetch the feed and process each post concurrently for maximum throughput."""
+    """Fetch the feed, signing every post image in bulk up front."""
     try:
         # Grab raw feed data (single DB/RPC call)
-        result = await supabase.rpc("get_user_feed", {"user_id_param": user_id}).execute()
+        result = await coalesced_execute(supabase.rpc("get_user_feed", {"user_id_param": user_id}))
 
         if not result.data:
             return []
 
-        # Bound the per-post parallelism to avoid hammering Supabase storage
-        post_sem = asyncio.Semaphore(10)
+        # Sign every image in the feed in one bulk request per bucket
+        feed_image_urls = await generate_post_image_urls_batch(supabase, result.data)
 
-        async def process_post(post: dict):
-            """Convert DB row => API response object (runs inside bounded semaphore)."""
-            async with post_sem:
-                try:
-                    # Ensure comments are proper Python list
-                    if isinstance(post.get('comments'), str):
-                        post['comments'] = json.loads(post['comments'])
+        def process_post(post: dict, image_urls: dict):
+            """Convert DB row => API response object."""
+            try:
+                # Ensure comments are proper Python list
+                if isinstance(post.get('comments'), str):
+                    post['comments'] = json.loads(post['comments'])
 
-                    # Simplified comment mapping (keeps iOS happy)
-                    comments = []
-                    for comment_data in post['comments']:
-                        comments.append({
-                            "id": str(comment_data['id']),
-                            "content": comment_data['content'],
-                            "created_at": comment_data['created_at'],
-                            "user_id": str(comment_data['user_id']),
-                            "user_name": comment_data['user_name'],
-                            "is_edited": comment_data['is_edited'],
-                            "parent_comment": str(comment_data.get('parent_comment_id')) if comment_data.get('parent_comment_id') else None,
-                            # 🔄  Avatar fields for comment authors
-                            "user_avatar_version": comment_data.get("user_avatar_version"),
-                            "user_avatar_url_80": comment_data.get("user_avatar_url_80"),
-                            "user_avatar_url_200": comment_data.get("user_avatar_url_200"),
-                            "user_avatar_url_original": comment_data.get("user_avatar_url_original"),
-                        })
-
-                    # Generate signed URLs for both selfie & content images (already concurrent inside)
-                    image_urls = await generate_post_image_urls(
-                        supabase,
-                        post,
-                        post.get("is_private", False)
-                    )
+                # Simplified comment mapping (keeps iOS happy)
+                comments = []
+                for comment_data in post['comments']:
+                    comments.append({
+                        "id": str(comment_data['id']),
+                        "content": comment_data['content'],
+                        "created_at": comment_data['created_at'],
+                        "user_id": str(comment_data['user_id']),
+                        "user_name": comment_data['user_name'],
+                        "is_edited": comment_data['is_edited'],
+                        "parent_comment": str(comment_data.get('parent_comment_id')) if comment_data.get('parent_comment_id') else None,
+                        # 🔄  Avatar fields for comment authors
+                        "user_avatar_version": comment_data.get("user_avatar_version"),
+                        "user_avatar_url_80": comment_data.get("user_avatar_url_80"),
+                        "user_avatar_url_200": comment_data.get("user_avatar_url_200"),
+                        "user_avatar_url_original": comment_data.get("user_avatar_url_original"),
+                    })
 
-                    return {
-                        "post_id": str(post["post_id"]),
-                        "caption": post.get("caption"),
-                        "created_at": post["created_at"],
-                        "is_private": post.get("is_private", False),
-                        "image_url": image_urls.get("content_image_url") or image_urls.get("selfie_image_url"),
-                        "selfie_image_url": image_urls.get("selfie_image_url"),
-                        "content_image_url": image_urls.get("content_image_url"),
-                        "user_id": str(post["user_id"]),
-                        "user_name": post["user_name"],
-                        # 🔄  Avatar fields for the post author (now available from SQL)
-                        "user_avatar_version": post.get("user_avatar_version"),
-                        "user_avatar_url_80": post.get("user_avatar_url_80"),
-                        "user_avatar_url_200": post.get("user_avatar_url_200"),
-                        "user_avatar_url_original": post.get("user_avatar_url_original"),
-                        "habit_id": post.get("habit_id"),
-                        "habit_name": post.get("habit_name"),
-                        "habit_type": post.get("habit_type"),
-                        "penalty_amount": round(float(post["penalty_amount"]), 2) if post.get("penalty_amount") is not None else None,
-                        "comments": comments,
-                        "streak": post.get("streak"),
-                    }
-                except Exception as post_err:
-                    print(f"⚠️ [Sync] Failed to process feed post {post.get('post_id')}: {post_err}")
-                    return None
+                return {
+                    "post_id": str(post["post_id"]),
+                    "caption": post.get("caption"),
+                    "created_at": post["created_at"],
+                    "is_private": post.get("is_private", False),
+                    "image_url": image_urls.get("content_image_url") or image_urls.get("selfie_image_url"),
+                    "selfie_image_url": image_urls.get("selfie_image_url"),
+                    "content_image_url": image_urls.get("content_image_url"),
+                    "user_id": str(post["user_id"]),
+                    "user_name": post["user_name"],
+                    # 🔄  Avatar fields for the post author (now available from SQL)
+                    "user_avatar_version": post.get("user_avatar_version"),
+                    "user_avatar_url_80": post.get("user_avatar_url_80"),
+                    "user_avatar_url_200": post.get("user_avatar_url_200"),
+                    "user_avatar_url_original": post.get("user_avatar_url_original"),
+                    "habit_id": post.get("habit_id"),
+                    "habit_name": post.get("habit_name"),
+                    "habit_type": post.get("habit_type"),
+                    "penalty_amount": round(float(post["penalty_amount"]), 2) if post.get("penalty_amount") is not None else None,
+                    "comments": comments,
+                    "streak": post.get("streak"),
+                }
+            except Exception as post_err:
+                print(f"⚠️ [Sync] Failed to process feed post {post.get('post_id')}: {post_err}")
+                return None
 
-        # Kick off parallel processing of every post
-        processed = await asyncio.gather(*(process_post(p) for p in result.data))
+        processed = [process_post(p, urls) for p, urls in zip(result.data, feed_image_urls)]
         # Filter out any failures / None values
         return [p for p in processed if p]
     except Exception as e:
@@ -227,7 +221,7 @@ async def fetch_payment_method(supabase: AsyncClient, user_id: str) -> Optional[
         customer_id = user_result.data[0]["stripe_customer_id"]
         
         # Get payment methods from Stripe
-        payment_methods = stripe.PaymentMethod.list(customer=customer_id, type="card")
+        payment_methods = await stripe_gateway.call(stripe.PaymentMethod.list, customer=customer_id, type="card")
         if not payment_methods.data:
             return None
 
@@ -14,6 +14,7 @@ from .progress_verification_service import (
     fetch_weekly_progress, fetch_verification_data, fetch_friend_requests,
     fetch_staged_deletions, fetch_friend_recommendations
 )
+from .sync_cursor_service import parse_sync_cursor, fetch_section_watermarks, get_changed_sections
 from pydantic import BaseModel
 
 # Disable verbose printing to reduce response latency
@@ -27,6 +28,9 @@ class DeltaChanges(BaseModel):
     user_profile_changed: Optional[bool] = None
     last_modified: Optional[str] = None
     
+    # Sections included in this response (omitted sections are unchanged since the cursor)
+    changed_sections: Optional[list[str]] = None
+    
     # Include ALL the data types from PreloadedData
     habits: Optional[list[dict]] = None
     friends: Optional[list[dict]] = None
@@ -67,39 +71,42 @@ async def get_delta_changes_service(
     current_user: User,
     supabase: AsyncClient,
     if_modified_since: Optional[str] = None
-) -> DeltaChanges:
+) -> Optional[DeltaChanges]:
     """
-    Get ALL app data in delta format using high-level coordination utilities.
-    Returns 304 Not Modified if no changes since last sync, 200 with ALL data otherwise.
+    Get app data in delta format using high-level coordination utilities.
+    
+    Without If-Modified-Since ALL sections are returned. With a cursor, only sections whose
+    watermarks moved since the cursor are fetched and returned; None means nothing changed
+    and the router should answer 304 Not Modified.
     """
     try:
         user_id = str(current_user.id)
         print(f"Delta sync request for user {user_id} since {if_modified_since}")
         
+        # Taken before reading watermarks so changes landing mid-request are re-sent next time
+        sync_started_at = datetime.now(timezone.utc)
+        
         # Initialize response
         delta_response = DeltaChanges()
         
         # Parse the If-Modified-Since header (optional for full data load)
-        since_date = None
-        if if_modified_since:
-            try:
-                since_date = datetime.fromisoformat(if_modified_since.replace('Z', '+00:00'))
-            except ValueError:
-                try:
-                    since_date = datetime.strptime(if_modified_since, "%a, %d %b %Y %H:%M:%S %Z")
-                    since_date = since_date.replace(tzinfo=timezone.utc)
-                except ValueError:
-                    print(f"Invalid If-Modified-Since format: {if_modified_since}")
-                    since_date = None
+        since_date = parse_sync_cursor(if_modified_since)
+        
+        # Decide which sections actually need to be fetched
+        watermarks = await fetch_section_watermarks(supabase, user_id) if since_date else None
+        sections = get_changed_sections(watermarks, since_date, current_user.timezone, sync_started_at)
+        
+        if not sections:
+            print("No sections changed since cursor - 304")
+            return None
         
-        # ALWAYS fetch ALL data using the new high-level DataFetcher
-        print("Fetching all app data with coordinated parallelism...")
+        print(f"Fetching {len(sections)} changed sections with coordinated parallelism...")
         
         # Use the high-level DataFetcher for organized, parallel data fetching
         fetcher = DataFetcher(max_concurrent=16)
         
         # Define all fetch operations with descriptive names
-        fetch_operations = {
+        all_fetch_operations = {
             'habits': lambda: fetch_habits(supabase, user_id),
             'friends': lambda: fetch_friends(supabase, user_id),
             'friends_with_stripe': lambda: fetch_friends_with_stripe(supabase, user_id),
@@ -115,40 +122,58 @@ async def get_delta_changes_service(
             'staged_deletions': lambda: fetch_staged_deletions(supabase, user_id),
             'friend_recommendations': lambda: fetch_friend_recommendations(supabase, user_id)
         }
+        fetch_operations = {
+            name: func for name, func in all_fetch_operations.items() if name in sections
+        }
         
         # Execute all fetches with coordinated parallelism
         results = await fetcher.fetch_multiple(fetch_operations)
 
         # Process results with clean error handling
         try:
-            # Map results to response fields
-            delta_response.habits = results.get('habits', [])
-            delta_response.friends = results.get('friends', [])
-            delta_response.friends_with_stripe = results.get('friends_with_stripe', [])
-            delta_response.feed_posts = results.get('feed_posts', [])
-            delta_response.payment_method = results.get('payment_method')
-            delta_response.custom_habit_types = results.get('custom_habit_types', [])
-            delta_response.friend_requests = results.get('friend_requests')
-            delta_response.available_habit_types = results.get('available_habit_types')
-            delta_response.onboarding_state = results.get('onboarding_state', 0)
-            delta_response.user_profile = results.get('user_profile')
-            delta_response.weekly_progress = results.get('weekly_progress', [])
+            # Map results to response fields (unfetched sections stay None = unchanged)
+            if 'habits' in sections:
+                delta_response.habits = results.get('habits', [])
+            if 'friends' in sections:
+                delta_response.friends = results.get('friends', [])
+            if 'friends_with_stripe' in sections:
+                delta_response.friends_with_stripe = results.get('friends_with_stripe', [])
+            if 'feed_posts' in sections:
+                delta_response.feed_posts = results.get('feed_posts', [])
+            if 'payment_method' in sections:
+                delta_response.payment_method = results.get('payment_method')
+            if 'custom_habit_types' in sections:
+                delta_response.custom_habit_types = results.get('custom_habit_types', [])
+            if 'friend_requests' in sections:
+                delta_response.friend_requests = results.get('friend_requests')
+            if 'available_habit_types' in sections:
+                delta_response.available_habit_types = results.get('available_habit_types')
+            if 'onboarding_state' in sections:
+                delta_response.onboarding_state = results.get('onboarding_state', 0)
+            if 'user_profile' in sections:
+                delta_response.user_profile = results.get('user_profile')
+            if 'weekly_progress' in sections:
+                delta_response.weekly_progress = results.get('weekly_progress', [])
             
             # Handle verification data tuple
-            verification_data = results.get('verification_data')
-            if verification_data and len(verification_data) == 3:
-                delta_response.verified_habits_today, delta_response.habit_verifications, delta_response.weekly_verified_habits = verification_data
-            else:
-                delta_response.verified_habits_today = {}
-                delta_response.habit_verifications = {}
-                delta_response.weekly_verified_habits = {}
+            if 'verification_data' in sections:
+                verification_data = results.get('verification_data')
+                if verification_data and len(verification_data) == 3:
+                    delta_response.verified_habits_today, delta_response.habit_verifications, delta_response.weekly_verified_habits = verification_data
+                else:
+                    delta_response.verified_habits_today = {}
+                    delta_response.habit_verifications = {}
+                    delta_response.weekly_verified_habits = {}
             
             # Handle other complex data
-            delta_response.staged_deletions = results.get('staged_deletions', {})
-            delta_response.friend_recommendations = results.get('friend_recommendations', [])
+            if 'staged_deletions' in sections:
+                delta_response.staged_deletions = results.get('staged_deletions', {})
+            if 'friend_recommendations' in sections:
+                delta_response.friend_recommendations = results.get('friend_recommendations', [])
 
-            # Set timestamps and change flags (always return data for full preload)
-            delta_response.last_modified = datetime.now(timezone.utc).isoformat()
+            # Set timestamps and change flags for the sections included in this response
+            delta_response.last_modified = sync_started_at.isoformat()
+            delta_response.changed_sections = sorted(sections)
             delta_response.habits_changed = [str(h.get("id", "")) for h in (delta_response.habits or [])]
             delta_response.friends_changed = [str(f.get("friend_id", "")) for f in (delta_response.friends or [])]
             delta_response.feed_posts_changed = [str(p.get("post_id", "")) for p in (delta_response.feed_posts or [])]
@@ -4,6 +4,7 @@ from supabase._async.client import AsyncClient
 from models.schemas import User
 from utils import (
     AsyncCoordinator,
+    coalesced_execute,
     cleanup_memory,
     disable_print,
     memory_optimized,
@@ -256,14 +257,14 @@ async def fetch_friend_requests(supabase: AsyncClient, user_id: str) -> Dict[str
     try:
         # Use the new database functions with avatar data (1 call each instead of complex queries)
         # Fetch received friend requests using the optimized RPC function with avatars
-        received_result = await supabase.rpc("get_received_friend_requests_with_avatars", {
+        received_result = await coalesced_execute(supabase.rpc("get_received_friend_requests_with_avatars", {
             "user_id": user_id
-        }).execute()
+        }))
         
         # Fetch sent friend requests using the optimized RPC function with avatars
-        sent_result = await supabase.rpc("get_sent_friend_requests_with_avatars", {
+        sent_result = await coalesced_execute(supabase.rpc("get_sent_friend_requests_with_avatars", {
             "user_id": user_id
-        }).execute()
+        }))
         
         received_list = []
         if received_result.data:
@@ -0,0 +1,125 @@
+from typing import Dict, Optional, Set
+from datetime import datetime, timezone, timedelta
+from supabase._async.client import AsyncClient
+from utils.memory_optimization import disable_print
+from utils.storage.url_generation import _signed_url_cache_ttl
+import pytz
+
+# Disable verbose printing to reduce response latency
+print = disable_print()
+
+# Client cursors come from the device clock; re-send anything that changed within
+# this window of the cursor so a fast device clock can't hide a change.
+CLOCK_SKEW_ALLOWANCE = timedelta(minutes=2)
+
+# Recommendations are computed, not stored, so they are refreshed on a timer
+FRIEND_RECOMMENDATIONS_MAX_AGE = timedelta(hours=1)
+
+# Sections that embed signed storage URLs. A URL may be served from the URL cache for up to
+# its TTL, and is then guaranteed valid for at least that long again - so a client that
+# synced longer ago than the TTL may be holding URLs about to expire and gets fresh ones.
+SIGNED_URL_SECTIONS = {'feed_posts', 'user_profile', 'verification_data'}
+SIGNED_URL_SECTIONS_MAX_AGE = timedelta(seconds=_signed_url_cache_ttl)
+
+# Delta response section -> watermark sections (see backend/sync_watermarks.sql) it is built from
+SECTION_DEPENDENCIES: Dict[str, Set[str]] = {
+    'habits': {'habits'},
+    'friends': {'friends'},
+    'friends_with_stripe': {'friends'},
+    'feed_posts': {'feed'},
+    'payment_method': {'profile'},
+    'custom_habit_types': {'custom_habit_types'},
+    'friend_requests': {'friend_requests'},
+    'available_habit_types': {'custom_habit_types'},
+    'onboarding_state': {'profile'},
+    'user_profile': {'profile'},
+    'weekly_progress': {'weekly_progress', 'habits'},
+    'verification_data': {'verifications', 'habits'},
+    'staged_deletions': {'staged_deletions', 'habits'},
+    'friend_recommendations': {'friends', 'friend_requests'},
+}
+
+ALL_SECTIONS: Set[str] = set(SECTION_DEPENDENCIES.keys())
+
+def parse_sync_cursor(if_modified_since: Optional[str]) -> Optional[datetime]:
+    """Parse the If-Modified-Since header (ISO 8601 or HTTP date) into an aware UTC datetime"""
+    if not if_modified_since:
+        return None
+
+    try:
+        since_date = datetime.fromisoformat(if_modified_since.replace('Z', '+00:00'))
+    except ValueError:
+        try:
+            since_date = datetime.strptime(if_modified_since, "%a, %d %b %Y %H:%M:%S %Z")
+        except ValueError:
+            print(f"Invalid If-Modified-Since format: {if_modified_since}")
+            return None
+
+    if since_date.tzinfo is None:
+        since_date = since_date.replace(tzinfo=timezone.utc)
+    return since_date
+
+async def fetch_section_watermarks(supabase: AsyncClient, user_id: str) -> Optional[Dict[str, datetime]]:
+    """
+    Fetch the user's per-section watermarks in one query.
+
+    Returns:
+        Dict of {watermark_section: changed_at}, or None if watermarks are unavailable
+        (e.g. the migration hasn't been applied) and the caller should load everything.
+    """
+    try:
+        result = await supabase.table("sync_watermarks").select("section, changed_at").eq("user_id", user_id).execute()
+
+        watermarks = {}
+        for row in result.data or []:
+            watermarks[row["section"]] = datetime.fromisoformat(row["changed_at"].replace('Z', '+00:00'))
+        return watermarks
+    except Exception as e:
+        print(f"⚠️ [Sync] Watermarks unavailable, falling back to full load: {e}")
+        return None
+
+def get_changed_sections(
+    watermarks: Optional[Dict[str, datetime]],
+    since_date: Optional[datetime],
+    user_timezone: str = "UTC",
+    now: Optional[datetime] = None
+) -> Set[str]:
+    """
+    Work out which delta sections must be re-sent for a client cursor.
+
+    A section is included if any watermark it depends on moved past the cursor, or if
+    it is time-based and the cursor falls before the current day/week/refresh window, or
+    it carries signed URLs that may have expired on the client since the cursor.
+    """
+    if since_date is None or watermarks is None:
+        return set(ALL_SECTIONS)
+
+    now = now or datetime.now(timezone.utc)
+    threshold = since_date - CLOCK_SKEW_ALLOWANCE
+
+    changed_watermarks = {
+        section for section, changed_at in watermarks.items()
+        if changed_at > threshold
+    }
+    changed = {
+        section for section, depends_on in SECTION_DEPENDENCIES.items()
+        if depends_on & changed_watermarks
+    }
+
+    # "Today" and "this week" roll over in the user's timezone without any row changing
+    try:
+        tz = pytz.timezone(user_timezone or "UTC")
+    except pytz.UnknownTimeZoneError:
+        tz = pytz.utc
+    since_local = since_date.astimezone(tz).date()
+    today_local = now.astimezone(tz).date()
+    if since_local != today_local:
+        changed |= {'verification_data', 'weekly_progress'}
+
+    if now - since_date > FRIEND_RECOMMENDATIONS_MAX_AGE:
+        changed.add('friend_recommendations')
+
+    if now - threshold > SIGNED_URL_SECTIONS_MAX_AGE:
+        changed |= SIGNED_URL_SECTIONS
+
+    return changed
@@ -1,5 +1,6 @@
 import stripe
 from utils.memory_optimization import cleanup_memory, disable_print
+from utils.stripe_gateway import stripe_gateway
 
 # Disable verbose printing to reduce response latency
 print = disable_print()
@@ -11,7 +12,7 @@ async def verify_stripe_connect_status(account_id: str) -> bool:
     """
     try:
         # Retrieve the account from Stripe
-        account = stripe.Account.retrieve(account_id)
+        account = await stripe_gateway.call(stripe.Account.retrieve, account_id)
         
         # Check if account exists
         if not account or not isinstance(account, stripe.Account):
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from models.schemas import User, UserCreate
 from config.database import get_async_supabase_client
@@ -13,20 +14,23 @@ from utils import (
     upload_to_supabase_storage_with_cache_control,
     validate_face_in_image,
     detect_moderation_labels,
-    is_content_appropriate_for_profile
+    is_content_appropriate_for_profile,
+    get_async_rekognition,
+    RekognitionTimeoutError
 )
 from PIL import Image, ImageOps
 import io
 from botocore.exceptions import ClientError, NoCredentialsError
 import os
 from config.settings import get_settings
-from config.aws import get_rekognition_client
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 import logging
 import time
 import random
 from utils.friends_filter import get_eligible_friends_with_stripe
+from utils.auth_cache import invalidate_user_principal
+from utils.identity_snapshot_cache import invalidate_identity_snapshot
 from fastapi import Request
 from typing import Any
 
@@ -313,16 +317,19 @@ async def upload_avatar(
         if not is_valid_content_type and not is_valid_signature:
             raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, and GIF are allowed.")
         
-        # Optional content moderation
-        rekognition_client = get_rekognition_client()
-        if rekognition_client:
+        # Optional content moderation (runs on the Rekognition thread pool)
+        rekognition = get_async_rekognition()
+        if rekognition.is_available():
             try:
-                moderation_response = detect_moderation_labels(original_bytes, rekognition_client)
+                moderation_response = await rekognition.run(
+                    lambda client: detect_moderation_labels(original_bytes, client),
+                    "detect_moderation_labels"
+                )
                 is_appropriate, moderation_reason = is_content_appropriate_for_profile(moderation_response)
                 if not is_appropriate:
                     logger.warning(f"Content moderation failed: {moderation_reason}")
                     raise HTTPException(status_code=400, detail=moderation_reason)
-            except (ClientError, ValueError) as moderation_error:
+            except (ClientError, ValueError, RekognitionTimeoutError) as moderation_error:
                 logger.warning(f"Content moderation error (continuing anyway): {moderation_error}")
         
         # Generate version timestamp and paths
@@ -408,6 +415,7 @@ async def upload_avatar(
         }
         
         update_response = await supabase.table("users").update(avatar_urls).eq("id", user_id).execute()
+        invalidate_user_principal(user_id)
         
         if update_response.data:
             return AvatarUploadResponse(
@@ -539,6 +547,7 @@ async def delete_avatar(
             "avatar_url_original": None,
             "updated_at": datetime.utcnow().isoformat()
         }).eq("id", user_id).execute()
+        invalidate_user_principal(user_id)
         
         return {"message": "Avatar deleted successfully"}
         
@@ -583,6 +592,7 @@ async def delete_profile_photo(
             "profile_photo_url": None,
             "updated_at": datetime.utcnow().isoformat()
         }).eq("id", user_id).execute()
+        invalidate_user_principal(user_id)
         
         return {"message": "Profile photo deleted successfully"}
         
@@ -672,6 +682,7 @@ async def update_user_profile(
         
         # Update user in database
         update_response = await supabase.table("users").update(update_data).eq("id", user_id).execute()
+        invalidate_user_principal(user_id)
         
         if update_response.data:
             # If timezone changed, reschedule all notifications
@@ -773,6 +784,7 @@ async def update_timezone(
         
         # Update user's timezone
         update_response = await supabase.table("users").update({"timezone": timezone}).eq("id", user_id).execute()
+        invalidate_user_principal(user_id)
         if not update_response.data:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -1024,6 +1036,7 @@ async def update_onboarding_state(
         update_response = await supabase.table("users").update({
             "onboarding_state": onboarding_state
         }).eq("id", user_id).execute()
+        invalidate_user_principal(current_user.id)
         
         if not update_response.data:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1077,6 +1090,7 @@ async def update_premium_status(
         update_response = await supabase.table("users").update({
             "ispremium": ispremium
         }).eq("id", user_id).execute()
+        invalidate_user_principal(current_user.id)
         
         if not update_response.data:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1175,17 +1189,22 @@ async def upload_identity_snapshot(
         if not is_valid_content_type and not is_valid_signature:
             raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, and GIF are allowed.")
         
-        # Perform facial recognition
-        rekognition_client = get_rekognition_client()
-        if rekognition_client:
-            # Validate face in image
-            face_validation = validate_face_in_image(processed_image_bytes, rekognition_client)
+        # Perform facial recognition (runs on the Rekognition thread pool)
+        rekognition = get_async_rekognition()
+        if rekognition.is_available():
+            try:
+                # Validate face in image and moderate content concurrently
+                face_validation, moderation_response = await asyncio.gather(
+                    rekognition.run(lambda client: validate_face_in_image(processed_image_bytes, client), "detect_faces"),
+                    rekognition.run(lambda client: detect_moderation_labels(processed_image_bytes, client), "detect_moderation_labels")
+                )
+            except RekognitionTimeoutError:
+                raise HTTPException(status_code=503, detail="Face verification service temporarily unavailable")
+            
             if not face_validation["valid"]:
                 raise HTTPException(status_code=400, detail=face_validation["message"])
             
-            
             # Content moderation
-            moderation_response = detect_moderation_labels(processed_image_bytes, rekognition_client)
             is_appropriate, moderation_reason = is_content_appropriate_for_profile(moderation_response)
             
             if not is_appropriate:
@@ -1215,11 +1234,15 @@ async def upload_identity_snapshot(
         )
         
         if upload_response:
+            # Drop the cached copy used by image verification on this worker
+            await invalidate_identity_snapshot(identity_snapshot_filename)
+            
             # Update user with identity snapshot filename
             update_response = await supabase.table("users").update({
                 "identity_snapshot_filename": identity_snapshot_filename,
                 "updated_at": datetime.utcnow().isoformat()
             }).eq("id", user_id).execute()
+            invalidate_user_principal(user_id)
             
             if update_response.data:
                 # Generate signed URL for response
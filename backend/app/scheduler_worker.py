@@ -12,6 +12,8 @@ Updated to use the restructured task modules:
 - habit_management.py - Habit notifications and staging changes
 - maintenance.py - Feed card archiving and cleanup tasks
 - scheduler_utils.py - Shared utility functions
+- job_coordination.py - Leases and user sharding for running several workers
+- services/push_outbox.py - Consumer delivering queued push notifications
 - scheduler.py - Main scheduler setup orchestrating all tasks
 """
 
@@ -22,6 +24,11 @@ import sys
 
 # Import scheduler setup (now properly organized across multiple modules)
 from tasks.scheduler import setup_scheduler
+from config.database import init_async_supabase_pool, close_async_supabase_pool
+from utils.memory_optimization import configure_gc
+from utils.stripe_gateway import stripe_gateway
+from utils.http_clients import close_http_clients
+from services.push_outbox import push_outbox, PushOutboxConsumer
 
 # Configure logging for Heroku
 logging.basicConfig(
@@ -53,14 +60,24 @@ async def main():
     logger.info(f"   • Habit Management: tasks.habit_management")
     logger.info(f"   • Maintenance: tasks.maintenance")
     logger.info(f"   • Shared Utils: tasks.scheduler_utils")
+    logger.info(f"   • Job Coordination: tasks.job_coordination")
+    
+    # Warm the shared async Supabase connection pool used by all jobs
+    if not await init_async_supabase_pool():
+        logger.warning("⚠️ Async Supabase pool failed its startup health check")
     
     try:
         # Set up scheduler with appropriate mode (now using restructured modules)
         scheduler = setup_scheduler(development_mode=development_mode)
         scheduler.start()
+        configure_gc()
         
         logger.info("✅ Scheduler started successfully with restructured tasks")
         
+        # Deliver pushes queued by the web dynos (PUSH_OUTBOX)
+        if push_outbox is not None:
+            push_consumer = asyncio.create_task(PushOutboxConsumer(push_outbox).run())
+        
         # Log all scheduled jobs
         jobs = scheduler.get_jobs()
         logger.info(f"📅 Running {len(jobs)} scheduled jobs:")
@@ -91,10 +108,17 @@ async def main():
         
     finally:
         # Clean shutdown
+        if 'push_consumer' in locals():
+            push_consumer.cancel()
+        
         if 'scheduler' in locals():
             logger.info("🛑 Shutting down scheduler...")
             scheduler.shutdown(wait=True)
             logger.info("✅ Scheduler shutdown complete")
+        
+        stripe_gateway.shutdown(wait=True)
+        await close_async_supabase_pool()
+        await close_http_clients()
 
 def signal_handler(signum, frame):
     """Handle SIGTERM from Heroku dyno restarts"""
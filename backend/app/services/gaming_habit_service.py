@@ -1,24 +1,45 @@
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set
 from uuid import UUID
 import logging
 import json
 
 from services.riot_api_service import RiotAPIService
 from models.schemas import GamingSession, GamingVerificationResult
-from config.database import get_supabase_client
+from supabase._async.client import AsyncClient
+from config.database import get_async_supabase_client
 from utils.weekly_habits import get_week_dates
 
 logger = logging.getLogger(__name__)
 
 class GamingHabitService:
-    def __init__(self):
+    def __init__(self, supabase: Optional[AsyncClient] = None):
         self.riot_api = RiotAPIService()
-        self.supabase = get_supabase_client()
+        self._supabase = supabase
+    
+    async def _get_supabase(self) -> AsyncClient:
+        """The injected client, or the worker's pooled async client"""
+        # Not memoized: the pool recycles its client after a failed health check
+        if self._supabase is not None:
+            return self._supabase
+        return await get_async_supabase_client()
+    
+    async def _get_tracked_match_ids(self, supabase: AsyncClient, habit_id: str, match_ids: List[Optional[str]]) -> Set[str]:
+        """The match IDs that already have a gaming session for the habit, in one query."""
+        match_ids = [match_id for match_id in match_ids if match_id]
+        if not match_ids:
+            return set()
+        result = await supabase.table("gaming_sessions") \
+            .select("match_id") \
+            .eq("habit_id", habit_id) \
+            .in_("match_id", match_ids) \
+            .execute()
+        return {row["match_id"] for row in result.data or []}
     
     async def link_riot_account(self, user_id: str, riot_id: str, tagline: str, region: str, game_name: str) -> Dict:
         """Link a Riot account to a user."""
         try:
+            supabase = await self._get_supabase()
             logger.info(f"Starting link_riot_account for user {user_id}")
             
             # Get PUUID from Riot API
@@ -67,7 +88,7 @@ class GamingHabitService:
             
             # Check if account already exists for this user (same PUUID = same account)
             logger.info("Checking for existing account...")
-            existing = self.supabase.table("riot_accounts").select("*").eq("user_id", user_id).eq("puuid", puuid).execute()
+            existing = await supabase.table("riot_accounts").select("*").eq("user_id", user_id).eq("puuid", puuid).execute()
             if existing.data:
                 # Update the existing account to support the new game if needed
                 account_id = existing.data[0]["id"]
@@ -83,7 +104,7 @@ class GamingHabitService:
                     update_data = {"game_name": "both", "updated_at": datetime.now(timezone.utc).isoformat()}
                 else:
                     update_data = {"game_name": "both", "updated_at": datetime.now(timezone.utc).isoformat()}
-                update_result = self.supabase.table("riot_accounts").update(update_data).eq("id", account_id).execute()
+                update_result = await supabase.table("riot_accounts").update(update_data).eq("id", account_id).execute()
                 
                 if update_result.data:
                     return {"success": True, "account": update_result.data[0]}
@@ -91,7 +112,7 @@ class GamingHabitService:
                     return {"success": False, "error": "Failed to update account"}
             
             # Check if someone else has linked this PUUID
-            other_user = self.supabase.table("riot_accounts").select("*").eq("puuid", puuid).neq("user_id", user_id).execute()
+            other_user = await supabase.table("riot_accounts").select("*").eq("puuid", puuid).neq("user_id", user_id).execute()
             if other_user.data:
                 return {"success": False, "error": "This Riot account is already linked to another user"}
             
@@ -106,7 +127,7 @@ class GamingHabitService:
             }
             
             logger.info(f"Inserting account data: {account_data}")
-            result = self.supabase.table("riot_accounts").insert(account_data).execute()
+            result = await supabase.table("riot_accounts").insert(account_data).execute()
             logger.info(f"Insert result type: {type(result)}")
             logger.info(f"Insert result.data type: {type(result.data)}")
             
@@ -153,7 +174,8 @@ class GamingHabitService:
     async def get_user_riot_accounts(self, user_id: str) -> List[Dict]:
         """Get all Riot accounts linked to a user."""
         try:
-            result = self.supabase.table("riot_accounts").select("*").eq("user_id", user_id).execute()
+            supabase = await self._get_supabase()
+            result = await supabase.table("riot_accounts").select("*").eq("user_id", user_id).execute()
             return result.data if result.data is not None else []
         except (ValueError, KeyError, ConnectionError, TimeoutError) as e:
             logger.error(f"Error fetching Riot accounts: {str(e)}")
@@ -165,8 +187,9 @@ class GamingHabitService:
     async def verify_gaming_habit(self, habit_id: str, user_id: str, target_date: datetime) -> GamingVerificationResult:
         """Verify gaming time for a habit on the target date."""
         try:
+            supabase = await self._get_supabase()
             # Get habit details
-            habit_result = self.supabase.table("habits").select("*").eq("id", habit_id).eq("user_id", user_id).single().execute()
+            habit_result = await supabase.table("habits").select("*").eq("id", habit_id).eq("user_id", user_id).single().execute()
             if not habit_result.data:
                 raise ValueError("Habit not found")
             
@@ -211,12 +234,14 @@ class GamingHabitService:
                 if (game_name == "lol" or game_name == "both") and "lol" in games_tracked:
                     matches = await self.riot_api.get_lol_matches_for_date(puuid, region, target_date)
                     
+                    # Skip matches we already tracked (one lookup for all of them)
+                    tracked_ids = await self._get_tracked_match_ids(
+                        supabase, habit_id, [match.get("metadata", {}).get("matchId") for match in matches]
+                    )
+                    
                     for match in matches:
                         match_id = match.get("metadata", {}).get("matchId")
-                        
-                        # Check if we already tracked this match
-                        existing = self.supabase.table("gaming_sessions").select("id").eq("habit_id", habit_id).eq("match_id", match_id).execute()
-                        if existing.data:
+                        if match_id in tracked_ids:
                             continue
                         
                         # Calculate duration
@@ -234,7 +259,7 @@ class GamingHabitService:
                         }
                         
                         # Insert session
-                        session_result = self.supabase.table("gaming_sessions").insert(session_data).execute()
+                        session_result = await supabase.table("gaming_sessions").insert(session_data).execute()
                         if session_result.data:
                             all_sessions.append(GamingSession(**session_result.data[0]))
                             total_minutes += duration_minutes
@@ -242,12 +267,14 @@ class GamingHabitService:
                 if (game_name == "valorant" or game_name == "both") and "valorant" in games_tracked:
                     matches = await self.riot_api.get_valorant_matches_for_date(puuid, region, target_date)
                     
+                    # Skip matches we already tracked (one lookup for all of them)
+                    tracked_ids = await self._get_tracked_match_ids(
+                        supabase, habit_id, [match.get("matchInfo", {}).get("matchId") for match in matches]
+                    )
+                    
                     for match in matches:
                         match_id = match.get("matchInfo", {}).get("matchId")
-                        
-                        # Check if we already tracked this match
-                        existing = self.supabase.table("gaming_sessions").select("id").eq("habit_id", habit_id).eq("match_id", match_id).execute()
-                        if existing.data:
+                        if match_id in tracked_ids:
                             continue
                         
                         # Calculate duration
@@ -264,7 +291,7 @@ class GamingHabitService:
                         }
                         
                         # Insert session
-                        session_result = self.supabase.table("gaming_sessions").insert(session_data).execute()
+                        session_result = await supabase.table("gaming_sessions").insert(session_data).execute()
                         if session_result.data:
                             all_sessions.append(GamingSession(**session_result.data[0]))
                             total_minutes += duration_minutes
@@ -276,7 +303,7 @@ class GamingHabitService:
             
             # Update last sync time for accounts
             for account in relevant_accounts:
-                self.supabase.table("riot_accounts").update({
+                await supabase.table("riot_accounts").update({
                     "last_sync_at": datetime.now(timezone.utc).isoformat()
                 }).eq("id", account["id"]).execute()
             
@@ -299,12 +326,13 @@ class GamingHabitService:
     async def get_gaming_sessions(self, habit_id: str, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> List[GamingSession]:
         """Get gaming sessions for a habit within a date range."""
         try:
+            supabase = await self._get_supabase()
             # Always fetch from Riot API first if we have a date range
             if start_date and end_date:
                 logger.info(f"Fetching from Riot API for habit {habit_id} for dates {start_date} to {end_date}")
                 
                 # Get habit details to know which user and games to fetch
-                habit_result = self.supabase.table("habits").select("*").eq("id", habit_id).single().execute()
+                habit_result = await supabase.table("habits").select("*").eq("id", habit_id).single().execute()
                 if not habit_result.data:
                     logger.error(f"Habit {habit_id} not found")
                     return []
@@ -326,7 +354,7 @@ class GamingHabitService:
                     return []
                 
                 # Get user's timezone to properly handle date ranges
-                user_tz_result = self.supabase.table("users").select("timezone").eq("id", user_id).single().execute()
+                user_tz_result = await supabase.table("users").select("timezone").eq("id", user_id).single().execute()
                 user_timezone = user_tz_result.data.get("timezone", "America/Los_Angeles") if user_tz_result.data else "America/Los_Angeles"
                 logger.info(f"User timezone: {user_timezone}")
                 
@@ -359,12 +387,14 @@ class GamingHabitService:
                             matches = await self.riot_api.get_lol_matches_for_date(puuid, region, current_date)
                             logger.info(f"Found {len(matches)} LoL matches")
                             
+                            # Skip matches we already tracked (one lookup for all of them)
+                            tracked_ids = await self._get_tracked_match_ids(
+                                supabase, habit_id, [match.get("metadata", {}).get("matchId") for match in matches]
+                            )
+                            
                             for match in matches:
                                 match_id = match.get("metadata", {}).get("matchId")
-                                
-                                # Check if we already tracked this match
-                                existing = self.supabase.table("gaming_sessions").select("id").eq("habit_id", habit_id).eq("match_id", match_id).execute()
-                                if existing.data:
+                                if match_id in tracked_ids:
                                     continue
                                 
                                 # Calculate duration
@@ -393,7 +423,7 @@ class GamingHabitService:
                                 }
                                 
                                 # Insert session
-                                session_result = self.supabase.table("gaming_sessions").insert(session_data).execute()
+                                session_result = await supabase.table("gaming_sessions").insert(session_data).execute()
                                 if session_result.data:
                                     sessions.append(GamingSession(**session_result.data[0]))
                         
@@ -403,12 +433,14 @@ class GamingHabitService:
                                 matches = await self.riot_api.get_valorant_matches_for_date(puuid, region, current_date)
                                 logger.info(f"Found {len(matches)} Valorant matches")
                                 
+                                # Skip matches we already tracked (one lookup for all of them)
+                                tracked_ids = await self._get_tracked_match_ids(
+                                    supabase, habit_id, [match.get("matchInfo", {}).get("matchId") for match in matches]
+                                )
+                                
                                 for match in matches:
                                     match_id = match.get("matchInfo", {}).get("matchId")
-                                    
-                                    # Check if we already tracked this match
-                                    existing = self.supabase.table("gaming_sessions").select("id").eq("habit_id", habit_id).eq("match_id", match_id).execute()
-                                    if existing.data:
+                                    if match_id in tracked_ids:
                                         continue
                                     
                                     # Calculate duration
@@ -425,7 +457,7 @@ class GamingHabitService:
                                     }
                                     
                                     # Insert session
-                                    session_result = self.supabase.table("gaming_sessions").insert(session_data).execute()
+                                    session_result = await supabase.table("gaming_sessions").insert(session_data).execute()
                                     if session_result.data:
                                         sessions.append(GamingSession(**session_result.data[0]))
                             except (ValueError, KeyError) as val_error:
@@ -438,12 +470,12 @@ class GamingHabitService:
                 
                 # Update last sync time for accounts
                 for account in relevant_accounts:
-                    self.supabase.table("riot_accounts").update({
+                    await supabase.table("riot_accounts").update({
                         "last_sync_at": datetime.now(timezone.utc).isoformat()
                     }).eq("id", account["id"]).execute()
             
             # Now fetch all sessions from DB (including the ones we just added)
-            query = self.supabase.table("gaming_sessions").select("*").eq("habit_id", habit_id)
+            query = supabase.table("gaming_sessions").select("*").eq("habit_id", habit_id)
             
             if start_date:
                 query = query.gte("game_start_time", start_date.isoformat())
@@ -452,7 +484,7 @@ class GamingHabitService:
             
             query = query.order("game_start_time", desc=True)
             
-            result = query.execute()
+            result = await query.execute()
             sessions = [GamingSession(**session) for session in result.data]
             
             return sessions
@@ -467,6 +499,7 @@ class GamingHabitService:
     async def calculate_weekly_gaming_total(self, habit_id: str, week_start: datetime) -> Dict:
         """Calculate total gaming time for a weekly habit."""
         try:
+            supabase = await self._get_supabase()
             week_end = week_start + timedelta(days=7)
             
             # Get all sessions for the week
@@ -476,7 +509,7 @@ class GamingHabitService:
             total_hours = total_minutes / 60
             
             # Get habit details for limit
-            habit_result = self.supabase.table("habits").select("daily_limit_hours, hourly_penalty_rate").eq("id", habit_id).single().execute()
+            habit_result = await supabase.table("habits").select("daily_limit_hours, hourly_penalty_rate").eq("id", habit_id).single().execute()
             habit = habit_result.data
             
             # For weekly habits, daily_limit_hours is actually the weekly limit
@@ -1,14 +1,44 @@
 import asyncio
 import logging
+import os
 from datetime import datetime, timedelta, time, timezone, date
 from typing import List, Dict, Optional, Any
 import pytz
 from supabase._async.client import AsyncClient
 from services.notification_service import notification_service
 from services.gaming_habit_service import GamingHabitService
+from tasks.scheduler_utils import get_user_timezones_async
+from tasks.job_coordination import default_worker_id
 
 logger = logging.getLogger(__name__)
 
+# Unique key of scheduled_notifications (backend/scheduled_notifications_unique.sql)
+NOTIFICATION_CONFLICT_KEY = "habit_id,notification_type,scheduled_time"
+
+# Rows per bulk insert/update/delete request
+NOTIFICATION_BATCH_SIZE = 500
+
+# IDs per IN (...) filter when prefetching for a dispatch batch (keeps URLs short)
+NOTIFICATION_ID_CHUNK_SIZE = 200
+
+# Due notifications claimed per batch, and batches per dispatch cycle
+NOTIFICATION_DISPATCH_BATCH_SIZE = int(os.getenv("NOTIFICATION_DISPATCH_BATCH_SIZE", "500"))
+NOTIFICATION_DISPATCH_MAX_BATCHES = int(os.getenv("NOTIFICATION_DISPATCH_MAX_BATCHES", "60"))
+
+# Notifications sent at once within a batch
+NOTIFICATION_SEND_CONCURRENCY = int(os.getenv("NOTIFICATION_SEND_CONCURRENCY", "50"))
+
+# A claimed notification that was neither sent nor skipped can be reclaimed after this
+NOTIFICATION_CLAIM_TTL_SECONDS = int(os.getenv("NOTIFICATION_CLAIM_TTL_SECONDS", "600"))
+
+# Failed sends per notification before it is given up (skip_reason 'delivery_failed')
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", "5"))
+
+# Reminder/missed notifications that are dropped when the habit was already verified that day
+VERIFICATION_CHECKED_TYPES = {
+    'habit_missed', 'alarm_missed', 'habit_reminder_12h', 'habit_reminder_6h', 'habit_reminder_1h', 'alarm_checkin_window'
+}
+
 class HabitNotificationScheduler:
     """Enhanced notification scheduler for habit reminders and missed habit notifications"""
     
@@ -19,58 +49,97 @@ class HabitNotificationScheduler:
     async def schedule_notifications_for_habit(
         self,
         habit_data: Dict[str, Any],
-        supabase_client: AsyncClient
+        supabase_client: AsyncClient,
+        replace: bool = False
     ):
-        """Schedule all notifications for a specific habit based on its type and schedule"""
+        """
+        Schedule all notifications for a specific habit based on its type and schedule
+        
+        Args:
+            habit_data: The habit row
+            supabase_client: Async Supabase client
+            replace: Diff against the habit's pending notifications instead of only adding
+                missing ones - use after an edit in place of delete + reschedule
+        """
+        habit_id = habit_data.get('id')
         try:
-            habit_type = habit_data.get('habit_type', '')
-            habit_id = habit_data.get('id')
-            user_id = habit_data.get('user_id')
-            habit_schedule_type = habit_data.get('habit_schedule_type', 'daily')
-            
-            # Get user timezone
-            user_timezone = await self._get_user_timezone(supabase_client, user_id)
+            user_timezone = await self._get_user_timezone(supabase_client, habit_data.get('user_id'))
             user_tz = pytz.timezone(user_timezone)
-            now = datetime.now(user_tz)
+            notifications = await self._build_notifications_for_habit(
+                habit_data, user_tz, datetime.now(user_tz), supabase_client
+            )
             
-            if habit_type == 'alarm':
-                await self._schedule_alarm_notifications(habit_data, user_tz, now, supabase_client)
-            elif habit_type in ['league_of_legends', 'valorant']:
-                await self._schedule_gaming_notifications(habit_data, user_tz, now, supabase_client)
-            elif habit_schedule_type == 'weekly':
-                await self._schedule_weekly_habit_notifications(habit_data, user_tz, now, supabase_client)
+            if replace:
+                pending_query = supabase_client.table('scheduled_notifications').select(
+                    'id, habit_id, notification_type, scheduled_time, title, message'
+                ).eq('habit_id', habit_id).eq('sent', False)
+                inserted, deleted = await self._sync_pending_notifications(supabase_client, pending_query, notifications)
+                logger.info(f"Rescheduled notifications for habit {habit_id}: {inserted} added, {deleted} removed")
             else:
-                await self._schedule_regular_habit_notifications(habit_data, user_tz, now, supabase_client)
+                await self._upsert_notifications(supabase_client, notifications)
+                logger.info(f"Scheduled {len(notifications)} notifications for habit {habit_id}")
                 
         except Exception as e:
             logger.error(f"Error scheduling notifications for habit {habit_id}: {e}")
     
+    async def _build_notifications_for_habit(
+        self,
+        habit_data: Dict[str, Any],
+        user_tz: pytz.timezone,
+        now: datetime,
+        supabase_client: AsyncClient
+    ) -> List[Dict[str, Any]]:
+        """Build (without saving) every notification row for a habit based on its type and schedule"""
+        notifications: List[Dict[str, Any]] = []
+        habit_type = habit_data.get('habit_type', '')
+        habit_schedule_type = habit_data.get('habit_schedule_type', 'daily')
+        
+        if habit_type == 'alarm':
+            self._schedule_alarm_notifications(habit_data, user_tz, now, notifications)
+        elif habit_type in ['league_of_legends', 'valorant']:
+            self._schedule_gaming_notifications(habit_data, user_tz, now, notifications)
+        elif habit_schedule_type == 'weekly':
+            await self._schedule_weekly_habit_notifications(habit_data, user_tz, now, supabase_client, notifications)
+        else:
+            self._schedule_regular_habit_notifications(habit_data, user_tz, now, notifications)
+        return notifications
+    
     async def reschedule_all_notifications_for_user(
         self,
         user_id: str,
         supabase_client: AsyncClient
     ):
-        """Reschedule all notifications for a user (useful when timezone changes)"""
+        """
+        Reschedule all notifications for a user (useful when timezone changes).
+        Builds every habit's notifications concurrently and applies only the difference
+        to the user's pending notifications.
+        """
         try:
-            # Delete all existing unsent notifications for this user
-            await supabase_client.table('scheduled_notifications').delete().eq(
-                'user_id', user_id
-            ).eq('sent', False).execute()
-            
             # Get all active habits for this user
             habits_result = await supabase_client.table('habits').select(
                 '*'
             ).eq('user_id', user_id).eq('is_active', True).execute()
+            habits = habits_result.data or []
             
-            if not habits_result.data:
-                logger.info(f"No active habits found for user {user_id}")
-                return
+            user_timezone = await self._get_user_timezone(supabase_client, user_id)
+            user_tz = pytz.timezone(user_timezone)
+            now = datetime.now(user_tz)
             
-            # Reschedule notifications for each habit
-            for habit_data in habits_result.data:
-                await self.schedule_notifications_for_habit(habit_data, supabase_client)
+            notifications = []
+            if habits:
+                per_habit = await asyncio.gather(*[
+                    self._build_notifications_for_habit(habit_data, user_tz, now, supabase_client)
+                    for habit_data in habits
+                ])
+                notifications = [n for habit_notifications in per_habit for n in habit_notifications]
             
-            logger.info(f"Rescheduled notifications for {len(habits_result.data)} habits for user {user_id}")
+            # Pending notifications of deleted/inactive habits are removed as stale
+            pending_query = supabase_client.table('scheduled_notifications').select(
+                'id, habit_id, notification_type, scheduled_time, title, message'
+            ).eq('user_id', user_id).eq('sent', False)
+            inserted, deleted = await self._sync_pending_notifications(supabase_client, pending_query, notifications)
+            
+            logger.info(f"Rescheduled notifications for {len(habits)} habits for user {user_id}: {inserted} added, {deleted} removed")
             
         except Exception as e:
             logger.error(f"Error rescheduling all notifications for user {user_id}: {e}")
@@ -104,12 +173,12 @@ class HabitNotificationScheduler:
         hours = int(time_diff.total_seconds() / 3600)
         return max(hours, 0)  # Don't return negative hours
     
-    async def _schedule_gaming_notifications(
+    def _schedule_gaming_notifications(
         self,
         habit_data: Dict[str, Any],
         user_tz: pytz.timezone,
         now: datetime,
-        supabase_client: AsyncClient
+        notifications: List[Dict[str, Any]]
     ):
         """Schedule gaming-specific notifications for limit warnings"""
         habit_id = habit_data.get('id')
@@ -139,14 +208,14 @@ class HabitNotificationScheduler:
                         continue
                     
                     # Create a gaming check notification
-                    await self._create_scheduled_notification(
+                    self._add_scheduled_notification(
                         user_id=user_id,
                         habit_id=habit_id,
                         notification_type='gaming_limit_check',
                         scheduled_time=check_time,
                         title='Gaming Check',  # This won't be sent to user
                         message='Check gaming usage and send warning if needed',
-                        supabase_client=supabase_client
+                        notifications=notifications
                     )
         
         else:  # weekly
@@ -162,22 +231,22 @@ class HabitNotificationScheduler:
                     if check_time <= now:
                         continue
                     
-                    await self._create_scheduled_notification(
+                    self._add_scheduled_notification(
                         user_id=user_id,
                         habit_id=habit_id,
                         notification_type='gaming_limit_check',
                         scheduled_time=check_time,
                         title='Gaming Check',
                         message='Check weekly gaming usage and send warning if needed',
-                        supabase_client=supabase_client
+                        notifications=notifications
                     )
     
-    async def _schedule_alarm_notifications(
+    def _schedule_alarm_notifications(
         self,
         habit_data: Dict[str, Any],
         user_tz: pytz.timezone,
         now: datetime,
-        supabase_client: AsyncClient
+        notifications: List[Dict[str, Any]]
     ):
         """Schedule alarm-specific notifications"""
         habit_id = habit_data.get('id')
@@ -215,19 +284,19 @@ class HabitNotificationScheduler:
                     continue
                 
                 # Schedule the 3 alarm notifications
-                await self._schedule_single_alarm_notifications(
-                    habit_data, alarm_datetime, user_tz, supabase_client
+                self._schedule_single_alarm_notifications(
+                    habit_data, alarm_datetime, user_tz, notifications
                 )
                 
         except Exception as e:
             logger.error(f"Error scheduling alarm notifications for habit {habit_id}: {e}")
     
-    async def _schedule_single_alarm_notifications(
+    def _schedule_single_alarm_notifications(
         self,
         habit_data: Dict[str, Any],
         alarm_datetime: datetime,
         user_tz: pytz.timezone,
-        supabase_client: AsyncClient
+        notifications: List[Dict[str, Any]]
     ):
         """Schedule the 3 notifications for a single alarm occurrence"""
         habit_id = habit_data.get('id')
@@ -247,47 +316,47 @@ class HabitNotificationScheduler:
         one_hour_before = alarm_datetime - timedelta(hours=1)
         if one_hour_before > now + timedelta(minutes=5):  # Only schedule if at least 5 minutes away
             hours_until = self._calculate_hours_until(alarm_datetime, one_hour_before)
-            await self._create_scheduled_notification(
+            self._add_scheduled_notification(
                 user_id=user_id,
                 habit_id=habit_id,
                 notification_type='alarm_checkin_window',
                 scheduled_time=one_hour_before,
                 title=habit_title,
                 message=f'1 hour left until your {habit_title} is due at {alarm_time_str}. Get ready!',
-                supabase_client=supabase_client
+                notifications=notifications
             )
         else:
             logger.debug(f"Skipped 1h alarm checkin for habit {habit_id} - too close to current time")
         
         # 2. At alarm time: "Wake up!" (always schedule this one)
-        await self._create_scheduled_notification(
+        self._add_scheduled_notification(
             user_id=user_id,
             habit_id=habit_id,
             notification_type='alarm_wake_up',
             scheduled_time=alarm_datetime,
             title=habit_title,
             message=f'⏰ Your {habit_title} is due now! Time to wake up.',
-            supabase_client=supabase_client
+            notifications=notifications
         )
         
         # 3. Ten minutes after: "You missed the alarm habit" (always schedule this one)
         ten_minutes_after = alarm_datetime + timedelta(minutes=10)
-        await self._create_scheduled_notification(
+        self._add_scheduled_notification(
             user_id=user_id,
             habit_id=habit_id,
             notification_type='alarm_missed',
             scheduled_time=ten_minutes_after,
             title=habit_title,
             message=f'You missed your {habit_title}. Better luck tomorrow!',
-            supabase_client=supabase_client
+            notifications=notifications
         )
     
-    async def _schedule_regular_habit_notifications(
+    def _schedule_regular_habit_notifications(
         self,
         habit_data: Dict[str, Any],
         user_tz: pytz.timezone,
         now: datetime,
-        supabase_client: AsyncClient
+        notifications: List[Dict[str, Any]]
     ):
         """Schedule notifications for regular (non-alarm) habits"""
         habit_id = habit_data.get('id')
@@ -317,16 +386,16 @@ class HabitNotificationScheduler:
                 continue
             
             # Schedule the 4 regular habit notifications
-            await self._schedule_single_habit_notifications(
-                habit_data, due_datetime, user_tz, supabase_client
+            self._schedule_single_habit_notifications(
+                habit_data, due_datetime, user_tz, notifications
             )
     
-    async def _schedule_single_habit_notifications(
+    def _schedule_single_habit_notifications(
         self,
         habit_data: Dict[str, Any],
         due_datetime: datetime,
         user_tz: pytz.timezone,
-        supabase_client: AsyncClient
+        notifications: List[Dict[str, Any]]
     ):
         """Schedule the 4 notifications for a single habit occurrence"""
         habit_id = habit_data.get('id')
@@ -349,14 +418,14 @@ class HabitNotificationScheduler:
         twelve_hours_before = due_datetime - timedelta(hours=12)
         if twelve_hours_before > now + timedelta(minutes=5):  # Only schedule if at least 5 minutes away
             hours_until = self._calculate_hours_until(due_datetime, twelve_hours_before)
-            await self._create_scheduled_notification(
+            self._add_scheduled_notification(
                 user_id=user_id,
                 habit_id=habit_id,
                 notification_type='habit_reminder_12h',
                 scheduled_time=twelve_hours_before,
                 title=habit_title,
                 message=f'12 hours left until your {habit_title} is due {day_text}.',
-                supabase_client=supabase_client
+                notifications=notifications
             )
         else:
             logger.debug(f"Skipped 12h reminder for habit {habit_id} - too close to current time")
@@ -365,14 +434,14 @@ class HabitNotificationScheduler:
         six_hours_before = due_datetime - timedelta(hours=6)
         if six_hours_before > now + timedelta(minutes=5):  # Only schedule if at least 5 minutes away
             hours_until = self._calculate_hours_until(due_datetime, six_hours_before)
-            await self._create_scheduled_notification(
+            self._add_scheduled_notification(
                 user_id=user_id,
                 habit_id=habit_id,
                 notification_type='habit_reminder_6h',
                 scheduled_time=six_hours_before,
                 title=habit_title,
                 message=f'6 hours left until your {habit_title} is due {day_text}.',
-                supabase_client=supabase_client
+                notifications=notifications
             )
         else:
             logger.debug(f"Skipped 6h reminder for habit {habit_id} - too close to current time")
@@ -381,27 +450,27 @@ class HabitNotificationScheduler:
         one_hour_before = due_datetime - timedelta(hours=1)
         if one_hour_before > now + timedelta(minutes=5):  # Only schedule if at least 5 minutes away
             hours_until = self._calculate_hours_until(due_datetime, one_hour_before)
-            await self._create_scheduled_notification(
+            self._add_scheduled_notification(
                 user_id=user_id,
                 habit_id=habit_id,
                 notification_type='habit_reminder_1h',
                 scheduled_time=one_hour_before,
                 title=habit_title,
                 message=f'1 hour left until your {habit_title} is due {day_text}. Don\'t forget!',
-                supabase_client=supabase_client
+                notifications=notifications
             )
         else:
             logger.debug(f"Skipped 1h reminder for habit {habit_id} - too close to current time")
         
         # 4. At due time: Missed notification (always schedule this one)
-        await self._create_scheduled_notification(
+        self._add_scheduled_notification(
             user_id=user_id,
             habit_id=habit_id,
             notification_type='habit_missed',
             scheduled_time=due_datetime,
             title=habit_title,
             message=f'You missed your {habit_title}. ${penalty_amount:.2f} penalty charged.',
-            supabase_client=supabase_client
+            notifications=notifications
         )
     
     async def _schedule_weekly_habit_notifications(
@@ -409,7 +478,8 @@ class HabitNotificationScheduler:
         habit_data: Dict[str, Any],
         user_tz: pytz.timezone,
         now: datetime,
-        supabase_client: AsyncClient
+        supabase_client: AsyncClient,
+        notifications: List[Dict[str, Any]]
     ):
         """Schedule notifications for weekly habits (progress reminders)"""
         habit_id = habit_data.get('id')
@@ -440,20 +510,20 @@ class HabitNotificationScheduler:
             current_completions = 0
         
         # Schedule weekly progress notifications
-        await self._schedule_weekly_progress_notifications(
+        self._schedule_weekly_progress_notifications(
             habit_data, user_tz, now, current_week_start, current_week_end, 
-            current_completions, weekly_target, supabase_client
+            current_completions, weekly_target, notifications
         )
         
         # Schedule next week notifications 
         next_week_start = current_week_end + timedelta(days=1)
         next_week_end = next_week_start + timedelta(days=6)
-        await self._schedule_weekly_progress_notifications(
+        self._schedule_weekly_progress_notifications(
             habit_data, user_tz, now, next_week_start, next_week_end, 
-            0, weekly_target, supabase_client  # Next week starts with 0 completions
+            0, weekly_target, notifications  # Next week starts with 0 completions
         )
     
-    async def _schedule_weekly_progress_notifications(
+    def _schedule_weekly_progress_notifications(
         self,
         habit_data: Dict[str, Any],
         user_tz: pytz.timezone,
@@ -462,7 +532,7 @@ class HabitNotificationScheduler:
         week_end: date,
         current_completions: int,
         weekly_target: int,
-        supabase_client: AsyncClient
+        notifications: List[Dict[str, Any]]
     ):
         """Schedule progress reminder notifications for a specific week"""
         habit_id = habit_data.get('id')
@@ -525,17 +595,17 @@ class HabitNotificationScheduler:
                 else:
                     message = f"Final day: {current_completions}/{weekly_target} done. Complete {completions_needed} more today!"
             
-            await self._create_scheduled_notification(
+            self._add_scheduled_notification(
                 user_id=user_id,
                 habit_id=habit_id,
                 notification_type=f'weekly_reminder_{notification_stage}',
                 scheduled_time=notification_datetime,
                 title=habit_title,
                 message=message,
-                supabase_client=supabase_client
+                notifications=notifications
             )
     
-    async def _create_scheduled_notification(
+    def _add_scheduled_notification(
         self,
         user_id: str,
         habit_id: str,
@@ -543,162 +613,361 @@ class HabitNotificationScheduler:
         scheduled_time: datetime,
         title: str,
         message: str,
-        supabase_client: AsyncClient
+        notifications: List[Dict[str, Any]]
     ):
-        """Create a scheduled notification record in the database"""
+        """Add a scheduled notification row to the set being built (persisted in bulk later)"""
+        notifications.append({
+            'user_id': user_id,
+            'habit_id': habit_id,
+            'notification_type': notification_type,
+            'scheduled_time': scheduled_time.isoformat(),
+            'title': title,
+            'message': message,
+            'sent': False,
+            'created_at': datetime.utcnow().isoformat()
+        })
+    
+    @staticmethod
+    def _notification_key(row: Dict[str, Any]) -> tuple:
+        """Unique key of a scheduled notification; scheduled_time compared as an instant"""
+        scheduled_time = datetime.fromisoformat(row['scheduled_time'].replace('Z', '+00:00'))
+        return (row['habit_id'], row['notification_type'], scheduled_time.astimezone(pytz.UTC))
+    
+    async def _upsert_notifications(
+        self,
+        supabase_client: AsyncClient,
+        notifications: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Insert the notifications that don't exist yet, one request per batch.
+        Existing rows (including sent ones) are left untouched, so nothing is sent twice.
+        """
+        if not notifications:
+            return
+        
+        batches = [notifications[i:i + NOTIFICATION_BATCH_SIZE] for i in range(0, len(notifications), NOTIFICATION_BATCH_SIZE)]
         try:
-            notification_data = {
-                'user_id': user_id,
-                'habit_id': habit_id,
-                'notification_type': notification_type,
-                'scheduled_time': scheduled_time.isoformat(),
-                'title': title,
-                'message': message,
-                'sent': False,
-                'created_at': datetime.utcnow().isoformat()
-            }
-            
-            # Check if notification already exists to avoid duplicates
-            existing = await supabase_client.table('scheduled_notifications').select('*').eq(
-                'user_id', user_id
-            ).eq('habit_id', habit_id).eq('notification_type', notification_type).eq(
-                'scheduled_time', scheduled_time.isoformat()
-            ).execute()
-            
-            if not existing.data:
-                await supabase_client.table('scheduled_notifications').insert(notification_data).execute()
-                logger.info(f"Scheduled {notification_type} notification for habit {habit_id} at {scheduled_time}")
-            
+            for batch in batches:
+                await supabase_client.table('scheduled_notifications').upsert(
+                    batch, on_conflict=NOTIFICATION_CONFLICT_KEY, ignore_duplicates=True
+                ).execute()
+            return
         except Exception as e:
-            logger.error(f"Error creating scheduled notification: {e}")
+            # ON CONFLICT needs the unique index from backend/scheduled_notifications_unique.sql
+            logger.warning(f"Notification upsert unavailable, deduplicating client-side: {e}")
+        
+        habit_ids = list({n['habit_id'] for n in notifications})
+        existing = await supabase_client.table('scheduled_notifications').select(
+            'habit_id, notification_type, scheduled_time'
+        ).in_('habit_id', habit_ids).execute()
+        existing_keys = {self._notification_key(row) for row in existing.data or []}
+        
+        new_notifications = [n for n in notifications if self._notification_key(n) not in existing_keys]
+        for i in range(0, len(new_notifications), NOTIFICATION_BATCH_SIZE):
+            await supabase_client.table('scheduled_notifications').insert(
+                new_notifications[i:i + NOTIFICATION_BATCH_SIZE]
+            ).execute()
+    
+    async def _sync_pending_notifications(
+        self,
+        supabase_client: AsyncClient,
+        pending_query,
+        notifications: List[Dict[str, Any]]
+    ) -> tuple:
+        """
+        Make the pending (unsent) notifications matched by pending_query equal the new set:
+        unchanged rows are kept, stale or edited rows deleted, missing rows inserted.
+        
+        Returns:
+            (number inserted, number deleted)
+        """
+        desired = {self._notification_key(n): n for n in notifications}
+        
+        pending = await pending_query.execute()
+        kept = set()
+        stale_ids = []
+        for row in pending.data or []:
+            key = self._notification_key(row)
+            wanted = desired.get(key)
+            if wanted and key not in kept and wanted['title'] == row['title'] and wanted['message'] == row['message']:
+                kept.add(key)
+            else:
+                stale_ids.append(row['id'])
+        
+        for i in range(0, len(stale_ids), NOTIFICATION_BATCH_SIZE):
+            await supabase_client.table('scheduled_notifications').delete().in_(
+                'id', stale_ids[i:i + NOTIFICATION_BATCH_SIZE]
+            ).execute()
+        
+        new_notifications = [n for key, n in desired.items() if key not in kept]
+        await self._upsert_notifications(supabase_client, new_notifications)
+        return len(new_notifications), len(stale_ids)
     
     async def process_due_notifications(self, supabase_client: AsyncClient):
-        """Process all notifications that are due to be sent"""
+        """
+        Process all notifications that are due to be sent.
+        
+        Claims due notifications in batches (claim_due_notifications RPC, FOR UPDATE
+        SKIP LOCKED) so several workers can dispatch side by side, and keeps going until
+        nothing is due or NOTIFICATION_DISPATCH_MAX_BATCHES batches were handled.
+        """
+        worker_id = default_worker_id()
+        total = 0
         try:
-            now_utc = datetime.now(pytz.UTC)
+            for _ in range(NOTIFICATION_DISPATCH_MAX_BATCHES):
+                batch, claimed = await self._claim_due_notifications(supabase_client, worker_id)
+                if not batch:
+                    break
+                total += len(batch)
+                await self._dispatch_batch(batch, supabase_client)
+                # Unclaimed failures would be fetched again, so the fallback does one batch per cycle
+                if not claimed or len(batch) < NOTIFICATION_DISPATCH_BATCH_SIZE:
+                    break
             
-            # Get all unsent notifications that are due (limit to prevent overwhelming)
-            # Add retry logic for network timeouts
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    due_notifications = await supabase_client.table('scheduled_notifications').select(
-                        '*'
-                    ).eq('sent', False).lte('scheduled_time', now_utc.isoformat()).order(
-                        'scheduled_time', desc=False
-                    ).limit(50).execute()  # Process max 50 notifications per run
-                    break  # Success, exit retry loop
-                except asyncio.CancelledError:
-                    if attempt == max_retries - 1:
-                        logger.error(f"Failed to fetch due notifications after {max_retries} attempts due to network timeout")
-                        return
-                    else:
-                        logger.warning(f"Network timeout fetching due notifications, retrying ({attempt + 1}/{max_retries})...")
-                        await asyncio.sleep(2 ** attempt)  # Exponential backoff: 1s, 2s, 4s
-                        continue
-                except Exception as e:
-                    logger.error(f"Database error fetching due notifications: {e}")
-                    return
-
-            if not due_notifications.data:
+            if total:
+                logger.info(f"Processed {total} due notifications")
+            else:
                 logger.debug("No due notifications to process")
-                return
-                
-            logger.info(f"Processing {len(due_notifications.data)} due notifications")
-            
-            for notification in due_notifications.data:
-                await self._process_single_notification(notification, supabase_client)
                 
         except Exception as e:
             logger.error(f"Error processing due notifications: {e}")
     
-    async def _process_single_notification(
+    async def _claim_due_notifications(self, supabase_client: AsyncClient, worker_id: str) -> tuple:
+        """
+        Atomically claim the next batch of due, unsent notifications for this worker.
+        Falls back to a plain (unclaimed) query when the RPC isn't installed.
+        
+        Returns:
+            (notifications, whether they were claimed)
+        """
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                result = await supabase_client.rpc('claim_due_notifications', {
+                    'p_worker': worker_id,
+                    'p_limit': NOTIFICATION_DISPATCH_BATCH_SIZE,
+                    'p_claim_ttl_seconds': NOTIFICATION_CLAIM_TTL_SECONDS
+                }).execute()
+                return result.data or [], True
+            except asyncio.CancelledError:
+                # Network timeouts surface as cancellations - retry with backoff
+                if attempt == max_retries - 1:
+                    logger.error(f"Failed to claim due notifications after {max_retries} attempts due to network timeout")
+                    return [], True
+                logger.warning(f"Network timeout claiming due notifications, retrying ({attempt + 1}/{max_retries})...")
+                await asyncio.sleep(2 ** attempt)  # Exponential backoff: 1s, 2s, 4s
+            except Exception as e:
+                logger.warning(f"claim_due_notifications RPC unavailable, fetching without claims: {e}")
+                break
+        
+        # Single-worker fallback (backend/notification_dispatch.sql not applied)
+        now_utc = datetime.now(pytz.UTC)
+        result = await supabase_client.table('scheduled_notifications').select(
+            '*'
+        ).eq('sent', False).lte('scheduled_time', now_utc.isoformat()).order(
+            'scheduled_time', desc=False
+        ).limit(NOTIFICATION_DISPATCH_BATCH_SIZE).execute()
+        return result.data or [], False
+    
+    async def _fetch_verified_notification_ids(
         self,
-        notification: Dict[str, Any],
+        notifications: List[Dict[str, Any]],
         supabase_client: AsyncClient
-    ):
-        """Process a single notification"""
-        try:
-            notification_id = notification['id']
-            notification_type = notification['notification_type']
-            user_id = notification['user_id']
-            habit_id = notification['habit_id']
-            title = notification['title']
-            message = notification['message']
-            scheduled_time = notification['scheduled_time']
-            
-            logger.debug(f"Processing {notification_type} notification for user {user_id[:8]}... scheduled at {scheduled_time}")
-            
-            # Handle gaming limit check notifications
-            if notification_type == 'gaming_limit_check':
-                await self._process_gaming_limit_check(
-                    user_id=user_id,
-                    habit_id=habit_id,
-                    supabase_client=supabase_client
+    ) -> set:
+        """
+        IDs of notifications whose habit was verified on the notification's local day.
+        One timezone query and one verifications query per chunk of habits, for the whole batch.
+        """
+        if not notifications:
+            return set()
+        
+        user_timezones = await get_user_timezones_async(
+            supabase_client, list({n['user_id'] for n in notifications})
+        )
+        
+        day_windows = {}
+        for notification in notifications:
+            user_tz = pytz.timezone(user_timezones.get(notification['user_id'], 'UTC'))
+            scheduled_time = datetime.fromisoformat(notification['scheduled_time'].replace('Z', '+00:00'))
+            check_date = scheduled_time.astimezone(user_tz).date()
+            day_windows[notification['id']] = (
+                user_tz.localize(datetime.combine(check_date, datetime.min.time())),
+                user_tz.localize(datetime.combine(check_date, datetime.max.time()))
+            )
+        
+        window_start = min(start for start, _ in day_windows.values())
+        window_end = max(end for _, end in day_windows.values())
+        habit_ids = list({n['habit_id'] for n in notifications})
+        
+        verified_at_by_habit: Dict[str, List[datetime]] = {}
+        for i in range(0, len(habit_ids), NOTIFICATION_ID_CHUNK_SIZE):
+            result = await supabase_client.table('habit_verifications').select(
+                'habit_id, verified_at'
+            ).in_('habit_id', habit_ids[i:i + NOTIFICATION_ID_CHUNK_SIZE]).gte(
+                'verified_at', window_start.isoformat()
+            ).lte('verified_at', window_end.isoformat()).execute()
+            for row in result.data or []:
+                verified_at_by_habit.setdefault(row['habit_id'], []).append(
+                    datetime.fromisoformat(row['verified_at'].replace('Z', '+00:00'))
                 )
-                
-                # Mark as sent
-                await supabase_client.table('scheduled_notifications').update({
-                    'sent': True,
-                    'sent_at': datetime.utcnow().isoformat()
-                }).eq('id', notification_id).execute()
+        
+        verified_ids = set()
+        for notification in notifications:
+            start, end = day_windows[notification['id']]
+            if any(start <= verified_at <= end for verified_at in verified_at_by_habit.get(notification['habit_id'], ())):
+                verified_ids.add(notification['id'])
+        return verified_ids
+    
+    async def _fetch_device_tokens_by_user(
+        self,
+        user_ids: List[str],
+        supabase_client: AsyncClient
+    ) -> Dict[str, List[str]]:
+        """Active device tokens for many users, one query per chunk of user IDs"""
+        tokens_by_user: Dict[str, List[str]] = {}
+        for i in range(0, len(user_ids), NOTIFICATION_ID_CHUNK_SIZE):
+            result = await supabase_client.table('device_tokens').select('user_id, token').in_(
+                'user_id', user_ids[i:i + NOTIFICATION_ID_CHUNK_SIZE]
+            ).eq('is_active', True).execute()
+            for row in result.data or []:
+                tokens_by_user.setdefault(row['user_id'], []).append(row['token'])
+        return tokens_by_user
+    
+    async def _dispatch_batch(self, notifications: List[Dict[str, Any]], supabase_client: AsyncClient):
+        """
+        Send a claimed batch: prefetch verifications and device tokens for the whole batch,
+        send with bounded concurrency, then record outcomes with one update per outcome.
+        Notifications that fail stay unsent and are retried once their claim expires, up to
+        NOTIFICATION_MAX_ATTEMPTS times.
+        """
+        gaming_checks = [n for n in notifications if n['notification_type'] == 'gaming_limit_check']
+        to_check = [n for n in notifications if n['notification_type'] in VERIFICATION_CHECKED_TYPES]
+        
+        verified_ids = await self._fetch_verified_notification_ids(to_check, supabase_client)
+        to_send = [
+            n for n in notifications
+            if n['notification_type'] != 'gaming_limit_check' and n['id'] not in verified_ids
+        ]
+        tokens_by_user = await self._fetch_device_tokens_by_user(
+            list({n['user_id'] for n in to_send}), supabase_client
+        )
+        
+        semaphore = asyncio.Semaphore(NOTIFICATION_SEND_CONCURRENCY)
+        sent_ids = []
+        
+        async def run(notification: Dict[str, Any], send):
+            async with semaphore:
+                try:
+                    await send(notification)
+                    sent_ids.append(notification['id'])
+                except Exception as e:
+                    logger.error(f"Error processing notification {notification.get('id')}: {e}")
+        
+        async def gaming_check(notification):
+            await self._process_gaming_limit_check(
+                user_id=notification['user_id'],
+                habit_id=notification['habit_id'],
+                supabase_client=supabase_client
+            )
+        
+        async def push(notification):
+            device_tokens = tokens_by_user.get(notification['user_id'])
+            if not device_tokens:
+                logger.info(f"No device tokens found for user {notification['user_id']}")
                 return
-            
-            # Check if habit was verified for reminder notifications and missed notifications
-            # Skip verification check for alarm_wake_up as it should always fire regardless
-            if notification_type in ['habit_missed', 'alarm_missed', 'habit_reminder_12h', 'habit_reminder_6h', 'habit_reminder_1h', 'alarm_checkin_window']:
-                # Check if habit was verified for this day
-                scheduled_time_dt = datetime.fromisoformat(scheduled_time)
-                user_timezone = await self._get_user_timezone(supabase_client, user_id)
-                user_tz = pytz.timezone(user_timezone)
-                local_time = scheduled_time_dt.astimezone(user_tz)
-                check_date = local_time.date()
-                
-                # Check for verifications on this date
-                start_of_day = user_tz.localize(datetime.combine(check_date, datetime.min.time()))
-                end_of_day = user_tz.localize(datetime.combine(check_date, datetime.max.time()))
-                
-                verifications = await supabase_client.table('habit_verifications').select(
-                    '*'
-                ).eq('habit_id', habit_id).gte(
-                    'verified_at', start_of_day.isoformat()
-                ).lte('verified_at', end_of_day.isoformat()).execute()
-                
-                if verifications.data:
-                    # Habit was verified, don't send notification
-                    skip_reason = 'habit_was_verified'
-                    if notification_type.startswith('habit_reminder') or notification_type == 'alarm_checkin_window':
-                        skip_reason = 'habit_already_completed'
-                    
-                    await supabase_client.table('scheduled_notifications').update({
-                        'sent': True,
-                        'sent_at': datetime.utcnow().isoformat(),
-                        'skipped': True,
-                        'skip_reason': skip_reason
-                    }).eq('id', notification_id).execute()
-                    logger.info(f"Skipped {notification_type} notification for user {user_id[:8]}... - habit already completed")
-                    return
-            
-            # Send the notification
-            await self._send_notification_to_user(
-                user_id=user_id,
-                title=title,
-                message=message,
-                notification_type=notification_type,
-                habit_id=habit_id,
+            await self.notification_service.send_apns_notification(
+                device_tokens=device_tokens,
+                title=notification['title'],
+                body=notification['message'],
+                data={
+                    'type': 'habit_notification',
+                    'notification_type': notification['notification_type'],
+                    'habit_id': notification['habit_id'],
+                    'timestamp': datetime.utcnow().isoformat()
+                },
                 supabase_client=supabase_client
             )
-            
-            # Mark as sent
-            await supabase_client.table('scheduled_notifications').update({
+        
+        await asyncio.gather(
+            *[run(n, gaming_check) for n in gaming_checks],
+            *[run(n, push) for n in to_send]
+        )
+        
+        # Verified habits: reminders are moot, missed notices are wrong
+        skipped_by_reason: Dict[str, List] = {}
+        for notification in to_check:
+            if notification['id'] in verified_ids:
+                notification_type = notification['notification_type']
+                skip_reason = 'habit_was_verified'
+                if notification_type.startswith('habit_reminder') or notification_type == 'alarm_checkin_window':
+                    skip_reason = 'habit_already_completed'
+                skipped_by_reason.setdefault(skip_reason, []).append(notification['id'])
+        
+        sent_at = datetime.utcnow().isoformat()
+        await self._mark_notifications(supabase_client, sent_ids, {'sent': True, 'sent_at': sent_at})
+        for skip_reason, ids in skipped_by_reason.items():
+            await self._mark_notifications(supabase_client, ids, {
                 'sent': True,
-                'sent_at': datetime.utcnow().isoformat()
-            }).eq('id', notification_id).execute()
-            
-            logger.info(f"Successfully sent {notification_type} notification to user {user_id[:8]}...")
-            
-        except Exception as e:
-            logger.error(f"Error processing notification {notification.get('id')}: {e}")
+                'sent_at': sent_at,
+                'skipped': True,
+                'skip_reason': skip_reason
+            })
+        
+        sent_id_set = set(sent_ids)
+        failed = [n for n in gaming_checks + to_send if n['id'] not in sent_id_set]
+        given_up = await self._record_failed_attempts(supabase_client, failed, sent_at)
+        
+        skipped = sum(len(ids) for ids in skipped_by_reason.values())
+        logger.info(
+            f"Notification batch: {len(sent_ids)} sent, {skipped} skipped (habit verified), "
+            f"{len(failed)} failed ({given_up} given up after {NOTIFICATION_MAX_ATTEMPTS} attempts)"
+        )
+    
+    async def _record_failed_attempts(
+        self,
+        supabase_client: AsyncClient,
+        notifications: List[Dict[str, Any]],
+        failed_at: str
+    ) -> int:
+        """
+        Count a failed attempt for each notification, one update per resulting attempt count.
+        Notifications reaching NOTIFICATION_MAX_ATTEMPTS are closed as skipped with
+        skip_reason 'delivery_failed' instead of being retried again.
+        
+        Rows without an attempts column (backend/notification_dispatch.sql not applied)
+        are left as they are and retried.
+        
+        Returns:
+            Number of notifications given up
+        """
+        by_attempts: Dict[int, List] = {}
+        for notification in notifications:
+            if 'attempts' in notification:
+                by_attempts.setdefault((notification['attempts'] or 0) + 1, []).append(notification['id'])
+        
+        given_up = 0
+        for attempts, ids in by_attempts.items():
+            values: Dict[str, Any] = {'attempts': attempts}
+            if attempts >= NOTIFICATION_MAX_ATTEMPTS:
+                values.update({
+                    'sent': True,
+                    'sent_at': failed_at,
+                    'skipped': True,
+                    'skip_reason': 'delivery_failed'
+                })
+                given_up += len(ids)
+            await self._mark_notifications(supabase_client, ids, values)
+        
+        if given_up:
+            logger.warning(f"Gave up on {given_up} notifications after {NOTIFICATION_MAX_ATTEMPTS} failed attempts")
+        return given_up
+    
+    async def _mark_notifications(self, supabase_client: AsyncClient, ids: List, values: Dict[str, Any]):
+        """Apply the same update to many notifications, one request per chunk of IDs"""
+        for i in range(0, len(ids), NOTIFICATION_BATCH_SIZE):
+            await supabase_client.table('scheduled_notifications').update(values).in_(
+                'id', ids[i:i + NOTIFICATION_BATCH_SIZE]
+            ).execute()
     
     async def _process_gaming_limit_check(
         self,
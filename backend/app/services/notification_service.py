@@ -2,7 +2,8 @@ import asyncio
 import json
 import logging
 import os
-from typing import List, Optional, Dict, Any
+import time
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 from aioapns import APNs, NotificationRequest, PushType
 from supabase._async.client import AsyncClient
@@ -11,6 +12,12 @@ from config.notifications import notification_config
 
 logger = logging.getLogger(__name__)
 
+# Concurrent APNs requests per fan-out; they are multiplexed as HTTP/2 streams
+APNS_SEND_CONCURRENCY = int(os.getenv("APNS_SEND_CONCURRENCY", "100"))
+
+# Persistent HTTP/2 connections the APNs client may open
+APNS_MAX_CONNECTIONS = int(os.getenv("APNS_MAX_CONNECTIONS", "10"))
+
 class NotificationService:
     """Service for sending push notifications to users"""
     
@@ -26,6 +33,10 @@ class NotificationService:
         # Initialize APNs client as None - will be initialized in async context
         self.apns_client = None
         self._apns_key_content = None
+        self._metrics: Dict[str, float] = {
+            "batches": 0, "notifications": 0, "failed": 0, "invalid_tokens": 0,
+            "total_seconds": 0.0, "max_seconds": 0.0, "last_batch_size": 0, "last_batch_seconds": 0.0
+        }
         
         if self.notifications_enabled and notification_config.is_apns_configured():
             try:
@@ -60,6 +71,7 @@ class NotificationService:
                     team_id=self.apns_team_id,
                     topic=self.apns_bundle_id,
                     use_sandbox=self.apns_use_sandbox,
+                    max_connections=APNS_MAX_CONNECTIONS,
                     max_connection_attempts=3
                 )
             except (ValueError, ConnectionError, TimeoutError, OSError) as e:
@@ -68,26 +80,23 @@ class NotificationService:
                 logger.error(f"APNs config - key_id: {self.apns_key_id}, team_id: {self.apns_team_id}, bundle_id: {self.apns_bundle_id}, sandbox: {self.apns_use_sandbox}")
                 self.apns_client = None
 
-    async def _cleanup_invalid_device_token(self, token: str, supabase_client: AsyncClient):
-        """Mark device token as inactive when APNs returns BadDeviceToken"""
+    async def _deactivate_device_tokens(self, tokens: List[str], supabase_client: AsyncClient):
+        """Mark device tokens as inactive (APNs returned BadDeviceToken) with one bulk update"""
         try:
-            logger.info(f"🧹 [NotificationService] Cleaning up invalid device token: {token[:10]}...")
+            logger.info(f"🧹 [NotificationService] Cleaning up {len(tokens)} invalid device tokens")
             
-            # Mark the token as inactive instead of deleting it
+            # Mark the tokens as inactive instead of deleting them
             result = await supabase_client.table("device_tokens").update({
                 "is_active": False,
                 "updated_at": datetime.utcnow().isoformat()
-            }).eq("token", token).execute()
+            }).in_("token", tokens).execute()
             
-            if result.data:
-                logger.info(f"✅ [NotificationService] Successfully marked device token {token[:10]}... as inactive")
-            else:
-                logger.warning(f"⚠️ [NotificationService] No device token found to cleanup: {token[:10]}...")
+            logger.info(f"✅ [NotificationService] Marked {len(result.data or [])} device tokens as inactive")
                 
         except (ValueError, KeyError) as e:
-            logger.error(f"❌ [NotificationService] Error cleaning up device token {token[:10]}...: {e}")
+            logger.error(f"❌ [NotificationService] Error cleaning up device tokens: {e}")
         except (ConnectionError, TimeoutError, OSError) as e:
-            logger.error(f"❌ [NotificationService] Connectivity error during device token cleanup {token[:10]}...: {e}")
+            logger.error(f"❌ [NotificationService] Connectivity error during device token cleanup: {e}")
     
     async def send_comment_notification(
         self, 
@@ -441,21 +450,19 @@ class NotificationService:
                 "habit_type": habit_type
             }
             
-            # Send notifications to each friend's devices
-            for friend_user_id in friends_user_ids:
-                device_tokens = user_tokens_map.get(friend_user_id, [])
-                
-                if not device_tokens:
-                    continue
-                
-                # Send to all friend's devices
-                await self.send_apns_notification(
-                    device_tokens=device_tokens,
-                    title=title,
-                    body=body,
-                    data=notification_data,
-                    supabase_client=supabase_client
-                )
+            # Fan out to every friend's devices in one concurrent batch
+            device_tokens = [
+                token
+                for friend_user_id in friends_user_ids
+                for token in user_tokens_map.get(friend_user_id, [])
+            ]
+            await self.send_apns_notification(
+                device_tokens=device_tokens,
+                title=title,
+                body=body,
+                data=notification_data,
+                supabase_client=supabase_client
+            )
         except (ConnectionError, TimeoutError, OSError, ValueError) as e:
             logger.error(f"Failed to send new post notification: {e}")
     
@@ -484,13 +491,6 @@ class NotificationService:
     ):
         """Send APNs notification (iOS)"""
         
-        # Ensure APNs client is initialized in current event loop
-        await self._ensure_apns_client()
-        
-        if not self.apns_client:
-            logger.warning("APNs client not configured")
-            return
-        
         # Create notification payload
         payload = {
             "aps": {
@@ -510,37 +510,133 @@ class NotificationService:
         if badge is not None:
             payload["aps"]["badge"] = badge
         
-        # Send to each device token
-        for token in device_tokens:
+        if not device_tokens:
+            return
+        
+        # Imported here: the outbox's consumer imports this module for its default sender
+        from services.push_outbox import push_outbox, collapse_key_for
+        
+        if push_outbox is not None:
+            collapse_key = collapse_key_for(payload)
             try:
-                request = NotificationRequest(
-                    device_token=token,
-                    message=payload,
-                    push_type=PushType.ALERT
-                )
-                
-                # Log the notification attempt
-                
-                response = await self.apns_client.send_notification(request)
-                
-                if response.is_successful:
-                    logger.info(f"Successfully sent APNs notification to token {token[:10]}...")
-                else:
-                    logger.error(f"Failed to send APNs notification to token {token[:10]}...: {response.description}")
-                    
-                    # Check if it's a BadDeviceToken error and clean it up
-                    if (response.description and "BadDeviceToken" in str(response.description)) or (hasattr(response, 'status') and response.status == 400):
-                        if supabase_client:
-                            logger.warning(f"🚫 [NotificationService] BadDeviceToken detected for {token[:10]}..., cleaning up")
-                            await self._cleanup_invalid_device_token(token, supabase_client)
-                        else:
-                            logger.warning(f"🚫 [NotificationService] BadDeviceToken detected for {token[:10]}... but no supabase_client provided for cleanup")
-                    
-            except (ConnectionError, TimeoutError, OSError, ValueError) as e:
-                logger.error(f"Error sending APNs notification to token {token[:10]}...: {str(e)}")
-                # Log the full exception for debugging
-                import traceback
-                logger.error(f"Full exception: {traceback.format_exc()}")
+                await push_outbox.enqueue([(token, payload, collapse_key) for token in device_tokens])
+                return
+            except Exception as e:
+                # A push is better late than lost: deliver it inline if it can't be queued
+                logger.error(f"Failed to queue {len(device_tokens)} pushes, sending inline: {e}")
+        
+        await self.send_apns_batch([(token, payload) for token in device_tokens], supabase_client)
+    
+    async def send_apns_batch(
+        self,
+        messages: List[Tuple[str, Dict[str, Any]]],
+        supabase_client: Optional[AsyncClient] = None
+    ) -> Dict[str, int]:
+        """
+        Send many APNs notifications concurrently and summarize the results.
+        
+        Args:
+            messages: (device token, payload) pairs
+            supabase_client: Used to deactivate invalid tokens (skipped if None)
+        
+        Returns:
+            Counts of sent, failed and invalid-token notifications
+        """
+        outcomes = await self.deliver_apns_batch(messages, supabase_client)
+        sent = outcomes.count("sent")
+        return {"sent": sent, "failed": len(outcomes) - sent, "invalid_tokens": outcomes.count("invalid")}
+    
+    async def deliver_apns_batch(
+        self,
+        messages: List[Tuple[str, Dict[str, Any]]],
+        supabase_client: Optional[AsyncClient] = None
+    ) -> List[str]:
+        """
+        Send many APNs notifications concurrently over the client's persistent HTTP/2 connections.
+        
+        At most APNS_SEND_CONCURRENCY requests are in flight; tokens APNs rejects as
+        BadDeviceToken are deactivated with one bulk update after the batch.
+        
+        Args:
+            messages: (device token, payload) pairs
+            supabase_client: Used to deactivate invalid tokens (skipped if None)
+        
+        Returns:
+            One outcome per message, in order: "sent", "invalid" (bad device token, not
+            worth retrying) or "failed" (may succeed on retry)
+        """
+        if not messages:
+            return []
+        
+        # Ensure APNs client is initialized in current event loop
+        await self._ensure_apns_client()
+        
+        if not self.apns_client:
+            logger.warning("APNs client not configured")
+            return ["failed"] * len(messages)
+        
+        semaphore = asyncio.Semaphore(APNS_SEND_CONCURRENCY)
+        
+        async def send_one(token: str, payload: Dict[str, Any]) -> str:
+            async with semaphore:
+                try:
+                    request = NotificationRequest(
+                        device_token=token,
+                        message=payload,
+                        push_type=PushType.ALERT
+                    )
+                    response = await self.apns_client.send_notification(request)
+                except (ConnectionError, TimeoutError, OSError, ValueError) as e:
+                    logger.error(f"Error sending APNs notification to token {token[:10]}...: {str(e)}")
+                    return "failed"
+            
+            if response.is_successful:
+                logger.debug(f"Successfully sent APNs notification to token {token[:10]}...")
+                return "sent"
+            
+            logger.error(f"Failed to send APNs notification to token {token[:10]}...: {response.description}")
+            # Check if it's a BadDeviceToken error and collect it for cleanup
+            if (response.description and "BadDeviceToken" in str(response.description)) or (hasattr(response, 'status') and response.status == 400):
+                return "invalid"
+            return "failed"
+        
+        started = time.perf_counter()
+        outcomes = list(await asyncio.gather(*[send_one(token, payload) for token, payload in messages]))
+        elapsed = time.perf_counter() - started
+        
+        sent = outcomes.count("sent")
+        invalid_tokens = list({token for (token, _), outcome in zip(messages, outcomes) if outcome == "invalid"})
+        self._record_batch(len(messages), len(messages) - sent, len(invalid_tokens), elapsed)
+        logger.info(f"APNs batch: {sent}/{len(messages)} sent in {elapsed:.2f}s")
+        
+        if invalid_tokens:
+            if supabase_client:
+                logger.warning(f"🚫 [NotificationService] BadDeviceToken detected for {len(invalid_tokens)} tokens, cleaning up")
+                await self._deactivate_device_tokens(invalid_tokens, supabase_client)
+            else:
+                logger.warning(f"🚫 [NotificationService] BadDeviceToken detected for {len(invalid_tokens)} tokens but no supabase_client provided for cleanup")
+        
+        return outcomes
+    
+    def _record_batch(self, size: int, failed: int, invalid_tokens: int, elapsed: float) -> None:
+        stats = self._metrics
+        stats["batches"] += 1
+        stats["notifications"] += size
+        stats["failed"] += failed
+        stats["invalid_tokens"] += invalid_tokens
+        stats["total_seconds"] += elapsed
+        stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+        stats["last_batch_size"] = size
+        stats["last_batch_seconds"] = round(elapsed, 3)
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        batches = self._metrics["batches"]
+        return {
+            **self._metrics,
+            "avg_batch_seconds": round(self._metrics["total_seconds"] / batches, 3) if batches else 0.0,
+            "concurrency": APNS_SEND_CONCURRENCY,
+            "max_connections": APNS_MAX_CONNECTIONS
+        }
 
 # Global notification service instance
 notification_service = NotificationService() 
\ No newline at end of file
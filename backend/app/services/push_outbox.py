@@ -0,0 +1,305 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from supabase._async.client import AsyncClient
+
+logger = logging.getLogger(__name__)
+
+# The outbox is opt-in: "none" sends pushes inline (no table needed), "supabase" queues them
+# in backend/push_outbox.sql for the worker dyno to deliver and "memory" is an in-process
+# stand-in for tests and local runs.
+PUSH_OUTBOX = os.getenv("PUSH_OUTBOX", "none").lower()
+
+PUSH_OUTBOX_BATCH_SIZE = int(os.getenv("PUSH_OUTBOX_BATCH_SIZE", "200"))
+PUSH_OUTBOX_POLL_SECONDS = float(os.getenv("PUSH_OUTBOX_POLL_SECONDS", "2"))
+PUSH_OUTBOX_MAX_ATTEMPTS = int(os.getenv("PUSH_OUTBOX_MAX_ATTEMPTS", "5"))
+
+# Retry delay doubles per attempt (30s, 1m, 2m, ...) up to PUSH_OUTBOX_MAX_BACKOFF_SECONDS
+PUSH_OUTBOX_BACKOFF_SECONDS = int(os.getenv("PUSH_OUTBOX_BACKOFF_SECONDS", "30"))
+PUSH_OUTBOX_MAX_BACKOFF_SECONDS = int(os.getenv("PUSH_OUTBOX_MAX_BACKOFF_SECONDS", "3600"))
+
+# A claimed message that was neither delivered nor rescheduled can be reclaimed after this
+PUSH_OUTBOX_CLAIM_TTL_SECONDS = int(os.getenv("PUSH_OUTBOX_CLAIM_TTL_SECONDS", "300"))
+
+def collapse_key_for(payload: Dict[str, Any]) -> str:
+    """
+    Coalescing key of a push: identical payloads (ignoring their timestamp) to the same
+    device collapse into one pending message.
+    """
+    content = {key: value for key, value in payload.items() if key != "timestamp"}
+    return hashlib.md5(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+def retry_delay(attempts: int) -> int:
+    """Seconds to wait before the next delivery attempt after `attempts` failures"""
+    return min(PUSH_OUTBOX_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0), PUSH_OUTBOX_MAX_BACKOFF_SECONDS)
+
+class OutboxMessage:
+    """One queued push to one device"""
+
+    __slots__ = ("id", "device_token", "payload", "collapse_key", "attempts")
+
+    def __init__(self, id: Any, device_token: str, payload: Dict[str, Any], collapse_key: str, attempts: int = 0):
+        self.id = id
+        self.device_token = device_token
+        self.payload = payload
+        self.collapse_key = collapse_key
+        self.attempts = attempts
+
+class PushOutbox:
+    """Durable queue of outbound pushes, coalesced per (device, collapse key) while pending"""
+
+    async def enqueue(self, messages: List[Tuple[str, Dict[str, Any], str]]) -> None:
+        """Queue (device token, payload, collapse key) triples"""
+        raise NotImplementedError
+
+    async def claim(self, worker_id: str, limit: int) -> List[OutboxMessage]:
+        """Claim up to `limit` messages that are due, for exclusive delivery by worker_id"""
+        raise NotImplementedError
+
+    async def complete(self, ids: List[Any]) -> None:
+        """Mark messages as delivered (or permanently undeliverable, e.g. a bad token)"""
+        raise NotImplementedError
+
+    async def retry(self, messages: List[OutboxMessage], error: str) -> None:
+        """Reschedule failed messages with backoff; give up after PUSH_OUTBOX_MAX_ATTEMPTS"""
+        raise NotImplementedError
+
+    async def prune(self, days: int = 7) -> None:
+        """Delete delivered and abandoned messages older than `days`"""
+        raise NotImplementedError
+
+class SupabasePushOutbox(PushOutbox):
+    """Outbox in the push_outbox table (backend/push_outbox.sql)"""
+
+    def __init__(self, client_factory: Optional[Callable[[], Awaitable[AsyncClient]]] = None):
+        if client_factory is None:
+            from config.database import get_async_supabase_client
+            client_factory = get_async_supabase_client
+        self._client_factory = client_factory
+
+    async def enqueue(self, messages: List[Tuple[str, Dict[str, Any], str]]) -> None:
+        if not messages:
+            return
+        supabase = await self._client_factory()
+        await supabase.rpc("enqueue_push_notifications", {
+            "p_messages": [
+                {"device_token": token, "payload": payload, "collapse_key": collapse_key}
+                for token, payload, collapse_key in messages
+            ]
+        }).execute()
+
+    async def claim(self, worker_id: str, limit: int) -> List[OutboxMessage]:
+        supabase = await self._client_factory()
+        result = await supabase.rpc("claim_push_outbox", {
+            "p_worker": worker_id,
+            "p_limit": limit,
+            "p_claim_ttl_seconds": PUSH_OUTBOX_CLAIM_TTL_SECONDS
+        }).execute()
+        return [
+            OutboxMessage(row["id"], row["device_token"], row["payload"], row["collapse_key"], row.get("attempts") or 0)
+            for row in result.data or []
+        ]
+
+    async def complete(self, ids: List[Any]) -> None:
+        if not ids:
+            return
+        supabase = await self._client_factory()
+        now = datetime.now(timezone.utc).isoformat()
+        await supabase.table("push_outbox").update({
+            "status": "sent", "sent_at": now, "updated_at": now
+        }).in_("id", ids).execute()
+
+    async def retry(self, messages: List[OutboxMessage], error: str) -> None:
+        # Messages with the same attempt count share a backoff, so one update per count
+        by_attempts: Dict[int, List[Any]] = {}
+        for message in messages:
+            by_attempts.setdefault(message.attempts + 1, []).append(message.id)
+
+        supabase = await self._client_factory()
+        now = datetime.now(timezone.utc)
+        for attempts, ids in by_attempts.items():
+            await supabase.table("push_outbox").update({
+                "status": "failed" if attempts >= PUSH_OUTBOX_MAX_ATTEMPTS else "pending",
+                "attempts": attempts,
+                "next_attempt_at": (now + timedelta(seconds=retry_delay(attempts))).isoformat(),
+                "claimed_at": None,
+                "claimed_by": None,
+                "last_error": error[:500],
+                "updated_at": now.isoformat()
+            }).in_("id", ids).execute()
+
+    async def prune(self, days: int = 7) -> None:
+        supabase = await self._client_factory()
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+        await supabase.table("push_outbox").delete().in_("status", ["sent", "failed"]).lt("updated_at", cutoff).execute()
+
+class InMemoryPushOutbox(PushOutbox):
+    """
+    In-process outbox with the same claim/retry/coalescing rules, for tests and local runs.
+    Lost on restart, so not durable - use "supabase" in deployments.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._next_id = 1
+        self._messages: Dict[int, dict] = {}
+        self._pending_keys: Dict[Tuple[str, str], int] = {}
+
+    async def enqueue(self, messages: List[Tuple[str, Dict[str, Any], str]]) -> None:
+        for token, payload, collapse_key in messages:
+            existing_id = self._pending_keys.get((token, collapse_key))
+            if existing_id is not None:
+                self._messages[existing_id]["payload"] = payload
+                continue
+            self._messages[self._next_id] = {
+                "device_token": token, "payload": payload, "collapse_key": collapse_key,
+                "status": "pending", "attempts": 0, "next_attempt_at": self._clock(),
+                "claimed_at": None, "claimed_by": None, "last_error": None,
+                "updated_at": self._clock()
+            }
+            self._pending_keys[(token, collapse_key)] = self._next_id
+            self._next_id += 1
+
+    async def claim(self, worker_id: str, limit: int) -> List[OutboxMessage]:
+        now = self._clock()
+        claimed = []
+        for message_id, row in self._messages.items():
+            if len(claimed) >= limit:
+                break
+            if row["status"] != "pending" or row["next_attempt_at"] > now:
+                continue
+            if row["claimed_at"] is not None and now - row["claimed_at"] < PUSH_OUTBOX_CLAIM_TTL_SECONDS:
+                continue
+            row["claimed_at"], row["claimed_by"] = now, worker_id
+            claimed.append(OutboxMessage(message_id, row["device_token"], row["payload"], row["collapse_key"], row["attempts"]))
+        return claimed
+
+    def _close(self, message_id: int, status: str) -> None:
+        row = self._messages[message_id]
+        row["status"] = status
+        row["updated_at"] = self._clock()
+        self._pending_keys.pop((row["device_token"], row["collapse_key"]), None)
+
+    async def complete(self, ids: List[Any]) -> None:
+        for message_id in ids:
+            self._close(message_id, "sent")
+
+    async def retry(self, messages: List[OutboxMessage], error: str) -> None:
+        now = self._clock()
+        for message in messages:
+            row = self._messages[message.id]
+            row["attempts"] = message.attempts + 1
+            row["next_attempt_at"] = now + retry_delay(row["attempts"])
+            row["claimed_at"] = row["claimed_by"] = None
+            row["last_error"] = error
+            row["updated_at"] = now
+            if row["attempts"] >= PUSH_OUTBOX_MAX_ATTEMPTS:
+                self._close(message.id, "failed")
+
+    async def prune(self, days: int = 7) -> None:
+        cutoff = self._clock() - days * 86400
+        for message_id in [
+            i for i, row in self._messages.items()
+            if row["status"] != "pending" and row["updated_at"] < cutoff
+        ]:
+            del self._messages[message_id]
+
+    def rows(self, status: Optional[str] = None) -> List[dict]:
+        """Messages (optionally with the given status), for assertions in tests"""
+        return [
+            {"id": message_id, **row} for message_id, row in self._messages.items()
+            if status is None or row["status"] == status
+        ]
+
+# (device token, payload) pairs -> "sent" | "invalid" | "failed" per pair
+Sender = Callable[[List[Tuple[str, Dict[str, Any]]], Optional[AsyncClient]], Awaitable[List[str]]]
+
+class PushOutboxConsumer:
+    """
+    Delivers queued pushes: claims batches, sends them concurrently over APNs, completes
+    delivered (and bad-token) messages and reschedules failures with backoff.
+    """
+
+    def __init__(
+        self,
+        outbox: PushOutbox,
+        sender: Optional[Sender] = None,
+        worker_id: Optional[str] = None,
+        batch_size: int = PUSH_OUTBOX_BATCH_SIZE,
+        poll_seconds: float = PUSH_OUTBOX_POLL_SECONDS
+    ):
+        if sender is None:
+            from services.notification_service import notification_service
+            sender = notification_service.deliver_apns_batch
+        if worker_id is None:
+            from tasks.job_coordination import default_worker_id
+            worker_id = default_worker_id()
+        self.outbox = outbox
+        self.sender = sender
+        self.worker_id = worker_id
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+
+    async def drain_once(self, supabase_client: Optional[AsyncClient] = None) -> int:
+        """
+        Deliver one batch.
+
+        Returns:
+            Number of messages claimed (0 when nothing is due)
+        """
+        messages = await self.outbox.claim(self.worker_id, self.batch_size)
+        if not messages:
+            return 0
+
+        try:
+            outcomes = await self.sender([(m.device_token, m.payload) for m in messages], supabase_client)
+        except Exception as e:
+            # Errors the sender doesn't map to an outcome fail the whole batch; without
+            # this the claimed messages would never be retried
+            await self.outbox.retry(messages, str(e))
+            logger.warning(f"📮 Push outbox: sending {len(messages)} pushes failed ({e}), rescheduled with backoff")
+            return len(messages)
+
+        # Bad tokens are deactivated by the sender; retrying them can't succeed
+        done = [m.id for m, outcome in zip(messages, outcomes) if outcome in ("sent", "invalid")]
+        failed = [m for m, outcome in zip(messages, outcomes) if outcome == "failed"]
+        await self.outbox.complete(done)
+        if failed:
+            await self.outbox.retry(failed, "APNs delivery failed")
+            logger.warning(f"📮 Push outbox: {len(failed)}/{len(messages)} deliveries failed, rescheduled with backoff")
+        return len(messages)
+
+    async def run(self) -> None:
+        """Deliver until cancelled, polling when the outbox is empty"""
+        logger.info(f"📮 Push outbox consumer started ({PUSH_OUTBOX}, worker {self.worker_id})")
+        while True:
+            try:
+                supabase_client = None
+                if isinstance(self.outbox, SupabasePushOutbox):
+                    supabase_client = await self.outbox._client_factory()
+                claimed = await self.drain_once(supabase_client)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Push outbox consumer error: {e}")
+                claimed = 0
+            if claimed < self.batch_size:
+                await asyncio.sleep(self.poll_seconds)
+
+def create_push_outbox() -> Optional[PushOutbox]:
+    """The outbox selected by PUSH_OUTBOX, or None to send inline"""
+    if PUSH_OUTBOX == "supabase":
+        return SupabasePushOutbox()
+    if PUSH_OUTBOX == "memory":
+        return InMemoryPushOutbox()
+    if PUSH_OUTBOX != "none":
+        logger.warning(f"Unknown PUSH_OUTBOX '{PUSH_OUTBOX}', sending pushes inline")
+    return None
+
+# Global outbox instance (None when pushes are sent inline)
+push_outbox = create_push_outbox()
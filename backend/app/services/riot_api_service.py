@@ -1,5 +1,6 @@
 import os
-import httpx
+from utils.http_clients import get_http_client
+from utils.ttl_cache import TTLCache
 from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Optional, Tuple
 from uuid import UUID
@@ -7,6 +8,66 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Match IDs of an account are re-listed at most this often; between refreshes every day and
+# habit checked for the account reuses the same list
+RIOT_MATCH_IDS_REFRESH_SECONDS = int(os.getenv("RIOT_MATCH_IDS_REFRESH_SECONDS", "60"))
+# Match details downloaded per call when walking back through uncached matches
+RIOT_MATCH_DETAIL_FETCH_LIMIT = int(os.getenv("RIOT_MATCH_DETAIL_FETCH_LIMIT", "20"))
+MATCH_ID_PAGE_SIZE = 20
+MAX_TRACKED_MATCH_IDS = 100  # Riot's max page; also how far back a cursor reaches
+
+# Finished matches never change, so their metadata is cached for as long as it's useful.
+# Only the fields habit tracking reads are kept (a full match-v5 payload is tens of KB).
+_match_metadata_cache = TTLCache("riot_match_metadata", max_entries=10000, ttl=7 * 24 * 3600)
+# Per-account cursors (newest-first match IDs seen so far) and their freshness gate
+_match_cursors = TTLCache("riot_match_cursors", max_entries=5000, ttl=7 * 24 * 3600)
+_fresh_match_ids = TTLCache("riot_match_ids", max_entries=5000, ttl=RIOT_MATCH_IDS_REFRESH_SECONDS)
+
+class MatchCursor:
+    """Newest-first match IDs seen for one account; the first one is the cursor position"""
+    
+    def __init__(self):
+        self.match_ids: List[str] = []
+    
+    @property
+    def last_seen_id(self) -> Optional[str]:
+        return self.match_ids[0] if self.match_ids else None
+    
+    def advance(self, new_ids: List[str], contiguous: bool) -> None:
+        """
+        Record match IDs newer than the cursor.
+        
+        Args:
+            new_ids: The new IDs, newest first
+            contiguous: Whether new_ids end right before last_seen_id; if not there may be a
+                gap, so older IDs are dropped
+        """
+        known = self.match_ids if contiguous else []
+        self.match_ids = (new_ids + known)[:MAX_TRACKED_MATCH_IDS]
+
+def _slim_lol_match(match_data: Dict) -> Dict:
+    """The parts of a match-v5 payload that habit tracking reads, in the same shape"""
+    info = match_data.get("info", {})
+    return {
+        "metadata": {"matchId": match_data.get("metadata", {}).get("matchId")},
+        "info": {
+            key: info.get(key)
+            for key in ("gameCreation", "gameStartTimestamp", "gameDuration", "queueId")
+            if key in info
+        }
+    }
+
+def _slim_valorant_match(match_data: Dict) -> Dict:
+    """The parts of a Valorant match payload that habit tracking reads, in the same shape"""
+    match_info = match_data.get("matchInfo", {})
+    return {
+        "matchInfo": {
+            key: match_info.get(key)
+            for key in ("matchId", "gameStartMillis", "gameLengthMillis", "mode")
+            if key in match_info
+        }
+    }
+
 class RiotAPIService:
     def __init__(self):
         self.api_key = os.getenv("RIOT_API_KEY")
@@ -45,25 +106,125 @@ class RiotAPIService:
         try:
             url = f"{self.region_urls[region]}/riot/account/v1/accounts/by-riot-id/{riot_id}/{tagline}"
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, headers=self.headers)
+            client = get_http_client(url)
+            response = await client.get(url, headers=self.headers)
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    return data.get("puuid")
-                elif response.status_code == 404:
-                    logger.warning(f"Riot account not found: {riot_id}#{tagline}")
-                    return None
-                else:
-                    logger.error(f"Error fetching PUUID: {response.status_code} - {response.text}")
-                    return None
+            if response.status_code == 200:
+                data = response.json()
+                return data.get("puuid")
+            elif response.status_code == 404:
+                logger.warning(f"Riot account not found: {riot_id}#{tagline}")
+                return None
+            else:
+                logger.error(f"Error fetching PUUID: {response.status_code} - {response.text}")
+                return None
                     
         except Exception as e:
             logger.error(f"Exception fetching PUUID: {str(e)}")
             return None
     
+    async def _fetch_lol_match_id_page(self, puuid: str, region: str, start: int, count: int) -> Optional[List[str]]:
+        """One page of an account's LoL match IDs (newest first), or None on error."""
+        match_ids_url = f"{self.region_urls[region]}/lol/match/v5/matches/by-puuid/{puuid}/ids"
+        
+        # No date filter due to Riot API issues - paging from the newest match instead
+        params = {
+            "start": start,
+            "count": count
+        }
+        
+        client = get_http_client(match_ids_url)
+        response = await client.get(match_ids_url, headers=self.headers, params=params)
+            
+        logger.info(f"Riot API response status: {response.status_code}")
+            
+        # Handle specific error codes
+        if response.status_code == 401:
+            logger.error("401 Unauthorized - Invalid API key")
+            return None
+        elif response.status_code == 403:
+            logger.error("403 Forbidden - API key may not have access to this endpoint")
+            return None
+        elif response.status_code == 429:
+            retry_after = response.headers.get('Retry-After', 'Unknown')
+            logger.error(f"429 Rate Limited - Retry after {retry_after} seconds")
+            return None
+        elif response.status_code == 404:
+            logger.error("404 Not Found - PUUID may be invalid")
+            return None
+        elif response.status_code != 200:
+            logger.error(f"Error fetching LoL match IDs: {response.status_code} - {response.text}")
+            return None
+        
+        return response.json()
+    
+    async def _refresh_lol_match_ids(self, puuid: str, region: str) -> Optional[List[str]]:
+        """
+        Advance the account's match cursor: page back from the newest match until the last
+        seen one, so usually only a single small page is fetched.
+        """
+        cursor = _match_cursors.get((region, puuid)) or MatchCursor()
+        last_seen_id = cursor.last_seen_id
+        # Without a cursor, fetch the full 100 at once (the old behaviour)
+        page_size = MATCH_ID_PAGE_SIZE if last_seen_id else MAX_TRACKED_MATCH_IDS
+        
+        new_ids: List[str] = []
+        contiguous = False
+        while len(new_ids) < MAX_TRACKED_MATCH_IDS:
+            page = await self._fetch_lol_match_id_page(puuid, region, len(new_ids), page_size)
+            if page is None:
+                return None
+            
+            if last_seen_id in page:
+                new_ids += page[:page.index(last_seen_id)]
+                contiguous = True
+                break
+            
+            new_ids += page
+            if len(page) < page_size:
+                # Reached the start of the account's history
+                contiguous = True
+                break
+        
+        cursor.advance(new_ids, contiguous)
+        _match_cursors.set((region, puuid), cursor)
+        logger.info(f"Riot API returned {len(new_ids)} new match IDs, tracking {len(cursor.match_ids)}")
+        return cursor.match_ids
+    
+    async def get_lol_match_ids(self, puuid: str, region: str) -> Optional[List[str]]:
+        """
+        Recent LoL match IDs of an account (newest first, up to 100), or None on error.
+        
+        Listed from Riot at most every RIOT_MATCH_IDS_REFRESH_SECONDS; concurrent callers
+        share one refresh.
+        """
+        return await _fresh_match_ids.get_or_load(
+            ("lol", region, puuid), lambda: self._refresh_lol_match_ids(puuid, region)
+        )
+    
+    async def _fetch_lol_match(self, match_id: str, region: str) -> Optional[Dict]:
+        match_url = f"{self.region_urls[region]}/lol/match/v5/matches/{match_id}"
+        client = get_http_client(match_url)
+        match_response = await client.get(match_url, headers=self.headers)
+        
+        if match_response.status_code != 200:
+            logger.warning(f"Failed to fetch match {match_id}: {match_response.status_code}")
+            return None
+        return _slim_lol_match(match_response.json())
+    
+    async def get_lol_match(self, match_id: str, region: str) -> Optional[Dict]:
+        """A LoL match's metadata (see _slim_lol_match), cached indefinitely, or None on error."""
+        return await _match_metadata_cache.get_or_load(
+            ("lol", match_id), lambda: self._fetch_lol_match(match_id, region)
+        )
+    
     async def get_lol_matches_for_date(self, puuid: str, region: str, target_date: datetime) -> List[Dict]:
-        """Get all League of Legends matches that started on the target date."""
+        """
+        Get all League of Legends matches that started on the target date.
+        
+        Matches are returned as metadata only: metadata.matchId and info.gameCreation,
+        gameStartTimestamp, gameDuration and queueId.
+        """
         matches = []
         
         try:
@@ -98,7 +259,6 @@ class RiotAPIService:
             start_time = int(start_of_day.timestamp() * 1000)
             end_time = int(end_of_day.timestamp() * 1000)
             
-            logger.info(f"Date range: {start_of_day} to {end_of_day}")
             logger.info(f"Timestamp range: {start_time} to {end_time}")
             
             # Ensure we have a valid region key
@@ -106,95 +266,68 @@ class RiotAPIService:
                 logger.error(f"Invalid region: {region}. Valid regions: {list(self.region_urls.keys())}")
                 return matches
             
-            # Get match IDs - fetch without date filter due to Riot API issues
-            match_ids_url = f"{self.region_urls[region]}/lol/match/v5/matches/by-puuid/{puuid}/ids"
-            
-            # Fetch last 100 matches without date filter (Riot API date filtering seems broken)
-            params = {
-                "count": 100  # Max allowed
-            }
-            
-            logger.info(f"Fetching LoL matches from URL: {match_ids_url}")
-            logger.info(f"Target date range: {start_of_day} to {end_of_day}")
-            logger.info(f"Fetching last 100 matches and filtering locally due to Riot API date parameter issues")
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.get(match_ids_url, headers=self.headers, params=params)
-                
-                logger.info(f"Riot API response status: {response.status_code}")
-                
-                # Handle specific error codes
-                if response.status_code == 401:
-                    logger.error("401 Unauthorized - Invalid API key")
-                    return matches
-                elif response.status_code == 403:
-                    logger.error("403 Forbidden - API key may not have access to this endpoint")
-                    return matches
-                elif response.status_code == 429:
-                    retry_after = response.headers.get('Retry-After', 'Unknown')
-                    logger.error(f"429 Rate Limited - Retry after {retry_after} seconds")
-                    return matches
-                elif response.status_code == 404:
-                    logger.error("404 Not Found - PUUID may be invalid")
-                    return matches
-                elif response.status_code != 200:
-                    logger.error(f"Error fetching LoL match IDs: {response.status_code} - {response.text}")
-                    return matches
-                
-                all_match_ids = response.json()
-                logger.info(f"Riot API returned {len(all_match_ids)} total match IDs")
+            # Recent match IDs from the account's cursor (only new matches are listed)
+            all_match_ids = await self.get_lol_match_ids(puuid, region)
+            if not all_match_ids:
+                return matches
                 
-                # Now we need to filter matches by date locally
-                match_ids_in_range = []
+            # Now we need to filter matches by date locally, newest first
+            checked = 0
+            downloaded = 0
+            for match_id in all_match_ids:
+                match_data = _match_metadata_cache.get(("lol", match_id))
+                if match_data is None:
+                    if downloaded >= RIOT_MATCH_DETAIL_FETCH_LIMIT:
+                        logger.info(f"Downloaded {downloaded} match details, stopping search")
+                        break
+                    downloaded += 1
+                    match_data = await self.get_lol_match(match_id, region)
+                    if match_data is None:
+                        continue
+                checked += 1
                 
-                # Check each match to see if it falls within our date range
-                for match_id in all_match_ids[:20]:  # Check first 20 matches to avoid too many API calls
-                    match_url = f"{self.region_urls[region]}/lol/match/v5/matches/{match_id}"
-                    match_response = await client.get(match_url, headers=self.headers)
+                game_creation = (match_data["info"].get("gameCreation") or 0) / 1000
+                game_start = (match_data["info"].get("gameStartTimestamp") or 0) / 1000
                     
-                    if match_response.status_code == 200:
-                        match_data = match_response.json()
-                        game_creation = match_data.get("info", {}).get("gameCreation", 0) / 1000
-                        game_start = match_data.get("info", {}).get("gameStartTimestamp", 0) / 1000
-                        
-                        # Use game start time if available, otherwise use creation time
-                        game_time = game_start if game_start > 0 else game_creation
-                        
-                        # Check if this match falls within our date range
-                        if start_time / 1000 <= game_time <= end_time / 1000:
-                            match_ids_in_range.append(match_id)
-                            logger.info(f"Match {match_id} is within date range: {datetime.fromtimestamp(game_time, tz=timezone.utc)}")
-                        else:
-                            logger.debug(f"Match {match_id} is outside date range: {datetime.fromtimestamp(game_time, tz=timezone.utc)}")
-                        
-                        # If we've gone past our date range, we can stop checking
-                        if game_time < start_time / 1000:
-                            logger.info("Reached matches before our date range, stopping search")
-                            break
-                
-                logger.info(f"Found {len(match_ids_in_range)} matches within date range out of {len(all_match_ids[:20])} checked")
-                
-                # Now fetch full details for matches in our date range
-                for match_id in match_ids_in_range:
-                    match_url = f"{self.region_urls[region]}/lol/match/v5/matches/{match_id}"
-                    match_response = await client.get(match_url, headers=self.headers)
+                # Use game start time if available, otherwise use creation time
+                game_time = game_start if game_start > 0 else game_creation
                     
-                    if match_response.status_code == 200:
-                        match_data = match_response.json()
-                        matches.append(match_data)
-                    else:
-                        logger.warning(f"Failed to fetch match {match_id}: {match_response.status_code}")
+                # Check if this match falls within our date range
+                if start_time / 1000 <= game_time <= end_time / 1000:
+                    matches.append(match_data)
+                    logger.info(f"Match {match_id} is within date range: {datetime.fromtimestamp(game_time, tz=timezone.utc)}")
+                else:
+                    logger.debug(f"Match {match_id} is outside date range: {datetime.fromtimestamp(game_time, tz=timezone.utc)}")
+                    
+                # If we've gone past our date range, we can stop checking
+                if game_time < start_time / 1000:
+                    logger.info("Reached matches before our date range, stopping search")
+                    break
                 
-                logger.info(f"Found {len(matches)} LoL matches for {target_date.date()}")
+            logger.info(f"Found {len(matches)} LoL matches for {target_date.date()} "
+                        f"({checked} checked, {downloaded} downloaded)")
                 
         except Exception as e:
             logger.error(f"Exception fetching LoL matches: {str(e)}")
             
         return matches
     
+    async def _fetch_valorant_match(self, match_id: str, platform: str) -> Optional[Dict]:
+        match_url = f"https://{platform}.api.riotgames.com/val/match/v1/matches/{match_id}"
+        client = get_http_client(match_url)
+        match_response = await client.get(match_url, headers=self.headers)
+        
+        if match_response.status_code != 200:
+            logger.warning(f"Failed to fetch Valorant match {match_id}: {match_response.status_code}")
+            return None
+        return _slim_valorant_match(match_response.json())
+    
     async def get_valorant_matches_for_date(self, puuid: str, region: str, target_date: datetime) -> List[Dict]:
         """Get all Valorant matches that started on the target date.
         
+        Matches are returned as metadata only: matchInfo.matchId, gameStartMillis,
+        gameLengthMillis and mode.
+        
         NOTE: Valorant API requires a Production API key from Riot.
         Development keys only work for League of Legends.
         """
@@ -214,37 +347,34 @@ class RiotAPIService:
             # Get match history
             match_history_url = f"https://{platform}.api.riotgames.com/val/match/v1/matchlists/by-puuid/{puuid}"
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(match_history_url, headers=self.headers)
+            client = get_http_client(match_history_url)
+            response = await client.get(match_history_url, headers=self.headers)
                 
-                if response.status_code != 200:
-                    logger.error(f"Error fetching Valorant match history: {response.status_code} - {response.text}")
-                    return matches
+            if response.status_code != 200:
+                logger.error(f"Error fetching Valorant match history: {response.status_code} - {response.text}")
+                return matches
                 
-                match_list = response.json()
+            match_list = response.json()
                 
-                # Filter matches by date and fetch details
-                start_of_day = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_of_day = start_of_day + timedelta(days=1)
+            # Filter matches by date and fetch details
+            start_of_day = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
+            end_of_day = start_of_day + timedelta(days=1)
                 
-                for match_entry in match_list.get("history", []):
-                    match_id = match_entry.get("matchId")
-                    match_start = match_entry.get("gameStartMillis", 0) / 1000
-                    match_datetime = datetime.fromtimestamp(match_start, tz=timezone.utc)
+            for match_entry in match_list.get("history", []):
+                match_id = match_entry.get("matchId")
+                match_start = match_entry.get("gameStartMillis", 0) / 1000
+                match_datetime = datetime.fromtimestamp(match_start, tz=timezone.utc)
                     
-                    # Check if match started on target date
-                    if start_of_day <= match_datetime < end_of_day:
-                        # Fetch full match details
-                        match_url = f"https://{platform}.api.riotgames.com/val/match/v1/matches/{match_id}"
-                        match_response = await client.get(match_url, headers=self.headers)
-                        
-                        if match_response.status_code == 200:
-                            match_data = match_response.json()
-                            matches.append(match_data)
-                        else:
-                            logger.warning(f"Failed to fetch Valorant match {match_id}: {match_response.status_code}")
+                # Check if match started on target date
+                if start_of_day <= match_datetime < end_of_day:
+                    # Match details (cached indefinitely - finished matches never change)
+                    match_data = await _match_metadata_cache.get_or_load(
+                        ("valorant", match_id), lambda: self._fetch_valorant_match(match_id, platform)
+                    )
+                    if match_data is not None:
+                        matches.append(match_data)
                 
-                logger.info(f"Found {len(matches)} Valorant matches for {target_date.date()}")
+            logger.info(f"Found {len(matches)} Valorant matches for {target_date.date()}")
                 
         except Exception as e:
             logger.error(f"Exception fetching Valorant matches: {str(e)}")
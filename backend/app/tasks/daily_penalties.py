@@ -1,197 +1,224 @@
 from datetime import datetime, timedelta, date, time
 import pytz
 import logging
-from config.database import get_supabase_client, get_async_supabase_client
-from supabase import Client
-from .scheduler_utils import get_user_timezone, decrement_habit_streak_local, check_and_create_penalty_for_habit
+from typing import Callable, Optional
+from config.database import get_async_supabase_client
+from supabase._async.client import AsyncClient
+from .scheduler_utils import get_timezones_at_local_hour, falls_back_to_utc
+from .penalty_engine import run_daily_penalty_engine, resolve_due_days
+from .job_coordination import Shard
+from .penalty_ledger import penalty_ledger, hour_run_key, shard_key
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-async def check_and_charge_penalties():
+# Local hour at which yesterday is considered over and evaluated
+PENALTY_CHECK_LOCAL_HOUR = 1
+
+# Job name of the daily check in the penalty job ledger
+DAILY_PENALTY_JOB = "check_and_charge_penalties"
+
+# Rows per page; PostgREST truncates unpaged selects at its max-rows limit (1000 on Supabase)
+PENALTY_QUERY_PAGE_SIZE = 1000
+
+def _daily_habits_query(supabase: AsyncClient):
+    """Active daily habits (excluding gaming) joined with the owner's timezone"""
+    return supabase.table("habits") \
+        .select("*, users!habits_user_id_fkey!inner(timezone)") \
+        .eq("habit_schedule_type", "daily") \
+        .eq("is_active", True) \
+        .not_.in_("habit_type", ["league_of_legends", "valorant"])
+
+async def _fetch_all_pages(build_query: Callable, page_size: int = PENALTY_QUERY_PAGE_SIZE) -> list:
+    """
+    Every row of a query, fetched page by page with .range().
+
+    Args:
+        build_query: Zero-argument function returning the query, ordered by a unique column
+            (a fresh builder per page)
+    """
+    rows = []
+    offset = 0
+    while True:
+        result = await build_query().range(offset, offset + page_size - 1).execute()
+        page = result.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        offset += page_size
+
+async def _fetch_daily_habits_for_utc_fallback_users(supabase: AsyncClient, batch_size: int = 200) -> list:
+    """
+    Daily habits of users whose timezone is NULL or unrecognised (evaluated as UTC).
+    Runs only in the hour when UTC is due; pages through the narrow users.timezone column once.
+    """
+    users = await _fetch_all_pages(lambda: supabase.table("users").select("id, timezone").order("id"))
+    user_ids = [u["id"] for u in users if falls_back_to_utc(u.get("timezone"))]
+    
+    habits = []
+    for i in range(0, len(user_ids), batch_size):
+        batch = user_ids[i:i + batch_size]
+        habits.extend(await _fetch_all_pages(
+            lambda: _daily_habits_query(supabase).in_("user_id", batch).order("id")
+        ))
+    
+    if user_ids:
+        logger.info(f"🌍 {len(user_ids)} users with NULL/unknown timezone evaluated as UTC ({len(habits)} habits)")
+    return habits
+
+async def check_and_charge_penalties(shard: Optional[Shard] = None, utc_now: Optional[datetime] = None):
     """
     Check for missed habits from yesterday and create penalties
     Then attempt to charge penalties for habits with auto-pay enabled
     Includes first-day grace period - no charging on the first day after habit creation
     Runs hourly but only processes users at 1 AM in their timezone (when day has truly ended)
+    
+    Each hour is recorded in the penalty job ledger: a completed hour is never evaluated
+    again, and a failed one resumes after the last step it finished.
+    
+    Args:
+        shard: Only process users in this shard (set when workers split the job)
+        utc_now: Hour to evaluate (defaults to now; set when replaying a missed hour)
     """
-    supabase = get_supabase_client()
-    async_supabase = await get_async_supabase_client()
-    utc_now = datetime.now(pytz.UTC)
+    supabase = await get_async_supabase_client()
+    utc_now = utc_now or datetime.now(pytz.UTC)
     logger.info(f"\n{'='*50}")
     logger.info(f"🔄 Starting penalty check at {utc_now} UTC")
     logger.info(f"{'='*50}")
     
+    run = await penalty_ledger.begin(DAILY_PENALTY_JOB, hour_run_key(utc_now), shard_key(shard))
+    if run is None:
+        logger.info(f"⏭️ Penalty check for {hour_run_key(utc_now)} already completed - skipping")
+        return
+    
     try:
         # Process habits that were deleted/edited today and charge penalties if missed
         try:
             logger.info("📋 Checking for deleted/edited habits...")
             from .habit_management import check_deleted_edited_habits_penalties
-            await check_deleted_edited_habits_penalties(supabase)
+            await check_deleted_edited_habits_penalties(supabase, shard, utc_now, run)
         except Exception as e:
             logger.error(f"❌ Error checking deleted/edited habits penalties: {e}")
         
-        # Get all DAILY habits with their created_at timestamps and user timezones (excluding gaming habits)
-        logger.info("\n📥 Fetching active daily habits...")
-        habits_result = supabase.table("habits") \
-            .select("*, users!habits_user_id_fkey!inner(timezone)") \
-            .eq("habit_schedule_type", "daily") \
-            .eq("is_active", True) \
-            .not_.in_("habit_type", ["league_of_legends", "valorant"]) \
-            .execute()
-        habits = habits_result.data
-        logger.info(f"📋 Found {len(habits)} active daily habits (excluding gaming)")
+        # Penalties are evaluated at 1 AM local time, so only users in zones at that hour are due
+        due_timezones = get_timezones_at_local_hour(PENALTY_CHECK_LOCAL_HOUR, utc_now)
+        logger.info(f"\n🌍 {len(due_timezones)} timezone names at {PENALTY_CHECK_LOCAL_HOUR}:00 local time")
+        
+        # Get DAILY habits (excluding gaming) of users due now, with their timezones
+        logger.info("\n📥 Fetching active daily habits for due timezones...")
+        habits = await _fetch_all_pages(
+            lambda: _daily_habits_query(supabase).in_("users.timezone", due_timezones).order("id")
+        )
+        
+        # NULL/unrecognised timezones are treated as UTC; they can't be matched by name
+        if "UTC" in due_timezones:
+            habits.extend(await _fetch_daily_habits_for_utc_fallback_users(supabase))
+        
+        if shard:
+            habits = shard.filter(habits)
+        
+        logger.info(f"📋 Found {len(habits)} active daily habits due for evaluation (excluding gaming)")
 
         if not habits:
-            logger.warning("⚠️ No active daily habits found - exiting early")
+            logger.info("📭 No users at the penalty check hour - exiting early")
+            await run.complete({"users": 0, "penalties_created": 0})
             return
 
-        # Group habits by user to avoid duplicate timezone processing
-        users_processed = set()
-        users_at_check_time = 0
-        penalties_created = 0
-
-        # Group habits by user for better logging
-        habits_by_user = {}
-        for habit in habits:
-            user_id = habit['user_id']
-            if user_id not in habits_by_user:
-                habits_by_user[user_id] = []
-            habits_by_user[user_id].append(habit)
+        # Set-based evaluation of the whole bucket: bulk verifications query, in-memory
+        # weekday/grace checks and one apply_daily_penalties round-trip
+        engine_error = None
+        if run.is_done("engine"):
+            logger.info("⏭️ Daily habit penalties already applied by an earlier attempt")
+            due_days = resolve_due_days(habits, utc_now, PENALTY_CHECK_LOCAL_HOUR)
+            created_penalties = []
+        else:
+            try:
+                due_days, created_penalties = await run_daily_penalty_engine(
+                    supabase, habits, utc_now, PENALTY_CHECK_LOCAL_HOUR
+                )
+                await run.mark_done("engine", penalties_created=len(created_penalties))
+            except Exception as e:
+                # Don't let a failed batch skip the integration habit checks below;
+                # the run is marked failed so a resume retries just the engine
+                logger.error(f"❌ Error applying daily habit penalties: {e}")
+                engine_error = e
+                due_days = resolve_due_days(habits, utc_now, PENALTY_CHECK_LOCAL_HOUR)
+                created_penalties = []
+        users_with_habits = len({habit["user_id"] for habit in habits})
+        users_at_check_time = len(due_days)
+        penalties_created = len(created_penalties)
+        for penalty in created_penalties:
+            logger.info(f"   💸 Penalty created: habit {penalty['habit_id']} on {penalty['penalty_date']} (${penalty['amount']})")
         
-        logger.info(f"\n👥 Processing {len(habits_by_user)} users with daily habits...")
+        logger.info(f"\n👥 Checking integration habits for {users_at_check_time} users at the check hour...")
 
-        for user_id, user_habits in habits_by_user.items():
-            # Skip if we already processed this user in this run
-            if user_id in users_processed:
-                logger.info(f"⏭️ User {user_id}: Already processed in this run")
-                continue
-            users_processed.add(user_id)
-            
-            # Get user's timezone and current time - USE SAME METHOD AS ENDPOINTS
-            user_timezone = get_user_timezone(supabase, user_id)
-            user_tz = pytz.timezone(user_timezone)
-            user_now = datetime.now(user_tz)  # Changed from utc_now.astimezone(user_tz)
-            
-            logger.info(f"\n👤 User {user_id}:")
-            logger.info(f"   🌍 Timezone: {user_timezone}")
-            logger.info(f"   🕒 Local time: {user_now.strftime('%Y-%m-%d %H:%M %Z')}")
-            logger.info(f"   📝 Active habits: {len(user_habits)}")
-            
-            # Only process penalties if it's 1 AM in the user's timezone
-            if user_now.hour != 1:  # 1 AM
-                logger.info(f"   ⏭️ Wrong hour: {user_now.hour}:00 (waiting for 01:00)")
+        users_skipped = 0
+        users_unverified = 0
+        for user_id, due_day in due_days.items():
+            if run.is_done("integrations", user_id):
+                users_skipped += 1
                 continue
             
-            users_at_check_time += 1
-            logger.info(f"   ✅ Processing at correct hour (01:00)")
-            
-            # Get yesterday in user's timezone - USE SAME METHOD AS ENDPOINTS
-            yesterday_user = (user_now.date() - timedelta(days=1))  # Changed from user_now.date() - timedelta(days=1)
-            logger.info(f"   📅 Checking for: {yesterday_user} (yesterday in user's timezone)")
-            
-            # Pre-fetch all verifications for all user habits in a single query to avoid N+1
-            start_of_yesterday = user_tz.localize(datetime.combine(yesterday_user, datetime.min.time()))
-            end_of_yesterday = user_tz.localize(datetime.combine(yesterday_user, datetime.max.time()))
-            
-            habit_ids = [habit["id"] for habit in user_habits]
-            verifications_result = supabase.table("habit_verifications") \
-                .select("*") \
-                .in_("habit_id", habit_ids) \
-                .gte("verified_at", start_of_yesterday.isoformat()) \
-                .lte("verified_at", end_of_yesterday.isoformat()) \
-                .execute()
-            
-            # Group verifications by habit_id for quick lookup
-            verifications_by_habit = {}
-            if verifications_result.data:
-                for verification in verifications_result.data:
-                    habit_id = verification["habit_id"]
-                    if habit_id not in verifications_by_habit:
-                        verifications_by_habit[habit_id] = []
-                    verifications_by_habit[habit_id].append(verification)
-            
-            for habit in user_habits:
-                logger.info(f"\n      🔍 Habit {habit['id']}:")
-                
-                # First-day grace period - no charging on the first day after habit creation
-                habit_created_at = datetime.fromisoformat(habit['created_at'].replace('Z', '+00:00'))
-                habit_creation_date = habit_created_at.date()
-                if habit_creation_date >= yesterday_user:
-                    logger.info(f"      ⏭️ First day grace period (created {habit_creation_date})")
-                    continue
-                
-                # Check if yesterday was a required day
-                postgres_weekday = (yesterday_user.weekday() + 1) % 7  # Convert to Postgres weekday format
-                weekday_name = yesterday_user.strftime('%A')
-                
-                logger.info(f"      📅 Yesterday ({weekday_name}) weekday value: {postgres_weekday}")
-                logger.info(f"      📅 Required days: {habit['weekdays']}")
-                
-                if postgres_weekday not in habit["weekdays"]:
-                    logger.info(f"      ⏭️ Not required on {weekday_name}")
-                    continue
-
-                # Check for verifications using pre-fetched data
-                logger.info(f"      🔍 Checking verifications between:")
-                logger.info(f"         {start_of_yesterday.isoformat()}")
-                logger.info(f"         {end_of_yesterday.isoformat()}")
-                
-                # Get verifications from pre-fetched map
-                habit_verifications = verifications_by_habit.get(habit["id"], [])
-
-                if not habit_verifications:
-                    logger.info(f"      ❌ No verifications found")
-                    
-                    # Create penalty using the function that updates analytics
-                    try:
-                        await check_and_create_penalty_for_habit(
-                            supabase=async_supabase,
-                            habit_id=habit["id"],
-                            user_id=habit["user_id"],
-                            habit_data=habit,
-                            penalty_date=yesterday_user,
-                            reason=f"Missed {habit.get('name', 'habit')} on {yesterday_user}"
-                        )
-                        penalties_created += 1
-                        logger.info(f"      💸 Created penalty with analytics update: ${habit['penalty_amount']}")
-                    except Exception as e:
-                        logger.error(f"      ❌ Error creating penalty: {e}")
-                else:
-                    logger.info(f"      ✅ Found {len(habit_verifications)} verifications")
+            user_timezone = due_day.timezone
+            yesterday_user = due_day.day
+            user_penalties = 0
             
             # After processing regular habits, check gaming habits for this user
             logger.info(f"\n   🎮 Checking gaming habits for user {user_id}...")
             from .gaming_habits import check_gaming_habits_for_penalties
-            gaming_penalties = await check_gaming_habits_for_penalties(supabase, async_supabase, user_id, yesterday_user)
-            penalties_created += gaming_penalties
+            gaming_penalties = await check_gaming_habits_for_penalties(supabase, user_id, yesterday_user)
+            user_penalties += gaming_penalties
             if gaming_penalties > 0:
                 logger.info(f"   🎮 Created {gaming_penalties} gaming penalties")
 
             # After processing gaming habits, check GitHub commit habits for this user
             logger.info(f"\n   📝 Checking GitHub commit habits for user {user_id}...")
             from .github_habits import check_github_habits_for_penalties
-            github_penalties = await check_github_habits_for_penalties(supabase, async_supabase, user_id, yesterday_user, user_timezone)
-            penalties_created += github_penalties
+            github_penalties = await check_github_habits_for_penalties(supabase, user_id, yesterday_user, user_timezone)
+            user_penalties += github_penalties
             if github_penalties > 0:
                 logger.info(f"   📝 Created {github_penalties} GitHub commit penalties")
             
             # Check LeetCode habits for this user
             logger.info(f"\n   🧩 Checking LeetCode habits for user {user_id}...")
-            from .leetcode_habits import check_leetcode_habits_for_penalties
-            leetcode_penalties = await check_leetcode_habits_for_penalties(supabase, async_supabase, user_id, yesterday_user)
-            penalties_created += leetcode_penalties
-            if leetcode_penalties > 0:
+            from .leetcode_habits import check_leetcode_habits_for_penalties, LeetCodeCountUnavailable
+            try:
+                leetcode_penalties = await check_leetcode_habits_for_penalties(supabase, user_id, yesterday_user)
+            except LeetCodeCountUnavailable as e:
+                # Not charged on a stale count: the user stays open and a resume retries them
+                logger.warning(f"   ⏳ {e}")
+                leetcode_penalties = None
+            if leetcode_penalties:
+                user_penalties += leetcode_penalties
                 logger.info(f"   🧩 Created {leetcode_penalties} LeetCode penalties")
+            
+            penalties_created += user_penalties
+            if leetcode_penalties is None:
+                users_unverified += 1
+            else:
+                await run.mark_done("integrations", user_id, penalties_created=user_penalties)
 
         logger.info(f"\n{'='*50}")
         logger.info(f"📊 Penalty Check Summary:")
-        logger.info(f"   • Total users with habits: {len(habits_by_user)}")
+        logger.info(f"   • Total users with habits: {users_with_habits}")
         logger.info(f"   • Users at check time (1 AM): {users_at_check_time}")
+        if users_skipped:
+            logger.info(f"   • Users already checked by an earlier attempt: {users_skipped}")
+        if users_unverified:
+            logger.info(f"   • Users whose LeetCode day can't be verified yet: {users_unverified}")
         logger.info(f"   • Penalties created: {penalties_created}")
         logger.info(f"{'='*50}\n")
 
+        stats = {"users": users_at_check_time, "penalties_created": penalties_created}
+        if engine_error:
+            await run.fail(f"apply_daily_penalties: {engine_error}", stats)
+        elif users_unverified:
+            await run.fail(f"{users_unverified} users' LeetCode day couldn't be verified yet", stats)
+        else:
+            await run.complete(stats)
+
     except Exception as e:
         logger.error(f"❌ Error in check_and_charge_penalties: {str(e)}")
         logger.error(f"{'='*50}")
-        raise 
\ No newline at end of file
+        await run.fail(str(e))
+        raise 
@@ -1,25 +1,24 @@
 from datetime import datetime, timedelta, date, time
 import pytz
 import logging
-from supabase import Client
 from supabase._async.client import AsyncClient
 from services.gaming_habit_service import GamingHabitService
 from utils.weekly_habits import get_week_dates
-from .scheduler_utils import get_user_timezone, decrement_habit_streak_local, check_and_create_penalty_for_habit
+from .scheduler_utils import get_user_timezone_async, decrement_habit_streak_local, check_and_create_penalty_for_habit
 from utils.recipient_analytics import update_analytics_on_habit_verified
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-async def check_gaming_habits_for_penalties(supabase: Client, async_supabase: AsyncClient, user_id: str, yesterday_user: date):
+async def check_gaming_habits_for_penalties(supabase: AsyncClient, user_id: str, yesterday_user: date):
     """
     Check gaming habits for a user and create penalties if they exceeded their limits.
     """
     try:
-        gaming_service = GamingHabitService()
+        gaming_service = GamingHabitService(supabase)
         
         # Get user's gaming habits
-        gaming_habits_result = supabase.table("habits") \
+        gaming_habits_result = await supabase.table("habits") \
             .select("*") \
             .eq("user_id", user_id) \
             .eq("habit_schedule_type", "daily") \
@@ -33,7 +32,7 @@ async def check_gaming_habits_for_penalties(supabase: Client, async_supabase: As
         penalties_created = 0
         
         # Get user's timezone - USE SAME METHOD AS ENDPOINTS
-        user_timezone = get_user_timezone(supabase, user_id)
+        user_timezone = await get_user_timezone_async(supabase, user_id)
         user_tz = pytz.timezone(user_timezone)
         
         for habit in gaming_habits_result.data:
@@ -75,7 +74,7 @@ async def check_gaming_habits_for_penalties(supabase: Client, async_supabase: As
                     # Create penalty using the function that updates analytics
                     habit['penalty_amount'] = verification_result.penalty_amount  # Ensure penalty amount is set
                     await check_and_create_penalty_for_habit(
-                        supabase=async_supabase,
+                        supabase=supabase,
                         habit_id=habit_id,
                         user_id=user_id,
                         habit_data=habit,
@@ -108,7 +107,7 @@ async def check_gaming_habits_for_penalties(supabase: Client, async_supabase: As
                     if recipient_id:
                         try:
                             await update_analytics_on_habit_verified(
-                                supabase=async_supabase,
+                                supabase=supabase,
                                 habit_id=habit_id,
                                 recipient_id=recipient_id,
                                 verification_date=yesterday_user
@@ -127,15 +126,15 @@ async def check_gaming_habits_for_penalties(supabase: Client, async_supabase: As
         logger.error(f"❌ Error checking gaming habits for user {user_id}: {e}")
         return 0
 
-async def check_weekly_gaming_habits_for_penalties(supabase: Client, async_supabase: AsyncClient, user_id: str, completed_week_start: date, completed_week_end: date):
+async def check_weekly_gaming_habits_for_penalties(supabase: AsyncClient, user_id: str, completed_week_start: date, completed_week_end: date):
     """
     Check weekly gaming habits for a user and create penalties if they exceeded their weekly limits.
     """
     try:
-        gaming_service = GamingHabitService()
+        gaming_service = GamingHabitService(supabase)
         
         # Get user's weekly gaming habits
-        gaming_habits_result = supabase.table("habits") \
+        gaming_habits_result = await supabase.table("habits") \
             .select("*") \
             .eq("user_id", user_id) \
             .eq("habit_schedule_type", "weekly") \
@@ -184,7 +183,7 @@ async def check_weekly_gaming_habits_for_penalties(supabase: Client, async_supab
                     # Create penalty using the function that updates analytics
                     habit['penalty_amount'] = summary['penalty_amount']  # Ensure penalty amount is set
                     await check_and_create_penalty_for_habit(
-                        supabase=async_supabase,
+                        supabase=supabase,
                         habit_id=habit_id,
                         user_id=user_id,
                         habit_data=habit,
@@ -223,7 +222,7 @@ async def check_weekly_gaming_habits_for_penalties(supabase: Client, async_supab
                             days_in_week = 7  # Weekly habits track full weeks
                             
                             await update_analytics_on_weekly_penalty_created(
-                                supabase=async_supabase,
+                                supabase=supabase,
                                 habit_id=habit_id,
                                 recipient_id=recipient_id,
                                 penalty_amount=0,  # No penalty for success
@@ -1,22 +1,23 @@
 from datetime import datetime, timedelta, date, time
 import pytz
 import logging
-from supabase import Client
 from supabase._async.client import AsyncClient
+from typing import Optional
 from utils.weekly_habits import get_week_dates
-from .scheduler_utils import get_user_timezone, decrement_habit_streak_local, check_and_create_penalty_for_habit
+from .job_coordination import Shard
+from .scheduler_utils import decrement_habit_streak_local, check_and_create_penalty_for_habit, penalty_exists, get_user_tokens
 from utils.recipient_analytics import update_analytics_on_habit_verified
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-async def check_github_habits_for_penalties(supabase: Client, async_supabase: AsyncClient, user_id: str, yesterday_user: date, user_timezone: str):
+async def check_github_habits_for_penalties(supabase: AsyncClient, user_id: str, yesterday_user: date, user_timezone: str):
     """
     Check GitHub commit habits for a user and create penalties if they didn't meet their commit targets.
     """
     try:
         # Get user's GitHub commit habits
-        github_habits_result = supabase.table("habits") \
+        github_habits_result = await supabase.table("habits") \
             .select("*") \
             .eq("user_id", user_id) \
             .eq("habit_schedule_type", "daily") \
@@ -28,19 +29,24 @@ async def check_github_habits_for_penalties(supabase: Client, async_supabase: As
             return 0  # No GitHub commit habits
         
         # Get user's GitHub token
-        token_result = supabase.table("user_tokens") \
-            .select("github_access_token") \
-            .eq("user_id", user_id) \
-            .single() \
-            .execute()
+        tokens = await get_user_tokens(supabase, user_id, "github_access_token")
         
-        if not token_result.data or not token_result.data.get("github_access_token"):
+        if not tokens or not tokens.get("github_access_token"):
             logger.warning(f"      ⚠️ User {user_id} has GitHub habits but no access token")
             return 0
         
-        access_token = token_result.data["github_access_token"]
+        access_token = tokens["github_access_token"]
         penalties_created = 0
         
+        # Yesterday's (UTC) commits for all of the user's habits, counted once over the exact UTC day
+        from utils.github_commits import get_commit_count
+        yesterday_utc = datetime.now(pytz.UTC).date() - timedelta(days=1)
+        yesterday_commits = await get_commit_count(
+            access_token,
+            datetime.combine(yesterday_utc, time.min),
+            datetime.combine(yesterday_utc, time.max)
+        )
+        
         for habit in github_habits_result.data:
             try:
                 habit_id = habit['id']
@@ -50,12 +56,8 @@ async def check_github_habits_for_penalties(supabase: Client, async_supabase: As
                 # Use the EXACT same logic as test_github_commits.py UTC version (which works correctly)
                 # Force UTC timezone since that's what works correctly
                 
-                # Get UTC timezone (like timezone_str='UTC' in test script)
-                utc_tz = pytz.timezone('UTC')
-                
-                # Get yesterday's date in UTC timezone (like the test script)
-                utc_now = datetime.now(utc_tz)
-                yesterday_date = utc_now.date() - timedelta(days=1)
+                # Yesterday's date in UTC timezone (like the test script), the day counted above
+                yesterday_date = yesterday_utc
                 
                 # First-day grace period (using UTC date)
                 if habit_creation_date >= yesterday_date:
@@ -68,17 +70,8 @@ async def check_github_habits_for_penalties(supabase: Client, async_supabase: As
                     logger.info(f"      ⏭️ GitHub habit {habit_id}: Not required on {yesterday_date.strftime('%A')} (UTC)")
                     continue
                 
-                # Create timezone-aware datetime objects for start and end of yesterday (EXACT test script logic)
-                start_local = utc_tz.localize(datetime.combine(yesterday_date, time.min))
-                end_local = utc_tz.localize(datetime.combine(yesterday_date, time.max))
-                
-                # Convert to UTC for GitHub API (GitHub expects UTC timestamps)
-                start_utc = start_local.astimezone(pytz.UTC).replace(tzinfo=None)
-                end_utc = end_local.astimezone(pytz.UTC).replace(tzinfo=None)
-                
-                # Get commit count for yesterday
-                from utils.github_commits import get_commit_count
-                commit_count = await get_commit_count(access_token, start_utc, end_utc) or 0
+                # Get commit count for yesterday (None means the fetch failed: count 0)
+                commit_count = yesterday_commits if yesterday_commits is not None else 0
                 commit_target = habit.get('commit_target', 1)
                 
                 logger.info(f"      📝 GitHub habit {habit_id}: {commit_count} commits on {yesterday_date} (UTC) (target: {commit_target})")
@@ -87,7 +80,7 @@ async def check_github_habits_for_penalties(supabase: Client, async_supabase: As
                 if commit_count < commit_target:
                     # Create penalty using the function that updates analytics
                     await check_and_create_penalty_for_habit(
-                        supabase=async_supabase,
+                        supabase=supabase,
                         habit_id=habit_id,
                         user_id=user_id,
                         habit_data=habit,
@@ -104,7 +97,7 @@ async def check_github_habits_for_penalties(supabase: Client, async_supabase: As
                     if recipient_id:
                         try:
                             await update_analytics_on_habit_verified(
-                                supabase=async_supabase,
+                                supabase=supabase,
                                 habit_id=habit_id,
                                 recipient_id=recipient_id,
                                 verification_date=yesterday_date
@@ -123,7 +116,7 @@ async def check_github_habits_for_penalties(supabase: Client, async_supabase: As
         logger.error(f"❌ Error checking GitHub habits for user {user_id}: {e}")
         return 0
 
-async def check_weekly_github_habits_for_penalties(supabase: Client, async_supabase: AsyncClient, user_id: str, completed_week_start: date, completed_week_end: date):
+async def check_weekly_github_habits_for_penalties(supabase: AsyncClient, user_id: str, completed_week_start: date, completed_week_end: date):
     """
     Check weekly GitHub habits for a user and create penalties if they didn't meet their weekly commit goals.
     Calls GitHub API directly at penalty time to get accurate commit counts.
@@ -137,7 +130,7 @@ async def check_weekly_github_habits_for_penalties(supabase: Client, async_supab
         penalties_created = 0
         
         # Get user's weekly GitHub commit habits
-        github_habits_result = supabase.table("habits") \
+        github_habits_result = await supabase.table("habits") \
             .select("*") \
             .eq("user_id", user_id) \
             .eq("habit_schedule_type", "weekly") \
@@ -149,13 +142,9 @@ async def check_weekly_github_habits_for_penalties(supabase: Client, async_supab
             return 0
         
         # Get user's GitHub access token once for all habits
-        token_result = supabase.table("user_tokens") \
-            .select("github_access_token") \
-            .eq("user_id", user_id) \
-            .single() \
-            .execute()
+        tokens = await get_user_tokens(supabase, user_id, "github_access_token")
         
-        if not token_result.data or not token_result.data.get("github_access_token"):
+        if not tokens or not tokens.get("github_access_token"):
             logger.warning(f"User {user_id} has GitHub habits but no access token")
             # Create penalties for all habits since we can't verify
             for habit in github_habits_result.data:
@@ -175,17 +164,10 @@ async def check_weekly_github_habits_for_penalties(supabase: Client, async_supab
                     reason = f"Weekly GitHub habit: missed commit {i+1}/{weekly_commit_goal} for week {completed_week_start} (no GitHub token)"
                     
                     # Check if penalty already exists
-                    existing_penalty = supabase.table("penalties") \
-                        .select("*") \
-                        .eq("habit_id", habit_id) \
-                        .eq("penalty_date", completed_week_end.isoformat()) \
-                        .eq("reason", reason) \
-                        .execute()
-                    
-                    if not existing_penalty.data:
+                    if not await penalty_exists(supabase, habit_id, completed_week_end, reason):
                         # Create penalty using the function that updates analytics
                         await check_and_create_penalty_for_habit(
-                            supabase=async_supabase,
+                            supabase=supabase,
                             habit_id=habit_id,
                             user_id=user_id,
                             habit_data=habit,
@@ -196,7 +178,15 @@ async def check_weekly_github_habits_for_penalties(supabase: Client, async_supab
                         logger.info(f"✅ Created penalty {i+1}/{weekly_commit_goal} for GitHub habit {habit_id} (no token) with analytics update: ${penalty_amount}")
             return penalties_created
         
-        access_token = token_result.data["github_access_token"]
+        access_token = tokens["github_access_token"]
+        
+        # The completed week's commits for all of the user's habits, counted once over its exact UTC range
+        from utils.github_commits import get_commit_count
+        week_commits = await get_commit_count(
+            access_token,
+            datetime.combine(completed_week_start, time.min),
+            datetime.combine(completed_week_end, time.max)
+        )
         
         for habit in github_habits_result.data:
             habit_id = habit["id"]
@@ -220,23 +210,8 @@ async def check_weekly_github_habits_for_penalties(supabase: Client, async_supab
             logger.info(f"Checking GitHub weekly habit {habit_id} for week {completed_week_start} to {completed_week_end}, goal: {weekly_commit_goal} commits")
             
             try:
-                # Call GitHub API directly for the completed week
-                # Follow the EXACT UTC pattern from test_github_commits.py
-                
-                # Use UTC timezone (like timezone_str='UTC' in test script)
-                utc_tz = pytz.timezone('UTC')
-                
-                # completed_week_start and completed_week_end are dates, treat them as UTC dates
-                # Create timezone-aware datetime objects (EXACT test script logic)
-                start_local = utc_tz.localize(datetime.combine(completed_week_start, time.min))
-                end_local = utc_tz.localize(datetime.combine(completed_week_end, time.max))
-                
-                # Convert to UTC for GitHub API (GitHub expects UTC timestamps)
-                start_utc = start_local.astimezone(pytz.UTC).replace(tzinfo=None)
-                end_utc = end_local.astimezone(pytz.UTC).replace(tzinfo=None)
-                
-                from utils.github_commits import get_commit_count
-                actual_commits = await get_commit_count(access_token, start_utc, end_utc)
+                # completed_week_start and completed_week_end are dates, treated as UTC dates
+                actual_commits = week_commits
                 
                 if actual_commits is None:
                     logger.error(f"GitHub habit {habit_id}: Failed to fetch commits from GitHub API")
@@ -257,7 +232,7 @@ async def check_weekly_github_habits_for_penalties(supabase: Client, async_supab
                             
                             # For weekly GitHub success, track based on commit target
                             await update_analytics_on_weekly_penalty_created(
-                                supabase=async_supabase,
+                                supabase=supabase,
                                 habit_id=habit_id,
                                 recipient_id=recipient_id,
                                 penalty_amount=0,  # No penalty for success
@@ -278,17 +253,10 @@ async def check_weekly_github_habits_for_penalties(supabase: Client, async_supab
                         reason = f"Weekly GitHub habit: missed commit {i+1}/{missed_commits} for week {completed_week_start} ({actual_commits}/{weekly_commit_goal} commits)"
                         
                         # Check if penalty already exists
-                        existing_penalty = supabase.table("penalties") \
-                            .select("*") \
-                            .eq("habit_id", habit_id) \
-                            .eq("penalty_date", completed_week_end.isoformat()) \
-                            .eq("reason", reason) \
-                            .execute()
-                        
-                        if not existing_penalty.data:
+                        if not await penalty_exists(supabase, habit_id, completed_week_end, reason):
                             # Create penalty using the function that updates analytics
                             await check_and_create_penalty_for_habit(
-                                supabase=async_supabase,
+                                supabase=supabase,
                                 habit_id=habit_id,
                                 user_id=user_id,
                                 habit_data=habit,
@@ -311,17 +279,10 @@ async def check_weekly_github_habits_for_penalties(supabase: Client, async_supab
                     reason = f"Weekly GitHub habit: missed commit {i+1}/{weekly_commit_goal} for week {completed_week_start} (error)"
                     
                     # Check if penalty already exists
-                    existing_penalty = supabase.table("penalties") \
-                        .select("*") \
-                        .eq("habit_id", habit_id) \
-                        .eq("penalty_date", completed_week_end.isoformat()) \
-                        .eq("reason", reason) \
-                        .execute()
-                    
-                    if not existing_penalty.data:
+                    if not await penalty_exists(supabase, habit_id, completed_week_end, reason):
                         # Create penalty using the function that updates analytics
                         await check_and_create_penalty_for_habit(
-                            supabase=async_supabase,
+                            supabase=supabase,
                             habit_id=habit_id,
                             user_id=user_id,
                             habit_data=habit,
@@ -337,8 +298,8 @@ async def check_weekly_github_habits_for_penalties(supabase: Client, async_supab
     
     return penalties_created
 
-async def update_github_weekly_progress_task():
-    """Update GitHub weekly progress for all users with active GitHub weekly habits"""
+async def update_github_weekly_progress_task(shard: Optional[Shard] = None):
+    """Update GitHub weekly progress for all users (of the shard, if given) with active GitHub weekly habits"""
     try:
         from config.database import get_async_supabase_client
         from utils.github_commits import update_all_github_weekly_progress
@@ -349,7 +310,7 @@ async def update_github_weekly_progress_task():
         logger.info("🔄 Starting GitHub weekly progress update")
         
         # Update all GitHub weekly habits progress
-        await update_all_github_weekly_progress(async_supabase)
+        await update_all_github_weekly_progress(async_supabase, shard=shard)
         
         logger.info("✅ GitHub weekly progress update completed")
         
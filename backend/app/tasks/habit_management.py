@@ -1,38 +1,56 @@
 from datetime import datetime, timedelta, date, time
 import pytz
 import logging
+from typing import Optional
 import json
-from supabase import Client
-from config.database import get_supabase_client, get_async_supabase_client
+from supabase._async.client import AsyncClient
 from utils.weekly_habits import get_week_dates
-from .scheduler_utils import get_user_timezone, check_and_create_penalty_for_habit
+from .scheduler_utils import get_user_timezones_async, check_and_create_penalty_for_habit
+from .job_coordination import Shard
+from .penalty_ledger import PenaltyRun
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-async def check_deleted_edited_habits_penalties(supabase: Client):
+async def check_deleted_edited_habits_penalties(
+    supabase: AsyncClient,
+    shard: Optional[Shard] = None,
+    utc_now: Optional[datetime] = None,
+    run: Optional[PenaltyRun] = None
+):
     """
     Check for habits that were deleted or edited today and charge penalties if they were missed.
     This runs at the end of the day to catch any habits that were removed from today's schedule.
     For weekly habits, this runs at the end of the week (Sunday).
     Only processes users at 1 AM in their timezone (when day has truly ended).
+    
+    Args:
+        supabase: Async Supabase client
+        shard: Only process users in this shard
+        utc_now: Hour being evaluated (defaults to now; set when replaying a missed hour)
+        run: Penalty job run used to skip users a previous attempt already processed
     """
     try:
-        async_supabase = await get_async_supabase_client()
-        utc_now = datetime.now(pytz.UTC)
+        utc_now = utc_now or datetime.now(pytz.UTC)
         # Get all staging records that haven't been applied yet
-        staging_result = supabase.table("habit_change_staging") \
+        staging_result = await supabase.table("habit_change_staging") \
             .select("*") \
             .eq("applied", False) \
             .execute()
         
-        if not staging_result.data:
+        staging_records = shard.filter(staging_result.data or []) if shard else staging_result.data
+        if not staging_records:
             return
         
+        # One query for every timezone instead of one per staged user
+        user_timezones = await get_user_timezones_async(
+            supabase, list({record['user_id'] for record in staging_records})
+        )
+        
         # Group by user to avoid duplicate processing
         users_processed = set()
         
-        for staging_record in staging_result.data:
+        for staging_record in staging_records:
             try:
                 user_id = staging_record['user_id']
                 change_type = staging_record['change_type']
@@ -42,7 +60,7 @@ async def check_deleted_edited_habits_penalties(supabase: Client):
                     continue
                 
                 # Get user timezone and current time
-                user_timezone = get_user_timezone(supabase, user_id)
+                user_timezone = user_timezones.get(user_id, "UTC")
                 user_tz = pytz.timezone(user_timezone)
                 user_now = utc_now.astimezone(user_tz)
                 today_user = user_now.date()
@@ -61,8 +79,12 @@ async def check_deleted_edited_habits_penalties(supabase: Client):
                 
                 users_processed.add(user_id)
                 
+                # Already charged by an earlier attempt of this run
+                if run and run.is_done("staged_changes", user_id):
+                    continue
+                
                 # Get all staging records for this user that are ready to be processed
-                user_staging_records = [r for r in staging_result.data 
+                user_staging_records = [r for r in staging_records 
                                       if r['user_id'] == user_id 
                                       and datetime.fromisoformat(r['effective_date']).date() <= today_user
                                       and not r['applied']]
@@ -86,7 +108,7 @@ async def check_deleted_edited_habits_penalties(supabase: Client):
                             # For deletions, check if yesterday was a required day
                             if postgres_weekday in old_habit_data.get('weekdays', []):
                                 await check_and_create_penalty_for_habit(
-                                    async_supabase, habit_id, user_id, old_habit_data, yesterday_user, 
+                                    supabase, habit_id, user_id, old_habit_data, yesterday_user, 
                                     f"Habit deleted on required day {yesterday_user}"
                                 )
                         elif record['change_type'] == 'update':
@@ -98,7 +120,7 @@ async def check_deleted_edited_habits_penalties(supabase: Client):
                             # If yesterday was in old schedule but not in new schedule
                             if postgres_weekday in old_weekdays and postgres_weekday not in new_weekdays:
                                 await check_and_create_penalty_for_habit(
-                                    async_supabase, habit_id, user_id, old_habit_data, yesterday_user,
+                                    supabase, habit_id, user_id, old_habit_data, yesterday_user,
                                     f"Habit schedule changed, removing {yesterday_user} requirement"
                                 )
                     
@@ -116,7 +138,7 @@ async def check_deleted_edited_habits_penalties(supabase: Client):
                             week_start, week_end = get_week_dates(yesterday_user, week_start_day)
                             
                             # Check weekly progress for the completed week
-                            progress_result = supabase.table("weekly_habit_progress") \
+                            progress_result = await supabase.table("weekly_habit_progress") \
                                 .select("*") \
                                 .eq("habit_id", habit_id) \
                                 .eq("week_start_date", week_start.isoformat()) \
@@ -143,7 +165,7 @@ async def check_deleted_edited_habits_penalties(supabase: Client):
                                             "reason": f"Weekly habit deleted with incomplete week: {current_completions}/{target_completions} completions"
                                         }
                                         
-                                        penalty_result = supabase.table("penalties").insert(penalty_data).execute()
+                                        penalty_result = await supabase.table("penalties").insert(penalty_data).execute()
                                         if penalty_result.data:
                                             logger.info(f"Created penalty for weekly habit {habit_id}: missed completion {i+1}/{missed_completions}")
                                 
@@ -160,10 +182,12 @@ async def check_deleted_edited_habits_penalties(supabase: Client):
                                         "reason": f"Weekly habit deleted with no completions: 0/{weekly_target} completions"
                                     }
                                     
-                                    penalty_result = supabase.table("penalties").insert(penalty_data).execute()
+                                    penalty_result = await supabase.table("penalties").insert(penalty_data).execute()
                                     if penalty_result.data:
                                         logger.info(f"Created penalty for weekly habit {habit_id}: no progress, missed completion {i+1}/{weekly_target}")
-                    
+                
+                if run:
+                    await run.mark_done("staged_changes", user_id)
                 
             except Exception as e:
                 logger.error(f"Error processing staging record {staging_record.get('id')}: {e}")
@@ -0,0 +1,367 @@
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
+from supabase._async.client import AsyncClient
+
+logger = logging.getLogger(__name__)
+
+# Coordination is opt-in: "none" keeps the single-worker behaviour (no lease table needed),
+# "supabase" coordinates worker dynos through backend/scheduler_leases.sql and "sqlite" is a
+# local stand-in for tests and for running several workers on one machine.
+SCHEDULER_COORDINATION = os.getenv("SCHEDULER_COORDINATION", "none").lower()
+
+# Must be identical on every worker - shards are only disjoint for the same count
+SCHEDULER_SHARD_COUNT = max(1, int(os.getenv("SCHEDULER_SHARD_COUNT", "1")))
+
+# A lease not renewed for this long is considered abandoned (crashed or partitioned worker)
+SCHEDULER_LEASE_TTL_SECONDS = int(os.getenv("SCHEDULER_LEASE_TTL_SECONDS", "120"))
+SCHEDULER_HEARTBEAT_SECONDS = int(os.getenv("SCHEDULER_HEARTBEAT_SECONDS", "30"))
+SCHEDULER_SQLITE_PATH = os.getenv("SCHEDULER_SQLITE_PATH", "scheduler_leases.db")
+
+def _stable_hash(value: str) -> int:
+    # Python's hash() is salted per process, so it can't be used to agree on shards
+    return int(hashlib.md5(value.encode()).hexdigest()[:8], 16)
+
+def shard_of(user_id: Any, shard_count: int) -> int:
+    """The shard (0 .. shard_count - 1) a user belongs to, identical on every worker"""
+    return _stable_hash(str(user_id)) % shard_count
+
+class Shard:
+    """One partition of the user set, handed to a sharded job"""
+
+    __slots__ = ("index", "count")
+
+    def __init__(self, index: int, count: int):
+        self.index = index
+        self.count = count
+
+    def owns(self, user_id: Any) -> bool:
+        return self.count == 1 or shard_of(user_id, self.count) == self.index
+
+    def filter(self, rows: Iterable[dict], key: str = "user_id") -> List[dict]:
+        """Rows whose `key` column belongs to this shard"""
+        return [row for row in rows if self.owns(row[key])]
+
+    def __repr__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+def default_worker_id() -> str:
+    """Unique per process: dyno name (or host), pid and a random suffix"""
+    worker = os.getenv("SCHEDULER_WORKER_ID")
+    if worker:
+        return worker
+    return f"{os.getenv('DYNO') or socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+class LeaseStore:
+    """
+    Storage for job leases. A lease named "<job>:<shard>/<count>" is held by one worker
+    at a time; completing it for a run key stops other workers from re-running that
+    shard for the same scheduled run.
+    """
+
+    async def acquire(self, name: str, owner: str, run_key: str, ttl: int) -> bool:
+        """Take the lease if it is free, expired or already ours and not completed for run_key"""
+        raise NotImplementedError
+
+    async def renew(self, name: str, owner: str, ttl: int) -> bool:
+        """Extend a held lease; False means it was lost to another worker"""
+        raise NotImplementedError
+
+    async def complete(self, name: str, owner: str, run_key: str) -> None:
+        """Mark the run done and free the lease"""
+        raise NotImplementedError
+
+    async def release(self, name: str, owner: str) -> None:
+        """Free the lease without marking the run done, so another worker may retry it"""
+        raise NotImplementedError
+
+class SupabaseLeaseStore(LeaseStore):
+    """
+    Leases in the scheduler_leases table, via the RPCs in backend/scheduler_leases.sql.
+
+    Each RPC is a single conditional statement evaluated with the database clock, so
+    workers never have to agree on time. (Session advisory locks don't fit here: every
+    PostgREST call may land on a different pooled connection.)
+    """
+
+    def __init__(self, client_factory: Callable[[], Awaitable[AsyncClient]]):
+        self._client_factory = client_factory
+
+    async def _rpc(self, function: str, params: dict) -> Any:
+        supabase = await self._client_factory()
+        result = await supabase.rpc(function, params).execute()
+        return result.data
+
+    async def acquire(self, name: str, owner: str, run_key: str, ttl: int) -> bool:
+        return bool(await self._rpc("acquire_scheduler_lease", {
+            "p_name": name, "p_owner": owner, "p_run_key": run_key, "p_ttl_seconds": ttl
+        }))
+
+    async def renew(self, name: str, owner: str, ttl: int) -> bool:
+        return bool(await self._rpc("renew_scheduler_lease", {
+            "p_name": name, "p_owner": owner, "p_ttl_seconds": ttl
+        }))
+
+    async def complete(self, name: str, owner: str, run_key: str) -> None:
+        await self._rpc("complete_scheduler_lease", {"p_name": name, "p_owner": owner, "p_run_key": run_key})
+
+    async def release(self, name: str, owner: str) -> None:
+        await self._rpc("release_scheduler_lease", {"p_name": name, "p_owner": owner})
+
+class SQLiteLeaseStore(LeaseStore):
+    """
+    Same lease semantics in a local SQLite file (or ":memory:" for a single process).
+
+    Used by tests and local multi-worker runs; processes sharing the file coordinate
+    through SQLite's own locking. Calls run in a thread so they don't block the loop.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS scheduler_leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            run_key TEXT,
+            completed_run TEXT,
+            expires_at REAL NOT NULL
+        )
+    """
+
+    def __init__(self, path: str = SCHEDULER_SQLITE_PATH, clock: Callable[[], float] = time.time):
+        self.path = path
+        self._clock = clock
+        # ":memory:" databases live and die with their connection, so keep one open
+        self._shared = sqlite3.connect(path, check_same_thread=False) if path == ":memory:" else None
+        self._lock = asyncio.Lock()
+        with self._connect() as conn:
+            conn.execute(self._SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._shared is not None:
+            return self._shared
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _execute(self, sql: str, params: tuple) -> int:
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute(sql, params).rowcount
+        finally:
+            if conn is not self._shared:
+                conn.close()
+
+    async def _run(self, sql: str, params: tuple) -> int:
+        async with self._lock:
+            return await asyncio.to_thread(self._execute, sql, params)
+
+    async def acquire(self, name: str, owner: str, run_key: str, ttl: int) -> bool:
+        now = self._clock()
+        changed = await self._run(
+            """
+            INSERT INTO scheduler_leases (name, owner, run_key, completed_run, expires_at)
+            VALUES (?, ?, ?, NULL, ?)
+            ON CONFLICT (name) DO UPDATE
+            SET owner = excluded.owner, run_key = excluded.run_key, expires_at = excluded.expires_at
+            WHERE (scheduler_leases.expires_at < ? OR scheduler_leases.owner = excluded.owner)
+              AND scheduler_leases.completed_run IS NOT excluded.run_key
+            """,
+            (name, owner, run_key, now + ttl, now)
+        )
+        return changed == 1
+
+    async def renew(self, name: str, owner: str, ttl: int) -> bool:
+        changed = await self._run(
+            "UPDATE scheduler_leases SET expires_at = ? WHERE name = ? AND owner = ?",
+            (self._clock() + ttl, name, owner)
+        )
+        return changed == 1
+
+    async def complete(self, name: str, owner: str, run_key: str) -> None:
+        await self._run(
+            "UPDATE scheduler_leases SET completed_run = ?, expires_at = 0 WHERE name = ? AND owner = ?",
+            (run_key, name, owner)
+        )
+
+    async def release(self, name: str, owner: str) -> None:
+        await self._run(
+            "UPDATE scheduler_leases SET expires_at = 0 WHERE name = ? AND owner = ?",
+            (name, owner)
+        )
+
+def run_key_for(now: datetime, period_seconds: int = 60) -> str:
+    """
+    Identify a scheduled run: the start of the `period_seconds` window containing `now`.
+
+    Every worker fires the same cron job within misfire_grace_time (30s) of the trigger,
+    so with the default one-minute window they all derive the same key.
+    """
+    epoch = int(now.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % period_seconds, tz=timezone.utc).isoformat()
+
+class JobCoordinator:
+    """
+    Runs scheduler jobs so that any number of workers can execute the same schedule.
+
+    Sharded jobs split their user set into `shard_count` partitions; on every run each
+    worker walks the shards (starting at a worker-specific offset, so workers spread
+    out) and executes those whose lease it can take. Unsharded jobs use a single lease,
+    i.e. leader election per run. While a shard runs, a heartbeat renews its lease; if
+    the lease is lost the shard is cancelled rather than run twice.
+
+    Example:
+        coordinator = create_job_coordinator()
+        scheduler.add_job(
+            coordinator.wrap("check_and_charge_penalties", check_and_charge_penalties, sharded=True),
+            CronTrigger(minute=0),
+            id="check_and_charge_penalties"
+        )
+    """
+
+    def __init__(
+        self,
+        store: Optional[LeaseStore],
+        worker_id: Optional[str] = None,
+        shard_count: int = SCHEDULER_SHARD_COUNT,
+        lease_ttl: int = SCHEDULER_LEASE_TTL_SECONDS,
+        heartbeat_interval: int = SCHEDULER_HEARTBEAT_SECONDS
+    ):
+        self.store = store  # None disables coordination
+        self.worker_id = worker_id or default_worker_id()
+        self.shard_count = shard_count
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = heartbeat_interval
+
+    @property
+    def enabled(self) -> bool:
+        return self.store is not None
+
+    def wrap(
+        self,
+        job_id: str,
+        func: Callable[..., Awaitable[Any]],
+        sharded: bool = False,
+        run_period_seconds: int = 60
+    ) -> Callable[[], Awaitable[None]]:
+        """
+        Wrap a job for scheduler.add_job.
+
+        Args:
+            job_id: Scheduler job id (also the lease name prefix)
+            func: The job; sharded jobs must accept a `shard` keyword argument
+            sharded: Partition the job's users across workers instead of electing one runner
+            run_period_seconds: Window that identifies one scheduled run (see run_key_for);
+                use the interval for interval-triggered jobs
+        """
+        if not self.enabled:
+            return func
+
+        @functools.wraps(func)
+        async def coordinated() -> None:
+            await self.run(job_id, func, sharded, run_key_for(datetime.now(timezone.utc), run_period_seconds))
+
+        return coordinated
+
+    def _shard_order(self, count: int) -> List[int]:
+        start = _stable_hash(self.worker_id) % count
+        return [(start + offset) % count for offset in range(count)]
+
+    async def run(self, job_id: str, func: Callable[..., Awaitable[Any]], sharded: bool, run_key: str) -> int:
+        """
+        Execute every shard of one run that this worker can claim.
+
+        Returns:
+            Number of shards this worker executed
+        """
+        count = self.shard_count if sharded else 1
+        executed = 0
+        for index in self._shard_order(count):
+            lease = f"{job_id}:{index}/{count}"
+            try:
+                acquired = await self.store.acquire(lease, self.worker_id, run_key, self.lease_ttl)
+            except Exception as e:
+                # Fail closed: running without the lease could charge users twice
+                logger.error(f"❌ Could not acquire lease {lease}, skipping (is scheduler_leases.sql applied?): {e}")
+                continue
+            if not acquired:
+                logger.debug(f"Lease {lease} held or completed by another worker for run {run_key}")
+                continue
+
+            shard = Shard(index, count)
+            logger.info(f"🔒 Worker {self.worker_id} running {job_id} shard {shard} for run {run_key}")
+            if await self._run_shard(lease, func(shard=shard) if sharded else func()):
+                executed += 1
+                await self._finish(self.store.complete(lease, self.worker_id, run_key), lease)
+            else:
+                await self._finish(self.store.release(lease, self.worker_id), lease)
+        return executed
+
+    async def _run_shard(self, lease: str, job: Awaitable[Any]) -> bool:
+        """Run a claimed shard under heartbeat; True if it finished without raising"""
+        job_task = asyncio.ensure_future(job)
+        heartbeat = asyncio.create_task(self._heartbeat(lease, job_task))
+        try:
+            await job_task
+            return True
+        except asyncio.CancelledError:
+            if heartbeat.done() and not heartbeat.cancelled() and heartbeat.result():
+                logger.error(f"❌ Lease {lease} was lost - shard cancelled to avoid running it twice")
+                return False
+            raise  # Worker shutdown - the lease expires on its own
+        except Exception as e:
+            logger.error(f"❌ Shard {lease} failed: {e}")
+            return False
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+    async def _heartbeat(self, lease: str, job_task: asyncio.Future) -> bool:
+        """Renew the lease until cancelled; returns True if it had to cancel the job"""
+        last_renewed = time.monotonic()
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                if await self.store.renew(lease, self.worker_id, self.lease_ttl):
+                    last_renewed = time.monotonic()
+                    continue
+                logger.error(f"❌ Lease {lease} was taken over by another worker")
+            except Exception as e:
+                if time.monotonic() - last_renewed < self.lease_ttl - self.heartbeat_interval:
+                    logger.warning(f"⚠️ Heartbeat for lease {lease} failed, retrying: {e}")
+                    continue
+                logger.error(f"❌ Heartbeat for lease {lease} failing until expiry: {e}")
+            job_task.cancel()
+            return True
+
+    async def _finish(self, operation: Awaitable[None], lease: str) -> None:
+        try:
+            await operation
+        except Exception as e:
+            # The lease still expires on its own after lease_ttl
+            logger.warning(f"⚠️ Could not update lease {lease}: {e}")
+
+def create_job_coordinator() -> JobCoordinator:
+    """Build the worker's coordinator from SCHEDULER_COORDINATION and related settings"""
+    if SCHEDULER_COORDINATION == "supabase":
+        from config.database import get_async_supabase_client
+        store = SupabaseLeaseStore(get_async_supabase_client)
+    elif SCHEDULER_COORDINATION == "sqlite":
+        store = SQLiteLeaseStore(SCHEDULER_SQLITE_PATH)
+    else:
+        if SCHEDULER_COORDINATION != "none":
+            logger.warning(f"Unknown SCHEDULER_COORDINATION '{SCHEDULER_COORDINATION}', running uncoordinated")
+        store = None
+
+    coordinator = JobCoordinator(store)
+    if coordinator.enabled:
+        logger.info(
+            f"Scheduler coordination: {SCHEDULER_COORDINATION}, worker {coordinator.worker_id}, "
+            f"{coordinator.shard_count} shards, lease ttl {coordinator.lease_ttl}s"
+        )
+    return coordinator
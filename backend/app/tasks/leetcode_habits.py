@@ -1,24 +1,28 @@
 from datetime import datetime, timedelta, date, time
 import pytz
 import logging
-from supabase import Client
 from supabase._async.client import AsyncClient
+from typing import Optional
 from utils.weekly_habits import get_week_dates
-from .scheduler_utils import decrement_habit_streak_local, check_and_create_penalty_for_habit
-from utils.timezone_utils import get_user_timezone
+from .job_coordination import Shard
+from .scheduler_utils import decrement_habit_streak_local, check_and_create_penalty_for_habit, penalty_exists, get_user_tokens
 from utils.recipient_analytics import update_analytics_on_habit_verified, update_analytics_on_weekly_penalty_created
-from utils.leetcode_habits import get_leetcode_problems_for_date, get_weekly_problems_solved
+from utils.leetcode_api import LeetCodeAPI
+from utils.leetcode_calendar import utc_day_end
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-async def check_leetcode_habits_for_penalties(supabase: Client, async_supabase: AsyncClient, user_id: str, yesterday_user: date):
+class LeetCodeCountUnavailable(Exception):
+    """The user's LeetCode calendar couldn't be refreshed after the checked day ended"""
+
+async def check_leetcode_habits_for_penalties(supabase: AsyncClient, user_id: str, yesterday_user: date):
     """
     Check LeetCode habits for a user and create penalties if they didn't meet their problem-solving targets.
     """
     try:
         # Get user's LeetCode habits
-        leetcode_habits_result = supabase.table("habits") \
+        leetcode_habits_result = await supabase.table("habits") \
             .select("*") \
             .eq("user_id", user_id) \
             .eq("habit_schedule_type", "daily") \
@@ -30,19 +34,23 @@ async def check_leetcode_habits_for_penalties(supabase: Client, async_supabase:
             return 0  # No LeetCode habits
         
         # Get user's LeetCode username
-        token_result = supabase.table("user_tokens") \
-            .select("leetcode_username") \
-            .eq("user_id", user_id) \
-            .single() \
-            .execute()
+        tokens = await get_user_tokens(supabase, user_id, "leetcode_username")
         
-        if not token_result.data or not token_result.data.get("leetcode_username"):
+        if not tokens or not tokens.get("leetcode_username"):
             logger.warning(f"      ⚠️ User {user_id} has LeetCode habits but no connected account")
             return 0
         
-        leetcode_username = token_result.data["leetcode_username"]
+        leetcode_username = tokens["leetcode_username"]
         penalties_created = 0
         
+        # Yesterday's count is the same for all of the user's habits: one calendar lookup,
+        # from a calendar refreshed after the (UTC) day ended so late solves are counted
+        problems_yesterday = await LeetCodeAPI.get_daily_problems_solved(
+            leetcode_username, yesterday_user, min_refreshed_at=utc_day_end(yesterday_user)
+        )
+        if problems_yesterday is None:
+            raise LeetCodeCountUnavailable(f"LeetCode count for {leetcode_username} on {yesterday_user} is unknown")
+        
         for habit in leetcode_habits_result.data:
             try:
                 habit_id = habit['id']
@@ -61,10 +69,7 @@ async def check_leetcode_habits_for_penalties(supabase: Client, async_supabase:
                     continue
                 
                 # Get problems solved yesterday
-                problems_solved = await get_leetcode_problems_for_date(async_supabase, user_id, yesterday_user)
-                if problems_solved is None:
-                    logger.error(f"      ❌ Failed to get LeetCode problems for habit {habit_id}")
-                    problems_solved = 0
+                problems_solved = problems_yesterday
                 
                 problems_target = habit['commit_target']  # LeetCode daily targets are stored in commit_target
                 
@@ -74,7 +79,7 @@ async def check_leetcode_habits_for_penalties(supabase: Client, async_supabase:
                 if problems_solved < problems_target:
                     # Create penalty using the function that updates analytics
                     await check_and_create_penalty_for_habit(
-                        supabase=async_supabase,
+                        supabase=supabase,
                         habit_id=habit_id,
                         user_id=user_id,
                         habit_data=habit,
@@ -91,7 +96,7 @@ async def check_leetcode_habits_for_penalties(supabase: Client, async_supabase:
                     if recipient_id:
                         try:
                             await update_analytics_on_habit_verified(
-                                supabase=async_supabase,
+                                supabase=supabase,
                                 habit_id=habit_id,
                                 recipient_id=recipient_id,
                                 verification_date=yesterday_user
@@ -106,11 +111,13 @@ async def check_leetcode_habits_for_penalties(supabase: Client, async_supabase:
         
         return penalties_created
         
+    except LeetCodeCountUnavailable:
+        raise
     except Exception as e:
         logger.error(f"❌ Error checking LeetCode habits for user {user_id}: {e}")
         return 0
 
-async def check_weekly_leetcode_habits_for_penalties(supabase: Client, async_supabase: AsyncClient, user_id: str, completed_week_start: date, completed_week_end: date):
+async def check_weekly_leetcode_habits_for_penalties(supabase: AsyncClient, user_id: str, completed_week_start: date, completed_week_end: date):
     """
     Check weekly LeetCode habits for a user and create penalties if they didn't meet their weekly problem-solving goals.
     For weekly LeetCode habits, commit_target contains the weekly problems goal.
@@ -123,7 +130,7 @@ async def check_weekly_leetcode_habits_for_penalties(supabase: Client, async_sup
         penalties_created = 0
         
         # Get user's weekly LeetCode habits
-        leetcode_habits_result = supabase.table("habits") \
+        leetcode_habits_result = await supabase.table("habits") \
             .select("*") \
             .eq("user_id", user_id) \
             .eq("habit_schedule_type", "weekly") \
@@ -135,13 +142,9 @@ async def check_weekly_leetcode_habits_for_penalties(supabase: Client, async_sup
             return 0
         
         # Get user's LeetCode username
-        token_result = supabase.table("user_tokens") \
-            .select("leetcode_username") \
-            .eq("user_id", user_id) \
-            .single() \
-            .execute()
+        tokens = await get_user_tokens(supabase, user_id, "leetcode_username")
         
-        if not token_result.data or not token_result.data.get("leetcode_username"):
+        if not tokens or not tokens.get("leetcode_username"):
             logger.warning(f"User {user_id} has LeetCode habits but no connected account")
             # Create penalties for all habits since we can't verify
             for habit in leetcode_habits_result.data:
@@ -159,17 +162,10 @@ async def check_weekly_leetcode_habits_for_penalties(supabase: Client, async_sup
                 reason = f"Weekly LeetCode habit: 0/{weekly_problems_goal} problems for week {completed_week_start} (no account connected)"
                 
                 # Check if penalty already exists
-                existing_penalty = supabase.table("penalties") \
-                    .select("*") \
-                    .eq("habit_id", habit_id) \
-                    .eq("penalty_date", completed_week_end.isoformat()) \
-                    .eq("reason", reason) \
-                    .execute()
-                
-                if not existing_penalty.data:
+                if not await penalty_exists(supabase, habit_id, completed_week_end, reason):
                     # Create penalty using the function that updates analytics
                     await check_and_create_penalty_for_habit(
-                        supabase=async_supabase,
+                        supabase=supabase,
                         habit_id=habit_id,
                         user_id=user_id,
                         habit_data=habit,
@@ -180,10 +176,16 @@ async def check_weekly_leetcode_habits_for_penalties(supabase: Client, async_sup
                     logger.info(f"✅ Created penalty for LeetCode habit {habit_id} (no account) with analytics update: ${penalty_amount}")
             return penalties_created
         
-        leetcode_username = token_result.data["leetcode_username"]
+        leetcode_username = tokens["leetcode_username"]
         
-        # Get user's timezone
-        user_tz_str = await get_user_timezone(async_supabase, user_id)
+        # The completed week's count for all of the user's habits, from a calendar refreshed
+        # after its last (UTC) day ended; an unknown count charges nothing and is retried
+        week_problems = await LeetCodeAPI.get_problems_solved_between(
+            leetcode_username, completed_week_start, completed_week_end,
+            min_refreshed_at=utc_day_end(completed_week_end)
+        )
+        if week_problems is None:
+            raise LeetCodeCountUnavailable(f"LeetCode count for {leetcode_username} in week {completed_week_start} is unknown")
         
         for habit in leetcode_habits_result.data:
             habit_id = habit["id"]
@@ -207,13 +209,8 @@ async def check_weekly_leetcode_habits_for_penalties(supabase: Client, async_sup
             logger.info(f"Checking LeetCode weekly habit {habit_id} for week {completed_week_start} to {completed_week_end}, goal: {weekly_problems_goal} problems")
             
             try:
-                # Get problems solved for the completed week
-                actual_problems = await get_weekly_problems_solved(
-                    leetcode_username, 
-                    completed_week_start, 
-                    completed_week_end, 
-                    user_tz_str
-                )
+                # Problems solved in the completed week
+                actual_problems = week_problems
                 
                 logger.info(f"LeetCode habit {habit_id}: {actual_problems}/{weekly_problems_goal} problems for week {completed_week_start}")
                 
@@ -225,7 +222,7 @@ async def check_weekly_leetcode_habits_for_penalties(supabase: Client, async_sup
                     if recipient_id:
                         try:
                             await update_analytics_on_weekly_penalty_created(
-                                supabase=async_supabase,
+                                supabase=supabase,
                                 habit_id=habit_id,
                                 recipient_id=recipient_id,
                                 penalty_amount=0,  # No penalty for success
@@ -244,17 +241,10 @@ async def check_weekly_leetcode_habits_for_penalties(supabase: Client, async_sup
                     reason = f"Weekly LeetCode habit: {actual_problems}/{weekly_problems_goal} problems for week {completed_week_start}"
                     
                     # Check if penalty already exists
-                    existing_penalty = supabase.table("penalties") \
-                        .select("*") \
-                        .eq("habit_id", habit_id) \
-                        .eq("penalty_date", completed_week_end.isoformat()) \
-                        .eq("reason", reason) \
-                        .execute()
-                    
-                    if not existing_penalty.data:
+                    if not await penalty_exists(supabase, habit_id, completed_week_end, reason):
                         # Create penalty using the function that updates analytics
                         await check_and_create_penalty_for_habit(
-                            supabase=async_supabase,
+                            supabase=supabase,
                             habit_id=habit_id,
                             user_id=user_id,
                             habit_data=habit,
@@ -272,17 +262,10 @@ async def check_weekly_leetcode_habits_for_penalties(supabase: Client, async_sup
                 reason = f"Weekly LeetCode habit: unable to verify for week {completed_week_start} (error)"
                 
                 # Check if penalty already exists
-                existing_penalty = supabase.table("penalties") \
-                    .select("*") \
-                    .eq("habit_id", habit_id) \
-                    .eq("penalty_date", completed_week_end.isoformat()) \
-                    .eq("reason", reason) \
-                    .execute()
-                
-                if not existing_penalty.data:
+                if not await penalty_exists(supabase, habit_id, completed_week_end, reason):
                     # Create penalty using the function that updates analytics
                     await check_and_create_penalty_for_habit(
-                        supabase=async_supabase,
+                        supabase=supabase,
                         habit_id=habit_id,
                         user_id=user_id,
                         habit_data=habit,
@@ -292,14 +275,16 @@ async def check_weekly_leetcode_habits_for_penalties(supabase: Client, async_sup
                     penalties_created += 1
                     logger.info(f"✅ Created penalty for LeetCode habit {habit_id} (error) with analytics update: ${penalty_amount}")
                         
+    except LeetCodeCountUnavailable:
+        raise
     except Exception as e:
         logger.error(f"❌ Error checking weekly LeetCode habits for penalties: {e}")
         return 0
     
     return penalties_created
 
-async def update_leetcode_weekly_progress_task():
-    """Update LeetCode weekly progress for all users with active LeetCode weekly habits"""
+async def update_leetcode_weekly_progress_task(shard: Optional[Shard] = None):
+    """Update LeetCode weekly progress for all users (of the shard, if given) with active LeetCode weekly habits"""
     try:
         from config.database import get_async_supabase_client
         from utils.leetcode_habits import update_all_leetcode_weekly_progress
@@ -310,7 +295,7 @@ async def update_leetcode_weekly_progress_task():
         logger.info("🔄 Starting LeetCode weekly progress update")
         
         # Update all LeetCode weekly habits progress
-        await update_all_leetcode_weekly_progress(async_supabase)
+        await update_all_leetcode_weekly_progress(async_supabase, shard=shard)
         
         logger.info("✅ LeetCode weekly progress update completed")
         
@@ -1,6 +1,7 @@
+import asyncio
 import logging
-from supabase import Client
-from config.database import get_supabase_client
+import ssl
+from config.database import get_async_supabase_client
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -12,24 +13,32 @@ async def archive_old_feed_cards_task():
     performs the delete in-database.  The heavy work (archiving via trigger +
     cascading deletes) happens inside Postgres so this task is lightweight.
     """
-    import ssl
-    import time
     max_retries = 3
     retry_delay = 2  # seconds
     
     for attempt in range(max_retries):
         try:
-            supabase: Client = get_supabase_client()
-            supabase.rpc("archive_old_feed_cards").execute()
+            supabase = await get_async_supabase_client()
+            await supabase.rpc("archive_old_feed_cards").execute()
             logger.info("✅ Archived & purged feed cards older than 24h")
             return  # Success, exit function
         except ssl.SSLError as e:
             if attempt < max_retries - 1:
                 logger.warning(f"SSL error in archive_old_feed_cards_task (attempt {attempt + 1}/{max_retries}): {e}. Retrying in {retry_delay}s...")
-                time.sleep(retry_delay)
+                await asyncio.sleep(retry_delay)  # Don't block other jobs while backing off
                 retry_delay *= 2  # Exponential backoff
             else:
                 logger.error(f"❌ archive_old_feed_cards_task failed after {max_retries} attempts: {e}")
         except Exception as e:
             logger.error(f"❌ archive_old_feed_cards_task: {e}")
-            break  # Don't retry for non-SSL errors 
\ No newline at end of file
+            break  # Don't retry for non-SSL errors 
+async def cleanup_push_outbox_task():
+    """Delete delivered and abandoned push outbox messages older than a week"""
+    from services.push_outbox import push_outbox
+    if push_outbox is None:
+        return
+    try:
+        await push_outbox.prune(days=7)
+        logger.info("✅ Pruned push outbox")
+    except Exception as e:
+        logger.error(f"❌ cleanup_push_outbox_task: {e}")
@@ -1,6 +1,8 @@
 from datetime import datetime, timedelta, date
+import asyncio
 import pytz
 import logging
+from typing import Optional
 import stripe
 import os
 from dotenv import load_dotenv
@@ -8,7 +10,9 @@ from supabase._async.client import AsyncClient
 from config.database import get_async_supabase_client
 from utils.memory_optimization import memory_optimized, cleanup_memory
 from utils.memory_monitoring import memory_profile
+from utils.stripe_gateway import stripe_gateway, idempotency_key
 from .scheduler_utils import get_user_timezone_async
+from .job_coordination import Shard
 
 # Load environment variables and set up Stripe
 # Get the correct path to .env file (in backend root, not app)
@@ -62,14 +66,21 @@ async def update_processing_payment_statuses():
         for i in range(0, len(payment_intent_ids), batch_size):
             batch_payment_intents = payment_intent_ids[i:i + batch_size]
             
-            for payment_intent_id in batch_payment_intents:
+            # Retrieve the batch's PaymentIntents from Stripe concurrently
+            stripe_start = datetime.now(pytz.UTC)
+            retrieved = await asyncio.gather(
+                *[stripe_gateway.call(stripe.PaymentIntent.retrieve, pi_id) for pi_id in batch_payment_intents],
+                return_exceptions=True
+            )
+            stripe_time = (datetime.now(pytz.UTC) - stripe_start).total_seconds()
+            logger.debug(f"Retrieved {len(batch_payment_intents)} payment intents in {stripe_time:.2f}s")
+            
+            for payment_intent_id, payment_intent in zip(batch_payment_intents, retrieved):
                 penalties = by_payment_intent[payment_intent_id]
                 
                 try:
-                    # Retrieve PaymentIntent from Stripe
-                    stripe_start = datetime.now(pytz.UTC)
-                    payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
-                    stripe_time = (datetime.now(pytz.UTC) - stripe_start).total_seconds()
+                    if isinstance(payment_intent, BaseException):
+                        raise payment_intent
                     
                     old_status = penalties[0].get("payment_status", "unknown")
                     payment_type = payment_intent.metadata.get("type", "unknown")
@@ -95,22 +106,22 @@ async def update_processing_payment_statuses():
                             logger.info(f"💰 Destination charge completed - recipients paid automatically")
                         
                     elif payment_intent.status == "canceled":
-                        # OPTIMIZATION: Batch update canceled penalties
+                        # OPTIMIZATION: Batch update canceled penalties (payment_intent_id is kept:
+                        # the retry's idempotency key is derived from it)
                         await supabase.table("penalties").update({
                             "is_paid": False,
-                            "payment_status": "canceled",
-                            "payment_intent_id": None  # Clear to allow retry
+                            "payment_status": "canceled"
                         }).in_("id", penalty_ids).execute()
                         
                         updated_count += len(penalties)
                         logger.warning(f"❌ {len(penalties)} penalties: {old_status} → canceled")
                     
                     elif payment_intent.status == "payment_failed":
-                        # OPTIMIZATION: Batch update failed penalties
+                        # OPTIMIZATION: Batch update failed penalties (payment_intent_id is kept:
+                        # the retry's idempotency key is derived from it)
                         await supabase.table("penalties").update({
                             "is_paid": False,
-                            "payment_status": "failed",
-                            "payment_intent_id": None  # Clear to allow retry
+                            "payment_status": "failed"
                         }).in_("id", penalty_ids).execute()
                         
                         updated_count += len(penalties)
@@ -181,49 +192,61 @@ async def process_recipient_transfers(supabase: AsyncClient, penalties: list):
         
         # OPTIMIZATION: Prepare batch updates for transfer IDs
         batch_penalty_updates = []
+        planned_transfers = []
         
         for recipient_id, recipient_penalties in recipient_groups.items():
+            # Get recipient data from pre-fetched map
+            recipient_data = recipients_map.get(recipient_id)
+            
+            if not recipient_data or not recipient_data.get("stripe_connect_account_id"):
+                logger.warning(f"⚠️ Recipient {recipient_id} missing Connect account, skipping transfer")
+                continue
+            
+            recipient_connect_account = recipient_data["stripe_connect_account_id"]
+            
+            # Calculate amounts dynamically from existing penalty amounts
+            recipient_penalty_amount = sum(float(p["amount"]) for p in recipient_penalties)
+            recipient_penalty_ids = [str(p["id"]) for p in recipient_penalties]
+            
+            # Platform fee rate (15% - can be made configurable later)
+            platform_fee_rate = 0.15  # 15% platform fee
+            platform_fee = recipient_penalty_amount * platform_fee_rate
+            transfer_amount = recipient_penalty_amount * (1 - platform_fee_rate)  # 85% to recipient
+            
+            # Skip if transfer amount is less than $5.00 minimum
+            if transfer_amount < 5.00:
+                logger.info(f"⏭️ Skipping recipient {recipient_data.get('name', 'Unknown')}: transfer amount ${transfer_amount:.2f} < $5.00 minimum")
+                continue
+            
+            logger.info(f"🎯 Creating transfer for {recipient_data.get('name', 'Unknown')}")
+            logger.info(f"   Transfer amount: ${transfer_amount:.2f}")
+            
+            planned_transfers.append((recipient_id, recipient_penalty_ids, platform_fee_rate, {
+                "amount": int(round(transfer_amount * 100)),  # Transfer amount after platform fee
+                "currency": "usd",
+                "destination": recipient_connect_account,
+                "metadata": {
+                    "recipient_id": recipient_id,
+                    "penalty_count": str(len(recipient_penalty_ids)),
+                    "original_amount": str(recipient_penalty_amount),
+                    "platform_fee": str(platform_fee),
+                    "platform_fee_rate": str(platform_fee_rate),
+                    "type": "recipient_penalty_payout"
+                },
+                # Same penalties -> same transfer, even if the transfer_id update below failed last run
+                "idempotency_key": idempotency_key("recipient_transfer", recipient_id, *sorted(recipient_penalty_ids))
+            }))
+        
+        # Create transfers to recipients concurrently (bounded by the Stripe pool)
+        transfer_results = await asyncio.gather(
+            *[stripe_gateway.call(stripe.Transfer.create, **params) for _, _, _, params in planned_transfers],
+            return_exceptions=True
+        )
+        
+        for (recipient_id, recipient_penalty_ids, platform_fee_rate, _), transfer in zip(planned_transfers, transfer_results):
             try:
-                # Get recipient data from pre-fetched map
-                recipient_data = recipients_map.get(recipient_id)
-                
-                if not recipient_data or not recipient_data.get("stripe_connect_account_id"):
-                    logger.warning(f"⚠️ Recipient {recipient_id} missing Connect account, skipping transfer")
-                    continue
-                
-                recipient_connect_account = recipient_data["stripe_connect_account_id"]
-                
-                # Calculate amounts dynamically from existing penalty amounts
-                recipient_penalty_amount = sum(float(p["amount"]) for p in recipient_penalties)
-                recipient_penalty_ids = [str(p["id"]) for p in recipient_penalties]
-                
-                # Platform fee rate (15% - can be made configurable later)
-                platform_fee_rate = 0.15  # 15% platform fee
-                platform_fee = recipient_penalty_amount * platform_fee_rate
-                transfer_amount = recipient_penalty_amount * (1 - platform_fee_rate)  # 85% to recipient
-                
-                # Skip if transfer amount is less than $5.00 minimum
-                if transfer_amount < 5.00:
-                    logger.info(f"⏭️ Skipping recipient {recipient_data.get('name', 'Unknown')}: transfer amount ${transfer_amount:.2f} < $5.00 minimum")
-                    continue
-                
-                logger.info(f"🎯 Creating transfer for {recipient_data.get('name', 'Unknown')}")
-                logger.info(f"   Transfer amount: ${transfer_amount:.2f}")
-                
-                # Create transfer to recipient
-                transfer = stripe.Transfer.create(
-                    amount=int(round(transfer_amount * 100)),  # Transfer amount after platform fee
-                    currency="usd",
-                    destination=recipient_connect_account,
-                    metadata={
-                        "recipient_id": recipient_id,
-                        "penalty_count": str(len(recipient_penalty_ids)),
-                        "original_amount": str(recipient_penalty_amount),
-                        "platform_fee": str(platform_fee),
-                        "platform_fee_rate": str(platform_fee_rate),
-                        "type": "recipient_penalty_payout"
-                    }
-                )
+                if isinstance(transfer, BaseException):
+                    raise transfer
                 
                 # OPTIMIZATION: Prepare batch update instead of individual updates
                 for penalty_id in recipient_penalty_ids:
@@ -312,10 +335,13 @@ async def process_all_eligible_transfers():
 
 @memory_optimized(cleanup_args=False)
 @memory_profile("check_and_charge_unpaid_penalties")
-async def check_and_charge_unpaid_penalties():
+async def check_and_charge_unpaid_penalties(shard: Optional[Shard] = None):
     """
     OPTIMIZED: Check for users with unpaid penalties >= $5 and charge them immediately.
     Uses batch operations and async client for better performance.
+    
+    Args:
+        shard: Only charge users in this shard (set when workers split the job)
     """
     supabase = await get_async_supabase_client()
     utc_now = datetime.now(pytz.UTC)
@@ -334,6 +360,8 @@ async def check_and_charge_unpaid_penalties():
         
         # Get unique user IDs
         user_ids = list(set([p["user_id"] for p in users_with_penalties.data]))
+        if shard:
+            user_ids = [user_id for user_id in user_ids if shard.owns(user_id)]
         logger.info(f"👥 Found {len(user_ids)} users with unpaid penalties")
         
         charged_users = 0
@@ -348,9 +376,13 @@ async def check_and_charge_unpaid_penalties():
                 try:
                     # OPTIMIZATION: Get unpaid penalties with selective columns
                     unpaid_penalties = await supabase.table("penalties").select(
-                        "id, amount, habit_id, recipient_id"
+                        "id, amount, habit_id, recipient_id, payment_intent_id, payment_status"
                     ).eq("user_id", user_id).eq("is_paid", False).execute()
                     
+                    # Charges still in flight are settled by update_processing_payment_statuses
+                    unpaid_penalties.data = [
+                        p for p in unpaid_penalties.data or [] if p.get("payment_status") != "processing"
+                    ]
                     if not unpaid_penalties.data:
                         continue
                     
@@ -379,20 +411,42 @@ async def check_and_charge_unpaid_penalties():
                     logger.info(f"💳 Creating charge for user {user_id}: ${total_amount:.2f} ({len(penalty_ids)} penalties)")
                     
                     # Create single charge to platform
-                    payment_intent = stripe.PaymentIntent.create(
-                        amount=int(total_amount * 100),  # Convert to cents
-                        currency="usd",
-                        customer=user.data["stripe_customer_id"],
-                        payment_method=user.data["default_payment_method_id"],
-                        off_session=True,
-                        confirm=True,
-                        metadata={
-                            "user_id": user_id,
-                            "type": "hourly_aggregate_with_separate_transfers",
-                            "penalty_count": str(len(penalty_ids)),
-                            "total_amount": str(total_amount)
-                        }
-                    )
+                    try:
+                        payment_intent = await stripe_gateway.call(
+                            stripe.PaymentIntent.create,
+                            amount=int(total_amount * 100),  # Convert to cents
+                            currency="usd",
+                            customer=user.data["stripe_customer_id"],
+                            payment_method=user.data["default_payment_method_id"],
+                            off_session=True,
+                            confirm=True,
+                            metadata={
+                                "user_id": user_id,
+                                "type": "hourly_aggregate_with_separate_transfers",
+                                "penalty_count": str(len(penalty_ids)),
+                                "total_amount": str(total_amount)
+                            },
+                            # A crash between charging and marking penalties "processing" must not
+                            # charge the same penalties again on the next run, so the key repeats
+                            # until an attempt is recorded. Each penalty's last payment intent is
+                            # part of it: after a decline (recorded below, or marked "failed" by
+                            # update_processing_payment_statuses) the retry gets a new key instead
+                            # of Stripe's cached decline. Changing the card also yields a new key.
+                            idempotency_key=idempotency_key(
+                                "penalty_charge", user_id, user.data["default_payment_method_id"],
+                                *sorted(f"{p['id']}:{p.get('payment_intent_id')}" for p in unpaid_penalties.data)
+                            )
+                        )
+                    except stripe.error.CardError as e:
+                        # Record the declined intent so the next run retries under a new key
+                        declined_intent = getattr(e.error, "payment_intent", None) if e.error else None
+                        if declined_intent and declined_intent.get("id"):
+                            await supabase.table("penalties").update({
+                                "payment_intent_id": declined_intent["id"],
+                                "payment_status": "failed"
+                            }).in_("id", penalty_ids).execute()
+                        logger.warning(f"💳 Charge declined for user {user_id}: {e.user_message or e}")
+                        continue
                     
                     # OPTIMIZATION: Batch update penalties with payment intent ID
                     await supabase.table("penalties").update({
@@ -0,0 +1,253 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, date
+from typing import Dict, Iterable, List, Optional, Tuple
+import pytz
+from supabase._async.client import AsyncClient
+from utils.memory_optimization import memory_optimized, cleanup_memory
+from utils.memory_monitoring import memory_profile
+from .scheduler_utils import normalize_timezone
+
+logger = logging.getLogger(__name__)
+
+# habit_id IN (...) lists are chunked to keep PostgREST URLs short
+ID_CHUNK_SIZE = 200
+
+def weekday_mask(weekdays: Optional[Iterable[int]]) -> int:
+    """Bitmask of required Postgres weekdays (0 = Sunday ... 6 = Saturday)"""
+    mask = 0
+    for weekday in weekdays or []:
+        mask |= 1 << int(weekday)
+    return mask
+
+def postgres_weekday(day: date) -> int:
+    """Python weekday (0 = Monday) -> Postgres weekday (0 = Sunday)"""
+    return (day.weekday() + 1) % 7
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+class DueDay:
+    """The local day being evaluated for one user, shared by all of their habits"""
+
+    __slots__ = ("timezone", "day", "weekday_bit", "start", "end")
+
+    def __init__(self, timezone: str, day: date):
+        tz = pytz.timezone(timezone)
+        self.timezone = timezone
+        self.day = day
+        self.weekday_bit = 1 << postgres_weekday(day)
+        self.start = tz.localize(datetime.combine(day, datetime.min.time()))
+        self.end = tz.localize(datetime.combine(day, datetime.max.time()))
+
+def resolve_due_days(habits: List[dict], utc_now: datetime, local_hour: int) -> Dict[str, DueDay]:
+    """
+    Map user_id -> the day to evaluate, for users whose local time is at local_hour.
+    The timezone comes from the habits' joined users row.
+    """
+    due_days: Dict[str, DueDay] = {}
+    skipped = set()
+    for habit in habits:
+        user_id = habit["user_id"]
+        if user_id in due_days or user_id in skipped:
+            continue
+        timezone = normalize_timezone((habit.get("users") or {}).get("timezone"))
+        user_now = utc_now.astimezone(pytz.timezone(timezone))
+        if user_now.hour != local_hour:
+            skipped.add(user_id)
+            continue
+        due_days[user_id] = DueDay(timezone, user_now.date() - timedelta(days=1))
+    return due_days
+
+async def fetch_verification_times(
+    supabase: AsyncClient,
+    habit_ids: List[str],
+    start: datetime,
+    end: datetime
+) -> Dict[str, List[datetime]]:
+    """
+    All verification timestamps for the given habits within [start, end], grouped by habit.
+    One query per ID chunk, issued concurrently.
+    """
+    async def fetch_chunk(chunk: List[str]) -> list:
+        result = await supabase.table("habit_verifications") \
+            .select("habit_id, verified_at") \
+            .in_("habit_id", chunk) \
+            .gte("verified_at", start.isoformat()) \
+            .lte("verified_at", end.isoformat()) \
+            .execute()
+        return result.data or []
+
+    chunks = [habit_ids[i:i + ID_CHUNK_SIZE] for i in range(0, len(habit_ids), ID_CHUNK_SIZE)]
+    results = await asyncio.gather(*[fetch_chunk(chunk) for chunk in chunks])
+
+    times_by_habit: Dict[str, List[datetime]] = {}
+    for rows in results:
+        for row in rows:
+            times_by_habit.setdefault(row["habit_id"], []).append(_parse_timestamp(row["verified_at"]))
+    return times_by_habit
+
+def plan_missed_penalties(
+    habits: List[dict],
+    due_days: Dict[str, DueDay],
+    verification_times: Dict[str, List[datetime]]
+) -> Tuple[List[dict], Dict[str, int]]:
+    """
+    Work out, in memory, which habits missed their due day.
+
+    A habit is penalised if its owner is due, it was created before the due day
+    (first-day grace period), the due day is in its weekday mask, and it has no
+    verification within the owner's local day.
+
+    Returns:
+        (penalty rows ready for apply_daily_penalties, counters for logging)
+    """
+    penalties = []
+    stats = {"evaluated": 0, "grace_period": 0, "not_required": 0, "verified": 0, "missed": 0}
+
+    for habit in habits:
+        due = due_days.get(habit["user_id"])
+        if due is None:
+            continue
+        stats["evaluated"] += 1
+
+        # First-day grace period - no charging on the first day after habit creation
+        if _parse_timestamp(habit["created_at"]).date() >= due.day:
+            stats["grace_period"] += 1
+            continue
+
+        if not weekday_mask(habit.get("weekdays")) & due.weekday_bit:
+            stats["not_required"] += 1
+            continue
+
+        if any(due.start <= verified_at <= due.end for verified_at in verification_times.get(habit["id"], ())):
+            stats["verified"] += 1
+            continue
+
+        stats["missed"] += 1
+        penalties.append({
+            "habit_id": habit["id"],
+            "user_id": habit["user_id"],
+            "recipient_id": habit.get("recipient_id"),
+            "amount": habit["penalty_amount"],
+            "penalty_date": due.day.isoformat(),
+            "reason": f"Missed {habit.get('name', 'habit')} on {due.day}"
+        })
+
+    return penalties, stats
+
+async def _apply_client_side(supabase: AsyncClient, penalties: List[dict]) -> List[dict]:
+    """Fallback for databases without apply_daily_penalties: bulk queries, per-row analytics"""
+    habit_ids = list({p["habit_id"] for p in penalties})
+    penalty_dates = list({p["penalty_date"] for p in penalties})
+
+    # Skip penalties that already exist (one query per ID chunk)
+    existing = set()
+    for i in range(0, len(habit_ids), ID_CHUNK_SIZE):
+        result = await supabase.table("penalties") \
+            .select("habit_id, penalty_date") \
+            .in_("habit_id", habit_ids[i:i + ID_CHUNK_SIZE]) \
+            .in_("penalty_date", penalty_dates) \
+            .execute()
+        existing.update((row["habit_id"], row["penalty_date"]) for row in result.data or [])
+
+    new_penalties = [
+        {**p, "is_paid": False}
+        for p in penalties
+        if (p["habit_id"], p["penalty_date"]) not in existing
+    ]
+    if not new_penalties:
+        return []
+
+    inserted = await supabase.table("penalties").insert(new_penalties).execute()
+    created = inserted.data or new_penalties
+
+    # Decrement streaks (minimum 0)
+    created_habit_ids = list({p["habit_id"] for p in created})
+    from routers.habit_verification.services.habit_verification_service import batch_update_streaks
+    streak_updates = {}
+    for i in range(0, len(created_habit_ids), ID_CHUNK_SIZE):
+        result = await supabase.table("habits").select("id, streak").in_("id", created_habit_ids[i:i + ID_CHUNK_SIZE]).execute()
+        for habit in result.data or []:
+            streak_updates[habit["id"]] = max(0, (habit.get("streak") or 0) - 1)
+    await batch_update_streaks(supabase, streak_updates)
+
+    # Recipient analytics
+    from utils.recipient_analytics import update_analytics_on_penalty_created
+    for penalty in created:
+        if penalty.get("recipient_id"):
+            await update_analytics_on_penalty_created(
+                supabase=supabase,
+                habit_id=penalty["habit_id"],
+                recipient_id=penalty["recipient_id"],
+                penalty_amount=float(penalty["amount"]),
+                penalty_date=date.fromisoformat(penalty["penalty_date"])
+            )
+
+    return created
+
+@memory_optimized(cleanup_args=False)
+@memory_profile("apply_daily_penalties")
+async def apply_daily_penalties(supabase: AsyncClient, penalties: List[dict]) -> List[dict]:
+    """
+    Create penalties, decrement streaks and update recipient analytics for a batch.
+
+    Uses the apply_daily_penalties RPC (see backend/penalty_engine.sql) - a single
+    round-trip - and falls back to client-side bulk queries if it is unavailable.
+    Penalties that already exist for a habit and day are skipped either way.
+
+    Returns:
+        The penalty rows that were created
+    """
+    if not penalties:
+        return []
+
+    try:
+        result = await supabase.rpc("apply_daily_penalties", {"p_penalties": penalties}).execute()
+        return result.data or []
+    except Exception as e:
+        logger.warning(f"⚠️ apply_daily_penalties RPC unavailable, applying client-side: {e}")
+
+    return await _apply_client_side(supabase, penalties)
+
+@memory_optimized(cleanup_args=False)
+@memory_profile("run_daily_penalty_engine")
+async def run_daily_penalty_engine(
+    supabase: AsyncClient,
+    habits: List[dict],
+    utc_now: datetime,
+    local_hour: int
+) -> Tuple[Dict[str, DueDay], List[dict]]:
+    """
+    Evaluate a whole timezone bucket of daily habits with a constant number of queries.
+
+    Args:
+        supabase: Async Supabase client
+        habits: Active daily habits joined with users(timezone)
+        utc_now: Reference instant for the bucket
+        local_hour: Local hour at which the previous day is evaluated
+
+    Returns:
+        (user_id -> DueDay for the users evaluated, created penalty rows)
+    """
+    due_days = resolve_due_days(habits, utc_now, local_hour)
+    if not due_days:
+        return due_days, []
+
+    due_habits = [habit for habit in habits if habit["user_id"] in due_days]
+    window_start = min(due.start for due in due_days.values())
+    window_end = max(due.end for due in due_days.values())
+
+    verification_times = await fetch_verification_times(
+        supabase, [habit["id"] for habit in due_habits], window_start, window_end
+    )
+    penalties, stats = plan_missed_penalties(due_habits, due_days, verification_times)
+    logger.info(
+        f"📊 Penalty engine: {len(due_days)} users, {stats['evaluated']} habits evaluated, "
+        f"{stats['verified']} verified, {stats['grace_period']} in grace period, "
+        f"{stats['not_required']} not required, {stats['missed']} missed"
+    )
+
+    created = await apply_daily_penalties(supabase, penalties)
+    cleanup_memory(verification_times, due_habits)
+    return due_days, created
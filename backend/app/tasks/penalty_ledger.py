@@ -0,0 +1,236 @@
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import pytz
+from supabase._async.client import AsyncClient
+from config.database import get_async_supabase_client
+from .job_coordination import Shard
+
+logger = logging.getLogger(__name__)
+
+# Subject of steps that cover the whole run rather than one user
+RUN_WIDE = "*"
+
+# A "running" run whose progress hasn't moved for this long is assumed to have crashed
+PENALTY_RUN_STALE_MINUTES = int(os.getenv("PENALTY_RUN_STALE_MINUTES", "30"))
+
+# How far back the resume job looks for failed or missed runs. A day, so users ahead of UTC
+# (checked before their UTC day ends) are retried once their LeetCode day can be verified
+PENALTY_REPLAY_LOOKBACK_HOURS = int(os.getenv("PENALTY_REPLAY_LOOKBACK_HOURS", "24"))
+
+# Seconds between updated_at bumps while a run records progress (staleness detection)
+_TOUCH_INTERVAL_SECONDS = 60
+
+def hour_run_key(utc_now: datetime) -> str:
+    """Run key of an hourly penalty run: the UTC hour it evaluates"""
+    return utc_now.astimezone(pytz.UTC).replace(minute=0, second=0, microsecond=0).isoformat()
+
+def shard_key(shard: Optional[Shard]) -> str:
+    """Ledger key of the shard a run covers ("0/1" when the job isn't sharded)"""
+    return repr(shard) if shard else "0/1"
+
+class PenaltyRun:
+    """
+    One penalty job run (job, hour, shard) and the steps it has already finished.
+
+    A step is identified by name and subject (a user id, or RUN_WIDE). Jobs check
+    is_done() before doing a step and mark_done() right after it, so a resumed run
+    skips exactly the work the failed attempt completed.
+    """
+
+    def __init__(self, ledger: Optional["PenaltyJobLedger"], row: dict, done: Set[Tuple[str, str]]):
+        self._ledger = ledger  # None: ledger unavailable, progress is not persisted
+        self.id = row.get("id")
+        self.job = row["job"]
+        self.run_key = row["run_key"]
+        self.shard = row["shard"]
+        self.attempt = row.get("attempts", 1)
+        self._done = done
+        self._last_touch = time.monotonic()
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self._done)
+
+    def is_done(self, step: str, subject: str = RUN_WIDE) -> bool:
+        return (step, str(subject)) in self._done
+
+    async def mark_done(self, step: str, subject: str = RUN_WIDE, penalties_created: int = 0) -> None:
+        self._done.add((step, str(subject)))
+        if self._ledger is None:
+            return
+        try:
+            supabase = await self._ledger.client()
+            await supabase.table("penalty_job_progress").upsert({
+                "run_id": self.id,
+                "step": step,
+                "subject": str(subject),
+                "penalties_created": penalties_created
+            }, on_conflict="run_id,step,subject").execute()
+            if time.monotonic() - self._last_touch > _TOUCH_INTERVAL_SECONDS:
+                self._last_touch = time.monotonic()
+                await self._update({"updated_at": datetime.now(pytz.UTC).isoformat()})
+        except Exception as e:
+            # Losing a progress row only means the step is redone on resume (steps are idempotent)
+            logger.warning(f"⚠️ Could not record {step}:{subject} for run {self.job} {self.run_key}: {e}")
+
+    async def complete(self, stats: Optional[dict] = None) -> None:
+        await self._finish("completed", stats=stats)
+
+    async def fail(self, error: str, stats: Optional[dict] = None) -> None:
+        await self._finish("failed", stats=stats, error=error[:1000])
+
+    async def _finish(self, status: str, stats: Optional[dict] = None, error: Optional[str] = None) -> None:
+        now = datetime.now(pytz.UTC).isoformat()
+        try:
+            await self._update({"status": status, "stats": stats, "error": error, "updated_at": now, "finished_at": now})
+        except Exception as e:
+            logger.warning(f"⚠️ Could not mark run {self.job} {self.run_key} as {status}: {e}")
+
+    async def _update(self, values: dict) -> None:
+        if self._ledger is None:
+            return
+        supabase = await self._ledger.client()
+        await supabase.table("penalty_job_runs").update(values).eq("id", self.id).execute()
+
+class PenaltyJobLedger:
+    """
+    Durable record of penalty job runs (backend/penalty_job_ledger.sql).
+
+    Gives each hourly run a row keyed by (job, run_key, shard) plus per-step progress,
+    so a completed hour is never evaluated twice and a failed one can be resumed.
+    If the tables are missing the jobs still run, just without checkpointing.
+    """
+
+    def __init__(self, client_factory: Callable[[], Awaitable[AsyncClient]] = get_async_supabase_client):
+        self._client_factory = client_factory
+
+    async def client(self) -> AsyncClient:
+        return await self._client_factory()
+
+    async def begin(self, job: str, run_key: str, shard: str) -> Optional[PenaltyRun]:
+        """
+        Start (or resume) the run for (job, run_key, shard).
+
+        Returns:
+            The run with its finished steps loaded, or None if it already completed
+        """
+        key = {"job": job, "run_key": run_key, "shard": shard}
+        try:
+            supabase = await self.client()
+            inserted = await supabase.table("penalty_job_runs") \
+                .upsert(key, on_conflict="job,run_key,shard", ignore_duplicates=True) \
+                .execute()
+            if inserted.data:
+                return PenaltyRun(self, inserted.data[0], set())
+
+            existing = await supabase.table("penalty_job_runs") \
+                .select("*").eq("job", job).eq("run_key", run_key).eq("shard", shard) \
+                .limit(1).execute()
+            row = existing.data[0]
+            if row["status"] == "completed":
+                return None
+
+            row["attempts"] = (row.get("attempts") or 1) + 1
+            await supabase.table("penalty_job_runs").update({
+                "status": "running",
+                "attempts": row["attempts"],
+                "error": None,
+                "updated_at": datetime.now(pytz.UTC).isoformat()
+            }).eq("id", row["id"]).execute()
+
+            progress = await supabase.table("penalty_job_progress") \
+                .select("step, subject").eq("run_id", row["id"]).execute()
+            done = {(p["step"], p["subject"]) for p in progress.data or []}
+            logger.info(f"↩️ Resuming {job} run {run_key} shard {shard} (attempt {row['attempts']}, {len(done)} steps done)")
+            return PenaltyRun(self, row, done)
+        except Exception as e:
+            logger.warning(f"⚠️ Penalty job ledger unavailable, running {job} without checkpoints: {e}")
+            return PenaltyRun(None, {**key, "attempts": 1}, set())
+
+    async def runs_since(self, job: str, shard: str, since_key: str) -> Dict[str, dict]:
+        """run_key -> run row for the job's runs at or after since_key"""
+        supabase = await self.client()
+        result = await supabase.table("penalty_job_runs") \
+            .select("run_key, status, updated_at") \
+            .eq("job", job).eq("shard", shard).gte("run_key", since_key) \
+            .execute()
+        return {row["run_key"]: row for row in result.data or []}
+
+    async def prune(self, days: int = 14) -> None:
+        """Delete runs (and, by cascade, their progress) older than `days`"""
+        cutoff = hour_run_key(datetime.now(pytz.UTC) - timedelta(days=days))
+        supabase = await self.client()
+        await supabase.table("penalty_job_runs").delete().lt("run_key", cutoff).execute()
+
+def _is_stale(run: dict, utc_now: datetime) -> bool:
+    updated_at = datetime.fromisoformat(run["updated_at"].replace('Z', '+00:00'))
+    return utc_now - updated_at > timedelta(minutes=PENALTY_RUN_STALE_MINUTES)
+
+def hours_to_replay(runs: Dict[str, dict], utc_now: datetime, lookback_hours: int) -> List[datetime]:
+    """
+    Past hours whose run failed, crashed (stale "running") or never happened.
+
+    Only hours at or after the oldest recorded run are considered missed, so enabling
+    the ledger (or an outage longer than the lookback) doesn't replay unrecorded history.
+    The current hour is left to the regular job.
+    """
+    if not runs:
+        return []
+    current_hour = utc_now.astimezone(pytz.UTC).replace(minute=0, second=0, microsecond=0)
+    oldest_recorded = min(runs)
+    replay = []
+    for hours_ago in range(lookback_hours, 0, -1):
+        hour = current_hour - timedelta(hours=hours_ago)
+        key = hour.isoformat()
+        if key < oldest_recorded:
+            continue
+        run = runs.get(key)
+        if run is None or run["status"] == "failed" or (run["status"] == "running" and _is_stale(run, utc_now)):
+            replay.append(hour)
+    return replay
+
+# Global singleton instance
+penalty_ledger = PenaltyJobLedger()
+
+async def resume_penalty_runs(shard: Optional[Shard] = None):
+    """
+    Resume failed or crashed penalty runs and replay hours missed during an outage.
+
+    Replays call the regular jobs with the missed hour as utc_now, so users are
+    evaluated exactly as they would have been on time; steps a failed attempt
+    finished are skipped.
+
+    Args:
+        shard: Only resume this shard's runs (set when workers split the job)
+    """
+    from .daily_penalties import check_and_charge_penalties, DAILY_PENALTY_JOB
+    from .weekly_penalties import check_weekly_penalties, WEEKLY_PENALTY_JOB
+
+    utc_now = datetime.now(pytz.UTC)
+    since_key = hour_run_key(utc_now - timedelta(hours=PENALTY_REPLAY_LOOKBACK_HOURS))
+
+    for job_name, job in ((DAILY_PENALTY_JOB, check_and_charge_penalties), (WEEKLY_PENALTY_JOB, check_weekly_penalties)):
+        try:
+            runs = await penalty_ledger.runs_since(job_name, shard_key(shard), since_key)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read penalty job ledger for {job_name}: {e}")
+            continue
+
+        for hour in hours_to_replay(runs, utc_now, PENALTY_REPLAY_LOOKBACK_HOURS):
+            status = runs.get(hour.isoformat(), {}).get("status", "missing")
+            logger.info(f"🔁 Replaying {job_name} for {hour.isoformat()} ({status})")
+            try:
+                await job(shard=shard, utc_now=hour)
+            except Exception as e:
+                # Left failed in the ledger; the next resume pass retries it
+                logger.error(f"❌ Replay of {job_name} for {hour.isoformat()} failed: {e}")
+
+async def prune_penalty_job_runs(days: int = 14):
+    """Delete penalty job ledger entries older than `days`"""
+    try:
+        await penalty_ledger.prune(days)
+    except Exception as e:
+        logger.error(f"❌ Error pruning penalty job runs: {e}")
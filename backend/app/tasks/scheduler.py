@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta, date, time
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 import pytz
 import logging
 
@@ -11,7 +12,9 @@ from .payment_processing import update_processing_payment_statuses, process_all_
 from .habit_management import process_habit_notifications, cleanup_old_habit_notifications
 from .github_habits import update_github_weekly_progress_task
 from .leetcode_habits import update_leetcode_weekly_progress_task
-from .maintenance import archive_old_feed_cards_task
+from .maintenance import archive_old_feed_cards_task, cleanup_push_outbox_task
+from .penalty_ledger import resume_penalty_runs, prune_penalty_job_runs
+from .job_coordination import JobCoordinator, create_job_coordinator
 
 # Import utility functions from other modules
 from utils.habit_staging import process_staged_habit_changes, cleanup_old_staged_changes
@@ -25,9 +28,35 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)  # Ensure logger itself is set to INFO level
 
-def setup_scheduler(development_mode=False):
+# Jobs whose users are partitioned across workers (they accept a `shard` argument);
+# every other job runs on one elected worker per scheduled run
+SHARDED_JOBS = {
+    "check_and_charge_penalties",
+    "check_and_charge_unpaid_penalties",
+    "check_weekly_penalties",
+    "process_staged_habit_changes",
+    "resume_penalty_runs",
+    "update_github_weekly_progress",
+    "update_leetcode_weekly_progress",
+}
+
+def _coordinate_jobs(scheduler: AsyncIOScheduler, coordinator: JobCoordinator) -> None:
+    """Route every job through the coordinator so several workers can share the schedule"""
+    for job in scheduler.get_jobs():
+        run_period_seconds = 60
+        if isinstance(job.trigger, IntervalTrigger):
+            run_period_seconds = int(job.trigger.interval.total_seconds())
+        job.modify(func=coordinator.wrap(
+            job.id, job.func, sharded=job.id in SHARDED_JOBS, run_period_seconds=run_period_seconds
+        ))
+
+def setup_scheduler(development_mode=False, coordinator: JobCoordinator = None):
     """
     Set up the APScheduler to run tasks at specific times
+
+    Args:
+        development_mode: Run jobs more frequently for testing
+        coordinator: Lease-based job coordination (defaults to the SCHEDULER_COORDINATION setting)
     """
     scheduler = AsyncIOScheduler()
     
@@ -61,6 +90,13 @@ def setup_scheduler(development_mode=False):
             id="check_weekly_penalties",
             replace_existing=True
         )
+        # Resume failed/missed penalty runs every 10 minutes in development
+        scheduler.add_job(
+            resume_penalty_runs,
+            CronTrigger(minute='*/10'),
+            id="resume_penalty_runs",
+            replace_existing=True
+        )
         # Process staged habit changes every 2 minutes for testing
         scheduler.add_job(
             process_staged_habit_changes,
@@ -140,6 +176,20 @@ def setup_scheduler(development_mode=False):
             id="check_weekly_penalties",
             replace_existing=True
         )
+        # Resume failed or crashed penalty runs and replay hours missed during an outage
+        scheduler.add_job(
+            resume_penalty_runs,
+            CronTrigger(minute=45),  # Every hour at minute 45 (after the daily and weekly checks)
+            id="resume_penalty_runs",
+            replace_existing=True
+        )
+        # Drop penalty job ledger entries older than two weeks daily at 4:00 UTC
+        scheduler.add_job(
+            prune_penalty_job_runs,
+            CronTrigger(hour=4, minute=0),
+            id="prune_penalty_job_runs",
+            replace_existing=True
+        )
         # Process staged habit changes every hour to handle different timezones
         scheduler.add_job(
             process_staged_habit_changes,
@@ -189,6 +239,13 @@ def setup_scheduler(development_mode=False):
             id="cleanup_old_habit_notifications",
             replace_existing=True
         )
+        # Prune delivered push outbox messages daily at 3:30 UTC
+        scheduler.add_job(
+            cleanup_push_outbox_task,
+            CronTrigger(hour=3, minute=30),
+            id="cleanup_push_outbox",
+            replace_existing=True
+        )
         # Update GitHub weekly progress every 30 minutes in production
         scheduler.add_job(
             update_github_weekly_progress_task,
@@ -226,4 +283,8 @@ def setup_scheduler(development_mode=False):
     from tasks.github_token_refresh import setup_github_token_refresh_tasks
     setup_github_token_refresh_tasks(scheduler)
     
+    coordinator = coordinator or create_job_coordinator()
+    if coordinator.enabled:
+        _coordinate_jobs(scheduler, coordinator)
+    
     return scheduler
\ No newline at end of file
@@ -1,9 +1,11 @@
 import pytz
 import logging
 from datetime import datetime, timedelta, date
+from typing import Dict, List, Optional
 from supabase._async.client import AsyncClient
 from utils.memory_optimization import memory_optimized, cleanup_memory
 from utils.memory_monitoring import memory_profile
+from utils.ttl_cache import TTLCache
 
 # Set up logging
 logging.basicConfig(
@@ -15,41 +17,76 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.WARNING)
 
-@memory_optimized(cleanup_args=False)
-async def get_user_timezone_async(supabase: AsyncClient, user_id: str) -> str:
-    """Get user's timezone from the database (async version)"""
-    user = await supabase.table("users").select("timezone").eq("id", user_id).execute()
-    if not user.data:
-        return "UTC"
-    
-    timezone = user.data[0]["timezone"]
-    
+# Timezone abbreviations some clients stored instead of IANA names
+TIMEZONE_ABBREVIATIONS = {
+    'PDT': 'America/Los_Angeles',
+    'PST': 'America/Los_Angeles',
+    'EDT': 'America/New_York',
+    'EST': 'America/New_York',
+    'CDT': 'America/Chicago',
+    'CST': 'America/Chicago',
+    'MDT': 'America/Denver',
+    'MST': 'America/Denver',
+}
+
+def normalize_timezone(timezone: Optional[str]) -> str:
+    """Map a stored users.timezone value to a valid pytz name, falling back to UTC"""
     # Handle timezone abbreviations by mapping them to proper pytz names
-    timezone_mapping = {
-        'PDT': 'America/Los_Angeles',
-        'PST': 'America/Los_Angeles',
-        'EDT': 'America/New_York',
-        'EST': 'America/New_York',
-        'CDT': 'America/Chicago',
-        'CST': 'America/Chicago',
-        'MDT': 'America/Denver',
-        'MST': 'America/Denver',
-    }
-    
-    # If it's an abbreviation, convert it
-    if timezone in timezone_mapping:
-        timezone = timezone_mapping[timezone]
+    timezone = TIMEZONE_ABBREVIATIONS.get(timezone, timezone)
     
     # Validate the timezone exists in pytz
     try:
         pytz.timezone(timezone)
-        cleanup_memory(user)
         return timezone
-    except pytz.exceptions.UnknownTimeZoneError:
+    except (pytz.exceptions.UnknownTimeZoneError, AttributeError):
         logger.error(f"Unknown timezone: {timezone}, falling back to UTC")
-        cleanup_memory(user)
         return "UTC"
 
+@memory_optimized(cleanup_args=False)
+async def get_user_timezone_async(supabase: AsyncClient, user_id: str) -> str:
+    """Get user's timezone from the database (async version)"""
+    user = await supabase.table("users").select("timezone").eq("id", user_id).execute()
+    if not user.data:
+        return "UTC"
+    
+    timezone = normalize_timezone(user.data[0]["timezone"])
+    cleanup_memory(user)
+    return timezone
+
+async def get_user_timezones_async(supabase: AsyncClient, user_ids: List[str], batch_size: int = 200) -> Dict[str, str]:
+    """
+    Get many users' timezones with one query per batch of IDs.
+
+    Returns:
+        user_id -> normalized timezone (users missing from the table are omitted)
+    """
+    timezones = {}
+    for i in range(0, len(user_ids), batch_size):
+        result = await supabase.table("users").select("id, timezone").in_("id", user_ids[i:i + batch_size]).execute()
+        for user in result.data or []:
+            timezones[user["id"]] = normalize_timezone(user.get("timezone"))
+    return timezones
+
+async def penalty_exists(supabase: AsyncClient, habit_id: str, penalty_date: date, reason: Optional[str] = None) -> bool:
+    """True if a penalty was already recorded for the habit on the given date (and reason, if given)"""
+    query = supabase.table("penalties") \
+        .select("id") \
+        .eq("habit_id", habit_id) \
+        .eq("penalty_date", penalty_date.isoformat())
+    if reason is not None:
+        query = query.eq("reason", reason)
+    result = await query.limit(1).execute()
+    return bool(result.data)
+
+async def get_user_tokens(supabase: AsyncClient, user_id: str, columns: str = "*") -> Optional[dict]:
+    """The user's user_tokens row (integration credentials), or None if they have none"""
+    result = await supabase.table("user_tokens") \
+        .select(columns) \
+        .eq("user_id", user_id) \
+        .limit(1) \
+        .execute()
+    return result.data[0] if result.data else None
+
 # Legacy sync version for backward compatibility
 def get_user_timezone(supabase, user_id: str) -> str:
     """Get user's timezone from the database (sync version for legacy code)"""
@@ -57,31 +94,40 @@ def get_user_timezone(supabase, user_id: str) -> str:
     if not user.data:
         return "UTC"
     
-    timezone = user.data[0]["timezone"]
-    
-    # Handle timezone abbreviations by mapping them to proper pytz names
-    timezone_mapping = {
-        'PDT': 'America/Los_Angeles',
-        'PST': 'America/Los_Angeles',
-        'EDT': 'America/New_York',
-        'EST': 'America/New_York',
-        'CDT': 'America/Chicago',
-        'CST': 'America/Chicago',
-        'MDT': 'America/Denver',
-        'MST': 'America/Denver',
-    }
+    return normalize_timezone(user.data[0]["timezone"])
+
+def get_timezones_at_local_hour(hour: int, now: Optional[datetime] = None) -> List[str]:
+    """
+    Every users.timezone value that normalizes to a zone currently in the given local hour.
     
-    # If it's an abbreviation, convert it
-    if timezone in timezone_mapping:
-        timezone = timezone_mapping[timezone]
+    Includes IANA names (canonical and legacy aliases such as "US/Pacific") and the
+    abbreviations in TIMEZONE_ABBREVIATIONS, so it can be used directly as an
+    `in_("users.timezone", ...)` filter. DST is handled because each zone is
+    evaluated at `now`; half-hour zones match for the whole local hour.
     
-    # Validate the timezone exists in pytz
-    try:
-        pytz.timezone(timezone)
-        return timezone
-    except pytz.exceptions.UnknownTimeZoneError:
-        print(f"Unknown timezone: {timezone}, falling back to UTC")
-        return "UTC"
+    Args:
+        hour: Local hour (0-23)
+        now: Reference instant (defaults to the current time)
+        
+    Returns:
+        Matching timezone strings (NULL/unknown timezones fall back to UTC - see
+        falls_back_to_utc)
+    """
+    now = now or datetime.now(pytz.UTC)
+    matching = set()
+    for name in pytz.all_timezones:
+        if name in TIMEZONE_ABBREVIATIONS:
+            continue  # e.g. pytz's fixed-offset "EST" - we treat it as America/New_York
+        if now.astimezone(pytz.timezone(name)).hour == hour:
+            matching.add(name)
+    for abbreviation, name in TIMEZONE_ABBREVIATIONS.items():
+        if name in matching:
+            matching.add(abbreviation)
+    return sorted(matching)
+
+def falls_back_to_utc(timezone: Optional[str]) -> bool:
+    """True if a stored timezone is NULL or unrecognised, i.e. normalize_timezone() uses UTC for it"""
+    return TIMEZONE_ABBREVIATIONS.get(timezone, timezone) not in pytz.all_timezones_set
 
 @memory_optimized(cleanup_args=False)
 @memory_profile("decrement_habit_streak")
@@ -264,38 +310,27 @@ async def batch_create_penalties(
         logger.error(f"Error in batch penalty creation: {e}")
         raise
 
-# OPTIMIZATION: Add habit data caching for penalty processing
-_habit_data_cache = {}
+# OPTIMIZATION: Add habit data caching for penalty processing.
+# Short TTL so penalty amount / recipient edits are picked up by the next run.
+_habit_data_cache = TTLCache("scheduler_habit_data", max_entries=1000, ttl=300)
 
 @memory_optimized(cleanup_args=False)
 async def get_habit_data_cached(supabase: AsyncClient, habit_id: str) -> dict:
     """Get habit data with caching for penalty processing"""
-    if habit_id in _habit_data_cache:
-        return _habit_data_cache[habit_id]
-    
     try:
-        # OPTIMIZATION: Use selective columns for habit data
-        habit_result = await supabase.table("habits").select(
-            "id, user_id, recipient_id, penalty_amount, name, habit_type"
-        ).eq("id", habit_id).execute()
-        
-        if habit_result.data:
-            habit_data = habit_result.data[0]
-            
-            # Cache with size limit
-            if len(_habit_data_cache) < 1000:
-                _habit_data_cache[habit_id] = habit_data
-            
-            cleanup_memory(habit_result)
-            return habit_data
-        
-        return None
-        
+        return await _habit_data_cache.get_or_load(habit_id, lambda: _fetch_habit_data(supabase, habit_id))
     except Exception as e:
         logger.error(f"Error fetching habit data for {habit_id}: {e}")
         return None
 
+async def _fetch_habit_data(supabase: AsyncClient, habit_id: str) -> Optional[dict]:
+    # OPTIMIZATION: Use selective columns for habit data
+    habit_result = await supabase.table("habits").select(
+        "id, user_id, recipient_id, penalty_amount, name, habit_type"
+    ).eq("id", habit_id).execute()
+    
+    return habit_result.data[0] if habit_result.data else None
+
 def clear_habit_data_cache():
     """Clear the habit data cache"""
-    global _habit_data_cache
-    _habit_data_cache.clear() 
\ No newline at end of file
+    _habit_data_cache.clear()
@@ -328,7 +328,7 @@ class TaskTester:
             try:
                 logger.info("📋 Checking for deleted/edited habits...")
                 from tasks.habit_management import check_deleted_edited_habits_penalties
-                await check_deleted_edited_habits_penalties(supabase)
+                await check_deleted_edited_habits_penalties(async_supabase)
             except Exception as e:
                 logger.error(f"❌ Error checking deleted/edited habits penalties: {e}")
             
@@ -450,7 +450,7 @@ class TaskTester:
                 # Check gaming habits
                 logger.info(f"\n   🎮 Checking gaming habits for user {user_id}...")
                 from tasks.gaming_habits import check_gaming_habits_for_penalties
-                gaming_penalties = await check_gaming_habits_for_penalties(supabase, async_supabase, user_id, yesterday_user)
+                gaming_penalties = await check_gaming_habits_for_penalties(async_supabase, user_id, yesterday_user)
                 penalties_created += gaming_penalties
                 if gaming_penalties > 0:
                     logger.info(f"   🎮 Created {gaming_penalties} gaming penalties")
@@ -458,7 +458,7 @@ class TaskTester:
                 # Check GitHub habits
                 logger.info(f"\n   📝 Checking GitHub commit habits for user {user_id}...")
                 from tasks.github_habits import check_github_habits_for_penalties
-                github_penalties = await check_github_habits_for_penalties(supabase, async_supabase, user_id, yesterday_user, user_timezone)
+                github_penalties = await check_github_habits_for_penalties(async_supabase, user_id, yesterday_user, user_timezone)
                 penalties_created += github_penalties
                 if github_penalties > 0:
                     logger.info(f"   📝 Created {github_penalties} GitHub commit penalties")
@@ -466,7 +466,7 @@ class TaskTester:
                 # Check LeetCode habits
                 logger.info(f"\n   🧩 Checking LeetCode habits for user {user_id}...")
                 from tasks.leetcode_habits import check_leetcode_habits_for_penalties
-                leetcode_penalties = await check_leetcode_habits_for_penalties(supabase, async_supabase, user_id, yesterday_user)
+                leetcode_penalties = await check_leetcode_habits_for_penalties(async_supabase, user_id, yesterday_user)
                 penalties_created += leetcode_penalties
                 if leetcode_penalties > 0:
                     logger.info(f"   🧩 Created {leetcode_penalties} LeetCode penalties")
@@ -504,7 +504,7 @@ class TaskTester:
     async def check_deleted_edited_habits_wrapper(self):
         """Wrapper for check_deleted_edited_habits_penalties that provides supabase client"""
         logger.info("Checking for deleted/edited habits penalties...")
-        await check_deleted_edited_habits_penalties(self.supabase)
+        await check_deleted_edited_habits_penalties(await get_async_supabase_client())
         logger.info("Deleted/edited habits check completed")
 
     async def test_daily_penalties_for_user(self):
@@ -584,7 +584,7 @@ class TaskTester:
         
         async_supabase = await get_async_supabase_client()
         penalties_created = await check_gaming_habits_for_penalties(
-            self.supabase, async_supabase, user_id, check_date
+            async_supabase, user_id, check_date
         )
         
         logger.info(f"Gaming penalties created: {penalties_created}")
@@ -605,7 +605,7 @@ class TaskTester:
         async_supabase = await get_async_supabase_client()
         
         penalties_created = await check_github_habits_for_penalties(
-            self.supabase, async_supabase, user_id, check_date, user_timezone
+            async_supabase, user_id, check_date, user_timezone
         )
         
         logger.info(f"GitHub penalties created: {penalties_created}")
@@ -624,7 +624,7 @@ class TaskTester:
         
         async_supabase = await get_async_supabase_client()
         penalties_created = await check_leetcode_habits_for_penalties(
-            self.supabase, async_supabase, user_id, check_date
+            async_supabase, user_id, check_date
         )
         
         logger.info(f"LeetCode penalties created: {penalties_created}")
@@ -1,47 +1,66 @@
 from datetime import datetime, timedelta, date
 import pytz
 import logging
-from supabase import Client
-from config.database import get_supabase_client, get_async_supabase_client
+from typing import Optional
+from config.database import get_async_supabase_client
 from utils.weekly_habits import get_week_dates
-from .scheduler_utils import get_user_timezone, decrement_habit_streak_local, check_and_create_penalty_for_habit
+from .scheduler_utils import normalize_timezone, decrement_habit_streak_local, check_and_create_penalty_for_habit, penalty_exists
+from .job_coordination import Shard
+from .penalty_ledger import penalty_ledger, hour_run_key, shard_key
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-async def check_weekly_penalties():
+# Job name of the weekly check in the penalty job ledger
+WEEKLY_PENALTY_JOB = "check_weekly_penalties"
+
+async def check_weekly_penalties(shard: Optional[Shard] = None, utc_now: Optional[datetime] = None):
     """
     Check weekly habits for missed completions and create penalties.
     This runs with timing restrictions to handle different week start days and timezones.
     
     Note: Payment processing for unpaid penalties is now handled separately by 
     check_and_charge_unpaid_penalties() which runs every hour.
+    
+    Each hour is recorded in the penalty job ledger, with progress per user and per habit,
+    so a failed run resumes without charging anyone twice.
+    
+    Args:
+        shard: Only process users in this shard (set when workers split the job)
+        utc_now: Hour to evaluate (defaults to now; set when replaying a missed hour)
     """
-    supabase = get_supabase_client()
-    async_supabase = await get_async_supabase_client()
-    utc_now = datetime.now(pytz.UTC)
+    supabase = await get_async_supabase_client()
+    utc_now = utc_now or datetime.now(pytz.UTC)
     
     logger.info(f"🔄 Starting weekly habit penalty check at {utc_now} UTC")
     
+    run = await penalty_ledger.begin(WEEKLY_PENALTY_JOB, hour_run_key(utc_now), shard_key(shard))
+    if run is None:
+        logger.info(f"⏭️ Weekly penalty check for {hour_run_key(utc_now)} already completed - skipping")
+        return
+    
     try:
         # Check weekly habits for missed completions and create penalties
-        weekly_habits = supabase.table("habits") \
+        weekly_habits = await supabase.table("habits") \
             .select("*, users!habits_user_id_fkey!inner(timezone)") \
             .eq("habit_schedule_type", "weekly") \
             .eq("is_active", True) \
             .not_.in_("habit_type", ["league_of_legends", "valorant", "github_commits"]) \
             .execute()
         
-        if not weekly_habits.data:
+        habits = shard.filter(weekly_habits.data or []) if shard else weekly_habits.data
+        if not habits:
             logger.info("📭 No weekly habits found")
+            await run.complete({"users": 0, "penalties_created": 0})
             return
         
-        logger.info(f"📋 Found {len(weekly_habits.data)} weekly habits to check")
+        logger.info(f"📋 Found {len(habits)} weekly habits to check")
         
         users_processed_weekly = set()
         weekly_penalty_count = 0
+        failed_users = 0
         
-        for habit in weekly_habits.data:
+        for habit in habits:
             user_id = habit['user_id']
             
             # Skip if we already processed this user for weekly habits
@@ -49,16 +68,21 @@ async def check_weekly_penalties():
                 continue
             users_processed_weekly.add(user_id)
             
-            # Get user timezone - USE SAME METHOD AS ENDPOINTS
-            user_timezone = get_user_timezone(supabase, user_id)
+            # Fully processed by an earlier attempt of this run
+            if run.is_done("weekly", user_id):
+                continue
+            user_failed = False
+            
+            # User timezone from the joined users row - same normalization as the endpoints
+            user_timezone = normalize_timezone((habit.get('users') or {}).get('timezone'))
             user_tz = pytz.timezone(user_timezone)
-            user_now = datetime.now(user_tz)  # Changed from utc_now.astimezone(user_tz)
+            user_now = utc_now.astimezone(user_tz)
             today_user = user_now.date()
             
             logger.info(f"👤 User {user_id}: {user_timezone}, local time: {user_now.strftime('%a %H:%M')}")
             
             # Get all weekly habits for this user
-            user_weekly_habits = [h for h in weekly_habits.data if h['user_id'] == user_id]
+            user_weekly_habits = [h for h in habits if h['user_id'] == user_id]
             
             # Pre-fetch all weekly_habit_progress for all user habits to avoid N+1
             if user_weekly_habits:
@@ -83,7 +107,7 @@ async def check_weekly_penalties():
                     habit_ids = list(set(q['habit_id'] for q in progress_queries))
                     week_start_dates = list(set(q['week_start_date'] for q in progress_queries))
                     
-                    progress_result = supabase.table("weekly_habit_progress") \
+                    progress_result = await supabase.table("weekly_habit_progress") \
                         .select("*") \
                         .in_("habit_id", habit_ids) \
                         .in_("week_start_date", week_start_dates) \
@@ -96,6 +120,8 @@ async def check_weekly_penalties():
                             progress_by_habit[key] = progress
             
             for weekly_habit in user_weekly_habits:
+                if run.is_done("weekly_habit", weekly_habit['id']):
+                    continue
                 try:
                     habit_week_start_day = weekly_habit.get('week_start_day', 0)
                     
@@ -140,6 +166,11 @@ async def check_weekly_penalties():
                         missed_count = weekly_habit['weekly_target']
                         logger.info(f"     📊 No progress found, missed all {missed_count} completions")
                     
+                    # A resumed run may have crashed between the insert and its checkpoint
+                    if missed_count > 0 and run.resumed and await penalty_exists(supabase, weekly_habit['id'], completed_week_end):
+                        logger.info(f"     ⏭️ Weekly penalty already created by an earlier attempt")
+                        missed_count = 0
+                    
                     if missed_count > 0:
                         # Create penalty for missed completions
                         penalty_amount = weekly_habit['penalty_amount'] * missed_count
@@ -155,7 +186,7 @@ async def check_weekly_penalties():
                             "reason": f"Weekly habit: missed {missed_count} completions for week {completed_week_start} to {completed_week_end}"
                         }
                         
-                        supabase.table("penalties").insert(penalty_data).execute()
+                        await supabase.table("penalties").insert(penalty_data).execute()
                         weekly_penalty_count += 1
                         
                         # Update recipient analytics with proper weekly tracking
@@ -170,7 +201,7 @@ async def check_weekly_penalties():
                                     actual_completions = current_progress['current_completions']
                                 
                                 await update_analytics_on_weekly_penalty_created(
-                                    supabase=async_supabase,
+                                    supabase=supabase,
                                     habit_id=weekly_habit['id'],
                                     recipient_id=recipient_id,
                                     penalty_amount=penalty_amount,
@@ -184,14 +215,17 @@ async def check_weekly_penalties():
                                 logger.error(f"     ❌ Error updating recipient analytics: {e}")
                         
                         # Decrement the streak when a weekly penalty is created
-                        await decrement_habit_streak_local(async_supabase, weekly_habit["id"])
+                        await decrement_habit_streak_local(supabase, weekly_habit["id"])
                         
                         logger.info(f"     💸 Created weekly penalty with proper analytics: ${penalty_amount} for {missed_count} missed completions")
                     else:
                         logger.info(f"     ✅ Weekly habit completed successfully")
+                    
+                    await run.mark_done("weekly_habit", weekly_habit['id'], penalties_created=1 if missed_count > 0 else 0)
                 
                 except Exception as e:
                     logger.error(f"Error processing weekly habit {weekly_habit.get('id')}: {e}")
+                    user_failed = True
                     continue
             
             # After processing regular weekly habits, check weekly gaming habits
@@ -206,7 +240,7 @@ async def check_weekly_penalties():
                 if yesterday == week_end:
                     from .gaming_habits import check_weekly_gaming_habits_for_penalties
                     gaming_penalties = await check_weekly_gaming_habits_for_penalties(
-                        supabase, async_supabase, user_id, week_start, week_end
+                        supabase, user_id, week_start, week_end
                     )
                     if gaming_penalties > 0:
                         logger.info(f"🎮 Created {gaming_penalties} weekly gaming penalties")
@@ -215,26 +249,45 @@ async def check_weekly_penalties():
                     # Also check weekly GitHub habits for this completed week
                     from .github_habits import check_weekly_github_habits_for_penalties
                     github_penalties = await check_weekly_github_habits_for_penalties(
-                        supabase, async_supabase, user_id, week_start, week_end
+                        supabase, user_id, week_start, week_end
                     )
                     if github_penalties > 0:
                         logger.info(f"📝 Created {github_penalties} weekly GitHub penalties")
                         weekly_penalty_count += github_penalties
                     
                     # Check weekly LeetCode habits for this completed week
-                    from .leetcode_habits import check_weekly_leetcode_habits_for_penalties
-                    leetcode_penalties = await check_weekly_leetcode_habits_for_penalties(
-                        supabase, async_supabase, user_id, week_start, week_end
-                    )
+                    from .leetcode_habits import check_weekly_leetcode_habits_for_penalties, LeetCodeCountUnavailable
+                    try:
+                        leetcode_penalties = await check_weekly_leetcode_habits_for_penalties(
+                            supabase, user_id, week_start, week_end
+                        )
+                    except LeetCodeCountUnavailable as e:
+                        # Not charged on a stale count: the user stays open and a resume retries them
+                        logger.warning(f"⏳ {e}")
+                        leetcode_penalties = 0
+                        user_failed = True
                     if leetcode_penalties > 0:
                         logger.info(f"🧩 Created {leetcode_penalties} weekly LeetCode penalties")
                         weekly_penalty_count += leetcode_penalties
+            
+            # Users with a failed habit stay open so a resume retries it
+            if user_failed:
+                failed_users += 1
+            else:
+                await run.mark_done("weekly", user_id)
         
         logger.info(f"📊 Weekly habit penalty summary:")
         logger.info(f"   • Users processed: {len(users_processed_weekly)}")
         logger.info(f"   • Weekly penalties created: {weekly_penalty_count}")
         logger.info("💡 Note: Payment processing for these penalties will be handled by the hourly payment task")
         
+        stats = {"users": len(users_processed_weekly), "penalties_created": weekly_penalty_count}
+        if failed_users:
+            await run.fail(f"{failed_users} users had weekly habits that failed to process", stats)
+        else:
+            await run.complete(stats)
+        
     except Exception as e:
         logger.error(f"Error in check_weekly_penalties: {e}")
+        await run.fail(str(e))
         raise 
\ No newline at end of file
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Tests for scheduler job coordination: two workers sharing one SQLiteLeaseStore must run
+every shard of a run exactly once, and a worker that loses its lease must stop.
+
+Run with `python test_job_coordination.py` or pytest from backend/app.
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from tasks.job_coordination import JobCoordinator, SQLiteLeaseStore, Shard, shard_of
+
+LEASE = "job:0/1"
+TTL = 60
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+async def _acquire_conditions():
+    clock = FakeClock()
+    store = SQLiteLeaseStore(":memory:", clock=clock)
+
+    assert await store.acquire(LEASE, "a", "run-1", TTL)
+    # Held by another worker
+    assert not await store.acquire(LEASE, "b", "run-1", TTL)
+    # Same owner may take it again (e.g. a retried job on the same worker)
+    assert await store.acquire(LEASE, "a", "run-1", TTL)
+
+    # Expired: anyone may take it over, and the old owner can no longer renew it
+    clock.now += TTL + 1
+    assert await store.acquire(LEASE, "b", "run-1", TTL)
+    assert not await store.renew(LEASE, "a", TTL)
+    assert await store.renew(LEASE, "b", TTL)
+
+    # A completed run is never re-acquired, even once the lease is free; the next run is
+    await store.complete(LEASE, "b", "run-1")
+    assert not await store.acquire(LEASE, "a", "run-1", TTL)
+    assert not await store.acquire(LEASE, "b", "run-1", TTL)
+    assert await store.acquire(LEASE, "a", "run-2", TTL)
+
+    # Released without completing: another worker may retry the same run at once
+    await store.release(LEASE, "a")
+    assert await store.acquire(LEASE, "b", "run-2", TTL)
+
+async def _workers_split_a_run():
+    store = SQLiteLeaseStore(":memory:", clock=FakeClock())
+    ran = []
+
+    def coordinator(worker_id):
+        return JobCoordinator(store, worker_id=worker_id, shard_count=4, lease_ttl=TTL, heartbeat_interval=1)
+
+    def job_for(worker_id):
+        async def job(shard: Shard):
+            ran.append((worker_id, shard.index))
+            await asyncio.sleep(0.01)
+        return job
+
+    a, b = coordinator("worker-a"), coordinator("worker-b")
+    executed = await asyncio.gather(
+        a.run("penalties", job_for("worker-a"), True, "run-1"),
+        b.run("penalties", job_for("worker-b"), True, "run-1")
+    )
+
+    # Every shard ran exactly once, split between the workers
+    assert sorted(index for _, index in ran) == [0, 1, 2, 3]
+    assert sum(executed) == 4 and {worker for worker, _ in ran} == {"worker-a", "worker-b"}
+
+    # Completed shards aren't re-run for the same run key, by either worker
+    assert await a.run("penalties", job_for("worker-a"), True, "run-1") == 0
+    assert await b.run("penalties", job_for("worker-b"), True, "run-1") == 0
+    assert len(ran) == 4
+
+    # An unsharded job is leader election: one worker runs it per run
+    ran.clear()
+    executed = await asyncio.gather(
+        a.run("digest", lambda: job_for("worker-a")(Shard(0, 1)), False, "run-1"),
+        b.run("digest", lambda: job_for("worker-b")(Shard(0, 1)), False, "run-1")
+    )
+    assert sorted(executed) == [0, 1] and len(ran) == 1
+
+async def _failed_shard_is_retried():
+    store = SQLiteLeaseStore(":memory:", clock=FakeClock())
+    a = JobCoordinator(store, worker_id="worker-a", shard_count=1, lease_ttl=TTL, heartbeat_interval=1)
+    b = JobCoordinator(store, worker_id="worker-b", shard_count=1, lease_ttl=TTL, heartbeat_interval=1)
+
+    async def failing(shard):
+        raise ConnectionError("database unavailable")
+
+    async def succeeding(shard):
+        return None
+
+    # The failed shard is released, not completed, so another worker retries the run
+    assert await a.run("penalties", failing, True, "run-1") == 0
+    assert await b.run("penalties", succeeding, True, "run-1") == 1
+    assert await a.run("penalties", succeeding, True, "run-1") == 0
+
+async def _lost_lease_cancels_the_shard():
+    clock = FakeClock()
+    store = SQLiteLeaseStore(":memory:", clock=clock)
+    a = JobCoordinator(store, worker_id="worker-a", shard_count=1, lease_ttl=TTL, heartbeat_interval=0.01)
+    started, cancelled = asyncio.Event(), []
+
+    async def slow_job(shard):
+        started.set()
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.append(shard.index)
+            raise
+
+    running = asyncio.create_task(a.run("penalties", slow_job, True, "run-1"))
+    await started.wait()
+
+    # Worker a stalls past the lease TTL and worker b takes the lease over
+    clock.now += TTL + 1
+    assert await store.acquire("penalties:0/1", "worker-b", "run-1", TTL)
+
+    # a's next heartbeat finds the lease gone and cancels its copy of the shard
+    assert await asyncio.wait_for(running, timeout=5) == 0
+    assert cancelled == [0]
+    # b still holds the lease; a's release didn't free it
+    assert not await store.acquire("penalties:0/1", "worker-c", "run-1", TTL)
+
+def test_shards_are_disjoint():
+    users = [f"user-{i}" for i in range(200)]
+    shards = [Shard(index, 4) for index in range(4)]
+    for user in users:
+        assert [shard.owns(user) for shard in shards].count(True) == 1
+        assert shards[shard_of(user, 4)].owns(user)
+    assert sorted(row["user_id"] for shard in shards for row in shard.filter([{"user_id": u} for u in users])) == sorted(users)
+    assert all(Shard(0, 1).owns(user) for user in users)
+
+def test_acquire_conditions():
+    asyncio.run(_acquire_conditions())
+
+def test_workers_split_a_run():
+    asyncio.run(_workers_split_a_run())
+
+def test_failed_shard_is_retried():
+    asyncio.run(_failed_shard_is_retried())
+
+def test_lost_lease_cancels_the_shard():
+    asyncio.run(_lost_lease_cancels_the_shard())
+
+if __name__ == "__main__":
+    test_shards_are_disjoint()
+    test_acquire_conditions()
+    test_workers_split_a_run()
+    test_failed_shard_is_retried()
+    test_lost_lease_cancels_the_shard()
+    print("✅ Job coordination tests passed")
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Tests for LeetCodeCalendarStore freshness: penalty checks must not count a finished day
+from a calendar refreshed before the day ended.
+
+Run with `python test_leetcode_calendar.py` or pytest from backend/app.
+"""
+
+import asyncio
+import os
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.leetcode_api import LeetCodeAPI
+from utils.leetcode_calendar import LeetCodeCalendarStore, utc_day_end
+
+DAY = date(2026, 3, 9)
+
+class FakeLeetCode:
+    """Stands in for LeetCodeAPI.get_calendar_data; returns None while `down`"""
+
+    def __init__(self):
+        self.fetches = 0
+        self.accepted = []
+        self.down = False
+
+    async def get_calendar_data(self, username):
+        self.fetches += 1
+        await asyncio.sleep(0)
+        if self.down:
+            return None
+        return {"accepted": list(self.accepted), "submission_calendar": None}
+
+    def solve(self, slug: str, moment: datetime):
+        self.accepted.append({"titleSlug": slug, "timestamp": str(int(moment.timestamp()))})
+
+async def _min_refreshed_at_forces_refresh():
+    fake = FakeLeetCode()
+    original = LeetCodeAPI.get_calendar_data
+    LeetCodeAPI.get_calendar_data = fake.get_calendar_data
+    try:
+        store = LeetCodeCalendarStore(refresh_seconds=300)
+        fake.solve("two-sum", datetime(2026, 3, 9, 12, tzinfo=timezone.utc))
+        calendar = await store.get("Coder")
+        assert calendar.problems.total(DAY) == 1 and fake.fetches == 1
+
+        # Inside refresh_seconds a plain read is served from the cache
+        fake.solve("add-two-numbers", datetime(2026, 3, 9, 23, 59, tzinfo=timezone.utc))
+        assert (await store.get("coder")).problems.total(DAY) == 1 and fake.fetches == 1
+
+        # A calendar refreshed before the cutoff is refreshed; concurrent readers share it
+        cutoff = calendar.refreshed_at + timedelta(microseconds=1)
+        calendars = await asyncio.gather(*(store.get("coder", min_refreshed_at=cutoff) for _ in range(3)))
+        assert fake.fetches == 2
+        assert [c.problems.total(DAY) for c in calendars] == [2, 2, 2]
+
+        # Already fresh enough: no request
+        assert (await store.get("coder", min_refreshed_at=cutoff)).problems.total(DAY) == 2
+        assert fake.fetches == 2
+
+        # A failed refresh serves the old calendar to plain reads, but not past a cutoff
+        fake.down = True
+        later = calendars[0].refreshed_at + timedelta(microseconds=1)
+        assert await store.get("coder", min_refreshed_at=later) is None
+        assert (await store.get("coder")).problems.total(DAY) == 2
+    finally:
+        LeetCodeAPI.get_calendar_data = original
+
+async def _penalty_count_unknown_until_day_ends():
+    fake = FakeLeetCode()
+    original = LeetCodeAPI.get_calendar_data
+    LeetCodeAPI.get_calendar_data = fake.get_calendar_data
+    try:
+        fake.solve("two-sum", datetime.now(timezone.utc))
+        today = datetime.now(timezone.utc).date()
+
+        # Today hasn't ended: no calendar can be fresh enough, so the count is unknown
+        assert await LeetCodeAPI.get_daily_problems_solved("coder-2", today, min_refreshed_at=utc_day_end(today)) is None
+        # Yesterday has: counted from a calendar refreshed now
+        yesterday = today - timedelta(days=1)
+        assert await LeetCodeAPI.get_daily_problems_solved("coder-2", yesterday, min_refreshed_at=utc_day_end(yesterday)) == 0
+        assert utc_day_end(DAY) == datetime(2026, 3, 10, tzinfo=timezone.utc)
+    finally:
+        LeetCodeAPI.get_calendar_data = original
+
+def test_min_refreshed_at_forces_refresh():
+    asyncio.run(_min_refreshed_at_forces_refresh())
+
+def test_penalty_count_unknown_until_day_ends():
+    asyncio.run(_penalty_count_unknown_until_day_ends())
+
+if __name__ == "__main__":
+    test_min_refreshed_at_forces_refresh()
+    test_penalty_count_unknown_until_day_ends()
+    print("✅ LeetCode calendar tests passed")
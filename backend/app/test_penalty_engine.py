@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Tests for the daily penalty engine's in-memory planning: which users are due at the check
+hour, and which of their habits missed the due day.
+
+Run with `python test_penalty_engine.py` or pytest from backend/app.
+"""
+
+import os
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from tasks.penalty_engine import DueDay, plan_missed_penalties, postgres_weekday, resolve_due_days, weekday_mask
+
+CHECK_HOUR = 1
+MONDAY = date(2026, 3, 9)  # Postgres weekday 1
+
+def _utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+def _habit(habit_id: str, user_id: str = "user-1", created_at: str = "2026-01-01T00:00:00Z", weekdays=range(7), tz: str = "UTC"):
+    return {
+        "id": habit_id, "user_id": user_id, "name": habit_id, "created_at": created_at,
+        "weekdays": list(weekdays), "penalty_amount": 5, "recipient_id": None,
+        "users": {"timezone": tz}
+    }
+
+def test_weekdays_use_postgres_numbering():
+    assert postgres_weekday(MONDAY) == 1
+    assert postgres_weekday(MONDAY - timedelta(days=1)) == 0  # Sunday
+    assert postgres_weekday(MONDAY + timedelta(days=5)) == 6  # Saturday
+    assert weekday_mask([0, 6]) == 0b1000001 and weekday_mask(None) == 0
+
+    due = {"user-1": DueDay("UTC", MONDAY)}
+    habits = [
+        _habit("monday", weekdays=[1]),
+        _habit("weekends", weekdays=[0, 6]),
+        _habit("python-monday", weekdays=[0]),  # Python's Monday number: must not match
+        _habit("never", weekdays=[])
+    ]
+    penalties, stats = plan_missed_penalties(habits, due, {})
+    assert [p["habit_id"] for p in penalties] == ["monday"]
+    assert stats["not_required"] == 3
+
+def test_first_day_grace_period_boundary():
+    due = {"user-1": DueDay("UTC", MONDAY)}
+    habits = [
+        _habit("created-day-before", created_at="2026-03-08T23:59:59Z"),
+        _habit("created-on-due-day", created_at="2026-03-09T00:00:00Z"),
+        _habit("created-after", created_at="2026-03-10T00:30:00Z")
+    ]
+    penalties, stats = plan_missed_penalties(habits, due, {})
+    assert [p["habit_id"] for p in penalties] == ["created-day-before"]
+    assert stats["grace_period"] == 2 and stats["missed"] == 1
+    assert penalties[0]["penalty_date"] == "2026-03-09" and penalties[0]["amount"] == 5
+
+def test_half_hour_zone_is_due_at_local_check_hour():
+    habits = [
+        _habit("kolkata", user_id="kolkata", tz="Asia/Kolkata"),
+        _habit("utc", user_id="utc", tz="UTC"),
+        _habit("unknown-zone", user_id="unknown", tz="Mars/Olympus")
+    ]
+
+    # 19:30 UTC is 01:00 in Kolkata (UTC+5:30): only that user is due, for their yesterday
+    due = resolve_due_days(habits, _utc(2026, 3, 9, 19, 30), CHECK_HOUR)
+    assert set(due) == {"kolkata"} and due["kolkata"].day == MONDAY
+
+    # On the hour UTC users (and unknown zones, read as UTC) are due instead
+    due = resolve_due_days(habits, _utc(2026, 3, 10, 1, 0), CHECK_HOUR)
+    assert set(due) == {"utc", "unknown"} and due["unknown"].timezone == "UTC"
+
+def test_verification_at_local_day_edges():
+    due = {"kolkata": DueDay("Asia/Kolkata", MONDAY)}
+    # Monday in Kolkata is 2026-03-08 18:30 .. 2026-03-09 18:29:59.999999 UTC
+    verifications = {
+        "at-start": [_utc(2026, 3, 8, 18, 30)],
+        "at-end": [_utc(2026, 3, 9, 18, 29, 59, 999999)],
+        "before-start": [_utc(2026, 3, 8, 18, 29, 59)],
+        "after-end": [_utc(2026, 3, 9, 18, 30)],
+    }
+    habits = [_habit(habit_id, user_id="kolkata", tz="Asia/Kolkata") for habit_id in verifications]
+    habits.append(_habit("not-due-user", user_id="someone-else"))
+
+    penalties, stats = plan_missed_penalties(habits, due, verifications)
+    assert sorted(p["habit_id"] for p in penalties) == ["after-end", "before-start"]
+    assert stats == {"evaluated": 4, "grace_period": 0, "not_required": 0, "verified": 2, "missed": 2}
+
+if __name__ == "__main__":
+    test_weekdays_use_postgres_numbering()
+    test_first_day_grace_period_boundary()
+    test_half_hour_zone_is_due_at_local_check_hour()
+    test_verification_at_local_day_edges()
+    print("✅ Penalty engine tests passed")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tests for hours_to_replay, which picks the penalty runs the resume job re-runs.
+
+Run with `python test_penalty_ledger.py` or pytest from backend/app.
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from tasks.penalty_ledger import PENALTY_RUN_STALE_MINUTES, hour_run_key, hours_to_replay
+
+NOW = datetime(2026, 3, 10, 12, 20, tzinfo=timezone.utc)
+CURRENT_HOUR = NOW.replace(minute=0)
+
+def _hour(hours_ago: int) -> datetime:
+    return CURRENT_HOUR - timedelta(hours=hours_ago)
+
+def _run(hours_ago: int, status: str, updated_at: datetime = None) -> tuple:
+    updated_at = updated_at or _hour(hours_ago) + timedelta(minutes=5)
+    return hour_run_key(_hour(hours_ago)), {"status": status, "updated_at": updated_at.isoformat()}
+
+def test_run_keys_are_utc_hours():
+    local = datetime(2026, 3, 10, 17, 50, tzinfo=timezone(timedelta(hours=5, minutes=30)))
+    assert hour_run_key(local) == "2026-03-10T12:00:00+00:00"
+
+def test_failed_stale_and_missing_hours_are_replayed():
+    runs = dict([
+        _run(6, "completed"),
+        _run(5, "failed"),
+        # 4 hours ago: never ran
+        _run(3, "running"),  # crashed: no progress since
+        _run(2, "running", updated_at=NOW - timedelta(minutes=PENALTY_RUN_STALE_MINUTES - 1)),  # still going
+        _run(1, "completed"),
+        _run(0, "failed")  # the current hour is left to the regular job
+    ])
+    assert hours_to_replay(runs, NOW, lookback_hours=6) == [_hour(5), _hour(4), _hour(3)]
+
+def test_history_before_the_oldest_run_is_not_replayed():
+    # Nothing recorded: the ledger was just enabled, nothing is "missed"
+    assert hours_to_replay({}, NOW, lookback_hours=24) == []
+
+    # Hours before the oldest recorded run are unrecorded history, not missed runs
+    runs = dict([_run(3, "completed")])
+    assert hours_to_replay(runs, NOW, lookback_hours=24) == [_hour(2), _hour(1)]
+
+    # Failed runs older than the lookback are left alone
+    runs = dict([_run(30, "failed"), _run(2, "completed"), _run(1, "completed")])
+    assert hours_to_replay(runs, NOW, lookback_hours=24) == [_hour(hours_ago) for hours_ago in range(24, 2, -1)]
+
+if __name__ == "__main__":
+    test_run_keys_are_utc_hours()
+    test_failed_stale_and_missing_hours_are_replayed()
+    test_history_before_the_oldest_run_is_not_replayed()
+    print("✅ Penalty ledger tests passed")
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+End-to-end test of the push outbox: pushes queued through NotificationService are
+coalesced, delivered by PushOutboxConsumer over a fake APNs client, retried with
+backoff and pruned once old enough.
+
+Run with `python test_push_outbox.py` or pytest from backend/app.
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import services.push_outbox as push_outbox_module
+from services.notification_service import notification_service
+from services.push_outbox import InMemoryPushOutbox, PushOutboxConsumer, retry_delay
+
+GOOD_TOKEN = "good-device-token"
+BAD_TOKEN = "bad-device-token"
+FLAKY_TOKEN = "flaky-device-token"
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+class FakeResponse:
+    def __init__(self, is_successful: bool, description: str = "", status: int = 200):
+        self.is_successful = is_successful
+        self.description = description
+        self.status = status
+
+class FakeAPNs:
+    """Accepts GOOD_TOKEN, rejects BAD_TOKEN and fails FLAKY_TOKEN's first attempt"""
+
+    def __init__(self):
+        self.delivered = []
+        self._flaky_failed = False
+
+    async def send_notification(self, request):
+        token = request.device_token
+        if token == BAD_TOKEN:
+            return FakeResponse(False, "BadDeviceToken", 400)
+        if token == FLAKY_TOKEN and not self._flaky_failed:
+            self._flaky_failed = True
+            raise ConnectionError("stream reset")
+        self.delivered.append((token, request.message))
+        return FakeResponse(True)
+
+async def _drain_end_to_end():
+    clock = FakeClock()
+    outbox = InMemoryPushOutbox(clock=clock)
+    apns = FakeAPNs()
+
+    original_outbox, original_client = push_outbox_module.push_outbox, notification_service.apns_client
+    push_outbox_module.push_outbox = outbox
+    notification_service.apns_client = apns
+    try:
+        tokens = [GOOD_TOKEN, BAD_TOKEN, FLAKY_TOKEN]
+        await notification_service.send_apns_notification(tokens, "Tickle", "Wake up", {"type": "tickle"})
+        # Same push again while pending: coalesced, not queued twice
+        await notification_service.send_apns_notification(tokens, "Tickle", "Wake up", {"type": "tickle"})
+
+        assert apns.delivered == [], "enqueue must not send inline"
+        assert len(outbox.rows("pending")) == 3
+
+        consumer = PushOutboxConsumer(outbox, worker_id="test-worker", batch_size=10)
+        assert await consumer.drain_once() == 3
+
+        assert [token for token, _ in apns.delivered] == [GOOD_TOKEN]
+        assert {row["device_token"] for row in outbox.rows("sent")} == {GOOD_TOKEN, BAD_TOKEN}
+        (retrying,) = outbox.rows("pending")
+        assert retrying["device_token"] == FLAKY_TOKEN and retrying["attempts"] == 1
+
+        # Not due until the backoff has elapsed
+        assert await consumer.drain_once() == 0
+        clock.now += retry_delay(1)
+        assert await consumer.drain_once() == 1
+
+        assert [token for token, _ in apns.delivered] == [GOOD_TOKEN, FLAKY_TOKEN]
+        assert outbox.rows("pending") == []
+        assert apns.delivered[0][1]["aps"]["alert"]["title"] == "Tickle"
+
+        # Finished rows are pruned only once older than the retention window
+        await outbox.prune(days=7)
+        assert len(outbox.rows()) == 3
+        clock.now += 8 * 86400
+        await outbox.enqueue([(GOOD_TOKEN, {"type": "later"}, "later")])
+        await outbox.prune(days=7)
+        assert [row["status"] for row in outbox.rows()] == ["pending"]
+    finally:
+        push_outbox_module.push_outbox = original_outbox
+        notification_service.apns_client = original_client
+
+async def _inline_fallback_when_enqueue_fails():
+    class BrokenOutbox(InMemoryPushOutbox):
+        async def enqueue(self, messages):
+            raise ConnectionError("database unavailable")
+
+    apns = FakeAPNs()
+    original_outbox, original_client = push_outbox_module.push_outbox, notification_service.apns_client
+    push_outbox_module.push_outbox = BrokenOutbox()
+    notification_service.apns_client = apns
+    try:
+        await notification_service.send_apns_notification([GOOD_TOKEN], "Tickle", "Wake up", {"type": "tickle"})
+        assert [token for token, _ in apns.delivered] == [GOOD_TOKEN]
+    finally:
+        push_outbox_module.push_outbox = original_outbox
+        notification_service.apns_client = original_client
+
+async def _sender_errors_reschedule_the_batch():
+    class MaxAttemptsExceeded(Exception):
+        pass
+
+    async def failing_sender(messages, supabase_client=None):
+        raise MaxAttemptsExceeded("connection pool exhausted")
+
+    clock = FakeClock()
+    outbox = InMemoryPushOutbox(clock=clock)
+    await outbox.enqueue([(GOOD_TOKEN, {"type": "tickle"}, "tickle"), (GOOD_TOKEN, {"type": "nudge"}, "nudge")])
+
+    consumer = PushOutboxConsumer(outbox, worker_id="test-worker", batch_size=10, sender=failing_sender)
+    assert await consumer.drain_once() == 2
+
+    rows = outbox.rows("pending")
+    assert len(rows) == 2
+    assert all(row["attempts"] == 1 and row["claimed_by"] is None for row in rows)
+    assert all(row["last_error"] == "connection pool exhausted" for row in rows)
+
+    # Not due until the backoff has elapsed
+    assert await consumer.drain_once() == 0
+
+    # Retried once the backoff has elapsed, with a sender that works again
+    clock.now += retry_delay(1)
+    apns = FakeAPNs()
+    original_client = notification_service.apns_client
+    notification_service.apns_client = apns
+    try:
+        assert await PushOutboxConsumer(outbox, worker_id="test-worker", batch_size=10).drain_once() == 2
+    finally:
+        notification_service.apns_client = original_client
+    assert len(outbox.rows("sent")) == 2
+
+def test_outbox_drains_end_to_end():
+    asyncio.run(_drain_end_to_end())
+
+def test_inline_fallback_when_enqueue_fails():
+    asyncio.run(_inline_fallback_when_enqueue_fails())
+
+def test_sender_errors_reschedule_the_batch():
+    asyncio.run(_sender_errors_reschedule_the_batch())
+
+if __name__ == "__main__":
+    test_outbox_drains_end_to_end()
+    test_inline_fallback_when_enqueue_fails()
+    test_sender_errors_reschedule_the_batch()
+    print("✅ Push outbox tests passed")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for get_changed_sections, which decides what /api/sync/delta re-sends for a cursor.
+
+Run with `python test_sync_cursor.py` or pytest from backend/app.
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from routers.sync.services.sync_cursor_service import (
+    ALL_SECTIONS,
+    FRIEND_RECOMMENDATIONS_MAX_AGE,
+    SIGNED_URL_SECTIONS,
+    SIGNED_URL_SECTIONS_MAX_AGE,
+    get_changed_sections
+)
+from utils.storage.url_generation import _signed_url_cache_ttl
+
+NOW = datetime(2026, 3, 10, 15, 0, tzinfo=timezone.utc)
+
+def test_no_cursor_loads_everything():
+    assert get_changed_sections({}, None, now=NOW) == ALL_SECTIONS
+    assert get_changed_sections(None, NOW, now=NOW) == ALL_SECTIONS
+
+def test_recent_cursor_with_nothing_changed_is_empty():
+    assert get_changed_sections({}, NOW - timedelta(minutes=5), now=NOW) == set()
+
+def test_watermark_selects_dependent_sections():
+    watermarks = {'profile': NOW - timedelta(minutes=1), 'habits': NOW - timedelta(days=2)}
+    changed = get_changed_sections(watermarks, NOW - timedelta(minutes=5), now=NOW)
+    assert changed == {'payment_method', 'onboarding_state', 'user_profile'}
+
+def test_signed_url_sections_refreshed_once_cached_urls_may_expire():
+    assert SIGNED_URL_SECTIONS_MAX_AGE == timedelta(seconds=_signed_url_cache_ttl)
+    assert SIGNED_URL_SECTIONS == {'feed_posts', 'user_profile', 'verification_data'}
+
+    # Inside the URL cache TTL nothing is forced
+    fresh = NOW - SIGNED_URL_SECTIONS_MAX_AGE + timedelta(minutes=5)
+    assert get_changed_sections({}, fresh, now=NOW) == set()
+
+    # Past it the URL-bearing sections are re-sent, so the response is never a 304
+    stale = NOW - SIGNED_URL_SECTIONS_MAX_AGE - timedelta(seconds=1)
+    changed = get_changed_sections({}, stale, now=NOW)
+    assert SIGNED_URL_SECTIONS <= changed
+    assert 'habits' not in changed and 'friends' not in changed
+
+def test_day_rollover_and_recommendations():
+    # Yesterday in the user's timezone: today's verifications and progress are stale
+    changed = get_changed_sections({}, NOW - timedelta(days=1), "America/New_York", now=NOW)
+    assert {'verification_data', 'weekly_progress', 'friend_recommendations'} <= changed
+
+    almost = NOW - FRIEND_RECOMMENDATIONS_MAX_AGE + timedelta(minutes=1)
+    assert 'friend_recommendations' not in get_changed_sections({}, almost, now=NOW)
+
+if __name__ == "__main__":
+    test_no_cursor_loads_everything()
+    test_recent_cursor_with_nothing_changed_is_empty()
+    test_watermark_selects_dependent_sections()
+    test_signed_url_sections_refreshed_once_cached_urls_may_expire()
+    test_day_rollover_and_recommendations()
+    print("✅ Sync cursor tests passed")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Tests for TTLCache.get_or_load single-flight loading.
+
+Run with `python test_ttl_cache.py` or pytest from backend/app.
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.ttl_cache import TTLCache
+
+async def _cancelled_leader_hands_over_to_waiters():
+    cache = TTLCache("test_cancelled_leader", max_entries=10, ttl=60)
+    started = []
+    release = asyncio.Event()
+
+    async def loader():
+        started.append(len(started))
+        await release.wait()
+        return f"value-{len(started)}"
+
+    leader = asyncio.create_task(cache.get_or_load("key", loader))
+    await asyncio.sleep(0)
+    waiters = [asyncio.create_task(cache.get_or_load("key", loader)) for _ in range(2)]
+    await asyncio.sleep(0)
+    assert len(started) == 1 and cache.coalesced == 2
+
+    leader.cancel()
+    await asyncio.gather(leader, return_exceptions=True)
+    assert leader.cancelled()
+
+    # One waiter takes over the load, the other coalesces onto it
+    await asyncio.sleep(0)
+    assert len(started) == 2
+    release.set()
+    results = await asyncio.gather(*waiters)
+
+    assert results == ["value-2", "value-2"]
+    assert cache.get("key") == "value-2"
+
+async def _loader_errors_reach_waiters():
+    cache = TTLCache("test_loader_error", max_entries=10, ttl=60)
+    release = asyncio.Event()
+
+    async def loader():
+        await release.wait()
+        raise ValueError("upstream failed")
+
+    tasks = [asyncio.create_task(cache.get_or_load("key", loader)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert "key" not in cache and cache.loads == 1
+
+def test_cancelled_leader_hands_over_to_waiters():
+    asyncio.run(_cancelled_leader_hands_over_to_waiters())
+
+def test_loader_errors_reach_waiters():
+    asyncio.run(_loader_errors_reach_waiters())
+
+if __name__ == "__main__":
+    test_cancelled_leader_hands_over_to_waiters()
+    test_loader_errors_reach_waiters()
+    print("✅ TTLCache tests passed")
@@ -5,10 +5,13 @@ from .storage import (
     generate_profile_photo_url,
     generate_post_image_url,
     generate_post_image_urls,
+    generate_post_image_urls_batch,
     generate_verification_image_url,
     generate_verification_image_urls,
     generate_identity_snapshot_url,
     generate_signed_url_optimized,
+    generate_signed_urls_batch,
+    generate_cached_signed_urls,
     upload_to_supabase_storage_with_retry,
     upload_to_supabase_storage_with_cache_control,
     async_upload_to_supabase_storage_with_retry
@@ -39,6 +42,8 @@ from .data import (
     fetch_with_coordination,
     parallel_data_processing,
     DataFetcher,
+    SingleFlight,
+    coalesced_execute,
     get_user_timezone,
     get_user_date_range_in_timezone,
     get_week_boundaries_in_timezone
@@ -51,6 +56,9 @@ from .monitoring import (
     log_memory_usage,
     get_system_memory_info,
     get_aws_rekognition_client,
+    get_async_rekognition,
+    RekognitionUnavailableError,
+    RekognitionTimeoutError,
     cleanup_aws_clients
 )
 
@@ -58,11 +66,14 @@ __all__ = [
     # Storage utilities
     "generate_profile_photo_url",
     "generate_post_image_url",
-    "generate_post_image_urls", 
+    "generate_post_image_urls",
+    "generate_post_image_urls_batch", 
     "generate_verification_image_url",
     "generate_verification_image_urls",
     "generate_identity_snapshot_url",
     "generate_signed_url_optimized",
+    "generate_signed_urls_batch",
+    "generate_cached_signed_urls",
     "upload_to_supabase_storage_with_retry",
     "upload_to_supabase_storage_with_cache_control",
     "async_upload_to_supabase_storage_with_retry",
@@ -87,6 +98,8 @@ __all__ = [
     "fetch_with_coordination",
     "parallel_data_processing",
     "DataFetcher",
+    "SingleFlight",
+    "coalesced_execute",
     "get_user_timezone",
     "get_user_date_range_in_timezone",
     "get_week_boundaries_in_timezone",
@@ -97,5 +110,8 @@ __all__ = [
     "log_memory_usage",
     "get_system_memory_info",
     "get_aws_rekognition_client",
+    "get_async_rekognition",
+    "RekognitionUnavailableError",
+    "RekognitionTimeoutError",
     "cleanup_aws_clients"
 ] 
\ No newline at end of file
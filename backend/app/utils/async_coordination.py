@@ -1,5 +1,8 @@
 import asyncio
-from typing import Any, Coroutine, List, TypeVar, Callable, Dict, Optional
+import copy
+import hashlib
+import json
+from typing import Any, Coroutine, List, TypeVar, Callable, Dict, Hashable, Optional
 from utils.memory_optimization import AsyncCoordinator, cleanup_memory, memory_optimized
 import logging
 
@@ -112,14 +115,132 @@ async def parallel_data_processing(
         if cleanup_batches:
             cleanup_memory(data_items, tasks if 'tasks' in locals() else None, results if 'results' in locals() else None)
 
+class SingleFlight:
+    """
+    Coalesce identical concurrent async calls within a worker.
+    
+    The first caller for a key runs the function; callers arriving while it is in
+    flight await the same result instead of issuing their own call. Nothing is
+    cached - once the call completes the next caller starts a fresh one.
+    
+    Example:
+        flight = SingleFlight()
+        friends = await flight.do(("friends", user_id), lambda: load_friends(user_id))
+    """
+    
+    def __init__(self):
+        self._inflight: Dict[Hashable, list] = {}  # key -> [future, waiter count]
+        self.calls = 0
+        self.coalesced = 0
+    
+    async def do(self, key: Hashable, func: Callable[[], Coroutine[Any, Any, T]], copy_result: bool = True) -> T:
+        """
+        Run func() once for all concurrent callers with the same key.
+        
+        Args:
+            key: Identity of the call (must be hashable)
+            func: Zero-argument coroutine function
+            copy_result: Give each caller its own deep copy when a result was shared,
+                so one caller mutating rows can't affect another
+            
+        Returns:
+            The call's result. Exceptions propagate to every caller.
+        """
+        entry = self._inflight.get(key)
+        if entry is not None:
+            entry[1] += 1
+            self.coalesced += 1
+            try:
+                result = await asyncio.shield(entry[0])
+            except asyncio.CancelledError:
+                if entry[0].cancelled():
+                    # The leading caller was cancelled, not us - run the call ourselves
+                    return await self.do(key, func, copy_result)
+                raise
+            return copy.deepcopy(result) if copy_result else result
+        
+        entry = [asyncio.get_running_loop().create_future(), 0]
+        self._inflight[key] = entry
+        self.calls += 1
+        try:
+            result = await func()
+        except BaseException as e:
+            if self._inflight.get(key) is entry:
+                del self._inflight[key]
+            if isinstance(e, asyncio.CancelledError):
+                entry[0].cancel()
+            else:
+                entry[0].set_exception(e)
+                entry[0].exception()  # Mark retrieved - there may be no waiters
+            raise
+        
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+        entry[0].set_result(result)
+        
+        # Waiters can only join while the key is registered, so the count is final here
+        return copy.deepcopy(result) if copy_result and entry[1] else result
+
+# Process-wide single-flight group for database reads
+DEFAULT_SINGLE_FLIGHT = SingleFlight()
+
+def _query_key(builder) -> Optional[tuple]:
+    """
+    Identity of a postgrest request builder: method, path, query params, body and
+    credentials. Returns None for writes, which must never be coalesced.
+    """
+    method = getattr(builder, "http_method", None)
+    path = getattr(builder, "path", None)
+    if method is None or path is None:
+        return None
+    path = str(path)
+    if method not in ("GET", "HEAD") and "rpc/" not in path:
+        return None
+    
+    headers = getattr(builder, "headers", None) or {}
+    authorization = headers.get("authorization") or headers.get("Authorization") or ""
+    body = getattr(builder, "json", None)
+    return (
+        "postgrest",
+        method,
+        path,
+        str(getattr(builder, "params", "")),
+        json.dumps(body, sort_keys=True, default=str) if body else "",
+        hashlib.sha256(str(authorization).encode()).hexdigest()
+    )
+
+async def coalesced_execute(builder, single_flight: Optional[SingleFlight] = None):
+    """
+    Execute a read-only postgrest query (table select or read-only RPC), sharing
+    the in-flight response with identical concurrent queries in this worker.
+    
+    Only use this for RPCs without side effects - any RPC path is treated as a read.
+    
+    Example:
+        result = await coalesced_execute(supabase.rpc("get_user_friends", {"user_id": user_id}))
+    """
+    key = _query_key(builder)
+    if key is None:
+        return await builder.execute()
+    return await (single_flight or DEFAULT_SINGLE_FLIGHT).do(key, builder.execute)
+
 class DataFetcher:
     """
     A reusable class for coordinated data fetching with memory optimization.
     Use this for consistent data fetching patterns across your app.
+    
+    Identical reads issued by the fetch functions (within one fetch_multiple call or
+    across concurrent requests) are coalesced when they go through fetch_once() or
+    coalesced_execute(), which share the same process-wide SingleFlight.
     """
     
-    def __init__(self, max_concurrent: int = 16):
+    def __init__(self, max_concurrent: int = 16, single_flight: Optional[SingleFlight] = None):
         self.coordinator = AsyncCoordinator(max_concurrent=max_concurrent)
+        self.single_flight = single_flight or DEFAULT_SINGLE_FLIGHT
+    
+    async def fetch_once(self, key: Hashable, func: Callable[[], Coroutine[Any, Any, T]]) -> T:
+        """Run func() once for all concurrent callers using the same key"""
+        return await self.single_flight.do(key, func)
     
     @memory_optimized(cleanup_args=False)
     async def fetch_multiple(
@@ -0,0 +1,226 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+from supabase._async.client import AsyncClient
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Principal cache: token hash -> users row, so authenticated requests skip the users SELECT.
+# TTL is short because profile updates on *other* workers can only be seen after expiry.
+_principal_cache: "OrderedDict[str, dict]" = OrderedDict()
+_user_token_hashes: Dict[str, Set[str]] = {}  # user_id -> token hashes, for invalidation
+_principal_cache_size_limit = 2000
+_principal_cache_ttl = 30  # 30 seconds
+
+# Blacklist refresh cadence - a token revoked on another worker is honoured here
+# within this many seconds (local logouts are honoured immediately)
+_blacklist_refresh_interval = 15
+_blacklist_page_size = 1000
+
+# Confirmed-revoked token hashes are remembered until the token expires (tokens without an
+# exp claim for this long); past that or the size limit they are just re-checked.
+_confirmed_cache_size_limit = 10_000
+_confirmed_cache_ttl = 24 * 3600
+
+def hash_token(token: str) -> str:
+    """Stable hash used as the cache key for a bearer token (raw tokens are never stored)"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _remaining_lifetime(token: str) -> float:
+    """Seconds until a JWT's exp claim (read without verification), capped at _confirmed_cache_ttl"""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        exp = claims.get("exp")
+    except (IndexError, ValueError, AttributeError):
+        exp = None
+    if not isinstance(exp, (int, float)):
+        return _confirmed_cache_ttl
+    # An expired token is still checked here before jwt.decode rejects it, so keep it a minute
+    return max(60.0, min(exp - time.time(), _confirmed_cache_ttl))
+
+class BloomFilter:
+    """Fixed-size Bloom filter over token hashes (no false negatives, tunable false positives)"""
+
+    def __init__(self, capacity: int = 100_000, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, token_hash: str):
+        # Double hashing over the already-uniform sha256 digest
+        h1 = int(token_hash[:16], 16)
+        h2 = int(token_hash[16:32], 16) | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, token_hash: str) -> None:
+        for pos in self._positions(token_hash):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, token_hash: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(token_hash))
+
+    @property
+    def is_saturated(self) -> bool:
+        return self.count > self.capacity
+
+class TokenBlacklist:
+    """
+    In-process view of the blacklisted_tokens table.
+
+    A Bloom filter answers "definitely not blacklisted" without a DB round-trip;
+    filter hits are confirmed against the table once and remembered. The filter
+    is loaded once and then refreshed incrementally by blacklisted_at.
+    """
+
+    def __init__(self):
+        self._filter: Optional[BloomFilter] = None
+        # Token hashes known to be blacklisted
+        self._confirmed = TTLCache("blacklisted_tokens", max_entries=_confirmed_cache_size_limit, ttl=_confirmed_cache_ttl)
+        self._watermark: Optional[str] = None  # Highest blacklisted_at seen
+        self._last_refresh = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _fetch_rows(self, supabase: AsyncClient, since: Optional[str]) -> list:
+        rows = []
+        offset = 0
+        while True:
+            query = supabase.table("blacklisted_tokens").select("token, blacklisted_at")
+            if since:
+                # gte, not gt: rows sharing the watermark timestamp may have landed after the last read
+                query = query.gte("blacklisted_at", since)
+            result = await query.order("blacklisted_at").range(offset, offset + _blacklist_page_size - 1).execute()
+            page = result.data or []
+            rows.extend(page)
+            if len(page) < _blacklist_page_size:
+                return rows
+            offset += _blacklist_page_size
+
+    def _apply_rows(self, rows: list) -> None:
+        for row in rows:
+            token = row.get("token")
+            if token:
+                self._filter.add(hash_token(token))
+            blacklisted_at = row.get("blacklisted_at")
+            if blacklisted_at and (self._watermark is None or blacklisted_at > self._watermark):
+                self._watermark = blacklisted_at
+
+    async def refresh(self, supabase: AsyncClient, force: bool = False) -> None:
+        """Load the filter on first use, then pull only rows newer than the watermark"""
+        if not force and self._filter is not None and time.monotonic() - self._last_refresh < _blacklist_refresh_interval:
+            return
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if not force and self._filter is not None and time.monotonic() - self._last_refresh < _blacklist_refresh_interval:
+                return
+
+            if self._filter is None or self._filter.is_saturated:
+                rows = await self._fetch_rows(supabase, None)
+                capacity = max(100_000, len(rows) * 2)
+                self._filter = BloomFilter(capacity=capacity)
+                self._watermark = None
+                self._apply_rows(rows)
+                logger.info(f"Loaded token blacklist filter: {len(rows)} tokens, {self._filter.num_bits // 8} bytes")
+            else:
+                self._apply_rows(await self._fetch_rows(supabase, self._watermark))
+
+            self._last_refresh = time.monotonic()
+
+    async def is_blacklisted(self, supabase: AsyncClient, token: str, token_hash: str) -> bool:
+        if self._confirmed.get(token_hash, False):
+            return True
+
+        try:
+            await self.refresh(supabase)
+        except Exception as e:
+            logger.warning(f"Token blacklist refresh failed, checking table directly: {e}")
+            self._filter = None
+
+        if self._filter is not None and token_hash not in self._filter:
+            return False
+
+        # Bloom hit (or no filter) - confirm against the table
+        result = await supabase.table("blacklisted_tokens").select("token").eq("token", token).limit(1).execute()
+        if result.data:
+            self._confirmed.set(token_hash, True, ttl=_remaining_lifetime(token))
+            return True
+        return False
+
+    def add(self, token_hash: str, ttl: Optional[float] = None) -> None:
+        """Record a token revoked by this worker so it is rejected immediately"""
+        self._confirmed.set(token_hash, True, ttl=ttl)
+        if self._filter is not None:
+            self._filter.add(token_hash)
+
+_token_blacklist = TokenBlacklist()
+
+async def is_token_blacklisted(supabase: AsyncClient, token: str, token_hash: Optional[str] = None) -> bool:
+    """Check whether a token has been revoked, usually without touching the database"""
+    return await _token_blacklist.is_blacklisted(supabase, token, token_hash or hash_token(token))
+
+def get_cached_principal(token_hash: str) -> Optional[dict]:
+    """Get the cached users row for a token if not expired"""
+    entry = _principal_cache.get(token_hash)
+    if entry is None:
+        return None
+    if time.monotonic() >= entry['expires_at']:
+        _drop_principal(token_hash)
+        return None
+    _principal_cache.move_to_end(token_hash)
+    return entry['user_data']
+
+def set_cached_principal(token_hash: str, user_id: str, user_data: dict) -> None:
+    """Cache the users row resolved for a token"""
+    _principal_cache[token_hash] = {
+        'user_id': user_id,
+        'user_data': user_data,
+        'expires_at': time.monotonic() + _principal_cache_ttl
+    }
+    _principal_cache.move_to_end(token_hash)
+    _user_token_hashes.setdefault(user_id, set()).add(token_hash)
+
+    # LRU eviction if cache is too large
+    while len(_principal_cache) > _principal_cache_size_limit:
+        oldest_hash = next(iter(_principal_cache))
+        _drop_principal(oldest_hash)
+
+def _drop_principal(token_hash: str) -> None:
+    entry = _principal_cache.pop(token_hash, None)
+    if entry is None:
+        return
+    hashes = _user_token_hashes.get(entry['user_id'])
+    if hashes is not None:
+        hashes.discard(token_hash)
+        if not hashes:
+            _user_token_hashes.pop(entry['user_id'], None)
+
+def revoke_token(token: str) -> None:
+    """
+    Invalidate a token locally. Call this on logout after inserting into blacklisted_tokens.
+    """
+    token_hash = hash_token(token)
+    _token_blacklist.add(token_hash, _remaining_lifetime(token))
+    _drop_principal(token_hash)
+
+def invalidate_user_principal(user_id: str) -> None:
+    """
+    Drop every cached principal for a user.
+    Call this when a users row field exposed on the User model changes.
+    """
+    for token_hash in list(_user_token_hashes.get(str(user_id), ())):
+        _drop_principal(token_hash)
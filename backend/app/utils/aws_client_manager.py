@@ -1,13 +1,26 @@
+import asyncio
 import boto3
 import threading
 import os
-from typing import Optional
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
 import weakref
 from utils.memory_optimization import cleanup_memory, disable_print
 
 # Disable verbose printing for performance
 print = disable_print()
 
+logger = logging.getLogger(__name__)
+T = TypeVar('T')
+
+# Rekognition calls run on a dedicated thread pool so they never block the event loop.
+# Timeouts must stay below the client's read_timeout, since a timed-out call keeps its
+# thread until boto3 gives up.
+REKOGNITION_POOL_SIZE = int(os.getenv("REKOGNITION_POOL_SIZE", "4"))
+REKOGNITION_CALL_TIMEOUT = float(os.getenv("REKOGNITION_CALL_TIMEOUT", "20"))
+
 class AWSClientManager:
     """
     Thread-safe singleton AWS client manager with proper lifecycle management.
@@ -51,7 +64,7 @@ class AWSClientManager:
                             'max_attempts': 2,  # Minimal retries
                             'mode': 'standard'
                         },
-                        max_pool_connections=3,  # Limit connection pool
+                        max_pool_connections=max(3, REKOGNITION_POOL_SIZE),  # One connection per pool thread
                         read_timeout=30,  # Prevent hanging
                         connect_timeout=10
                     )
@@ -115,15 +128,154 @@ class AWSClientManager:
             status[service_name] = "active" if client is not None else "inactive"
         return status
 
+class RekognitionUnavailableError(Exception):
+    """The Rekognition client could not be created"""
+
+class RekognitionTimeoutError(Exception):
+    """A Rekognition call did not finish within its timeout"""
+
+class AsyncRekognitionClient:
+    """
+    Async facade over the singleton Rekognition client.
+    
+    Blocking boto3 calls are submitted to a bounded thread pool and awaited with a
+    per-call timeout, so a slow verification no longer stalls the worker's event loop.
+    boto3 clients are thread-safe, so all pool threads share the manager's client.
+    
+    Example:
+        rekognition = get_async_rekognition()
+        response = await rekognition.compare_faces(
+            SourceImage={'Bytes': identity_bytes},
+            TargetImage={'Bytes': selfie_bytes},
+            SimilarityThreshold=80
+        )
+    """
+    
+    def __init__(
+        self,
+        manager: AWSClientManager,
+        max_workers: int = REKOGNITION_POOL_SIZE,
+        timeout: float = REKOGNITION_CALL_TIMEOUT
+    ):
+        self._manager = manager
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._in_flight = 0
+        self._metrics: Dict[str, Dict[str, float]] = {}
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="rekognition"
+                    )
+        return self._executor
+    
+    def is_available(self) -> bool:
+        return self._manager.get_rekognition_client() is not None
+    
+    def _record(self, operation: str, outcome: str, elapsed: float) -> None:
+        stats = self._metrics.setdefault(operation, {
+            "calls": 0, "errors": 0, "timeouts": 0, "total_seconds": 0.0, "max_seconds": 0.0
+        })
+        stats["calls"] += 1
+        if outcome != "ok":
+            stats[outcome] += 1
+        stats["total_seconds"] += elapsed
+        stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+    
+    async def run(
+        self,
+        func: Callable[[Any], T],
+        operation: str = "custom",
+        timeout: Optional[float] = None
+    ) -> T:
+        """
+        Run func(rekognition_client) on the Rekognition thread pool.
+        
+        Args:
+            func: Blocking callable taking the boto3 client
+            operation: Name used for metrics
+            timeout: Per-call timeout override in seconds
+            
+        Raises:
+            RekognitionUnavailableError: The client could not be created
+            RekognitionTimeoutError: The call exceeded its timeout
+        """
+        client = self._manager.get_rekognition_client()
+        if client is None:
+            raise RekognitionUnavailableError("Rekognition client unavailable")
+        
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        self._in_flight += 1
+        outcome = "ok"
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._get_executor(), func, client),
+                timeout=timeout or self.timeout
+            )
+        except asyncio.TimeoutError:
+            outcome = "timeouts"
+            logger.warning(f"Rekognition {operation} timed out after {timeout or self.timeout:g}s")
+            raise RekognitionTimeoutError(f"Rekognition {operation} timed out")
+        except Exception:
+            outcome = "errors"
+            raise
+        finally:
+            self._in_flight -= 1
+            self._record(operation, outcome, time.perf_counter() - started)
+    
+    async def compare_faces(self, **kwargs) -> Dict[str, Any]:
+        return await self.run(lambda client: client.compare_faces(**kwargs), "compare_faces")
+    
+    async def detect_moderation_labels(self, **kwargs) -> Dict[str, Any]:
+        return await self.run(lambda client: client.detect_moderation_labels(**kwargs), "detect_moderation_labels")
+    
+    async def detect_faces(self, **kwargs) -> Dict[str, Any]:
+        return await self.run(lambda client: client.detect_faces(**kwargs), "detect_faces")
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        operations = {}
+        for operation, stats in self._metrics.items():
+            operations[operation] = {
+                **stats,
+                "avg_seconds": round(stats["total_seconds"] / stats["calls"], 3) if stats["calls"] else 0.0
+            }
+        return {
+            "pool_size": self.max_workers,
+            "timeout_seconds": self.timeout,
+            "in_flight": self._in_flight,
+            "operations": operations
+        }
+    
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop the thread pool (pending calls are abandoned unless wait=True)"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=not wait)
+                self._executor = None
+
 # Global singleton instance
 _aws_manager = AWSClientManager()
 
+_async_rekognition = AsyncRekognitionClient(_aws_manager)
+
 def get_aws_rekognition_client() -> Optional[boto3.client]:
     """Get the singleton AWS Rekognition client"""
     return _aws_manager.get_rekognition_client()
 
+def get_async_rekognition() -> AsyncRekognitionClient:
+    """Get the thread-pool backed async Rekognition facade"""
+    return _async_rekognition
+
 def cleanup_aws_clients() -> None:
     """Clean up all AWS clients (useful for testing/shutdown)"""
+    _async_rekognition.shutdown()
     _aws_manager.cleanup_all_clients()
 
 def get_aws_client_status() -> dict:
@@ -0,0 +1,186 @@
+import hashlib
+import json
+from typing import Any, Iterable, List, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+# Fields that change on every response without the underlying data changing
+VOLATILE_FIELDS = frozenset({"last_modified", "data_timestamp"})
+
+class ConditionalRoute:
+    """Per-route conditional GET configuration"""
+
+    def __init__(
+        self,
+        path: str,
+        prefix: bool = False,
+        cache_control: Optional[str] = None,
+        max_body_bytes: int = 5 * 1024 * 1024
+    ):
+        self.path = path
+        self.prefix = prefix
+        self.cache_control = cache_control
+        self.max_body_bytes = max_body_bytes  # Larger bodies are streamed through without an ETag
+
+    def matches(self, path: str) -> bool:
+        if self.prefix:
+            return path == self.path or path.startswith(self.path.rstrip("/") + "/")
+        return path == self.path or path == self.path.rstrip("/") + "/"
+
+# Routes that get strong ETags and If-None-Match handling
+CONDITIONAL_ROUTES: List[ConditionalRoute] = [
+    ConditionalRoute("/api/sync/delta", cache_control="private, max-age=60"),
+    ConditionalRoute("/api/feed", prefix=True, cache_control="private, no-cache"),
+    ConditionalRoute("/api/friends", prefix=True, cache_control="private, no-cache"),
+]
+
+def _strip_volatile(value: Any, exclude: frozenset) -> Any:
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v, exclude) for k, v in value.items() if k not in exclude}
+    if isinstance(value, (list, tuple)):
+        return [_strip_volatile(v, exclude) for v in value]
+    return value
+
+def compute_payload_etag(payload: Any, exclude: Iterable[str] = VOLATILE_FIELDS) -> str:
+    """
+    Strong ETag for a JSON-able payload, stable across key order and volatile timestamps.
+    Pydantic models are dumped first so the hash matches what the client receives.
+    """
+    if hasattr(payload, "model_dump"):
+        payload = payload.model_dump(mode="json")
+    canonical = json.dumps(
+        _strip_volatile(payload, frozenset(exclude)),
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str
+    )
+    return f'"{hashlib.sha256(canonical.encode()).hexdigest()}"'
+
+def compute_body_etag(body: bytes) -> str:
+    """Strong ETag for an already-encoded response body"""
+    return f'"{hashlib.sha256(body).hexdigest()}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """RFC 7232 weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+def not_modified_response(etag: str, cache_control: Optional[str] = None) -> Response:
+    headers = {"ETag": etag, "Vary": "Authorization"}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    return Response(status_code=304, headers=headers)
+
+def check_not_modified(request, payload: Any) -> tuple:
+    """
+    Endpoint-side short circuit: hash the payload before FastAPI serializes it.
+
+    Returns:
+        (etag, response) where response is a 304 to return immediately, or None
+        if the client's copy is stale. The middleware reuses the ETag header set
+        by the endpoint instead of hashing the body again.
+    """
+    etag = compute_payload_etag(payload)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return etag, not_modified_response(etag)
+    return etag, None
+
+class ConditionalRequestMiddleware:
+    """
+    ASGI middleware adding strong ETags and 304 handling to configured GET routes.
+
+    Must sit inside GZipMiddleware so the hash covers the uncompressed (deterministic)
+    body. Responses that already carry an ETag are passed through, only honouring
+    If-None-Match.
+    """
+
+    def __init__(self, app, routes: Optional[List[ConditionalRoute]] = None):
+        self.app = app
+        self.routes = routes if routes is not None else CONDITIONAL_ROUTES
+
+    def _match(self, path: str) -> Optional[ConditionalRoute]:
+        for route in self.routes:
+            if route.matches(path):
+                return route
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        route = self._match(scope["path"])
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start_message = None
+        body_parts: List[bytes] = []
+        body_size = 0
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, body_size, passthrough
+
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                if message["status"] != 200:
+                    passthrough = True
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body_parts.append(message.get("body", b""))
+            body_size += len(body_parts[-1])
+
+            if body_size > route.max_body_bytes:
+                # Too large to buffer - stream what we have without an ETag
+                passthrough = True
+                await send(start_message)
+                await send({"type": "http.response.body", "body": b"".join(body_parts), "more_body": message.get("more_body", False)})
+                body_parts.clear()
+                return
+
+            if message.get("more_body", False):
+                return
+
+            await self._send_buffered(send, start_message, b"".join(body_parts), if_none_match, route)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _send_buffered(self, send, start_message, body: bytes, if_none_match: Optional[str], route: ConditionalRoute):
+        headers = MutableHeaders(raw=list(start_message["headers"]))
+        etag = headers.get("etag") or compute_body_etag(body)
+        headers["ETag"] = etag
+        headers["Vary"] = "Authorization"
+        if route.cache_control and "cache-control" not in headers:
+            headers["Cache-Control"] = route.cache_control
+
+        if etag_matches(if_none_match, etag):
+            del headers["content-length"]
+            if "content-type" in headers:
+                del headers["content-type"]
+            await send({"type": "http.response.start", "status": 304, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        await send({**start_message, "headers": headers.raw})
+        await send({"type": "http.response.body", "body": body})
@@ -9,6 +9,8 @@ from ..async_coordination import (
     fetch_with_coordination,
     parallel_data_processing,
     DataFetcher,
+    SingleFlight,
+    coalesced_execute,
     fetch_user_data_bundle,
     process_data_pipeline
 )
@@ -27,6 +29,8 @@ __all__ = [
     "fetch_with_coordination",
     "parallel_data_processing",
     "DataFetcher",
+    "SingleFlight",
+    "coalesced_execute",
     "fetch_user_data_bundle",
     "process_data_pipeline",
     "get_user_timezone",
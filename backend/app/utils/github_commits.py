@@ -1,14 +1,23 @@
-import httpx
+from utils.http_clients import get_http_client
 import logging
+import os
 from datetime import datetime, timedelta, date, time, timezone
-from typing import Optional
+from typing import Dict, Optional, Tuple
 import pytz
 from utils.weekly_habits import get_week_dates
+from utils.ttl_cache import TTLCache
 from supabase import Client
 from supabase._async.client import AsyncClient
 
 logger = logging.getLogger(__name__)
 
+# Commit calendars per (user, window); short-lived so new commits show up within minutes
+_calendar_cache = TTLCache(
+    "github_commit_calendars",
+    max_entries=2000,
+    ttl=int(os.getenv("GITHUB_CALENDAR_CACHE_TTL", "300"))
+)
+
 async def get_user_timezone(supabase: AsyncClient, user_id: str) -> str:
     """Get user's timezone from the database"""
     user = await supabase.table("users").select("timezone").eq("id", user_id).execute()
@@ -41,6 +50,61 @@ async def get_user_timezone(supabase: AsyncClient, user_id: str) -> str:
         logger.warning(f"Unknown timezone: {timezone_str}, falling back to UTC")
         return "UTC"
 
+async def _query_viewer(access_token: str, query: str, variables: dict) -> Optional[dict]:
+    """
+    Run a GraphQL query against GitHub and return its `viewer` object.
+    
+    Args:
+        access_token: GitHub access token
+        query: GraphQL query selecting fields of `viewer`
+        variables: Query variables
+        
+    Returns:
+        The viewer object or None if there was an error
+    """
+    client = get_http_client("https://api.github.com/graphql")
+    response = await client.post(
+        "https://api.github.com/graphql",
+        headers={
+            "Authorization": f"Bearer {access_token}",
+            "Accept": "application/vnd.github.v3+json"
+        },
+        json={
+            "query": query,
+            "variables": variables
+        },
+        timeout=30.0
+    )
+        
+    if response.status_code == 200:
+        data = response.json()
+        if data.get("data") and "viewer" in data["data"]:
+            return data["data"]["viewer"]
+        else:
+            logger.error(f"Unexpected GitHub API response: {data}")
+            return None
+    elif response.status_code == 401:
+        # Token expired or invalid - log specific error
+        logger.error(f"GitHub API authentication failed (401): {response.text}")
+        # Check if it's specifically a token expiry issue
+        try:
+            error_data = response.json()
+            if "message" in error_data and ("expired" in error_data["message"].lower() or "bad credentials" in error_data["message"].lower()):
+                logger.error("GitHub access token has expired or is invalid. User needs to reconnect GitHub.")
+                # TODO: Implement token refresh or trigger re-authentication
+                # For now, we return None to indicate the error
+                return None
+        except:
+            pass
+        return None
+    elif response.status_code == 403:
+        # Rate limiting or permission issues
+        logger.error(f"GitHub API rate limited or insufficient permissions (403): {response.text}")
+        return None
+    else:
+        logger.error(f"GitHub API error {response.status_code}: {response.text}")
+        return None
+
 async def get_commit_count(access_token: str, start_date: datetime, end_date: datetime) -> Optional[int]:
     """
     Get the number of commits made by the authenticated user in the given date range.
@@ -75,53 +139,158 @@ async def get_commit_count(access_token: str, start_date: datetime, end_date: da
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.github.com/graphql",
-                headers={
-                    "Authorization": f"Bearer {access_token}",
-                    "Accept": "application/vnd.github.v3+json"
-                },
-                json={
-                    "query": query,
-                    "variables": variables
-                },
-                timeout=30.0
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if "data" in data and "viewer" in data["data"]:
-                    return data["data"]["viewer"]["contributionsCollection"]["totalCommitContributions"]
-                else:
-                    logger.error(f"Unexpected GitHub API response: {data}")
-                    return None
-            elif response.status_code == 401:
-                # Token expired or invalid - log specific error
-                logger.error(f"GitHub API authentication failed (401): {response.text}")
-                # Check if it's specifically a token expiry issue
-                try:
-                    error_data = response.json()
-                    if "message" in error_data and ("expired" in error_data["message"].lower() or "bad credentials" in error_data["message"].lower()):
-                        logger.error("GitHub access token has expired or is invalid. User needs to reconnect GitHub.")
-                        # TODO: Implement token refresh or trigger re-authentication
-                        # For now, we return None to indicate the error
-                        return None
-                except:
-                    pass
-                return None
-            elif response.status_code == 403:
-                # Rate limiting or permission issues
-                logger.error(f"GitHub API rate limited or insufficient permissions (403): {response.text}")
-                return None
-            else:
-                logger.error(f"GitHub API error {response.status_code}: {response.text}")
-                return None
+        viewer = await _query_viewer(access_token, query, variables)
+        if viewer is None:
+            return None
+        return viewer["contributionsCollection"]["totalCommitContributions"]
                 
     except Exception as e:
         logger.error(f"Error fetching GitHub commit count: {e}")
         return None
 
+class CommitCalendar:
+    """
+    Per-day commit counts of one GitHub user over a date window, from a single GraphQL response.
+    
+    Today's, yesterday's and a week's counts for all of a user's habits are derived from
+    the same calendar instead of one contributionsCollection query per habit and range.
+    
+    The days are GitHub's aggregation days labelled with the nearest UTC date. They are
+    exact UTC days only if utc_aligned; otherwise counts are approximate and fit for display
+    only. Penalty checks always count commits over exact UTC ranges with get_commit_count.
+    """
+    
+    def __init__(self, start: date, end: date, days: Dict[date, int], utc_aligned: bool = True):
+        self.start = start
+        self.end = end
+        self.days = days
+        self.utc_aligned = utc_aligned
+    
+    def count(self, start: date, end: Optional[date] = None) -> int:
+        """
+        Commits from start through end (inclusive; end defaults to start).
+        
+        Days after the calendar's end count as zero - callers may ask for a whole week
+        that hasn't finished yet.
+        """
+        end = end or start
+        if start < self.start:
+            raise ValueError(f"Commit calendar starts {self.start}, can't count from {start}")
+        return sum(commits for day, commits in self.days.items() if start <= day <= end)
+
+# Commits are aggregated per repository and day; a week spans at most 7 nodes per repository
+COMMIT_CALENDAR_QUERY = """
+query($startDate: DateTime!, $endDate: DateTime!) {
+    viewer {
+        contributionsCollection(from: $startDate, to: $endDate) {
+            totalCommitContributions
+            commitContributionsByRepository(maxRepositories: 100) {
+                contributions(first: 100) {
+                    nodes {
+                        occurredAt
+                        commitCount
+                    }
+                }
+            }
+        }
+    }
+}
+"""
+
+async def fetch_commit_calendar(access_token: str, start: date, end: date) -> Optional[CommitCalendar]:
+    """
+    Fetch the user's per-day commit counts for the dates start..end in one request.
+    
+    Args:
+        access_token: GitHub access token
+        start: First day of the window
+        end: Last day of the window (clipped to now, GitHub rejects ranges ending in the future)
+        
+    Returns:
+        CommitCalendar or None if there was an error
+    """
+    start_datetime = datetime.combine(start, time.min)
+    end_datetime = min(datetime.combine(end, time.max), datetime.utcnow())
+    variables = {
+        "startDate": start_datetime.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "endDate": end_datetime.strftime("%Y-%m-%dT%H:%M:%SZ")
+    }
+    
+    try:
+        viewer = await _query_viewer(access_token, COMMIT_CALENDAR_QUERY, variables)
+        if viewer is None:
+            return None
+        collection = viewer["contributionsCollection"]
+        
+        days: Dict[date, int] = {}
+        utc_aligned = True
+        for repository in collection.get("commitContributionsByRepository") or []:
+            for node in (repository.get("contributions") or {}).get("nodes") or []:
+                occurred_at = datetime.fromisoformat(node["occurredAt"].replace("Z", "+00:00"))
+                # occurredAt is the start of the day the commits were aggregated into, which
+                # need not be UTC midnight; the nearest UTC midnight only labels that day
+                occurred_at = occurred_at.astimezone(timezone.utc)
+                if occurred_at.time() != time.min:
+                    utc_aligned = False
+                day = (occurred_at + timedelta(hours=12)).date()
+                days[day] = days.get(day, 0) + node.get("commitCount", 0)
+        
+        total = collection.get("totalCommitContributions")
+        if total is not None and total != sum(days.values()):
+            logger.warning(f"GitHub commit calendar {start}..{end} sums to {sum(days.values())}, total is {total}")
+        
+        return CommitCalendar(start, end, days, utc_aligned)
+        
+    except Exception as e:
+        logger.error(f"Error fetching GitHub commit calendar: {e}")
+        return None
+
+def _recent_calendar_window(utc_today: Optional[date] = None) -> Tuple[date, date]:
+    """
+    The window of the "recent" commit calendar (as a cache key, it changes once a day).
+    
+    It includes UTC yesterday, every user's local today and yesterday, and the current week
+    for any week_start_day, so one cached calendar per user serves all of them.
+    """
+    utc_today = utc_today or datetime.utcnow().date()
+    return utc_today - timedelta(days=8), utc_today + timedelta(days=1)
+
+async def get_user_commit_calendar(
+    supabase: AsyncClient,
+    user_id: str,
+    start: date,
+    end: date,
+    access_token: Optional[str] = None
+) -> Optional[CommitCalendar]:
+    """
+    Cached CommitCalendar of a user; concurrent callers share one GitHub request.
+    
+    Ranges starting in the last week are served from the user's recent calendar, so the
+    today/yesterday/current-week counts and all of the user's habits share one response.
+    
+    Args:
+        supabase: Supabase client
+        user_id: User ID
+        start: First day needed
+        end: Last day needed
+        access_token: Token to use as-is; if omitted the stored token is validated
+            (and refreshed) like get_commit_count_with_error_handling does
+        
+    Returns:
+        CommitCalendar or None if there was an error (errors are not cached)
+    """
+    window_start, window_end = _recent_calendar_window()
+    if not window_start <= start <= window_end:
+        window_start, window_end = start, end
+    
+    async def load() -> Optional[CommitCalendar]:
+        token = access_token or await get_valid_github_access_token(supabase, user_id)
+        if not token:
+            return None
+        return await fetch_commit_calendar(token, window_start, window_end)
+    
+    return await _calendar_cache.get_or_load((user_id, window_start, window_end), load)
+
 async def check_github_token_validity(access_token: str) -> dict:
     """
     Check if a GitHub access token is still valid.
@@ -133,31 +302,31 @@ async def check_github_token_validity(access_token: str) -> dict:
         Dict with status and error information
     """
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://api.github.com/user",
-                headers={
-                    "Authorization": f"Bearer {access_token}",
-                    "Accept": "application/vnd.github.v3+json"
-                },
-                timeout=10.0
-            )
+        client = get_http_client("https://api.github.com/user")
+        response = await client.get(
+            "https://api.github.com/user",
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "Accept": "application/vnd.github.v3+json"
+            },
+            timeout=10.0
+        )
             
-            if response.status_code == 200:
-                return {"valid": True, "user": response.json()}
-            elif response.status_code == 401:
-                error_data = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
-                return {
-                    "valid": False, 
-                    "error": "token_expired", 
-                    "message": error_data.get("message", "Token expired or invalid")
-                }
-            else:
-                return {
-                    "valid": False, 
-                    "error": "api_error", 
-                    "message": f"GitHub API returned {response.status_code}"
-                }
+        if response.status_code == 200:
+            return {"valid": True, "user": response.json()}
+        elif response.status_code == 401:
+            error_data = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
+            return {
+                "valid": False, 
+                "error": "token_expired", 
+                "message": error_data.get("message", "Token expired or invalid")
+            }
+        else:
+            return {
+                "valid": False, 
+                "error": "api_error", 
+                "message": f"GitHub API returned {response.status_code}"
+            }
                 
     except Exception as e:
         return {
@@ -198,18 +367,16 @@ async def handle_github_token_error(supabase: AsyncClient, user_id: str, error_t
     except Exception as e:
         logger.error(f"Error handling GitHub token error for user {user_id}: {e}")
 
-async def get_commit_count_with_error_handling(supabase: AsyncClient, user_id: str, start_date: datetime, end_date: datetime) -> Optional[int]:
+async def get_valid_github_access_token(supabase: AsyncClient, user_id: str) -> Optional[str]:
     """
-    Get commit count with proper error handling and automatic token refresh.
+    Get the user's GitHub access token, refreshing it if it expires soon or is rejected.
     
     Args:
         supabase: Supabase client
         user_id: User ID
-        start_date: Start date (UTC, timezone-naive)
-        end_date: End date (UTC, timezone-naive)
         
     Returns:
-        Number of commits or None if there was an error
+        A working access token or None (the token error is recorded on user_tokens)
     """
     try:
         # Get user's GitHub token info
@@ -252,8 +419,7 @@ async def get_commit_count_with_error_handling(supabase: AsyncClient, user_id: s
                 try:
                     access_token = await refresh_user_github_token(supabase, user_id, refresh_token)
                     if access_token:
-                        # Retry with new token
-                        return await get_commit_count(access_token, start_date, end_date)
+                        return access_token
                 except Exception as refresh_error:
                     logger.error(f"Token refresh failed for user {user_id}: {refresh_error}")
             
@@ -262,12 +428,29 @@ async def get_commit_count_with_error_handling(supabase: AsyncClient, user_id: s
             await handle_github_token_error(supabase, user_id, token_status.get("error", "unknown"))
             return None
         
-        # Token is valid, proceed with commit count
-        return await get_commit_count(access_token, start_date, end_date)
+        return access_token
         
     except Exception as e:
-        logger.error(f"Error getting commit count with error handling for user {user_id}: {e}")
+        logger.error(f"Error getting GitHub access token for user {user_id}: {e}")
+        return None
+
+async def get_commit_count_with_error_handling(supabase: AsyncClient, user_id: str, start_date: datetime, end_date: datetime) -> Optional[int]:
+    """
+    Get commit count with proper error handling and automatic token refresh.
+    
+    Args:
+        supabase: Supabase client
+        user_id: User ID
+        start_date: Start date (UTC, timezone-naive)
+        end_date: End date (UTC, timezone-naive)
+        
+    Returns:
+        Number of commits or None if there was an error
+    """
+    access_token = await get_valid_github_access_token(supabase, user_id)
+    if not access_token:
         return None
+    return await get_commit_count(access_token, start_date, end_date)
 
 async def refresh_user_github_token(supabase: AsyncClient, user_id: str, refresh_token: str) -> Optional[str]:
     """
@@ -283,7 +466,6 @@ async def refresh_user_github_token(supabase: AsyncClient, user_id: str, refresh
     """
     try:
         # Import here to avoid circular import
-        import httpx
         import os
         
         GITHUB_CLIENT_ID = os.getenv("GITHUB_CLIENT_ID")
@@ -295,21 +477,21 @@ async def refresh_user_github_token(supabase: AsyncClient, user_id: str, refresh
         
         # Call GitHub token refresh endpoint
         token_url = "https://github.com/login/oauth/access_token"
-        async with httpx.AsyncClient() as client:
-            headers = {"Accept": "application/json"}
-            data = {
-                "client_id": GITHUB_CLIENT_ID,
-                "client_secret": GITHUB_CLIENT_SECRET,
-                "grant_type": "refresh_token",
-                "refresh_token": refresh_token,
-            }
-            resp = await client.post(token_url, headers=headers, data=data, timeout=15)
+        client = get_http_client(token_url)
+        headers = {"Accept": "application/json"}
+        data = {
+            "client_id": GITHUB_CLIENT_ID,
+            "client_secret": GITHUB_CLIENT_SECRET,
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+        }
+        resp = await client.post(token_url, headers=headers, data=data, timeout=15)
             
-            if resp.status_code != 200:
-                logger.error(f"GitHub token refresh failed: {resp.status_code} {resp.text}")
-                return None
+        if resp.status_code != 200:
+            logger.error(f"GitHub token refresh failed: {resp.status_code} {resp.text}")
+            return None
             
-            token_json = resp.json()
+        token_json = resp.json()
             
         new_access_token = token_json.get("access_token")
         new_refresh_token = token_json.get("refresh_token", refresh_token)  # Use old refresh token if new one not provided
@@ -342,51 +524,52 @@ async def refresh_user_github_token(supabase: AsyncClient, user_id: str, refresh
         logger.error(f"Error refreshing GitHub token for user {user_id}: {e}")
         return None
 
-async def update_github_weekly_progress_async(supabase: AsyncClient, user_id: str, habit_id: str, week_start_date: date, weekly_target: int, week_start_day: int = 0):
+async def update_github_weekly_progress_async(
+    supabase: AsyncClient,
+    user_id: str,
+    habit_id: str,
+    week_start_date: date,
+    weekly_target: int,
+    week_start_day: int = 0,
+    commit_target: Optional[int] = None,
+    access_token: Optional[str] = None
+):
     """
     Update weekly progress for a GitHub weekly habit based on actual commit counts (ASYNC version).
     For weekly GitHub habits, the commit_target field contains the weekly commit goal.
+    
+    The count comes from the user's cached commit calendar, so updating several habits of a
+    user costs one GitHub request. Pass commit_target (and access_token) when the habit and
+    token rows are already loaded to skip re-reading them.
     """
     try:
-        # Get user's GitHub access token from user_tokens table
-        github_result = await supabase.table("user_tokens") \
-            .select("github_access_token") \
-            .eq("user_id", user_id) \
-            .execute()
-        
-        if not github_result.data or not github_result.data[0].get("github_access_token"):
-            logger.warning(f"No GitHub access token found for user {user_id}")
-            return
-        
-        access_token = github_result.data[0]["github_access_token"]
-        
         # Calculate week end date
         week_end_date = week_start_date + timedelta(days=6)
         
-        # Get commit count for the week
-        start_datetime = datetime.combine(week_start_date, time.min).replace(tzinfo=timezone.utc)
-        end_datetime = datetime.combine(week_end_date, time.max).replace(tzinfo=timezone.utc)
+        calendar = await get_user_commit_calendar(supabase, user_id, week_start_date, week_end_date, access_token)
         
-        commit_count = await get_commit_count_with_error_handling(supabase, user_id, start_datetime, end_datetime)
-        
-        if commit_count is None:
+        if calendar is None:
             logger.error(f"Failed to get commit count for user {user_id}")
             return
         
+        commit_count = calendar.count(week_start_date, week_end_date)
+        
         # For weekly GitHub habits, use the commit_target as the weekly goal
         # weekly_target should be 1 (we check once per week), but commit_target has the actual goal
+        if commit_target is None:
+            # Get the habit to find the actual weekly commit goal (stored in commit_target)
+            habit_result = await supabase.table("habits") \
+                .select("commit_target") \
+                .eq("id", habit_id) \
+                .execute()
+            
+            if not habit_result.data:
+                logger.error(f"Habit {habit_id} not found")
+                return
+            
+            commit_target = habit_result.data[0].get("commit_target")
         
-        # Get the habit to find the actual weekly commit goal (stored in commit_target)
-        habit_result = await supabase.table("habits") \
-            .select("commit_target") \
-            .eq("id", habit_id) \
-            .execute()
-        
-        if not habit_result.data:
-            logger.error(f"Habit {habit_id} not found")
-            return
-        
-        actual_weekly_goal = habit_result.data[0].get("commit_target", weekly_target)
+        actual_weekly_goal = commit_target
         if actual_weekly_goal is None:
             actual_weekly_goal = weekly_target  # Fallback to passed parameter
         
@@ -398,7 +581,7 @@ async def update_github_weekly_progress_async(supabase: AsyncClient, user_id: st
         
         # Check if progress record exists
         progress_result = await supabase.table("weekly_habit_progress") \
-            .select("*") \
+            .select("habit_id") \
             .eq("habit_id", habit_id) \
             .eq("week_start_date", week_start_str) \
             .execute()
@@ -460,13 +643,17 @@ async def update_github_weekly_progress(supabase, user_id: str, habit_id: str, w
         # For sync clients, use the sync version (which just logs and skips)
         update_github_weekly_progress_sync(supabase, user_id, habit_id, week_start_date, weekly_target, week_start_day)
 
-async def update_all_github_weekly_progress(supabase, user_id: str = None):
+async def update_all_github_weekly_progress(supabase, user_id: str = None, shard=None):
     """
     Update weekly progress for all GitHub weekly habits.
     
+    Habits are grouped by user: one timezone lookup per batch of users, one token read and
+    one commit calendar request per user, however many habits they have.
+    
     Args:
         supabase: Supabase client (async or sync)
         user_id: Optional user ID to limit updates to specific user
+        shard: Optional scheduler shard (tasks.job_coordination.Shard) to limit updates to its users
     """
     try:
         # Determine if we are using the async or sync client
@@ -487,43 +674,59 @@ async def update_all_github_weekly_progress(supabase, user_id: str = None):
         else:
             habits_result = query.execute()
         
-        if not habits_result.data:
+        habits = shard.filter(habits_result.data or []) if shard else habits_result.data
+        if not habits:
             logger.info("No active GitHub weekly habits found")
             return
         
-        logger.info(f"Updating weekly progress for {len(habits_result.data)} GitHub habits")
+        logger.info(f"Updating weekly progress for {len(habits)} GitHub habits")
         
-        for habit in habits_result.data:
+        if not is_async_client:
+            # For sync clients, fall back to UTC (scheduler context); the sync path only logs and skips
+            for habit in habits:
+                week_start, _ = get_week_dates(date.today(), habit.get('week_start_day', 0))
+                await update_github_weekly_progress(
+                    supabase, habit['user_id'], habit['id'], week_start,
+                    habit.get('weekly_target', 7), habit.get('week_start_day', 0)
+                )
+            return
+        
+        habits_by_user: Dict[str, list] = {}
+        for habit in habits:
+            habits_by_user.setdefault(habit['user_id'], []).append(habit)
+        
+        from tasks.scheduler_utils import get_user_timezones_async
+        user_timezones = await get_user_timezones_async(supabase, list(habits_by_user))
+        
+        for habit_user_id, user_habits in habits_by_user.items():
             try:
-                habit_id = habit['id']
-                habit_user_id = habit['user_id']
-                weekly_target = habit.get('weekly_target', 7)
-                week_start_day = habit.get('week_start_day', 0)
-                
-                # Get current week dates for this habit using USER'S timezone
-                if is_async_client:
-                    user_timezone = await get_user_timezone(supabase, habit_user_id)
-                    user_tz = pytz.timezone(user_timezone)
-                    user_now = datetime.now(user_tz)
-                    today = user_now.date()
-                else:
-                    # For sync clients, fall back to UTC (scheduler context)
-                    today = date.today()
+                # Get current week dates for these habits using USER'S timezone
+                user_tz = pytz.timezone(user_timezones.get(habit_user_id, "UTC"))
+                today = datetime.now(user_tz).date()
                 
-                week_start, week_end = get_week_dates(today, week_start_day)
+                # Validate (and refresh) the token once for all of the user's habits
+                access_token = await get_valid_github_access_token(supabase, habit_user_id)
+                if not access_token:
+                    continue
                 
-                # Update progress for current week
-                await update_github_weekly_progress(
-                    supabase=supabase,
-                    user_id=habit_user_id,
-                    habit_id=habit_id,
-                    week_start_date=week_start,
-                    weekly_target=weekly_target,
-                    week_start_day=week_start_day
-                )
+                for habit in user_habits:
+                    week_start_day = habit.get('week_start_day', 0)
+                    week_start, week_end = get_week_dates(today, week_start_day)
+                    
+                    # Update progress for current week
+                    await update_github_weekly_progress_async(
+                        supabase=supabase,
+                        user_id=habit_user_id,
+                        habit_id=habit['id'],
+                        week_start_date=week_start,
+                        weekly_target=habit.get('weekly_target', 7),
+                        week_start_day=week_start_day,
+                        commit_target=habit.get('commit_target'),
+                        access_token=access_token
+                    )
                 
             except Exception as e:
-                logger.error(f"Error updating GitHub habit {habit.get('id')}: {e}")
+                logger.error(f"Error updating GitHub habits for user {habit_user_id}: {e}")
                 continue
         
         logger.info("Completed updating GitHub weekly progress")
@@ -556,8 +759,6 @@ async def get_current_week_github_commits(supabase: AsyncClient, user_id: str, w
             logger.warning(f"No GitHub access token found for user {user_id}")
             return None
         
-        access_token = github_result.data[0]["github_access_token"]
-        
         # Get user's weekly GitHub habits to find the weekly commit goal
         habits_result = await supabase.table("habits") \
             .select("id, commit_target, weekly_target, name") \
@@ -598,13 +799,10 @@ async def get_current_week_github_commits(supabase: AsyncClient, user_id: str, w
         logger.info(f"GitHub weekly commits for user {user_id} in timezone {user_timezone}: "
                    f"today={today}, week_start={week_start}, week_end={week_end}")
         
-        # Get commit count for current week
-        start_datetime = datetime.combine(week_start, time.min).replace(tzinfo=timezone.utc)
-        end_datetime = datetime.combine(week_end, time.max).replace(tzinfo=timezone.utc)
-        
-        commit_count = await get_commit_count_with_error_handling(supabase, user_id, start_datetime, end_datetime)
+        # Get commit count for current week (from the calendar shared with today/yesterday counts)
+        calendar = await get_user_commit_calendar(supabase, user_id, week_start, week_end)
         
-        if commit_count is None:
+        if calendar is None:
             logger.error(f"Failed to get commit count for user {user_id}")
             return {
                 "current_commits": 0,
@@ -615,6 +813,7 @@ async def get_current_week_github_commits(supabase: AsyncClient, user_id: str, w
                 "error": "Failed to fetch commits from GitHub"
             }
         
+        commit_count = calendar.count(week_start, week_end)
         logger.info(f"Current week GitHub commits for user {user_id}: {commit_count}/{max_weekly_goal}")
         
         return {
@@ -1,6 +1,7 @@
 from datetime import datetime, date, timedelta, timezone
 from supabase import Client
-from config.database import get_supabase_client
+from supabase._async.client import AsyncClient
+from config.database import get_async_supabase_client
 import json
 import pytz
 import logging
@@ -44,30 +45,34 @@ def get_localized_datetime(supabase: Client, user_id: str) -> datetime:
     timezone = get_user_timezone(supabase, user_id)
     return datetime.now(pytz.timezone(timezone))
 
-async def process_staged_habit_changes():
+async def process_staged_habit_changes(shard=None):
     """
     Process all staged habit changes that should take effect today in users' timezones.
     This should be run daily to apply scheduled habit changes.
+    
+    Args:
+        shard: Optional scheduler shard (tasks.job_coordination.Shard) to limit processing to its users
     """
-    supabase = get_supabase_client()
+    supabase = await get_async_supabase_client()
     
     try:
         # Get all unprocessed staged changes
-        pending_changes = supabase.table("habit_change_staging") \
+        pending_changes = await supabase.table("habit_change_staging") \
             .select("*") \
             .eq("applied", False) \
             .execute()
         
-        if not pending_changes.data:
+        changes = shard.filter(pending_changes.data or []) if shard else pending_changes.data
+        if not changes:
             logger.info("No pending habit changes to process")
             return
         
-        logger.info(f"Found {len(pending_changes.data)} pending habit changes to process")
+        logger.info(f"Found {len(changes)} pending habit changes to process")
         
         processed_count = 0
         error_count = 0
         
-        for change in pending_changes.data:
+        for change in changes:
             try:
                 user_id = change['user_id']
                 user_timezone = change['user_timezone']
@@ -97,7 +102,7 @@ async def process_staged_habit_changes():
     except Exception as e:
         logger.error(f"Error in process_staged_habit_changes: {e}")
 
-async def apply_staged_change(supabase: Client, change: dict) -> bool:
+async def apply_staged_change(supabase: AsyncClient, change: dict) -> bool:
     """
     Apply a single staged habit change (update or delete).
     
@@ -115,7 +120,7 @@ async def apply_staged_change(supabase: Client, change: dict) -> bool:
         
         if change_type == 'delete':
             # Get the habit data before deletion to check for recipient
-            habit_result = supabase.table("habits") \
+            habit_result = await supabase.table("habits") \
                 .select("recipient_id, user_id") \
                 .eq("id", habit_id) \
                 .execute()
@@ -126,7 +131,7 @@ async def apply_staged_change(supabase: Client, change: dict) -> bool:
             
             # SOFT DELETE: Set is_active = false and completed_at timestamp
             # This preserves referential integrity with penalties, analytics, etc.
-            result = supabase.table("habits") \
+            result = await supabase.table("habits") \
                 .update({
                     "is_active": False,
                     "completed_at": datetime.now(timezone.utc).isoformat()
@@ -208,7 +213,7 @@ async def apply_staged_change(supabase: Client, change: dict) -> bool:
             
             # Update the habit
             try:
-                result = supabase.table("habits") \
+                result = await supabase.table("habits") \
                     .update(update_data) \
                     .eq("id", habit_id) \
                     .eq("is_active", True) \
@@ -251,7 +256,7 @@ async def apply_staged_change(supabase: Client, change: dict) -> bool:
                     logger.info(f"Retrying with fixed data: {update_data}")
                     
                     try:
-                        result = supabase.table("habits") \
+                        result = await supabase.table("habits") \
                             .update(update_data) \
                             .eq("id", habit_id) \
                             .eq("is_active", True) \
@@ -271,7 +276,7 @@ async def apply_staged_change(supabase: Client, change: dict) -> bool:
                 if recipient_changed:
                     try:
                         # Check if user is not premium and might be affected by the unique recipients rule
-                        user_result = supabase.table("users").select("ispremium").eq("id", user_id).execute()
+                        user_result = await supabase.table("users").select("ispremium").eq("id", user_id).execute()
                         is_premium = user_result.data and user_result.data[0].get("ispremium", False)
                         
                         if not is_premium:
@@ -291,7 +296,7 @@ async def apply_staged_change(supabase: Client, change: dict) -> bool:
         
         if success:
             # Mark the staged change as applied
-            supabase.table("habit_change_staging") \
+            await supabase.table("habit_change_staging") \
                 .update({"applied": True}) \
                 .eq("id", change['id']) \
                 .execute()
@@ -309,13 +314,13 @@ async def cleanup_old_staged_changes(days_old: int = 30):
     Args:
         days_old: Remove changes older than this many days
     """
-    supabase = get_supabase_client()
+    supabase = await get_async_supabase_client()
     
     try:
         cutoff_date = datetime.now() - timedelta(days=days_old)
         
         # Delete old applied changes or very old unprocessed changes
-        supabase.table("habit_change_staging") \
+        await supabase.table("habit_change_staging") \
             .delete() \
             .or_(f"applied.eq.true,created_at.lt.{cutoff_date.isoformat()}") \
             .execute()
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import os
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Pool settings for third-party integrations (GitHub, LeetCode, Riot). Each upstream host
+# gets ONE keep-alive client per process, so DNS/TLS is paid once rather than per call.
+INTEGRATION_HTTP_CONFIG = {
+    "max_connections": int(os.getenv("INTEGRATION_HTTP_MAX_CONNECTIONS", "20")),  # Per host
+    "max_keepalive_connections": int(os.getenv("INTEGRATION_HTTP_MAX_KEEPALIVE", "10")),
+    "keepalive_expiry": float(os.getenv("INTEGRATION_HTTP_KEEPALIVE_EXPIRY", "60")),
+    "connect_timeout": float(os.getenv("INTEGRATION_HTTP_CONNECT_TIMEOUT", "5")),
+    "request_timeout": float(os.getenv("INTEGRATION_HTTP_REQUEST_TIMEOUT", "15")),  # Per-call timeout= still wins
+    "http2": os.getenv("INTEGRATION_HTTP2", "true").lower() == "true",  # Negotiated via ALPN, falls back to HTTP/1.1
+}
+
+class IntegrationHTTPClients:
+    """
+    Registry of pooled httpx clients, one per upstream host, shared by the whole process.
+
+    Like AsyncSupabasePool, clients are bound to the event loop that created them; on a
+    different loop (e.g. a fresh asyncio.run in a script) the registry starts over.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _build_client(self, host: str) -> httpx.AsyncClient:
+        logger.info(f"Created pooled HTTP client for {host} (http2={self.config['http2']})")
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(self.config["request_timeout"], connect=self.config["connect_timeout"]),
+            limits=httpx.Limits(
+                max_connections=self.config["max_connections"],
+                max_keepalive_connections=self.config["max_keepalive_connections"],
+                keepalive_expiry=self.config["keepalive_expiry"]
+            ),
+            http2=self.config["http2"]
+        )
+
+    def get(self, url: str) -> httpx.AsyncClient:
+        """
+        The shared client for url's host. Callers must not close it.
+
+        Args:
+            url: Any URL (or base URL) on the upstream host
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Clients of another loop can't be used (or closed) from this one
+            self._clients = {}
+            self._loop = loop
+
+        host = urlsplit(url).netloc or url
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            client = self._clients[host] = self._build_client(host)
+        return client
+
+    async def close(self) -> None:
+        """Close every client (call on shutdown from the loop that used them)"""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    def get_status(self) -> dict:
+        return {
+            "hosts": sorted(self._clients),
+            "http2": self.config["http2"],
+            "max_connections_per_host": self.config["max_connections"]
+        }
+
+# Global registry instance
+integration_http = IntegrationHTTPClients(INTEGRATION_HTTP_CONFIG)
+
+def get_http_client(url: str) -> httpx.AsyncClient:
+    """Pooled client for the host of `url` (see IntegrationHTTPClients.get)"""
+    return integration_http.get(url)
+
+async def close_http_clients() -> None:
+    await integration_http.close()
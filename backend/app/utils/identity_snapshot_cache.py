@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import logging
+import mmap
+import os
+import time
+from typing import Optional
+from supabase._async.client import AsyncClient
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_SNAPSHOT_BUCKET = "identity-snapshots"
+
+# Identity snapshots are read on every image verification but only change when the user
+# uploads a new one. Entries are validated against users.updated_at on each read, so an
+# upload handled by another worker is picked up on the next verification; the local
+# upload endpoint also invalidates explicitly.
+_snapshot_cache = TTLCache(
+    "identity_snapshots",
+    max_entries=int(os.getenv("IDENTITY_SNAPSHOT_CACHE_ENTRIES", "500")),
+    ttl=3600,
+    max_bytes=int(os.getenv("IDENTITY_SNAPSHOT_CACHE_MB", "64")) * 1024 * 1024,
+    sizeof=lambda snapshot: len(snapshot.rekognition_bytes)
+)
+
+# Optional second tier on local disk (e.g. an instance's ephemeral SSD) that survives
+# restarts and is shared by every worker on the host. Disabled unless a directory is set.
+DISK_CACHE_DIR = os.getenv("IDENTITY_SNAPSHOT_DISK_CACHE_DIR") or None
+DISK_CACHE_MAX_FILES = int(os.getenv("IDENTITY_SNAPSHOT_DISK_CACHE_MAX_FILES", "5000"))
+_disk_writes_between_prunes = 100
+_disk_writes = 0
+
+class IdentitySnapshot:
+    """A user's identity snapshot, already resized and re-encoded for Rekognition"""
+
+    __slots__ = ("filename", "version", "rekognition_bytes", "original_size")
+
+    def __init__(self, filename: str, version: Optional[str], rekognition_bytes: bytes, original_size: int):
+        self.filename = filename
+        self.version = version  # users.updated_at when the snapshot was loaded
+        self.rekognition_bytes = rekognition_bytes
+        self.original_size = original_size
+
+def _disk_prefix(filename: str) -> str:
+    return hashlib.sha256(filename.encode()).hexdigest()[:32]
+
+def _disk_path(filename: str, version: Optional[str]) -> str:
+    version_hash = hashlib.sha256((version or "").encode()).hexdigest()[:16]
+    return os.path.join(DISK_CACHE_DIR, f"{_disk_prefix(filename)}_{version_hash}.jpg")
+
+def _read_disk(filename: str, version: Optional[str]) -> Optional[bytes]:
+    path = _disk_path(filename, version)
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return bytes(mapped)
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.warning(f"Identity snapshot disk cache read failed: {e}")
+        return None
+
+def _remove_disk_versions(filename: str, keep: Optional[str] = None) -> None:
+    prefix = _disk_prefix(filename) + "_"
+    try:
+        for name in os.listdir(DISK_CACHE_DIR):
+            if name.startswith(prefix) and name != keep:
+                os.remove(os.path.join(DISK_CACHE_DIR, name))
+    except OSError as e:
+        logger.warning(f"Identity snapshot disk cache cleanup failed: {e}")
+
+def _prune_disk() -> None:
+    """Drop the least recently written files once the directory exceeds its file budget"""
+    try:
+        entries = [entry for entry in os.scandir(DISK_CACHE_DIR) if entry.name.endswith(".jpg")]
+        if len(entries) <= DISK_CACHE_MAX_FILES:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - DISK_CACHE_MAX_FILES]:
+            os.remove(entry.path)
+    except OSError as e:
+        logger.warning(f"Identity snapshot disk cache prune failed: {e}")
+
+def _write_disk(filename: str, version: Optional[str], data: bytes) -> None:
+    global _disk_writes
+    path = _disk_path(filename, version)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(DISK_CACHE_DIR, mode=0o700, exist_ok=True)
+        # Biometric data: owner-only permissions, written atomically so readers never see a partial file
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        _remove_disk_versions(filename, keep=os.path.basename(path))
+    except OSError as e:
+        logger.warning(f"Identity snapshot disk cache write failed: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return
+
+    _disk_writes += 1
+    if _disk_writes % _disk_writes_between_prunes == 0:
+        _prune_disk()
+
+def _prepare_for_rekognition(image_bytes: bytes) -> bytes:
+    # Imported lazily: routers.habit_verification imports routers.auth, which imports utils
+    from routers.habit_verification.utils.image_processing import process_single_image_optimized
+    try:
+        return process_single_image_optimized(image_bytes)
+    except Exception as e:
+        # Rekognition accepts the stored JPEG as-is; resizing only makes the call cheaper
+        logger.warning(f"Identity snapshot pre-processing failed, using original image: {e}")
+        return image_bytes
+
+async def _load_snapshot(supabase: AsyncClient, filename: str, version: Optional[str]) -> IdentitySnapshot:
+    if DISK_CACHE_DIR:
+        data = await asyncio.to_thread(_read_disk, filename, version)
+        if data:
+            return IdentitySnapshot(filename, version, data, len(data))
+
+    started = time.perf_counter()
+    original = await supabase.storage.from_(IDENTITY_SNAPSHOT_BUCKET).download(filename)
+    if not original:
+        raise ValueError(f"Identity snapshot {filename} is empty")
+
+    # PIL decode/resize/encode is CPU-bound - keep it off the event loop
+    rekognition_bytes = await asyncio.to_thread(_prepare_for_rekognition, bytes(original))
+    logger.debug(
+        f"Identity snapshot {filename} loaded in {(time.perf_counter() - started) * 1000:.0f}ms "
+        f"({len(original) / 1024:.0f}KB -> {len(rekognition_bytes) / 1024:.0f}KB)"
+    )
+
+    if DISK_CACHE_DIR:
+        await asyncio.to_thread(_write_disk, filename, version, rekognition_bytes)
+
+    return IdentitySnapshot(filename, version, rekognition_bytes, len(original))
+
+async def get_identity_snapshot(supabase: AsyncClient, filename: str, version: Optional[str] = None) -> IdentitySnapshot:
+    """
+    Get a Rekognition-ready identity snapshot, downloading and resizing it only on a miss.
+
+    Args:
+        supabase: Async Supabase client
+        filename: users.identity_snapshot_filename
+        version: users.updated_at - a cached entry with a different version is reloaded
+
+    Returns:
+        IdentitySnapshot whose rekognition_bytes can be passed to CompareFaces
+
+    Raises:
+        Exception: If the snapshot can't be downloaded (nothing is cached)
+    """
+    cached = _snapshot_cache.get(filename)
+    if cached is not None and cached.version != version:
+        _snapshot_cache.delete(filename)
+
+    snapshot = await _snapshot_cache.get_or_load(filename, lambda: _load_snapshot(supabase, filename, version))
+    if snapshot.version != version:
+        # Coalesced onto a concurrent load for another version - load ours without caching it
+        snapshot = await _load_snapshot(supabase, filename, version)
+    return snapshot
+
+async def invalidate_identity_snapshot(filename: str) -> None:
+    """Forget a user's cached snapshot after it was replaced or removed"""
+    _snapshot_cache.delete(filename)
+    if DISK_CACHE_DIR:
+        await asyncio.to_thread(_remove_disk_versions, filename)
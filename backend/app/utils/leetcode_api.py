@@ -1,4 +1,4 @@
-import httpx
+from utils.http_clients import get_http_client
 import logging
 from typing import Optional, Dict, Any
 from datetime import datetime, date, timezone
@@ -52,53 +52,53 @@ class LeetCodeAPI:
         """
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    LeetCodeAPI.GRAPHQL_URL,
-                    json={
-                        "query": query,
-                        "variables": {"username": username}
-                    },
-                    headers={
-                        "Content-Type": "application/json",
-                        "Referer": LeetCodeAPI.BASE_URL
-                    }
-                )
+            client = get_http_client(LeetCodeAPI.GRAPHQL_URL)
+            response = await client.post(
+                LeetCodeAPI.GRAPHQL_URL,
+                json={
+                    "query": query,
+                    "variables": {"username": username}
+                },
+                headers={
+                    "Content-Type": "application/json",
+                    "Referer": LeetCodeAPI.BASE_URL
+                }
+            )
                 
-                if response.status_code != 200:
-                    logger.error(f"LeetCode API error: {response.status_code}")
-                    return {
-                        "exists": False,
-                        "is_public": False,
-                        "message": "Failed to connect to LeetCode API"
-                    }
+            if response.status_code != 200:
+                logger.error(f"LeetCode API error: {response.status_code}")
+                return {
+                    "exists": False,
+                    "is_public": False,
+                    "message": "Failed to connect to LeetCode API"
+                }
                 
-                data = response.json()
+            data = response.json()
                 
-                # Check if user exists
-                if not data.get("data", {}).get("matchedUser"):
-                    return {
-                        "exists": False,
-                        "is_public": False,
-                        "message": f"User '{username}' not found on LeetCode"
-                    }
+            # Check if user exists
+            if not data.get("data", {}).get("matchedUser"):
+                return {
+                    "exists": False,
+                    "is_public": False,
+                    "message": f"User '{username}' not found on LeetCode"
+                }
                 
-                user_data = data["data"]["matchedUser"]
+            user_data = data["data"]["matchedUser"]
                 
-                # Check if we can access their stats (indicator of public profile)
-                if user_data.get("submitStats") and user_data["submitStats"].get("acSubmissionNum"):
-                    return {
-                        "exists": True,
-                        "is_public": True,
-                        "message": "Profile is public",
-                        "profile_data": user_data
-                    }
-                else:
-                    return {
-                        "exists": True,
-                        "is_public": False,
-                        "message": "Profile exists but is private. Please make your LeetCode profile public in your account settings."
-                    }
+            # Check if we can access their stats (indicator of public profile)
+            if user_data.get("submitStats") and user_data["submitStats"].get("acSubmissionNum"):
+                return {
+                    "exists": True,
+                    "is_public": True,
+                    "message": "Profile is public",
+                    "profile_data": user_data
+                }
+            else:
+                return {
+                    "exists": True,
+                    "is_public": False,
+                    "message": "Profile exists but is private. Please make your LeetCode profile public in your account settings."
+                }
                     
         except Exception as e:
             logger.error(f"Error checking LeetCode profile: {e}")
@@ -136,29 +136,87 @@ class LeetCodeAPI:
         """
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    LeetCodeAPI.GRAPHQL_URL,
-                    json={
-                        "query": query,
-                        "variables": {"username": username}
-                    },
-                    headers={
-                        "Content-Type": "application/json",
-                        "Referer": LeetCodeAPI.BASE_URL
-                    }
-                )
+            client = get_http_client(LeetCodeAPI.GRAPHQL_URL)
+            response = await client.post(
+                LeetCodeAPI.GRAPHQL_URL,
+                json={
+                    "query": query,
+                    "variables": {"username": username}
+                },
+                headers={
+                    "Content-Type": "application/json",
+                    "Referer": LeetCodeAPI.BASE_URL
+                }
+            )
                 
-                if response.status_code != 200:
-                    return None
+            if response.status_code != 200:
+                return None
                 
-                data = response.json()
-                return data.get("data", {}).get("matchedUser")
+            data = response.json()
+            return data.get("data", {}).get("matchedUser")
                 
         except Exception as e:
             logger.error(f"Error getting LeetCode stats: {e}")
             return None
     
+    @staticmethod
+    async def get_calendar_data(username: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch the data behind a user's LeetCode calendar in one request.
+        
+        Returns:
+            dict: {
+                "accepted": recent accepted submissions ({"titleSlug", "timestamp"}, newest first),
+                "submission_calendar": submissionCalendar JSON for the past year (or None)
+            }, or None if error
+        """
+        query = """
+        query getUserCalendarData($username: String!, $limit: Int!) {
+            recentAcSubmissionList(username: $username, limit: $limit) {
+                titleSlug
+                timestamp
+            }
+            matchedUser(username: $username) {
+                userCalendar {
+                    submissionCalendar
+                }
+            }
+        }
+        """
+        
+        try:
+            client = get_http_client(LeetCodeAPI.GRAPHQL_URL)
+            response = await client.post(
+                LeetCodeAPI.GRAPHQL_URL,
+                json={
+                    "query": query,
+                    "variables": {"username": username, "limit": 200}  # Get more to ensure we cover the recent days
+                },
+                headers={
+                    "Content-Type": "application/json",
+                    "Referer": LeetCodeAPI.BASE_URL
+                }
+            )
+                
+            if response.status_code != 200:
+                logger.error(f"Failed to get calendar data: HTTP {response.status_code}")
+                return None
+                
+            data = response.json().get("data") or {}
+            user_data = data.get("matchedUser")
+            if not user_data:
+                logger.error(f"User {username} not found")
+                return None
+                
+            return {
+                "accepted": data.get("recentAcSubmissionList") or [],
+                "submission_calendar": (user_data.get("userCalendar") or {}).get("submissionCalendar")
+            }
+                
+        except Exception as e:
+            logger.error(f"Error getting LeetCode calendar data: {e}")
+            return None
+    
     @staticmethod
     async def get_daily_submissions(username: str, target_date: date) -> int:
         """
@@ -174,71 +232,22 @@ class LeetCodeAPI:
         Returns:
             Number of total submission attempts on the target date
         """
-        try:
-            # Get the year for the calendar query
-            year = target_date.year
-            
-            # Query for user calendar data
-            query = """
-            query getUserCalendar($username: String!, $year: Int!) {
-                matchedUser(username: $username) {
-                    userCalendar(year: $year) {
-                        submissionCalendar
-                    }
-                }
-            }
-            """
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    LeetCodeAPI.GRAPHQL_URL,
-                    json={
-                        "query": query,
-                        "variables": {"username": username, "year": year}
-                    },
-                    headers={
-                        "Content-Type": "application/json",
-                        "Referer": LeetCodeAPI.BASE_URL
-                    }
-                )
-                
-                if response.status_code != 200:
-                    logger.error(f"Failed to get calendar data: HTTP {response.status_code}")
-                    return 0
-                
-                data = response.json()
-                
-                # Extract submission calendar
-                user_data = data.get("data", {}).get("matchedUser")
-                if not user_data:
-                    logger.error(f"User {username} not found")
-                    return 0
-                
-                calendar_data = user_data.get("userCalendar", {}).get("submissionCalendar")
-                if not calendar_data:
-                    return 0
-                
-                # Parse the JSON calendar data
-                import json
-                calendar_dict = json.loads(calendar_data)
-                
-                # Convert target date to Unix timestamp (start of day in UTC)
-                from datetime import datetime, timezone
-                target_datetime = datetime.combine(target_date, datetime.min.time())
-                target_timestamp = int(target_datetime.replace(tzinfo=timezone.utc).timestamp())
-                
-                # Get submissions for the target date
-                submissions = calendar_dict.get(str(target_timestamp), 0)
-                
-                logger.info(f"User {username} had {submissions} submissions on {target_date}")
-                return submissions
-                
-        except Exception as e:
-            logger.error(f"Error getting daily submissions: {e}")
+        from utils.leetcode_calendar import get_leetcode_calendar
+        
+        calendar = await get_leetcode_calendar(username)
+        if calendar is None:
             return 0
+        
+        submissions = calendar.submissions.total(target_date)
+        logger.info(f"User {username} had {submissions} submissions on {target_date}")
+        return submissions
     
     @staticmethod
-    async def get_daily_problems_solved(username: str, target_date: date) -> int:
+    async def get_daily_problems_solved(
+        username: str,
+        target_date: date,
+        min_refreshed_at: Optional[datetime] = None
+    ) -> Optional[int]:
         """
         Get the number of unique problems solved (accepted) on a specific date.
         
@@ -248,65 +257,50 @@ class LeetCodeAPI:
         Args:
             username: LeetCode username
             target_date: Date to check problems solved
+            min_refreshed_at: See get_problems_solved_between
             
         Returns:
             Number of unique problems solved on the target date
         """
-        try:
-            # Get recent accepted submissions
-            query = """
-            query getRecentAcSubmissions($username: String!, $limit: Int!) {
-                recentAcSubmissionList(username: $username, limit: $limit) {
-                    id
-                    title
-                    titleSlug
-                    timestamp
-                }
-            }
-            """
+        return await LeetCodeAPI.get_problems_solved_between(username, target_date, target_date, min_refreshed_at)
+    
+    @staticmethod
+    async def get_problems_solved_between(
+        username: str,
+        start_date: date,
+        end_date: date,
+        min_refreshed_at: Optional[datetime] = None
+    ) -> Optional[int]:
+        """
+        Get the number of unique problems solved per day, summed over start_date..end_date.
+        
+        Read from the user's cached calendar (see utils.leetcode_calendar), so any range
+        costs at most one LeetCode request per refresh interval.
+        
+        Args:
+            username: LeetCode username
+            start_date: First date (UTC day)
+            end_date: Last date (UTC day), inclusive
+            min_refreshed_at: Only count from a calendar refreshed after this moment
+                (penalty checks pass the end of end_date, see utc_day_end)
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    LeetCodeAPI.GRAPHQL_URL,
-                    json={
-                        "query": query,
-                        "variables": {"username": username, "limit": 200}  # Get more to ensure we cover the date
-                    },
-                    headers={
-                        "Content-Type": "application/json",
-                        "Referer": LeetCodeAPI.BASE_URL
-                    }
-                )
-                
-                if response.status_code != 200:
-                    logger.error(f"Failed to get AC submissions: HTTP {response.status_code}")
-                    return 0
-                
-                data = response.json()
-                submissions = data.get("data", {}).get("recentAcSubmissionList", [])
-                
-                # Count unique problems solved on target date
-                problems_solved = set()
-                
-                for sub in submissions:
-                    timestamp = int(sub.get("timestamp", 0))
-                    submit_date = datetime.fromtimestamp(timestamp, tz=timezone.utc).date()
-                    
-                    if submit_date == target_date:
-                        problem_slug = sub.get("titleSlug", "")
-                        if problem_slug:
-                            problems_solved.add(problem_slug)
-                    elif submit_date < target_date:
-                        # Submissions are in reverse chronological order
-                        break
-                
-                count = len(problems_solved)
-                logger.info(f"User {username} solved {count} unique problems on {target_date}")
-                return count
-                
-        except Exception as e:
-            logger.error(f"Error getting daily problems solved: {e}")
+        Returns:
+            Number of problems solved in the range. Without min_refreshed_at an unavailable
+            calendar counts 0; with it the count is None (unknown) unless the calendar
+            could be refreshed after min_refreshed_at.
+        """
+        from utils.leetcode_calendar import get_leetcode_calendar
+        
+        calendar = await get_leetcode_calendar(username, min_refreshed_at)
+        if calendar is None:
+            if min_refreshed_at is not None:
+                logger.warning(f"No LeetCode calendar for {username} refreshed after {min_refreshed_at.isoformat()}")
+                return None
             return 0
+        
+        count = calendar.problems.total(start_date, end_date)
+        logger.info(f"User {username} solved {count} unique problems on {start_date}..{end_date}")
+        return count
     
     @staticmethod
     async def get_recent_submissions(username: str, limit: int = 20) -> Optional[Dict[str, Any]]:
@@ -329,24 +323,24 @@ class LeetCodeAPI:
         """
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    LeetCodeAPI.GRAPHQL_URL,
-                    json={
-                        "query": query,
-                        "variables": {"username": username, "limit": limit}
-                    },
-                    headers={
-                        "Content-Type": "application/json",
-                        "Referer": LeetCodeAPI.BASE_URL
-                    }
-                )
+            client = get_http_client(LeetCodeAPI.GRAPHQL_URL)
+            response = await client.post(
+                LeetCodeAPI.GRAPHQL_URL,
+                json={
+                    "query": query,
+                    "variables": {"username": username, "limit": limit}
+                },
+                headers={
+                    "Content-Type": "application/json",
+                    "Referer": LeetCodeAPI.BASE_URL
+                }
+            )
                 
-                if response.status_code != 200:
-                    return None
+            if response.status_code != 200:
+                return None
                 
-                data = response.json()
-                return data.get("data", {}).get("recentSubmissionList")
+            data = response.json()
+            return data.get("data", {}).get("recentSubmissionList")
                 
         except Exception as e:
             logger.error(f"Error getting recent submissions: {e}")
@@ -0,0 +1,166 @@
+"""
+Per-username LeetCode calendar store.
+
+Every daily/weekly LeetCode count used to re-download a user's submission data for one
+date. Instead, each username's calendar is fetched at most every
+LEETCODE_CALENDAR_REFRESH_SECONDS and kept as per-day buckets with prefix sums, so any
+date range is an O(1) lookup.
+"""
+import json
+import logging
+import os
+from array import array
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Optional, Set
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+LEETCODE_CALENDAR_REFRESH_SECONDS = int(os.getenv("LEETCODE_CALENDAR_REFRESH_SECONDS", "300"))
+# Accepted submissions older than the recent list are kept from earlier refreshes for this long
+LEETCODE_CALENDAR_RETENTION_DAYS = int(os.getenv("LEETCODE_CALENDAR_RETENTION_DAYS", "400"))
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def epoch_day(day: date) -> int:
+    """Days since 1970-01-01 (LeetCode buckets submissions by UTC day)"""
+    return day.toordinal() - _EPOCH_ORDINAL
+
+class DayCounts:
+    """
+    Immutable per-day counts over a range of epoch days, stored as prefix sums.
+
+    Days outside the range count as zero.
+    """
+
+    __slots__ = ("first_day", "_prefix")
+
+    def __init__(self, buckets: Dict[int, int]):
+        self.first_day = min(buckets) if buckets else 0
+        last_day = max(buckets) if buckets else -1
+
+        # _prefix[i] = total of the days before first_day + i
+        prefix = array("q", [0])
+        running = 0
+        for day in range(self.first_day, last_day + 1):
+            running += buckets.get(day, 0)
+            prefix.append(running)
+        self._prefix = prefix
+
+    def _before(self, day: int) -> int:
+        index = min(max(day - self.first_day, 0), len(self._prefix) - 1)
+        return self._prefix[index]
+
+    def total(self, start: date, end: Optional[date] = None) -> int:
+        """Sum of the days start..end inclusive (end defaults to start)"""
+        end = end or start
+        if end < start:
+            return 0
+        return self._before(epoch_day(end) + 1) - self._before(epoch_day(start))
+
+class LeetCodeCalendar:
+    """
+    One user's calendar: unique problems solved and submission attempts per UTC day.
+
+    Refreshes are incremental - accepted problems from earlier refreshes are merged with the
+    latest recent-submissions list, so days that scrolled off that list keep their counts.
+    """
+
+    def __init__(self, username: str):
+        self.username = username
+        self._solved: Dict[int, Set[str]] = {}  # epoch day -> accepted problem slugs
+        self._submissions: Dict[int, int] = {}  # epoch day -> submission attempts
+        self.problems = DayCounts({})
+        self.submissions = DayCounts({})
+        self.refreshed_at: Optional[datetime] = None
+
+    def merge(self, accepted: list, submission_calendar: Optional[str]) -> None:
+        """
+        Merge one fetch into the calendar and rebuild the prefix sums.
+
+        Args:
+            accepted: recentAcSubmissionList entries ({"titleSlug", "timestamp"})
+            submission_calendar: userCalendar.submissionCalendar JSON ({"<unix day start>": count})
+        """
+        for submission in accepted:
+            slug = submission.get("titleSlug")
+            if slug:
+                day = int(submission.get("timestamp", 0)) // 86400
+                self._solved.setdefault(day, set()).add(slug)
+
+        if submission_calendar:
+            for timestamp, count in json.loads(submission_calendar).items():
+                self._submissions[int(timestamp) // 86400] = count
+
+        oldest = epoch_day(datetime.now(timezone.utc).date()) - LEETCODE_CALENDAR_RETENTION_DAYS
+        self._solved = {day: slugs for day, slugs in self._solved.items() if day >= oldest}
+        self._submissions = {day: count for day, count in self._submissions.items() if day >= oldest}
+
+        self.problems = DayCounts({day: len(slugs) for day, slugs in self._solved.items()})
+        self.submissions = DayCounts(self._submissions)
+        self.refreshed_at = datetime.now(timezone.utc)
+
+class LeetCodeCalendarStore:
+    """
+    Calendars by username, refreshed at most every refresh_seconds.
+
+    Concurrent readers of a stale calendar share one refresh. If a refresh fails the
+    previous calendar (if any) is served until the next attempt, except to readers that
+    need a calendar refreshed after a given time (penalty checks of a finished day).
+    """
+
+    def __init__(self, refresh_seconds: int):
+        # Freshness gate: an entry here means the calendar was refreshed recently
+        self._fresh = TTLCache("leetcode_calendars", max_entries=5000, ttl=refresh_seconds)
+        # Accumulated history, kept across refreshes for incremental merging
+        self._calendars = TTLCache("leetcode_calendar_history", max_entries=5000, ttl=2 * 24 * 3600)
+
+    async def get(self, username: str, min_refreshed_at: Optional[datetime] = None) -> Optional[LeetCodeCalendar]:
+        """
+        The user's calendar, refreshed first if stale.
+
+        Args:
+            username: LeetCode username
+            min_refreshed_at: If set, a calendar refreshed before this (UTC, aware) is
+                refreshed now regardless of refresh_seconds
+
+        Returns:
+            The calendar, or None if it has never been fetched or, with min_refreshed_at,
+            couldn't be refreshed after it
+        """
+        key = username.lower()
+        load = lambda: self._refresh(key, username)
+        calendar = await self._fresh.get_or_load(key, load)
+        if min_refreshed_at is None or _refreshed_since(calendar, min_refreshed_at):
+            return calendar
+
+        # Force one refresh; concurrent readers that find it in flight share it
+        if self._fresh.get(key, record=False) is calendar:
+            self._fresh.delete(key)
+        calendar = await self._fresh.get_or_load(key, load)
+        return calendar if _refreshed_since(calendar, min_refreshed_at) else None
+
+    async def _refresh(self, key: str, username: str) -> Optional[LeetCodeCalendar]:
+        from utils.leetcode_api import LeetCodeAPI
+
+        calendar = self._calendars.get(key) or LeetCodeCalendar(username)
+        data = await LeetCodeAPI.get_calendar_data(username)
+        if data is None:
+            return calendar if calendar.refreshed_at else None
+
+        calendar.merge(data["accepted"], data["submission_calendar"])
+        self._calendars.set(key, calendar)
+        return calendar
+
+def _refreshed_since(calendar: Optional[LeetCodeCalendar], moment: datetime) -> bool:
+    return calendar is not None and calendar.refreshed_at is not None and calendar.refreshed_at >= moment
+
+def utc_day_end(day: date) -> datetime:
+    """The moment UTC day `day` ends; a calendar refreshed after it has the day's final count"""
+    return datetime.combine(day + timedelta(days=1), time.min, tzinfo=timezone.utc)
+
+# Global store instance
+leetcode_calendars = LeetCodeCalendarStore(LEETCODE_CALENDAR_REFRESH_SECONDS)
+
+async def get_leetcode_calendar(username: str, min_refreshed_at: Optional[datetime] = None) -> Optional[LeetCodeCalendar]:
+    return await leetcode_calendars.get(username, min_refreshed_at)
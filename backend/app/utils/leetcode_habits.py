@@ -236,7 +236,7 @@ async def get_leetcode_problems_for_date(
 ) -> Optional[int]:
     """
     Get the number of unique LeetCode problems solved on a specific date.
-    Always fetches fresh data from LeetCode API for live updates.
+    Reads the user's cached LeetCode calendar, refreshed at most every few minutes.
     
     Args:
         supabase: Supabase client
@@ -259,7 +259,7 @@ async def get_leetcode_problems_for_date(
         
         username = result.data[0]["leetcode_username"]
         
-        # Always fetch fresh data from LeetCode API for live updates
+        # Read from the user's calendar (refreshed from LeetCode every few minutes)
         problems_solved = await LeetCodeAPI.get_daily_problems_solved(username, target_date)
         
         return problems_solved
@@ -291,17 +291,8 @@ async def get_weekly_problems_solved(
         user_tz = pytz.timezone(user_timezone)
         today_in_user_tz = datetime.now(user_tz).date()
         
-        # Sum up problems solved for each day in the week
-        total_problems = 0
-        current_date = week_start
-        
-        while current_date <= week_end and current_date <= today_in_user_tz:
-            daily_problems = await LeetCodeAPI.get_daily_problems_solved(username, current_date)
-            if daily_problems is not None:
-                total_problems += daily_problems
-            current_date += timedelta(days=1)
-        
-        return total_problems
+        # Sum up problems solved for each day in the week (one prefix-sum lookup on the cached calendar)
+        return await LeetCodeAPI.get_problems_solved_between(username, week_start, min(week_end, today_in_user_tz))
         
     except Exception as e:
         logger.error(f"Error getting weekly problems solved: {e}")
@@ -519,13 +510,14 @@ async def update_leetcode_weekly_progress(supabase: AsyncClient, user_id: str, h
     except Exception as e:
         logger.error(f"Error updating LeetCode weekly progress for habit {habit_id}: {e}")
 
-async def update_all_leetcode_weekly_progress(supabase: AsyncClient, user_id: str = None):
+async def update_all_leetcode_weekly_progress(supabase: AsyncClient, user_id: str = None, shard=None):
     """
     Update weekly progress for all LeetCode weekly habits.
     
     Args:
         supabase: Supabase client
         user_id: Optional user ID to limit updates to specific user
+        shard: Optional scheduler shard (tasks.job_coordination.Shard) to limit updates to its users
     """
     try:
         # Get all active weekly LeetCode habits
@@ -540,13 +532,14 @@ async def update_all_leetcode_weekly_progress(supabase: AsyncClient, user_id: st
         
         habits_result = await query.execute()
         
-        if not habits_result.data:
+        habits = shard.filter(habits_result.data or []) if shard else habits_result.data
+        if not habits:
             logger.info("No active LeetCode weekly habits found")
             return
         
-        logger.info(f"Updating weekly progress for {len(habits_result.data)} LeetCode habits")
+        logger.info(f"Updating weekly progress for {len(habits)} LeetCode habits")
         
-        for habit in habits_result.data:
+        for habit in habits:
             try:
                 habit_id = habit['id']
                 habit_user_id = habit['user_id']
@@ -1,8 +1,5 @@
-import gc
-
 def _cleanup_memory(*objects):
-    """Explicitly cleanup memory for large objects"""
+    """Explicitly drop references to large objects (reference counting frees them; no forced GC)"""
     for obj in objects:
         if obj is not None:
-            del obj
-    gc.collect()
\ No newline at end of file
+            del obj
\ No newline at end of file
@@ -1,6 +1,8 @@
 import psutil
 import tracemalloc
 import gc
+import os
+import time
 import logging
 from functools import wraps
 from datetime import datetime
@@ -8,6 +10,15 @@ import asyncio
 
 logger = logging.getLogger(__name__)
 
+# tracemalloc hooks every allocation, so it is only enabled for debugging sessions
+TRACEMALLOC_ENABLED = os.getenv("MEMORY_TRACEMALLOC", "false").lower() == "true"
+
+# Opt-in RSS-driven collector (replaces per-call gc.collect() in cleanup_memory)
+PERIODIC_GC_ENABLED = os.getenv("MEMORY_PERIODIC_GC", "false").lower() == "true"
+PERIODIC_GC_RSS_THRESHOLD_MB = float(os.getenv("MEMORY_GC_RSS_THRESHOLD_MB", "400"))
+PERIODIC_GC_INTERVAL_SECONDS = float(os.getenv("MEMORY_GC_INTERVAL_SECONDS", "60"))
+PERIODIC_GC_COOLDOWN_SECONDS = float(os.getenv("MEMORY_GC_COOLDOWN_SECONDS", "600"))
+
 class MemoryMonitor:
     """Memory monitoring utility for tracking memory usage and potential leaks"""
     
@@ -17,7 +28,8 @@ class MemoryMonitor:
         
     def start_monitoring(self):
         """Start memory monitoring"""
-        tracemalloc.start()
+        if TRACEMALLOC_ENABLED:
+            tracemalloc.start()
         process = psutil.Process()
         self.start_memory = process.memory_info().rss / 1024 / 1024  # MB
         logger.info(f"🔍 Memory monitoring started - Initial: {self.start_memory:.1f} MB")
@@ -45,6 +57,7 @@ class MemoryMonitor:
         after = self.get_current_memory()
         freed = before - after
         logger.info(f"🗑️ Garbage collection: {collected} objects collected, {freed:.1f} MB freed")
+        return freed
         
     def get_top_memory_consumers(self, limit=10):
         """Get top memory consuming traces"""
@@ -125,9 +138,55 @@ def log_system_memory():
     logger.info(f"🔧 Process Memory - RSS: {process.memory_info().rss / 1024 / 1024:.1f} MB, "
                f"VMS: {process.memory_info().vms / 1024 / 1024:.1f} MB")
 
+class PeriodicGarbageCollector:
+    """
+    Background full collection driven by RSS readings instead of per-call gc.collect().
+    
+    Collects only when the process is above the RSS threshold, then waits out a cooldown
+    so a worker whose memory is genuinely live isn't rescanned every interval.
+    """
+    
+    def __init__(
+        self,
+        rss_threshold_mb: float = PERIODIC_GC_RSS_THRESHOLD_MB,
+        interval_seconds: float = PERIODIC_GC_INTERVAL_SECONDS,
+        cooldown_seconds: float = PERIODIC_GC_COOLDOWN_SECONDS
+    ):
+        self.rss_threshold_mb = rss_threshold_mb
+        self.interval_seconds = interval_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self._next_allowed = 0.0
+        self.collections = 0
+    
+    def maybe_collect(self) -> bool:
+        """Run a full collection if RSS is over the threshold and the cooldown has passed"""
+        now = time.monotonic()
+        if now < self._next_allowed:
+            return False
+        
+        current = memory_monitor.get_current_memory()
+        if current <= self.rss_threshold_mb:
+            return False
+        
+        logger.info(f"RSS {current:.1f} MB over {self.rss_threshold_mb:.0f} MB threshold - collecting")
+        memory_monitor.force_garbage_collection()
+        self.collections += 1
+        self._next_allowed = now + self.cooldown_seconds
+        return True
+    
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                self.maybe_collect()
+            except Exception as e:
+                logger.warning(f"Periodic GC check failed: {e}")
+
+periodic_gc = PeriodicGarbageCollector()
+
 # Automatic memory monitoring for critical endpoints
 def setup_memory_monitoring():
-    """Setup automatic memory monitoring"""
+    """Setup automatic memory monitoring (and the opt-in RSS-driven collector)"""
     memory_monitor.start_monitoring()
     
     # Schedule periodic memory checks (every 5 minutes)
@@ -136,11 +195,9 @@ def setup_memory_monitoring():
             await asyncio.sleep(300)  # 5 minutes
             memory_monitor.log_memory_usage("periodic check")
             log_system_memory()
-            
-            # Force GC if memory is high
-            current = memory_monitor.get_current_memory()
-            if current > 400:  # If using more than 400MB
-                memory_monitor.force_garbage_collection()
     
-    # Start background task
-    asyncio.create_task(periodic_memory_check()) 
\ No newline at end of file
+    # Start background tasks
+    asyncio.create_task(periodic_memory_check())
+    if PERIODIC_GC_ENABLED:
+        asyncio.create_task(periodic_gc.run())
+        logger.info(f"Periodic GC enabled (RSS threshold {PERIODIC_GC_RSS_THRESHOLD_MB:.0f} MB)")
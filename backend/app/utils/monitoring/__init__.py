@@ -8,6 +8,9 @@ from ..memory_monitoring import (
 )
 from ..aws_client_manager import (
     get_aws_rekognition_client,
+    get_async_rekognition,
+    RekognitionUnavailableError,
+    RekognitionTimeoutError,
     cleanup_aws_clients,
     get_aws_client_status,
     cleanup_aws_response,
@@ -22,6 +25,9 @@ __all__ = [
     "get_system_memory_info",
     "MemoryLeakDetector",
     "get_aws_rekognition_client",
+    "get_async_rekognition",
+    "RekognitionUnavailableError",
+    "RekognitionTimeoutError",
     "cleanup_aws_clients", 
     "get_aws_client_status",
     "cleanup_aws_response",
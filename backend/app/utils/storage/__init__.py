@@ -2,10 +2,13 @@ from .url_generation import (
     generate_profile_photo_url,
     generate_post_image_url,
     generate_post_image_urls,
+    generate_post_image_urls_batch,
     generate_verification_image_url,
     generate_verification_image_urls,
     generate_identity_snapshot_url,
-    generate_signed_url_optimized
+    generate_signed_url_optimized,
+    generate_signed_urls_batch,
+    generate_cached_signed_urls
 )
 from .upload_utils import (
     upload_to_supabase_storage_with_retry,
@@ -17,10 +20,13 @@ __all__ = [
     "generate_profile_photo_url",
     "generate_post_image_url", 
     "generate_post_image_urls",
+    "generate_post_image_urls_batch",
     "generate_verification_image_url",
     "generate_verification_image_urls",
     "generate_identity_snapshot_url",
     "generate_signed_url_optimized",
+    "generate_signed_urls_batch",
+    "generate_cached_signed_urls",
     "upload_to_supabase_storage_with_retry",
     "upload_to_supabase_storage_with_cache_control",
     "async_upload_to_supabase_storage_with_retry"
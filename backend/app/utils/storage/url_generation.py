@@ -1,70 +1,36 @@
-import time
-from typing import Optional, Dict, Any
+import asyncio
+from typing import Optional, Dict, Any, List, Iterable, Tuple
 from supabase._async.client import AsyncClient
 from utils.memory_optimization import cleanup_memory, disable_print, memory_optimized
+from utils.ttl_cache import TTLCache
 
 # Disable verbose printing for performance
 print = disable_print()
 
-# MEMORY OPTIMIZATION: Unified URL cache with LRU eviction
-_url_cache = {}
-_cache_access_order = []  # LRU tracking
-_cache_size_limit = 200  # Increased limit for multiple URL types
+# Signed URL lifetime; cached URLs are served for at most half of it so clients
+# always receive a URL with plenty of validity left
+_signed_url_expires_in = 3600
+_signed_url_cache_ttl = _signed_url_expires_in // 2
 
-def _cleanup_cache():
-    """Aggressive cache cleanup with LRU eviction"""
-    current_time = time.time()
-    
-    # Remove expired entries
-    expired_keys = []
-    for key in list(_url_cache.keys()):
-        if key not in _cache_access_order:
-            expired_keys.append(key)
-        elif current_time >= _url_cache.get(key, {}).get('expires_at', 0):
-            expired_keys.append(key)
-    
-    for key in expired_keys:
-        _url_cache.pop(key, None)
-        if key in _cache_access_order:
-            _cache_access_order.remove(key)
-    
-    # LRU eviction if cache is too large
-    while len(_url_cache) > _cache_size_limit:
-        oldest_key = _cache_access_order.pop(0)
-        _url_cache.pop(oldest_key, None)
-    
-    if expired_keys:
-        print(f"🧹 URL cache cleanup: removed {len(expired_keys)} entries, {len(_url_cache)} remaining")
+# Unified URL cache - room for a full feed page (two images per post) plus profile photos
+_url_cache = TTLCache("signed_urls", max_entries=500, ttl=_signed_url_cache_ttl)
+
+# Bulk signing: paths per storage request, and fan-out width when bulk signing fails
+_sign_batch_size = 100
+_sign_fallback_concurrency = 10
 
 def _get_cached_url(cache_key: str) -> Optional[str]:
-    """Get cached URL if not expired with LRU tracking"""
-    if cache_key in _url_cache:
-        cache_entry = _url_cache[cache_key]
-        if time.time() < cache_entry.get('expires_at', 0):
-            # Update LRU order
-            if cache_key in _cache_access_order:
-                _cache_access_order.remove(cache_key)
-            _cache_access_order.append(cache_key)
-            return cache_entry.get('url')
-        else:
-            # Expired - remove immediately
-            _url_cache.pop(cache_key, None)
-            if cache_key in _cache_access_order:
-                _cache_access_order.remove(cache_key)
-    return None
+    """Get cached URL if not expired"""
+    return _url_cache.get(cache_key)
 
-def _set_cached_url(cache_key: str, url: str, ttl: int = 1800) -> None:
-    """Cache URL with aggressive size management"""
-    # Cleanup before adding
-    _cleanup_cache()
-    
-    _url_cache[cache_key] = {
-        'url': url,
-        'expires_at': time.time() + ttl
-    }
-    if cache_key in _cache_access_order:
-        _cache_access_order.remove(cache_key)
-    _cache_access_order.append(cache_key)
+def _set_cached_urls(urls: Dict[str, str], ttl: int = _signed_url_cache_ttl) -> None:
+    """Cache several signed URLs"""
+    for cache_key, url in urls.items():
+        _url_cache.set(cache_key, url, ttl)
+
+def _storage_filename(filename: str) -> str:
+    """Ensure filename has .jpg extension for storage lookup"""
+    return filename if filename.endswith('.jpg') else f"{filename}.jpg"
 
 @memory_optimized(cleanup_args=False)
 async def generate_signed_url_optimized(
@@ -112,6 +78,121 @@ async def generate_signed_url_optimized(
         print(f"Error generating signed URL for {file_path}: {e}")
         return None
 
+async def _sign_paths_individually(
+    supabase: AsyncClient,
+    bucket_name: str,
+    file_paths: List[str],
+    expires_in: int
+) -> Dict[str, Optional[str]]:
+    """Bounded concurrent fallback when the bulk signing endpoint fails"""
+    semaphore = asyncio.Semaphore(_sign_fallback_concurrency)
+    
+    async def sign(path: str) -> Optional[str]:
+        async with semaphore:
+            return await generate_signed_url_optimized(supabase, bucket_name, path, expires_in)
+    
+    urls = await asyncio.gather(*(sign(path) for path in file_paths))
+    return dict(zip(file_paths, urls))
+
+async def generate_signed_urls_batch(
+    supabase: AsyncClient,
+    bucket_name: str,
+    file_paths: Iterable[str],
+    expires_in: int = _signed_url_expires_in
+) -> Dict[str, Optional[str]]:
+    """
+    Sign many files in one bucket with the storage bulk endpoint.
+    
+    Args:
+        supabase: Async Supabase client
+        bucket_name: Storage bucket name
+        file_paths: Paths to the files in storage (duplicates are signed once)
+        expires_in: URL expiration time in seconds
+        
+    Returns:
+        Dict of {file_path: signed URL or None if the file could not be signed}
+    """
+    paths = list(dict.fromkeys(path for path in file_paths if path))
+    if not paths:
+        return {}
+    
+    chunks = [paths[i:i + _sign_batch_size] for i in range(0, len(paths), _sign_batch_size)]
+    
+    async def sign_chunk(chunk: List[str]) -> Dict[str, Optional[str]]:
+        try:
+            response = await supabase.storage.from_(bucket_name).create_signed_urls(chunk, expires_in)
+        except Exception as e:
+            # A single missing object can fail the whole bulk response - sign one by one instead
+            print(f"Bulk signing failed for {bucket_name} ({len(chunk)} paths), falling back: {e}")
+            return await _sign_paths_individually(supabase, bucket_name, chunk, expires_in)
+        
+        signed = {path: None for path in chunk}
+        for item in response or []:
+            if item.get('error'):
+                continue
+            path = item.get('path')
+            if path in signed:
+                signed[path] = item.get('signedURL') or item.get('signedUrl')
+        return signed
+    
+    results: Dict[str, Optional[str]] = {}
+    for signed in await asyncio.gather(*(sign_chunk(chunk) for chunk in chunks)):
+        results.update(signed)
+    return results
+
+async def generate_cached_signed_urls(
+    supabase: AsyncClient,
+    requests: Iterable[Tuple[str, str]]
+) -> Dict[Tuple[str, str], Optional[str]]:
+    """
+    Resolve signed URLs for (bucket, filename) pairs, signing cache misses in bulk.
+    
+    Filenames are cached under the same keys as the single-file helpers, so both
+    paths share hits. Buckets are signed concurrently.
+    
+    Returns:
+        Dict of {(bucket, filename): signed URL or None}
+    """
+    resolved: Dict[Tuple[str, str], Optional[str]] = {}
+    misses: Dict[str, Dict[str, str]] = {}  # bucket -> {storage path: filename}
+    
+    for bucket_name, filename in requests:
+        if not filename or (bucket_name, filename) in resolved:
+            continue
+        cached_url = _get_cached_url(f"{bucket_name}:{filename}")
+        resolved[(bucket_name, filename)] = cached_url
+        if cached_url is None:
+            misses.setdefault(bucket_name, {})[_storage_filename(filename)] = filename
+    
+    if not misses:
+        return resolved
+    
+    buckets = list(misses.keys())
+    signed_by_bucket = await asyncio.gather(*(
+        generate_signed_urls_batch(supabase, bucket_name, misses[bucket_name].keys())
+        for bucket_name in buckets
+    ))
+    
+    new_cache_entries = {}
+    for bucket_name, signed in zip(buckets, signed_by_bucket):
+        for storage_path, url in signed.items():
+            filename = misses[bucket_name][storage_path]
+            resolved[(bucket_name, filename)] = url
+            if url:
+                new_cache_entries[f"{bucket_name}:{filename}"] = url
+    
+    if new_cache_entries:
+        _set_cached_urls(new_cache_entries)
+    
+    return resolved
+
+async def _get_or_sign_url(supabase: AsyncClient, bucket_name: str, filename: str) -> Optional[str]:
+    """Cached signed URL for one file; concurrent misses for the same file share one signing call"""
+    return await _url_cache.get_or_load(
+        f"{bucket_name}:{filename}",
+        lambda: generate_signed_url_optimized(supabase, bucket_name, _storage_filename(filename), _signed_url_expires_in)
+    )
+
 @memory_optimized(cleanup_args=False)
 async def generate_profile_photo_url(supabase, profile_photo_filename: Optional[str]) -> Optional[str]:
     """
@@ -121,30 +202,8 @@ async def generate_profile_photo_url(supabase, profile_photo_filename: Optional[
     if not profile_photo_filename:
         return None
     
-    # Check cache first
-    cache_key = f"profile-photos:{profile_photo_filename}"
-    cached_url = _get_cached_url(cache_key)
-    if cached_url:
-        return cached_url
-    
     try:
-        # Ensure filename has .jpg extension for storage lookup
-        if not profile_photo_filename.endswith('.jpg'):
-            storage_filename = f"{profile_photo_filename}.jpg"
-        else:
-            storage_filename = profile_photo_filename
-        
-        # Use the optimized signed URL function
-        signed_url = await generate_signed_url_optimized(
-            supabase, "profile-photos", storage_filename, 3600
-        )
-        
-        # Cache the result
-        if signed_url:
-            _set_cached_url(cache_key, signed_url)
-        
-        return signed_url
-        
+        return await _get_or_sign_url(supabase, "profile-photos", profile_photo_filename)
     except Exception as e:
         print(f"Error generating signed URL for profile photo: {e}")
         return None
@@ -158,30 +217,8 @@ async def generate_identity_snapshot_url(supabase: AsyncClient, identity_snapsho
     if not identity_snapshot_filename:
         return None
     
-    # Check cache first
-    cache_key = f"identity-snapshots:{identity_snapshot_filename}"
-    cached_url = _get_cached_url(cache_key)
-    if cached_url:
-        return cached_url
-    
     try:
-        # Ensure filename has .jpg extension for storage lookup
-        if not identity_snapshot_filename.endswith('.jpg'):
-            storage_filename = f"{identity_snapshot_filename}.jpg"
-        else:
-            storage_filename = identity_snapshot_filename
-        
-        # Use the optimized signed URL function
-        signed_url = await generate_signed_url_optimized(
-            supabase, "identity-snapshots", storage_filename, 3600
-        )
-        
-        # Cache the result
-        if signed_url:
-            _set_cached_url(cache_key, signed_url)
-        
-        return signed_url
-        
+        return await _get_or_sign_url(supabase, "identity-snapshots", identity_snapshot_filename)
     except Exception as e:
         print(f"Error generating signed URL for identity snapshot: {e}")
         return None
@@ -195,64 +232,77 @@ async def generate_post_image_url(supabase, image_filename: Optional[str], is_pr
     if not image_filename:
         return None
     
-    # Check cache first
-    bucket_name = 'private_images' if is_private else 'public_images'
-    cache_key = f"{bucket_name}:{image_filename}"
-    cached_url = _get_cached_url(cache_key)
-    if cached_url:
-        return cached_url
-    
     try:
-        # Ensure filename has .jpg extension for storage lookup
-        if not image_filename.endswith('.jpg'):
-            storage_filename = f"{image_filename}.jpg"
-        else:
-            storage_filename = image_filename
-        
-        # Use the optimized signed URL function
-        signed_url = await generate_signed_url_optimized(
-            supabase, bucket_name, storage_filename, 3600
-        )
-        
-        # Cache the result
-        if signed_url:
-            _set_cached_url(cache_key, signed_url)
-        
-        return signed_url
-        
+        return await _get_or_sign_url(supabase, 'private_images' if is_private else 'public_images', image_filename)
     except Exception as e:
         print(f"Error generating signed URL for post image: {e}")
         return None
 
+def _post_image_filenames(post: dict) -> Dict[str, str]:
+    """Selfie/content filenames for a post, falling back to the legacy post-ID naming"""
+    filenames = {}
+    has_legacy_ids = post.get("user_id") and post.get("id")
+    
+    selfie_filename = post.get("selfie_image_filename")
+    if selfie_filename:
+        filenames["selfie_image_url"] = selfie_filename
+    elif has_legacy_ids:
+        filenames["selfie_image_url"] = f"{post['user_id']}_{post['id']}_selfie.jpg"
+    
+    content_filename = post.get("image_filename")
+    if content_filename:
+        filenames["content_image_url"] = content_filename
+    elif has_legacy_ids:
+        filenames["content_image_url"] = f"{post['user_id']}_{post['id']}.jpg"
+    
+    return filenames
+
 @memory_optimized(cleanup_args=False)
 async def generate_post_image_urls(supabase, post: dict, is_private: bool) -> dict:
     """
     Generate signed URLs for both selfie and content images in a post.
     Returns a dict with 'selfie_image_url' and 'content_image_url' keys.
     """
-    urls = {}
+    # Don't cleanup the post dict - it's still needed by the caller!
+    return (await generate_post_image_urls_batch(supabase, [post], [is_private]))[0]
+
+async def generate_post_image_urls_batch(
+    supabase: AsyncClient,
+    posts: List[dict],
+    is_private: Optional[List[bool]] = None
+) -> List[dict]:
+    """
+    Generate image URLs for a page of posts with one bulk signing call per bucket.
     
-    # Generate selfie image URL
-    selfie_filename = post.get("selfie_image_filename")
-    if selfie_filename:
-        urls["selfie_image_url"] = await generate_post_image_url(supabase, selfie_filename, is_private)
-    elif post.get("user_id") and post.get("id"):
-        # Fallback to legacy pattern for selfie (based on post ID)
-        legacy_selfie_filename = f"{post['user_id']}_{post['id']}_selfie.jpg"
-        urls["selfie_image_url"] = await generate_post_image_url(supabase, legacy_selfie_filename, is_private)
+    Args:
+        supabase: Async Supabase client
+        posts: Post rows (same shape accepted by generate_post_image_urls)
+        is_private: Per-post privacy flags; defaults to each post's 'is_private' field
+        
+    Returns:
+        List of {'selfie_image_url', 'content_image_url'} dicts, aligned with posts
+    """
+    if is_private is None:
+        is_private = [bool(post.get('is_private', False)) for post in posts]
     
-    # Generate content image URL using existing image_filename field
-    content_filename = post.get("image_filename")
-    if content_filename:
-        urls["content_image_url"] = await generate_post_image_url(supabase, content_filename, is_private)
-    elif post.get("user_id") and post.get("id"):
-        # Fallback to legacy pattern for content (based on post ID)
-        legacy_content_filename = f"{post['user_id']}_{post['id']}.jpg"
-        urls["content_image_url"] = await generate_post_image_url(supabase, legacy_content_filename, is_private)
+    per_post = []
+    requests = []
+    for post, private in zip(posts, is_private):
+        bucket_name = 'private_images' if private else 'public_images'
+        filenames = _post_image_filenames(post)
+        per_post.append((bucket_name, filenames))
+        requests.extend((bucket_name, filename) for filename in filenames.values())
     
-    # Don't cleanup the post dict - it's still needed by the caller!
+    try:
+        resolved = await generate_cached_signed_urls(supabase, requests)
+    except Exception as e:
+        print(f"Error generating signed URLs for posts: {e}")
+        resolved = {}
     
-    return urls
+    return [
+        {key: resolved.get((bucket_name, filename)) for key, filename in filenames.items()}
+        for bucket_name, filenames in per_post
+    ]
 
 @memory_optimized(cleanup_args=False)
 async def generate_verification_image_url(supabase, image_filename: Optional[str], is_private: bool) -> Optional[str]:
@@ -263,31 +313,8 @@ async def generate_verification_image_url(supabase, image_filename: Optional[str
     if not image_filename:
         return None
     
-    # Check cache first
-    bucket_name = 'private_images' if is_private else 'public_images'
-    cache_key = f"{bucket_name}:{image_filename}"
-    cached_url = _get_cached_url(cache_key)
-    if cached_url:
-        return cached_url
-    
     try:
-        # Ensure filename has .jpg extension for storage lookup
-        if not image_filename.endswith('.jpg'):
-            storage_filename = f"{image_filename}.jpg"
-        else:
-            storage_filename = image_filename
-        
-        # Use the optimized signed URL function
-        signed_url = await generate_signed_url_optimized(
-            supabase, bucket_name, storage_filename, 3600
-        )
-        
-        # Cache the result
-        if signed_url:
-            _set_cached_url(cache_key, signed_url)
-        
-        return signed_url
-        
+        return await _get_or_sign_url(supabase, 'private_images' if is_private else 'public_images', image_filename)
     except Exception as e:
         print(f"Error generating signed URL for verification image: {e}")
         return None
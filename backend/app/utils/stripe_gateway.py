@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+import stripe
+from dotenv import load_dotenv
+
+# Load environment variables from backend root directory
+current_dir = os.path.dirname(os.path.abspath(__file__))
+app_dir = os.path.dirname(current_dir)
+backend_dir = os.path.dirname(app_dir)
+env_path = os.path.join(backend_dir, '.env')
+load_dotenv(env_path)
+
+logger = logging.getLogger(__name__)
+T = TypeVar('T')
+
+# Stripe calls run on a dedicated thread pool so they never block the event loop. The pool
+# size is also the concurrency limit: Stripe allows 100 req/s in live mode, and a scheduler
+# batch must not starve API requests of workers. Pool threads are long-lived, so each keeps
+# its requests session (and keep-alive connection to api.stripe.com) across calls.
+STRIPE_POOL_SIZE = int(os.getenv("STRIPE_POOL_SIZE", "8"))
+
+# Retries are delegated to the SDK: it backs off exponentially with jitter, honours
+# Stripe-Should-Retry and adds an idempotency key to retried POSTs.
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", "2"))
+
+def idempotency_key(operation: str, *parts: Any) -> str:
+    """
+    Deterministic idempotency key for a money-moving call.
+
+    The same operation on the same inputs (e.g. a transfer for one set of penalties)
+    maps to the same key, so a job re-run or a redelivered webhook within Stripe's
+    24h key window returns the original object instead of paying twice.
+    """
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()[:40]
+    return f"{operation}-{digest}"
+
+class AsyncStripeGateway:
+    """
+    Async facade over the stripe SDK.
+
+    Blocking SDK calls are submitted to a bounded thread pool, with per-operation
+    latency/error metrics. Stripe exceptions propagate unchanged, so existing
+    `except stripe.error.StripeError` handlers keep working.
+
+    Example:
+        payment_intent = await stripe_gateway.call(
+            stripe.PaymentIntent.create,
+            amount=500,
+            currency="usd",
+            idempotency_key=idempotency_key("charge", user_id, *penalty_ids)
+        )
+    """
+
+    def __init__(self, max_workers: int = STRIPE_POOL_SIZE, max_network_retries: int = STRIPE_MAX_NETWORK_RETRIES):
+        self.max_workers = max_workers
+        self.max_network_retries = max_network_retries
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._configured = False
+        self._in_flight = 0
+        self._metrics: Dict[str, Dict[str, float]] = {}
+
+    def _configure(self) -> None:
+        if self._configured:
+            return
+        if not stripe.api_key:
+            stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+        stripe.max_network_retries = self.max_network_retries
+        self._configured = True
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._configure()
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="stripe"
+                    )
+        return self._executor
+
+    def _record(self, operation: str, failed: bool, elapsed: float) -> None:
+        stats = self._metrics.setdefault(operation, {
+            "calls": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0
+        })
+        stats["calls"] += 1
+        if failed:
+            stats["errors"] += 1
+        stats["total_seconds"] += elapsed
+        stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+    async def call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Run a blocking stripe SDK callable (e.g. stripe.Transfer.create) on the pool.
+
+        Args:
+            func: SDK method or any blocking function making Stripe requests
+            *args, **kwargs: Passed through, including idempotency_key/stripe_account
+
+        Returns:
+            Whatever func returns
+
+        Note:
+            Cancelling the awaiting task does not abort a request already sent to
+            Stripe - pass an idempotency_key for anything that moves money.
+        """
+        executor = self._get_executor()
+        operation = getattr(func, "__qualname__", None) or getattr(func, "__name__", "custom")
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        self._in_flight += 1
+        failed = False
+        try:
+            return await loop.run_in_executor(executor, lambda: func(*args, **kwargs))
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._in_flight -= 1
+            self._record(operation, failed, time.perf_counter() - started)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        operations = {}
+        for operation, stats in self._metrics.items():
+            operations[operation] = {
+                **stats,
+                "avg_seconds": round(stats["total_seconds"] / stats["calls"], 3) if stats["calls"] else 0.0
+            }
+        return {
+            "pool_size": self.max_workers,
+            "max_network_retries": self.max_network_retries,
+            "in_flight": self._in_flight,
+            "operations": operations
+        }
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop the thread pool (queued calls are abandoned unless wait=True)"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=not wait)
+                self._executor = None
+
+# Global singleton instance
+stripe_gateway = AsyncStripeGateway()
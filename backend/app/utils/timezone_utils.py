@@ -2,12 +2,13 @@ import pytz
 from datetime import datetime, timezone, timedelta
 from supabase._async.client import AsyncClient
 from utils.memory_optimization import cleanup_memory
+from utils.async_coordination import coalesced_execute
 
 async def get_user_timezone(supabase: AsyncClient, user_id: str) -> str:
     """Get user's timezone from the database"""
     user_result = None
     try:
-        user_result = await supabase.table("users").select("timezone").eq("id", user_id).execute()
+        user_result = await coalesced_execute(supabase.table("users").select("timezone").eq("id", user_id))
         if not user_result.data:
             return "UTC"
         
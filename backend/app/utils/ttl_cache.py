@@ -0,0 +1,202 @@
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+_MISSING = object()
+# Handed to waiters when the loading caller is cancelled, so they retry instead of failing
+_RETRY = object()
+
+# Every TTLCache registers itself here so stats can be reported in one place
+_caches: List["TTLCache"] = []
+
+def approximate_size(value: Any, _depth: int = 0) -> int:
+    """Rough deep size in bytes of a cached value (containers are followed 4 levels deep)"""
+    size = sys.getsizeof(value)
+    if _depth >= 4:
+        return size
+    if isinstance(value, dict):
+        size += sum(approximate_size(k, _depth + 1) + approximate_size(v, _depth + 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approximate_size(item, _depth + 1) for item in value)
+    return size
+
+class TTLCache:
+    """
+    In-process LRU cache with per-entry expiry and async single-flight loading.
+
+    - LRU order is kept by an OrderedDict, so hits, inserts and evictions are O(1)
+    - Expired entries are dropped lazily when read (or when they reach the LRU end)
+    - Optional byte budget, measured with approximate_size() on insert
+    - get_or_load() coalesces concurrent misses for the same key into one load
+
+    Example:
+        _habit_cache = TTLCache("habits", max_entries=1000, ttl=300)
+
+        habit = await _habit_cache.get_or_load(habit_id, lambda: fetch_habit(supabase, habit_id))
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int = 1000,
+        ttl: float = 300,
+        max_bytes: Optional[int] = None,
+        sizeof: Callable[[Any], int] = approximate_size
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, expires_at, size)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.loads = 0
+        self.coalesced = 0
+
+        _caches.append(self)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING, record=False) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None, record: bool = True) -> Any:
+        """Get a cached value (refreshing its LRU position), or default if missing/expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            if record:
+                self.misses += 1
+            return default
+
+        if time.monotonic() >= entry[1]:
+            self._remove(key)
+            self.expirations += 1
+            if record:
+                self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        if record:
+            self.hits += 1
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Cache a value for ttl seconds (defaults to the cache TTL)"""
+        size = self._sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # Never cache a single value larger than the whole budget
+
+        self._remove(key)
+        self._entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl), size)
+        self._bytes += size
+        self._evict()
+
+    def delete(self, key: Hashable) -> None:
+        """Drop a key, including any in-flight load so its result isn't cached"""
+        self._remove(key)
+        self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._inflight.clear()
+        self._bytes = 0
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+        cache_none: bool = False
+    ) -> Any:
+        """
+        Return the cached value, or await loader() once for all concurrent callers.
+
+        Args:
+            key: Cache key
+            loader: Zero-argument coroutine function producing the value
+            ttl: Entry TTL override
+            cache_none: Whether a None result should be cached
+
+        Returns:
+            The cached or freshly loaded value. Loader exceptions propagate to every
+            waiting caller and nothing is cached. If the loading caller is cancelled its
+            waiters aren't - the first of them to retry runs the load instead.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            value = await asyncio.shield(inflight)
+            if value is _RETRY:
+                return await self.get_or_load(key, loader, ttl, cache_none)
+            return value
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.loads += 1
+        try:
+            value = await loader()
+        except BaseException as e:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.set_result(_RETRY)
+            else:
+                future.set_exception(e)
+                future.exception()  # Mark retrieved - there may be no other waiters
+            raise
+
+        # Only cache if the key wasn't invalidated while loading
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+            if value is not None or cache_none:
+                self.set(key, value, ttl)
+        future.set_result(value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes if self.max_bytes is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "loads": self.loads,
+            "coalesced": self.coalesced
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _evict(self) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            key, (_, expires_at, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            if time.monotonic() >= expires_at:
+                self.expirations += 1
+            else:
+                self.evictions += 1
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Hit/miss/eviction counters for every TTLCache in this process"""
+    return {cache.name: cache.stats() for cache in _caches}
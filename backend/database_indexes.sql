@@ -78,6 +78,8 @@ CREATE INDEX IF NOT EXISTS idx_health_progress_user_date ON health_habit_progres
 
 -- Gaming sessions (14 rows) - Add only if gaming habits become popular
 -- CREATE INDEX IF NOT EXISTS idx_gaming_sessions_habit_start ON gaming_sessions(habit_id, game_start_time);
+-- Serves the bulk "already tracked?" check (habit_id = ? AND match_id IN (...))
+-- CREATE INDEX IF NOT EXISTS idx_gaming_sessions_habit_match ON gaming_sessions(habit_id, match_id);
 
 -- Custom habit types (3 rows) - Add only if many custom habits created
 -- CREATE INDEX IF NOT EXISTS idx_custom_habit_types_user_active ON custom_habit_types(user_id, is_active);
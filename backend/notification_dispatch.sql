@@ -0,0 +1,60 @@
+-- Due Notification Dispatch
+-- Lets HabitNotificationScheduler.process_due_notifications claim due notifications in
+-- batches, so several workers (or overlapping runs) never send the same one twice.
+-- Without this function the dispatcher falls back to one unclaimed batch per run.
+
+-- ============================================================================
+-- CLAIM COLUMNS
+-- ============================================================================
+
+ALTER TABLE scheduled_notifications ADD COLUMN IF NOT EXISTS claimed_at timestamptz;
+ALTER TABLE scheduled_notifications ADD COLUMN IF NOT EXISTS claimed_by text;
+
+-- Failed send attempts; the dispatcher gives up at NOTIFICATION_MAX_ATTEMPTS (default 5)
+ALTER TABLE scheduled_notifications ADD COLUMN IF NOT EXISTS attempts integer NOT NULL DEFAULT 0;
+
+-- Due, unsent notifications in send order
+CREATE INDEX IF NOT EXISTS idx_scheduled_notifications_due
+ON scheduled_notifications(scheduled_time)
+WHERE sent = false;
+
+-- ============================================================================
+-- CLAIM FUNCTION
+-- ============================================================================
+
+-- Claim up to p_limit due, unsent notifications that are unclaimed or whose claim
+-- is older than p_claim_ttl_seconds (the claiming worker died or failed to send).
+-- SKIP LOCKED lets concurrent callers take disjoint batches without waiting.
+CREATE OR REPLACE FUNCTION claim_due_notifications(p_worker text, p_limit integer, p_claim_ttl_seconds integer)
+RETURNS SETOF scheduled_notifications
+LANGUAGE sql
+AS $$
+    WITH due AS (
+        SELECT id
+        FROM scheduled_notifications
+        WHERE sent = false
+          AND scheduled_time <= now()
+          AND (claimed_at IS NULL OR claimed_at < now() - make_interval(secs => p_claim_ttl_seconds))
+        ORDER BY scheduled_time
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE scheduled_notifications n
+    SET claimed_at = now(), claimed_by = p_worker
+    FROM due
+    WHERE n.id = due.id
+    RETURNING n.*;
+$$;
+
+-- ============================================================================
+-- NOTES
+-- ============================================================================
+
+/*
+- Outcomes are written back by the dispatcher with one UPDATE ... WHERE id IN (...)
+  per outcome (sent, skipped per reason); failed notifications keep their claim and
+  are retried once it expires.
+- Each failure increments attempts. At NOTIFICATION_MAX_ATTEMPTS the notification is
+  closed as sent = true, skipped = true, skip_reason = 'delivery_failed', so it is never
+  claimed again and is removed by the regular cleanup of old notifications.
+*/
@@ -0,0 +1,103 @@
+-- Set-Based Daily Penalty Engine
+-- Applies a whole batch of missed daily habits in one round-trip: inserts the
+-- penalties, decrements the habits' streaks and updates recipient analytics.
+-- Called by tasks/penalty_engine.py; the backend falls back to client-side bulk
+-- queries until this migration is applied.
+
+-- ============================================================================
+-- SUPPORTING INDEXES
+-- ============================================================================
+
+-- Duplicate check on (habit_id, penalty_date) and the analytics lookup
+CREATE INDEX IF NOT EXISTS idx_penalties_habit_date ON penalties (habit_id, penalty_date);
+CREATE INDEX IF NOT EXISTS idx_recipient_analytics_recipient_habit ON recipient_analytics (recipient_id, habit_id);
+
+-- ============================================================================
+-- APPLY DAILY PENALTIES
+-- ============================================================================
+
+-- p_penalties: [{habit_id, user_id, recipient_id, amount, penalty_date, reason}, ...]
+-- Returns the penalties actually created (rows that already existed are skipped).
+-- Data-modifying CTEs run in one statement, so the batch is applied atomically.
+CREATE OR REPLACE FUNCTION apply_daily_penalties(p_penalties jsonb)
+RETURNS SETOF penalties
+LANGUAGE sql
+AS $$
+    WITH candidates AS (
+        SELECT DISTINCT ON (c.habit_id, c.penalty_date) c.*
+        FROM jsonb_to_recordset(p_penalties) AS c(
+            habit_id uuid,
+            user_id uuid,
+            recipient_id uuid,
+            amount numeric,
+            penalty_date date,
+            reason text
+        )
+    ),
+    inserted AS (
+        INSERT INTO penalties (habit_id, user_id, recipient_id, amount, penalty_date, is_paid, reason)
+        SELECT c.habit_id, c.user_id, c.recipient_id, c.amount, c.penalty_date, false, c.reason
+        FROM candidates c
+        WHERE NOT EXISTS (
+            SELECT 1 FROM penalties p
+            WHERE p.habit_id = c.habit_id AND p.penalty_date = c.penalty_date
+        )
+        RETURNING *
+    ),
+    streaks AS (
+        UPDATE habits h
+        SET streak = GREATEST(COALESCE(h.streak, 0) - 1, 0)
+        FROM (SELECT DISTINCT habit_id FROM inserted) i
+        WHERE h.id = i.habit_id
+        RETURNING h.id
+    ),
+    failures AS (
+        SELECT recipient_id, habit_id, user_id AS habit_owner_id,
+               COUNT(*) AS failures, SUM(amount) AS amount,
+               MIN(penalty_date) AS first_date, MAX(penalty_date) AS last_date
+        FROM inserted
+        WHERE recipient_id IS NOT NULL
+        GROUP BY recipient_id, habit_id, user_id
+    ),
+    updated_analytics AS (
+        UPDATE recipient_analytics ra
+        SET total_failures = ra.total_failures + f.failures,
+            total_required_days = ra.total_required_days + f.failures,
+            pending_earnings = ra.pending_earnings + f.amount,
+            last_penalty_date = f.last_date,
+            success_rate = ROUND(ra.total_completions * 100.0 / NULLIF(ra.total_required_days + f.failures, 0), 2),
+            updated_at = now()
+        FROM failures f
+        WHERE ra.recipient_id = f.recipient_id AND ra.habit_id = f.habit_id
+        RETURNING ra.id
+    ),
+    created_analytics AS (
+        INSERT INTO recipient_analytics (
+            recipient_id, habit_id, habit_owner_id, total_completions, total_failures,
+            total_required_days, success_rate, first_recipient_date, last_penalty_date,
+            total_earned, pending_earnings
+        )
+        SELECT f.recipient_id, f.habit_id, f.habit_owner_id, 0, f.failures,
+               f.failures, 0, f.first_date, f.last_date,
+               0, f.amount
+        FROM failures f
+        WHERE NOT EXISTS (
+            SELECT 1 FROM recipient_analytics ra
+            WHERE ra.recipient_id = f.recipient_id AND ra.habit_id = f.habit_id
+        )
+        RETURNING id
+    )
+    SELECT * FROM inserted;
+$$;
+
+-- ============================================================================
+-- NOTES
+-- ============================================================================
+
+/*
+- Semantics match check_and_create_penalty_for_habit: one penalty per habit and
+  day, streak decremented (minimum 0), analytics failure/required-day counters
+  and pending earnings incremented, success rate recalculated.
+- Unreferenced data-modifying CTEs still run to completion in PostgreSQL, which
+  is what applies the streak and analytics changes.
+*/
@@ -0,0 +1,56 @@
+-- Penalty Job Ledger
+-- Records every hourly run of check_and_charge_penalties / check_weekly_penalties and
+-- the steps it finished, so a completed hour is never evaluated twice and a failed or
+-- crashed run resumes where it stopped. Used by tasks/penalty_ledger.py; without
+-- these tables the jobs still run, just without checkpoints or replay.
+
+-- ============================================================================
+-- RUNS
+-- ============================================================================
+
+-- run_key: the UTC hour evaluated (ISO 8601), shard: "<index>/<count>" ("0/1" unsharded)
+CREATE TABLE IF NOT EXISTS penalty_job_runs (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    job text NOT NULL,
+    run_key text NOT NULL,
+    shard text NOT NULL DEFAULT '0/1',
+    status text NOT NULL DEFAULT 'running' CHECK (status IN ('running', 'completed', 'failed')),
+    attempts integer NOT NULL DEFAULT 1,
+    stats jsonb,
+    error text,
+    started_at timestamptz NOT NULL DEFAULT now(),
+    updated_at timestamptz NOT NULL DEFAULT now(),
+    finished_at timestamptz,
+    UNIQUE (job, run_key, shard)
+);
+
+-- Resume pass: recent runs of one job and shard
+CREATE INDEX IF NOT EXISTS idx_penalty_job_runs_job_shard_key
+ON penalty_job_runs(job, shard, run_key DESC);
+
+-- ============================================================================
+-- PROGRESS
+-- ============================================================================
+
+-- One row per finished step. subject: a user or habit id, or '*' for steps that
+-- cover the whole run (e.g. the set-based daily penalty engine).
+CREATE TABLE IF NOT EXISTS penalty_job_progress (
+    run_id uuid NOT NULL REFERENCES penalty_job_runs(id) ON DELETE CASCADE,
+    step text NOT NULL,
+    subject text NOT NULL,
+    penalties_created integer NOT NULL DEFAULT 0,
+    completed_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (run_id, step, subject)
+);
+
+-- ============================================================================
+-- NOTES
+-- ============================================================================
+
+/*
+- The daily engine step is still protected per habit by the (habit_id, penalty_date)
+  check in apply_daily_penalties; the ledger adds per-user checkpoints for the
+  integration and weekly checks, which have no such key.
+- Hours are replayed only back to the oldest recorded run, so creating these tables
+  doesn't replay history. Old runs are pruned daily (prune_penalty_job_runs).
+*/
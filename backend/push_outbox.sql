@@ -0,0 +1,98 @@
+-- Push Notification Outbox
+-- Web dynos queue pushes here instead of calling APNs inside the request; the worker
+-- dyno's PushOutboxConsumer (services/push_outbox.py) delivers them with retries.
+-- Only used when PUSH_OUTBOX=supabase; otherwise pushes are sent inline.
+
+-- ============================================================================
+-- OUTBOX TABLE
+-- ============================================================================
+
+-- status: pending -> sent, or failed after PUSH_OUTBOX_MAX_ATTEMPTS attempts
+-- collapse_key: hash of the payload; duplicates to the same device coalesce while pending
+CREATE TABLE IF NOT EXISTS push_outbox (
+    id bigserial PRIMARY KEY,
+    device_token text NOT NULL,
+    payload jsonb NOT NULL,
+    collapse_key text NOT NULL,
+    status text NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'sent', 'failed')),
+    attempts integer NOT NULL DEFAULT 0,
+    next_attempt_at timestamptz NOT NULL DEFAULT now(),
+    claimed_at timestamptz,
+    claimed_by text,
+    last_error text,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    updated_at timestamptz NOT NULL DEFAULT now(),
+    sent_at timestamptz
+);
+
+-- Coalescing: at most one pending message per device and payload
+CREATE UNIQUE INDEX IF NOT EXISTS uq_push_outbox_pending
+ON push_outbox(device_token, collapse_key)
+WHERE status = 'pending';
+
+-- Consumer: due pending messages in order
+CREATE INDEX IF NOT EXISTS idx_push_outbox_due
+ON push_outbox(next_attempt_at, id)
+WHERE status = 'pending';
+
+-- Pruning of finished messages
+CREATE INDEX IF NOT EXISTS idx_push_outbox_finished
+ON push_outbox(updated_at)
+WHERE status <> 'pending';
+
+-- ============================================================================
+-- OUTBOX OPERATIONS
+-- ============================================================================
+
+-- Queue [{device_token, payload, collapse_key}, ...]. A message whose device and key
+-- are already pending replaces that message's payload instead of adding a row.
+CREATE OR REPLACE FUNCTION enqueue_push_notifications(p_messages jsonb)
+RETURNS integer
+LANGUAGE sql
+AS $$
+    WITH queued AS (
+        INSERT INTO push_outbox AS o (device_token, payload, collapse_key)
+        SELECT DISTINCT ON (m->>'device_token', m->>'collapse_key')
+               m->>'device_token', m->'payload', m->>'collapse_key'
+        FROM jsonb_array_elements(p_messages) AS m
+        ON CONFLICT (device_token, collapse_key) WHERE status = 'pending'
+        DO UPDATE SET payload = EXCLUDED.payload, updated_at = now()
+        RETURNING 1
+    )
+    SELECT count(*)::integer FROM queued;
+$$;
+
+-- Claim up to p_limit due messages that are unclaimed or whose claim is older than
+-- p_claim_ttl_seconds (the consumer died mid-batch). SKIP LOCKED lets several
+-- consumers take disjoint batches.
+CREATE OR REPLACE FUNCTION claim_push_outbox(p_worker text, p_limit integer, p_claim_ttl_seconds integer)
+RETURNS SETOF push_outbox
+LANGUAGE sql
+AS $$
+    WITH due AS (
+        SELECT id
+        FROM push_outbox
+        WHERE status = 'pending'
+          AND next_attempt_at <= now()
+          AND (claimed_at IS NULL OR claimed_at < now() - make_interval(secs => p_claim_ttl_seconds))
+        ORDER BY next_attempt_at, id
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE push_outbox o
+    SET claimed_at = now(), claimed_by = p_worker
+    FROM due
+    WHERE o.id = due.id
+    RETURNING o.*;
+$$;
+
+-- ============================================================================
+-- NOTES
+-- ============================================================================
+
+/*
+- Completion and retries are plain bulk UPDATEs from the consumer
+  (WHERE id IN (...)); retries set next_attempt_at with exponential backoff.
+- A coalesced update can land on a message that is already being delivered; it is then
+  delivered once, which is the point of coalescing identical pushes.
+*/
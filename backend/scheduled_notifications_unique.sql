@@ -0,0 +1,24 @@
+-- Scheduled Notifications Unique Key
+-- Lets HabitNotificationScheduler persist a habit's whole notification set with one
+-- upsert (ON CONFLICT DO NOTHING) instead of a duplicate SELECT + INSERT per row.
+-- Without this index the scheduler still works, deduplicating client-side.
+
+-- ============================================================================
+-- REMOVE EXISTING DUPLICATES
+-- ============================================================================
+
+-- Keep one row per key, preferring a sent row (so its delivery record survives)
+DELETE FROM scheduled_notifications a
+USING scheduled_notifications b
+WHERE a.habit_id = b.habit_id
+  AND a.notification_type = b.notification_type
+  AND a.scheduled_time = b.scheduled_time
+  AND (a.sent::int, a.id::text) < (b.sent::int, b.id::text);
+
+-- ============================================================================
+-- UNIQUE KEY
+-- ============================================================================
+
+-- Also serves the per-habit pending diff (habit_id is the leading column)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_scheduled_notifications_habit_type_time
+ON scheduled_notifications(habit_id, notification_type, scheduled_time);
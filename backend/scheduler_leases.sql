@@ -0,0 +1,86 @@
+-- Scheduler Leases
+-- Lets several scheduler worker dynos run the same schedule without running a job
+-- (or a shard of one) twice. Used by tasks/job_coordination.py when
+-- SCHEDULER_COORDINATION=supabase; not needed for a single uncoordinated worker.
+-- All expiry checks use the database clock, so worker clocks don't have to agree.
+
+-- ============================================================================
+-- LEASE TABLE
+-- ============================================================================
+
+-- name: "<job id>:<shard>/<shard count>"
+-- completed_run: run key of the last run finished under this lease; the same run
+-- is never acquired again, even after the lease is freed.
+CREATE TABLE IF NOT EXISTS scheduler_leases (
+    name text PRIMARY KEY,
+    owner text NOT NULL,
+    run_key text,
+    completed_run text,
+    expires_at timestamptz NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+-- ============================================================================
+-- LEASE OPERATIONS
+-- ============================================================================
+
+-- Take the lease if it is new, expired or already ours, unless this run is done.
+-- Returns true when acquired, NULL otherwise.
+CREATE OR REPLACE FUNCTION acquire_scheduler_lease(p_name text, p_owner text, p_run_key text, p_ttl_seconds integer)
+RETURNS boolean
+LANGUAGE sql
+AS $$
+    INSERT INTO scheduler_leases AS l (name, owner, run_key, expires_at, updated_at)
+    VALUES (p_name, p_owner, p_run_key, now() + make_interval(secs => p_ttl_seconds), now())
+    ON CONFLICT (name) DO UPDATE
+    SET owner = EXCLUDED.owner,
+        run_key = EXCLUDED.run_key,
+        expires_at = EXCLUDED.expires_at,
+        updated_at = now()
+    WHERE (l.expires_at < now() OR l.owner = EXCLUDED.owner)
+      AND l.completed_run IS DISTINCT FROM EXCLUDED.run_key
+    RETURNING true;
+$$;
+
+-- Heartbeat: extend a lease we still hold. NULL means another worker took it over.
+CREATE OR REPLACE FUNCTION renew_scheduler_lease(p_name text, p_owner text, p_ttl_seconds integer)
+RETURNS boolean
+LANGUAGE sql
+AS $$
+    UPDATE scheduler_leases
+    SET expires_at = now() + make_interval(secs => p_ttl_seconds), updated_at = now()
+    WHERE name = p_name AND owner = p_owner
+    RETURNING true;
+$$;
+
+-- Finish a run: record it as completed and free the lease.
+CREATE OR REPLACE FUNCTION complete_scheduler_lease(p_name text, p_owner text, p_run_key text)
+RETURNS void
+LANGUAGE sql
+AS $$
+    UPDATE scheduler_leases
+    SET completed_run = p_run_key, expires_at = now(), updated_at = now()
+    WHERE name = p_name AND owner = p_owner;
+$$;
+
+-- Give up a lease after a failed run so another worker can retry it.
+CREATE OR REPLACE FUNCTION release_scheduler_lease(p_name text, p_owner text)
+RETURNS void
+LANGUAGE sql
+AS $$
+    UPDATE scheduler_leases
+    SET expires_at = now(), updated_at = now()
+    WHERE name = p_name AND owner = p_owner;
+$$;
+
+-- ============================================================================
+-- NOTES
+-- ============================================================================
+
+/*
+- One row per job shard; rows are reused by every run, so the table stays tiny.
+- Changing SCHEDULER_SHARD_COUNT changes the lease names; old rows are inert and
+  can be deleted.
+- Postgres advisory locks were not used because they belong to a database session,
+  and PostgREST requests do not keep a session between calls.
+*/
@@ -0,0 +1,196 @@
+-- Per-Section Sync Watermarks for /api/sync/delta
+-- Each row records the last time a section of a user's app data changed, so the
+-- delta endpoint can skip sections (and answer 304) without refetching them.
+-- Maintained entirely by triggers; the backend only reads this table.
+
+-- ============================================================================
+-- WATERMARK TABLE
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS sync_watermarks (
+    user_id uuid NOT NULL,
+    section text NOT NULL,
+    changed_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (user_id, section)
+);
+
+CREATE OR REPLACE FUNCTION bump_sync_watermark(p_user_id uuid, p_section text)
+RETURNS void
+LANGUAGE sql
+AS $$
+    INSERT INTO sync_watermarks (user_id, section, changed_at)
+    VALUES (p_user_id, p_section, now())
+    ON CONFLICT (user_id, section) DO UPDATE SET changed_at = now();
+$$;
+
+-- Bump a section for a user and all of their accepted friends
+CREATE OR REPLACE FUNCTION bump_sync_watermark_for_friends(p_user_id uuid, p_section text)
+RETURNS void
+LANGUAGE sql
+AS $$
+    INSERT INTO sync_watermarks (user_id, section, changed_at)
+    SELECT p_user_id, p_section, now()
+    UNION
+    SELECT CASE WHEN r.user1_id = p_user_id THEN r.user2_id ELSE r.user1_id END, p_section, now()
+    FROM user_relationships r
+    WHERE (r.user1_id = p_user_id OR r.user2_id = p_user_id) AND r.status = 'accepted'
+    ON CONFLICT (user_id, section) DO UPDATE SET changed_at = now();
+$$;
+
+-- ============================================================================
+-- TRIGGERS (one per source table)
+-- ============================================================================
+
+-- Owner-scoped tables: habits, verifications, weekly progress, custom types, staging
+CREATE OR REPLACE FUNCTION sync_watermark_owner_trigger()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    row_data record := COALESCE(NEW, OLD);
+BEGIN
+    PERFORM bump_sync_watermark(row_data.user_id, TG_ARGV[0]);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_sync_watermark_habits ON habits;
+CREATE TRIGGER trg_sync_watermark_habits
+    AFTER INSERT OR UPDATE OR DELETE ON habits
+    FOR EACH ROW EXECUTE FUNCTION sync_watermark_owner_trigger('habits');
+
+DROP TRIGGER IF EXISTS trg_sync_watermark_verifications ON habit_verifications;
+CREATE TRIGGER trg_sync_watermark_verifications
+    AFTER INSERT OR UPDATE OR DELETE ON habit_verifications
+    FOR EACH ROW EXECUTE FUNCTION sync_watermark_owner_trigger('verifications');
+
+DROP TRIGGER IF EXISTS trg_sync_watermark_weekly_progress ON weekly_habit_progress;
+CREATE TRIGGER trg_sync_watermark_weekly_progress
+    AFTER INSERT OR UPDATE OR DELETE ON weekly_habit_progress
+    FOR EACH ROW EXECUTE FUNCTION sync_watermark_owner_trigger('weekly_progress');
+
+DROP TRIGGER IF EXISTS trg_sync_watermark_custom_habit_types ON custom_habit_types;
+CREATE TRIGGER trg_sync_watermark_custom_habit_types
+    AFTER INSERT OR UPDATE OR DELETE ON custom_habit_types
+    FOR EACH ROW EXECUTE FUNCTION sync_watermark_owner_trigger('custom_habit_types');
+
+DROP TRIGGER IF EXISTS trg_sync_watermark_staging ON habit_change_staging;
+CREATE TRIGGER trg_sync_watermark_staging
+    AFTER INSERT OR UPDATE OR DELETE ON habit_change_staging
+    FOR EACH ROW EXECUTE FUNCTION sync_watermark_owner_trigger('staged_deletions');
+
+-- Users: own profile/payment method, plus friends' lists (name, phone, Stripe status).
+-- Feed posts embed the author's name and avatar, so only those columns bump friends' feeds.
+-- last_active is bumped on every request, so it must not count as a change.
+CREATE OR REPLACE FUNCTION sync_watermark_users_trigger()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF (to_jsonb(NEW) - 'last_active') = (to_jsonb(OLD) - 'last_active') THEN
+        RETURN NULL;
+    END IF;
+    PERFORM bump_sync_watermark(NEW.id, 'profile');
+    PERFORM bump_sync_watermark_for_friends(NEW.id, 'friends');
+    IF (NEW.name, NEW.avatar_version, NEW.avatar_url_80, NEW.avatar_url_200, NEW.avatar_url_original)
+       IS DISTINCT FROM
+       (OLD.name, OLD.avatar_version, OLD.avatar_url_80, OLD.avatar_url_200, OLD.avatar_url_original) THEN
+        PERFORM bump_sync_watermark_for_friends(NEW.id, 'feed');
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_sync_watermark_users ON users;
+CREATE TRIGGER trg_sync_watermark_users
+    AFTER UPDATE ON users
+    FOR EACH ROW EXECUTE FUNCTION sync_watermark_users_trigger();
+
+-- Relationships: friends and friend requests for both sides
+CREATE OR REPLACE FUNCTION sync_watermark_relationships_trigger()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    row_data record := COALESCE(NEW, OLD);
+BEGIN
+    PERFORM bump_sync_watermark(row_data.user1_id, 'friends');
+    PERFORM bump_sync_watermark(row_data.user2_id, 'friends');
+    PERFORM bump_sync_watermark(row_data.user1_id, 'friend_requests');
+    PERFORM bump_sync_watermark(row_data.user2_id, 'friend_requests');
+    -- Feed visibility follows friendship
+    PERFORM bump_sync_watermark(row_data.user1_id, 'feed');
+    PERFORM bump_sync_watermark(row_data.user2_id, 'feed');
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_sync_watermark_relationships ON user_relationships;
+CREATE TRIGGER trg_sync_watermark_relationships
+    AFTER INSERT OR UPDATE OR DELETE ON user_relationships
+    FOR EACH ROW EXECUTE FUNCTION sync_watermark_relationships_trigger();
+
+-- Posts: the author's feed and every friend's feed
+CREATE OR REPLACE FUNCTION sync_watermark_posts_trigger()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    row_data record := COALESCE(NEW, OLD);
+BEGIN
+    PERFORM bump_sync_watermark_for_friends(row_data.user_id, 'feed');
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_sync_watermark_posts ON posts;
+CREATE TRIGGER trg_sync_watermark_posts
+    AFTER INSERT OR UPDATE OR DELETE ON posts
+    FOR EACH ROW EXECUTE FUNCTION sync_watermark_posts_trigger();
+
+-- Comments are embedded in feed posts, so they bump the post author's audience
+CREATE OR REPLACE FUNCTION sync_watermark_comments_trigger()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    row_data record := COALESCE(NEW, OLD);
+    author_id uuid;
+BEGIN
+    SELECT user_id INTO author_id FROM posts WHERE id = row_data.post_id;
+    IF author_id IS NOT NULL THEN
+        PERFORM bump_sync_watermark_for_friends(author_id, 'feed');
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_sync_watermark_comments ON comments;
+CREATE TRIGGER trg_sync_watermark_comments
+    AFTER INSERT OR UPDATE OR DELETE ON comments
+    FOR EACH ROW EXECUTE FUNCTION sync_watermark_comments_trigger();
+
+-- ============================================================================
+-- SEED (every existing client cursor predates the migration)
+-- ============================================================================
+
+INSERT INTO sync_watermarks (user_id, section, changed_at)
+SELECT u.id, s.section, now()
+FROM users u
+CROSS JOIN unnest(ARRAY[
+    'habits', 'verifications', 'weekly_progress', 'custom_habit_types', 'staged_deletions',
+    'profile', 'friends', 'friend_requests', 'feed'
+]) AS s(section)
+ON CONFLICT (user_id, section) DO NOTHING;
+
+-- ============================================================================
+-- NOTES
+-- ============================================================================
+
+/*
+- A missing (user_id, section) row means the section has not changed since the
+  seed above; new users always start with a full (cursor-less) load.
+- Until the migration is applied, the backend falls back to the full delta load.
+- Time-based sections (today's verifications, current week progress, friend
+  recommendations) are also refreshed by the backend on day/week boundaries.
+*/